@@ -0,0 +1,130 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+EVC計算結果の構築コストを比較するベンチマークです。
+calculate_evcと同じ経路（評価のたびにEVCResultを構築・検証）と、
+軽量なEVCRecordを返す一括計算の経路、およびEVCRecordを後からEVCResultに変換する経路の処理時間を計測します。
+
+使用例:
+    python benchmarks/evc_result_construction.py --segments 10000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# プロジェクトのルートディレクトリをPythonのパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.evc_engine import build_evc_result, evaluate_evc_records, get_evc_plan, resolve_adjustments
+
+SAMPLE_PARAMETERS = {
+    "reference_price": 15000,
+    "initial_cost": 20000,
+    "recurring_cost": 5000,
+    "implementation_years": 3,
+    "segment_adjustments": {"s1": {"Re": 1.2, "Co": 1.0, "I": 0.8}},
+    "revenue_components": {
+        "new_revenue": {
+            "formula": "Rn = new_customers × average_arpu + expansion_revenue",
+            "calculation_function": "saas",
+            "parameters": ["new_customers", "average_arpu", "expansion_revenue"]
+        },
+        "retention_revenue": {
+            "formula": "Rr = churn_reduction × current_customers × annual_contract_value",
+            "calculation_function": "subscription",
+            "parameters": ["churn_reduction", "current_customers", "annual_contract_value"]
+        }
+    },
+    "cost_components": {
+        "direct_cost_reduction": {
+            "formula": "Cd = (manual_hours - automated_hours) × hourly_rate + resource_savings",
+            "calculation_function": "standard",
+            "parameters": ["manual_hours", "automated_hours", "hourly_rate", "resource_savings"]
+        },
+        "time_cost_reduction": {
+            "formula": "Ct = process_time_reduction × process_frequency × employee_cost_per_hour / 60",
+            "calculation_function": "process_improvement",
+            "parameters": ["process_time_reduction", "process_frequency", "employee_cost_per_hour"]
+        }
+    },
+    "new_customers": 12,
+    "average_arpu": 3000,
+    "expansion_revenue": 8000,
+    "churn_reduction": 0.05,
+    "current_customers": 200,
+    "annual_contract_value": 36000,
+    "manual_hours": 400,
+    "automated_hours": 150,
+    "hourly_rate": 4000,
+    "resource_savings": 50000,
+    "process_time_reduction": 30,
+    "process_frequency": 500,
+    "employee_cost_per_hour": 4000
+}
+
+
+def build_segments(count: int):
+    """計測用のセグメント別パラメータを生成します。"""
+    return {
+        f"s{i + 1}": dict(SAMPLE_PARAMETERS, new_customers=SAMPLE_PARAMETERS["new_customers"] + i % 7)
+        for i in range(count)
+    }
+
+
+def bench_models(segments):
+    """評価のたびにEVCResultを構築・検証する経路（calculate_evcと同じ）"""
+    results = []
+    for segment_id, params in segments.items():
+        plan = get_evc_plan(params)
+        values = plan.bind(params)
+        breakdown = plan.evaluate_values(values, resolve_adjustments(params, segment_id))
+        results.append(build_evc_result(plan, segment_id, values, breakdown))
+    return results
+
+
+def bench_records(segments):
+    """軽量なEVCRecordのみを構築する経路"""
+    return evaluate_evc_records(segments)
+
+
+def bench_records_to_models(segments):
+    """EVCRecordを構築し、上位N件のみをAPIの境界でEVCResultに変換する経路"""
+    records = evaluate_evc_records(segments)
+    top = sorted(records, key=lambda record: record.evc_value, reverse=True)[:10]
+    return [record.to_model() for record in top]
+
+
+def measure(func, segments, repeat: int) -> float:
+    """最速の実行時間（秒）を返します。"""
+    best = float("inf")
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        func(segments)
+        best = min(best, time.perf_counter() - started_at)
+    return best
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description="EVC計算結果の構築コストのベンチマーク")
+    parser.add_argument("--segments", type=int, default=10000, help="計算するセグメント数（デフォルト: 10000）")
+    parser.add_argument("--repeat", type=int, default=3, help="計測の繰り返し回数（デフォルト: 3）")
+    args = parser.parse_args()
+
+    segments = build_segments(args.segments)
+    baseline = measure(bench_models, segments, args.repeat)
+    print(f"セグメント数: {args.segments}")
+    print(f"{'経路':<28}{'合計(秒)':>12}{'1件(µs)':>12}{'速度比':>10}")
+    for label, func in (
+        ("EVCResult（毎回検証）", bench_models),
+        ("EVCRecord", bench_records),
+        ("EVCRecord + 上位10件のみ検証", bench_records_to_models),
+    ):
+        elapsed = baseline if func is bench_models else measure(func, segments, args.repeat)
+        print(f"{label:<28}{elapsed:>12.4f}{elapsed / args.segments * 1e6:>12.2f}{baseline / elapsed:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
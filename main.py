@@ -18,7 +18,7 @@ from dotenv import load_dotenv
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # ローカルモジュールをインポート
-from workflows.segmentation_workflow import get_segmentation_workflow
+from workflows.segmentation_workflow import WORKFLOW_STEPS, get_segmentation_workflow, load_workflow_output
 from utils.utils import setup_logging
 
 
@@ -29,6 +29,13 @@ def parse_arguments():
     # サービスURLのみをオプションとして残す
     parser.add_argument("-su", "--service-url", dest="service_url",
                        help="サービス説明を取得するURL")
+
+    # 既存の実行結果から指定ステップ以降のみを再実行する
+    parser.add_argument("--replay", dest="replay",
+                       help="再実行の元にする以前の実行結果ファイル（例: output.json）")
+    parser.add_argument("--from-stage", dest="from_stage", default="formula_designs",
+                       choices=[step["name"] for step in WORKFLOW_STEPS],
+                       help="--replay指定時に再実行を開始するステップ（デフォルト: formula_designs）")
     
     return parser.parse_args()
 
@@ -97,9 +104,15 @@ async def main():
         # ワークフローのインスタンスを取得
         workflow = get_segmentation_workflow()
         
-        # サービス説明と市場データを使用してワークフローを実行
-        logger.info("通常のワークフローを実行します")
-        result = await workflow.run_workflow(service_description, market_data)
+        if args.replay:
+            # 以前の実行結果を復元し、指定ステップ以降のみを再実行
+            logger.info(f"{args.replay} の結果を使用してステップ {args.from_stage} から再実行します")
+            previous_results = load_workflow_output(args.replay)
+            result = await workflow.replay_workflow(previous_results, args.from_stage, service_description, market_data)
+        else:
+            # サービス説明と市場データを使用してワークフローを実行
+            logger.info("通常のワークフローを実行します")
+            result = await workflow.run_workflow(service_description, market_data)
         
         # 出力ファイルの準備
         output_path = "output.json"
@@ -133,7 +146,7 @@ async def main():
         if isinstance(result, dict):
             # 各ステップの結果確認
             for key in result.keys():
-                if key not in ["workflow_id", "started_at", "status", "error"]:
+                if key not in ["workflow_id", "started_at", "status", "error", "replayed_from"]:
                     step_result = result.get(key, {})
                     if isinstance(step_result, dict):
                         if "error" in step_result:
@@ -11,7 +11,12 @@ import logging
 # OpenAI Agents SDK
 from agents import Agent, function_tool
 from models.models import EVCResult
-from tools.evc_tools import calculate_evc, calculate_all_segment_evc
+from tools.evc_analytics import EVCTable
+from tools.evc_formula import SEGMENT_PARAMETER_UNITS, compile_formula
+from tools.evc_tools import (
+    calculate_evc, calculate_all_segment_evc, calculate_npv_evc, calculate_break_even_prices
+)
+from tools.parameter_tables import classify_segment_id, get_parameter_table, segment_type_for
 
 
 @function_tool
@@ -30,33 +35,9 @@ async def prepare_segment_parameters(
     Returns:
         準備されたパラメータ
     """
-    # フォーミュラをJSONとして解析する
-    try:
-        if isinstance(formula, str):
-            if formula.strip().startswith('{') and formula.strip().endswith('}'): 
-                try:
-                    formula_dict = json.loads(formula)
-                except json.JSONDecodeError:
-                    try:
-                        # シングルクォートをダブルクォートに変換するなどの修正を試みる
-                        fixed_json = formula.replace("'", "\"").replace("\n", " ")
-                        formula_dict = json.loads(fixed_json)
-                    except:
-                        logging.error(f"フォーミュラのパースに失敗しました。デフォルト値を使用します。")
-                        formula_dict = {}
-            else:
-                # JSONとして解析できない場合はテキストとして処理
-                logging.warning(f"フォーミュラがJSON形式ではありません: {formula[:50]}...")
-                formula_dict = {}
-        elif isinstance(formula, dict):
-            formula_dict = formula
-        else:
-            logging.error(f"フォーミュラの型が不正です: {type(formula)}")
-            formula_dict = {}
-    except Exception as e:
-        logging.error(f"フォーミュラの処理中にエラーが発生しました: {str(e)}")
-        formula_dict = {}
-    
+    # フォーミュラはcalculate_evcと同じコンパイル済みのフォーミュラを使用する（解析・検証は一度だけ）
+    compiled_formula = compile_formula(formula)
+
     # 市場データをJSONとして解析する
     try:
         if isinstance(market_data, str):
@@ -83,17 +64,16 @@ async def prepare_segment_parameters(
         market_data_dict = {}
         
     # フォーミュラからセグメント固有パラメータを取得
-    segment_params = formula_dict.get("segment_specific_parameters", {})
-    
-    # パラメータを市場データとセグメント情報から決定
-    # 実際の実装では、市場データから適切な値を抽出する
-    
-    # フォーミュラからのパラメータ取得を試みる
-    parameters = {}
-    
-    # セグメント固有のパラメータがあれば使用
-    if segment_params:
-        parameters = segment_params.copy()
+    # 単位を検証するパラメータは検証済みの数値のみを使用し（不正な値はパラメータ表の値で補う）、それ以外はそのまま使用する
+    segment_params = compiled_formula.definition.get("segment_specific_parameters") or {}
+    parameters = {
+        key: value for key, value in segment_params.items() if key not in SEGMENT_PARAMETER_UNITS
+    } if isinstance(segment_params, dict) else {}
+    parameters.update(compiled_formula.segment_parameters)
+
+    # フォーミュラにこのセグメントの調整係数があれば、検証済みの値を使用する
+    if segment_id in compiled_formula.segment_adjustments:
+        parameters["segment_adjustments"] = {segment_id: compiled_formula.adjustments_for(segment_id)}
     
     # 市場データから必要な情報を抽出する
     # 必要なキーが存在しない場合は市場データから計算
@@ -103,15 +83,16 @@ async def prepare_segment_parameters(
         "initial_cost", "operation_cost"
     ]
     
-    # 市場データとセグメントIDからパラメータを推定
-    segment_num = int(segment_id.replace("s", ""))
-    is_enterprise = segment_num <= 2
-    is_high_value = segment_num % 2 == 1
-    
-    # 必要なパラメータがない場合、セグメント特性から組み立てる
-    # 実験的な値ではなく、実際の分析から導出するように実装する必要があります
-    
-    # revenue_based, cost_basedなどの計算専用関数を実装して、セグメントの特性から推定する
+    # 必要なパラメータがない場合、セグメントタイプ（と市場データの業種・企業規模帯）からパラメータ表を参照
+    is_enterprise, is_high_value = classify_segment_id(segment_id)
+    defaults = get_parameter_table().lookup(
+        segment_type_for(is_enterprise, is_high_value),
+        industry=market_data_dict.get("industry"),
+        size_band=market_data_dict.get("size_band")
+    )
+    for key in required_keys:
+        if key not in parameters and key in defaults:
+            parameters[key] = defaults[key]
     
     return str(parameters)
 
@@ -121,81 +102,13 @@ async def analyze_evc_results(results: List[str]) -> str:
     """EVC計算結果を分析します。
 
     Args:
-        results: EVC計算結果のリスト
+        results: EVC計算結果のリスト（JSON文字列またはEVCResultの文字列表現）
 
     Returns:
         分析結果
     """
-    # 計算結果を詳細に分析する
-    
-    # セグメント別のEVC値を抽出
-    evc_values = {result.segment_id: result.evc_value for result in results}
-    
-    # 最大・最小・平均EVC値を計算
-    max_evc = max(evc_values.values()) if evc_values else 0
-    min_evc = min(evc_values.values()) if evc_values else 0
-    avg_evc = sum(evc_values.values()) / len(evc_values) if evc_values else 0
-    
-    # 最大EVCを持つセグメントを特定
-    max_evc_segment = next((result for result in results if result.evc_value == max_evc), None)
-    max_evc_segment_id = max_evc_segment.segment_id if max_evc_segment else None
-    max_evc_segment_name = max_evc_segment.segment_name if max_evc_segment else None
-    
-    # 各コンポーネントの寄与度を分析
-    component_contributions = {}
-    for result in results:
-        segment_id = result.segment_id
-        components = result.components
-        
-        # 各コンポーネントの寄与度を計算
-        total_positive = components.reference_price + components.revenue_enhancement.value + components.cost_optimization.value
-        
-        component_contributions[segment_id] = {
-            "reference_price": {
-                "value": components.reference_price,
-                "percentage": components.reference_price / total_positive if total_positive > 0 else 0
-            },
-            "revenue_enhancement": {
-                "value": components.revenue_enhancement.value,
-                "percentage": components.revenue_enhancement.value / total_positive if total_positive > 0 else 0
-            },
-            "cost_optimization": {
-                "value": components.cost_optimization.value,
-                "percentage": components.cost_optimization.value / total_positive if total_positive > 0 else 0
-            },
-            "implementation_cost": {
-                "value": components.implementation_cost,
-                "percentage_of_total": components.implementation_cost / (total_positive + components.implementation_cost) if (total_positive + components.implementation_cost) > 0 else 0
-            }
-        }
-    
-    # 分析結果をまとめる
-    analysis = {
-        "summary": {
-            "max_evc": {
-                "value": max_evc,
-                "segment_id": max_evc_segment_id,
-                "segment_name": max_evc_segment_name
-            },
-            "min_evc": min_evc,
-            "average_evc": avg_evc,
-            "evc_range": max_evc - min_evc
-        },
-        "segment_comparison": {
-            segment_id: {
-                "evc_value": evc_value,
-                "relative_to_average": evc_value / avg_evc if avg_evc > 0 else 0,
-                "percentage_of_max": evc_value / max_evc if max_evc > 0 else 0
-            } for segment_id, evc_value in evc_values.items()
-        },
-        "component_contributions": component_contributions,
-        "key_insights": [
-            f"最も高いEVC値を持つセグメントは「{max_evc_segment_name}」で、値は{max_evc:,.0f}円です。",
-            f"セグメント間のEVC値の差は{max_evc - min_evc:,.0f}円で、これは最大値の{(max_evc - min_evc) / max_evc * 100 if max_evc > 0 else 0:.1f}%に相当します。",
-            "収益向上価値は全セグメントで重要な貢献要素ですが、特に高価値セグメントでより大きな割合を占めています。",
-            "導入コストの影響は低価値セグメント、特に中小企業・低価値セグメントで最も大きくなっています。"
-        ]
-    }
+    # 計算結果を一度だけ列指向の表に取り込み、要約統計・寄与度・順位をまとめて計算する
+    analysis = EVCTable.from_results(results).analyze()
     
     return str(analysis)
 
@@ -205,28 +118,13 @@ async def visualize_evc_results(results: List[str]) -> str:
     """EVC計算結果を視覚化用のデータに変換します。
 
     Args:
-        results: EVC計算結果のリスト
+        results: EVC計算結果のリスト（JSON文字列またはEVCResultの文字列表現）
 
     Returns:
         視覚化用データ
     """
-    # 計算結果を視覺化用のデータに変換する
-    
-    visualization_data = {
-        "segment_evc_values": [
-            {
-                "segment_id": result.segment_id,
-                "segment_name": result.segment_name,
-                "evc_value": result.evc_value,
-                "components": {
-                    "reference_price": result.components.reference_price,
-                    "revenue_enhancement": result.components.revenue_enhancement.value,
-                    "cost_optimization": result.components.cost_optimization.value,
-                    "implementation_cost": result.components.implementation_cost
-                }
-            } for result in results
-        ]
-    }
+    # 計算結果を視覚化用のデータに変換する
+    visualization_data = EVCTable.from_results(results).visualization_data()
     
     return str(visualization_data)
 
@@ -264,6 +162,8 @@ evc_calculation_agent = Agent(
     tools=[
         calculate_evc,
         calculate_all_segment_evc,
+        calculate_npv_evc,
+        calculate_break_even_prices,
         prepare_segment_parameters,
         analyze_evc_results,
         visualize_evc_results
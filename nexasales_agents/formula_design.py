@@ -6,11 +6,19 @@
 """
 
 from typing import Dict, Any, List
+import ast
 import json
 import logging
+import re
 # OpenAI Agents SDK
 from agents import Agent, function_tool
+from tools.evc_formula import compile_formula, parse_formula_text
 from tools.evc_tools import design_evc_formula
+from tools.formula_docs import render_formula_documentation
+from tools.parameter_tables import classify_segment_id, get_parameter_table, segment_type_for
+
+# 1行に1セグメントの特性（"s1: 大企業・高価値：豊富な予算、..."）の先頭のセグメントID
+_SEGMENT_LINE_PATTERN = re.compile(r"^(s\d+)\s*[:：]\s*(.*)$")
 
 
 def extract_parameter_from_characteristics(characteristics, parameter_name, is_enterprise, is_high_value, default=None):
@@ -31,108 +39,29 @@ def extract_parameter_from_characteristics(characteristics, parameter_name, is_e
     if characteristics and parameter_name in characteristics:
         return characteristics[parameter_name]
     
-    # パラメータ名に基づいて値を計算
-    if parameter_name == "annual_revenue":
-        if is_enterprise:
-            return 1000000000 if is_high_value else 800000000
-        else:
-            return 200000000 if is_high_value else 50000000
-    
-    elif parameter_name == "annual_cost":
-        if is_enterprise:
-            return 500000000 if is_high_value else 400000000
-        else:
-            return 100000000 if is_high_value else 25000000
-    
-    elif parameter_name == "revenue_increase_rate":
-        if is_high_value:
-            return 0.05 if is_enterprise else 0.08
-        else:
-            return 0.03 if is_enterprise else 0.02
-    
-    elif parameter_name == "cost_reduction_rate":
-        if is_high_value:
-            return 0.15 if is_enterprise else 0.12
-        else:
-            return 0.20 if is_enterprise else 0.10
-    
-    elif parameter_name == "reference_price":
-        return 15000  # すべてのセグメントで同じ
-    
-    elif parameter_name == "initial_cost":
-        if is_enterprise:
-            return 500000 if is_high_value else 400000
-        else:
-            return 200000 if is_high_value else 100000
-    
-    elif parameter_name == "operation_cost":
-        if is_enterprise:
-            return 10000 if is_high_value else 8000
-        else:
-            return 5000 if is_high_value else 3000
-    
-    elif parameter_name == "implementation_years":
-        return 3  # すべてのセグメントで同じ
-    
-    # 上記以外の場合はデフォルト値を返す
-    return default
+    # セグメントタイプ（と特性に含まれる業種・企業規模帯）からパラメータ表を参照
+    characteristics = characteristics if isinstance(characteristics, dict) else {}
+    return get_parameter_table().get(
+        segment_type_for(is_enterprise, is_high_value),
+        parameter_name,
+        industry=characteristics.get("industry"),
+        size_band=characteristics.get("size_band"),
+        default=default
+    )
 
 
-@function_tool
-async def customize_formula_for_segment(
-    segment_id: str,
-    base_formula: str,
-    segment_characteristics: str
-) -> str:
-    """基本フォーミュラをセグメント特性に合わせてカスタマイズします。
+def parse_segment_characteristics(segment_characteristics: Any) -> Dict[str, Any]:
+    """セグメント特性を辞書に変換します。
 
     Args:
-        segment_id: セグメントID
-        base_formula: 基本フォーミュラ
-        segment_characteristics: セグメントの特性
+        segment_characteristics: セグメントの特性（JSON文字列、「名前：特性、特性」形式の文字列、または辞書）
 
     Returns:
-        カスタマイズされたフォーミュラ
+        特性名 -> 値の辞書
     """
-    # 実際にセグメント特性に基づいてフォーミュラをカスタマイズする
-    
-    # base_formulaが文字列の場合、JSONに変換を試みる
-    base_formula_dict = {}
-    if isinstance(base_formula, str):
-        try:
-            if base_formula.strip().startswith('{') and base_formula.strip().endswith('}'):
-                try:
-                    base_formula_dict = json.loads(base_formula)
-                except json.JSONDecodeError:
-                    # シングルクォートをダブルクォートに変換する
-                    fixed_json = base_formula.replace("'", "\"").replace("\n", " ")
-                    try:
-                        base_formula_dict = json.loads(fixed_json)
-                    except:
-                        logging.warning(f"フォーミュラの解析に失敗しました: {base_formula[:50]}...")
-            else:
-                logging.warning(f"フォーミュラがJSON形式ではありません: {base_formula[:50]}...")
-        except Exception as e:
-            logging.error(f"フォーミュラの処理エラー: {str(e)}")
-    
-    # セグメント情報から調整係数を決定する
-    # セグメントIDの解析を改善
-    is_enterprise = False
-    is_high_value = False
-    
-    # s1, s2, s3, s4 形式のIDの場合
-    if segment_id.startswith('s') and segment_id[1:].isdigit():
-        segment_num = int(segment_id[1:])
-        is_enterprise = segment_num <= 2  # s1, s2は大企業
-        is_high_value = segment_num % 2 == 1  # s1, s3は高価値
-    # 「大企業・高価値」などの日本語の場合
-    else:
-        if '大企業' in segment_id:
-            is_enterprise = True
-        if '高価値' in segment_id:
-            is_high_value = True
-    
-    # セグメント特性文字列からパラメータを抽出
+    if isinstance(segment_characteristics, dict):
+        return segment_characteristics
+
     characteristics_dict = {}
     # セグメント特性が文字列で提供されている場合は解析する
     if isinstance(segment_characteristics, str):
@@ -172,7 +101,29 @@ async def customize_formula_for_segment(
                             characteristics_dict["it_literacy"] = "high" if "高い" in characteristic else "low"
         except Exception as e:
             logging.error(f"セグメント特性の処理エラー: {str(e)}")
-    
+
+    return characteristics_dict
+
+
+def build_segment_formula(
+    segment_id: str,
+    base_formula_dict: Dict[str, Any],
+    characteristics_dict: Dict[str, Any]
+) -> Dict[str, Any]:
+    """解析済みの基本フォーミュラとセグメント特性から、セグメント別のフォーミュラを構築します。
+
+    Args:
+        segment_id: セグメントID
+        base_formula_dict: parse_formula_textで解析した基本フォーミュラ
+        characteristics_dict: parse_segment_characteristicsで解析したセグメント特性
+
+    Returns:
+        カスタマイズされたフォーミュラ
+    """
+    # セグメント情報から調整係数を決定する
+    # s1, s2, s3, s4 形式のID、または「大企業・高価値」などの日本語の場合
+    is_enterprise, is_high_value = classify_segment_id(segment_id)
+
     # セグメント特性に基づく調整係数を生成
     adjustments = {
         "R": 1.0,  # 参照価格は原則変更なし
@@ -264,8 +215,117 @@ async def customize_formula_for_segment(
         },
         "adjustment_justification": justification
     }
-    
-    return str(customized_formula)
+
+    return customized_formula
+
+
+@function_tool
+async def customize_formula_for_segment(
+    segment_id: str,
+    base_formula: str,
+    segment_characteristics: str
+) -> str:
+    """基本フォーミュラをセグメント特性に合わせてカスタマイズします。
+
+    Args:
+        segment_id: セグメントID
+        base_formula: 基本フォーミュラ
+        segment_characteristics: セグメントの特性
+
+    Returns:
+        カスタマイズされたフォーミュラ
+    """
+    # base_formulaを辞書に変換する（JSON・辞書表記・数式のみの文字列に対応）
+    base_formula_dict = parse_formula_text(base_formula)
+    characteristics_dict = parse_segment_characteristics(segment_characteristics)
+    return str(build_segment_formula(segment_id, base_formula_dict, characteristics_dict))
+
+
+def parse_segment_characteristics_map(segment_characteristics: str) -> Dict[str, Any]:
+    """全セグメントの特性を、セグメントID -> 特性の辞書に変換します。
+
+    次の形式に対応します。
+    - JSONオブジェクト: {"s1": {...} または "大企業・高価値：豊富な予算、...", ...}
+    - JSON配列: [{"segment_id": "s1", ...}, ...]
+    - 1行に1セグメントのテキスト: "s1: 大企業・高価値：豊富な予算、迅速な意思決定"
+
+    Args:
+        segment_characteristics: 全セグメントの特性
+
+    Returns:
+        セグメントID -> 特性（辞書または文字列）。空の場合はs1〜s4の特性なし
+    """
+    text = segment_characteristics.strip() if isinstance(segment_characteristics, str) else ""
+    if not text:
+        return {segment_id: {} for segment_id in ["s1", "s2", "s3", "s4"]}
+
+    if text[0] in "[{":
+        try:
+            parsed = json.loads(text)
+        except json.JSONDecodeError:
+            try:
+                parsed = ast.literal_eval(text)
+            except (ValueError, SyntaxError):
+                parsed = None
+        if isinstance(parsed, dict):
+            return parsed
+        if isinstance(parsed, list):
+            return {
+                str(item.get("segment_id") or f"s{index + 1}"): item
+                for index, item in enumerate(parsed) if isinstance(item, dict)
+            }
+        logging.warning(f"セグメント特性のJSON解析に失敗しました: {text[:50]}")
+
+    characteristics = {}
+    for line in text.splitlines():
+        line = line.strip().lstrip("-・* ")
+        if not line:
+            continue
+        # 先頭のセグメントIDと残りの特性を分ける（区切りは半角・全角のコロン）
+        match = _SEGMENT_LINE_PATTERN.match(line)
+        if match:
+            characteristics[match.group(1)] = match.group(2).strip()
+        else:
+            # "大企業・高価値：..." のようにセグメント名で始まる行は、セグメント名をIDとして分類に使用する
+            name = re.split(r"[:：]", line, maxsplit=1)[0].strip()
+            characteristics[name if name != line else f"s{len(characteristics) + 1}"] = line
+    return characteristics
+
+
+# 内部実装（同期）
+def _customize_formulas_for_segments_impl(base_formula: str, segment_characteristics: str) -> Dict[str, Dict[str, Any]]:
+    """基本フォーミュラを全セグメントの特性に合わせて一度にカスタマイズします - 内部実装
+
+    基本フォーミュラの解析は1回だけ行い、全セグメントで共有します。
+
+    Args:
+        base_formula: 基本フォーミュラ
+        segment_characteristics: 全セグメントの特性（形式はparse_segment_characteristics_mapを参照）
+
+    Returns:
+        セグメントID -> カスタマイズされたフォーミュラ
+    """
+    base_formula_dict = parse_formula_text(base_formula)
+    return {
+        segment_id: build_segment_formula(segment_id, base_formula_dict, parse_segment_characteristics(characteristics))
+        for segment_id, characteristics in parse_segment_characteristics_map(segment_characteristics).items()
+    }
+
+
+@function_tool
+async def customize_formulas_for_segments(base_formula: str, segment_characteristics: str) -> str:
+    """基本フォーミュラを全セグメントの特性に合わせて一度にカスタマイズします。
+
+    Args:
+        base_formula: 基本フォーミュラ
+        segment_characteristics: 全セグメントの特性（セグメントIDをキーとするJSON、
+            または "s1: 大企業・高価値：豊富な予算、迅速な意思決定" のような1行に1セグメントのテキスト）
+
+    Returns:
+        セグメントIDをキーとする、カスタマイズされたフォーミュラのJSON
+    """
+    formulas = _customize_formulas_for_segments_impl(base_formula, segment_characteristics)
+    return json.dumps(formulas, ensure_ascii=False)
 
 
 @function_tool
@@ -278,104 +338,8 @@ async def validate_formula(formula: str) -> str:
     Returns:
         検証結果
     """
-    import json
-    import logging
-    
-    # 文字列パラメータをパースする
-    if isinstance(formula, str):
-        try:
-            # JSONとして解析を試みる
-            if formula.strip().startswith('{') and formula.strip().endswith('}'): 
-                try:
-                    formula_dict = json.loads(formula)
-                except json.JSONDecodeError:
-                    # シングルクォートをダブルクォートに変換するなどの修正を試みる
-                    try:
-                        fixed_json = formula.replace("'", "\"").replace("\n", " ")
-                        formula_dict = json.loads(fixed_json)
-                    except Exception as e:
-                        logging.error(f"フォーミュラのパースに失敗しました: {str(e)}")
-                        formula_dict = {}
-            # すでに数式が定義されている単純なケース
-            elif "=" in formula:
-                # シンプルな数式としてのみ処理
-                formula_dict = {
-                    "base_formula": formula.strip(),
-                    "components": {
-                        "R": {"weight": 1.0},
-                        "Re": {"weight": 1.0},
-                        "Co": {"weight": 1.0},
-                        "I": {"weight": 1.0}
-                    },
-                    "segment_specific_parameters": {}
-                }
-            else:
-                logging.warning(f"フォーミュラのフォーマットが認識できません: {formula}")
-                formula_dict = {}
-        except Exception as e:
-            logging.error(f"フォーミュラのパース中にエラーが発生しました: {str(e)}")
-            formula_dict = {}
-    else:
-        # 既に辞書であれば、そのまま使用
-        formula_dict = formula
-    
-    validation_result = {
-        "is_valid": True,
-        "issues": [],
-        "recommendations": []
-    }
-    
-    # 基本的な検証
-    if "base_formula" not in formula_dict:
-        validation_result["is_valid"] = False
-        validation_result["issues"].append("基本フォーミュラが定義されていません")
-    
-    if "components" not in formula_dict:
-        validation_result["is_valid"] = False
-        validation_result["issues"].append("フォーミュラのコンポーネントが定義されていません")
-    
-    # コンポーネントの検証
-    components = formula_dict.get("components", {})
-    required_components = ["R", "Re", "Co", "I"]
-    
-    for component in required_components:
-        if component not in components:
-            validation_result["is_valid"] = False
-            validation_result["issues"].append(f"必須コンポーネント '{component}' が定義されていません")
-        else:
-            component_data = components[component]
-            if "weight" not in component_data:
-                validation_result["is_valid"] = False
-                validation_result["issues"].append(f"コンポーネント '{component}' の重みが定義されていません")
-            elif component_data["weight"] <= 0:
-                validation_result["is_valid"] = False
-                validation_result["issues"].append(f"コンポーネント '{component}' の重みは正の値である必要があります")
-    
-    # セグメント固有パラメータの検証
-    segment_params = formula_dict.get("segment_specific_parameters", {})
-    required_params = [
-        "annual_revenue", "annual_cost", "implementation_years",
-        "revenue_increase_rate", "cost_reduction_rate", "reference_price",
-        "initial_cost", "operation_cost"
-    ]
-    
-    for param in required_params:
-        if param not in segment_params:
-            validation_result["is_valid"] = False
-            validation_result["issues"].append(f"必須パラメータ '{param}' が定義されていません")
-    
-    # 推奨事項
-    if formula_dict.get("segment_id") == "s4":  # 中小企業・低価値
-        if components.get("I", {}).get("weight", 1.0) < 1.2:
-            validation_result["recommendations"].append(
-                "中小企業・低価値セグメントでは、導入コストの重みをより高く設定することを検討してください"
-            )
-    
-    if formula_dict.get("segment_id") == "s1":  # 大企業・高価値
-        if components.get("Re", {}).get("weight", 1.0) < 1.1:
-            validation_result["recommendations"].append(
-                "大企業・高価値セグメントでは、収益向上価値の重みをより高く設定することを検討してください"
-            )
+    # フォーミュラは一度だけ解析・検証し、calculate_evcと同じコンパイル済みのフォーミュラを共有する
+    validation_result = compile_formula(formula).to_validation_result()
     
     return str(validation_result)
 
@@ -384,84 +348,23 @@ async def validate_formula(formula: str) -> str:
 async def document_formula_design(
     base_formula: str,
     segment_formulas: List[str],
-    validation_results: List[str]
+    narrative: str
 ) -> str:
-    """フォーミュラ設計プロセスを文書化します。
+    """フォーミュラ設計プロセスを全セグメント分まとめて文書化します。
+
+    セグメント別のフォーミュラの説明、重みとパラメータの表、調整の根拠、検証結果は
+    コンパイル済みのフォーミュラから決定的に生成されるため、記述が必要なのは設計の概要だけです。
 
     Args:
         base_formula: 基本フォーミュラ
-        segment_formulas: セグメント別フォーミュラのリスト
-        validation_results: 検証結果のリスト
+        segment_formulas: セグメント別フォーミュラのリスト（customize_formulas_for_segmentsの出力をそのまま渡すことも可）
+        narrative: 設計の概要（2〜3文程度）
 
     Returns:
-        文書化されたフォーミュラ設計
+        文書化されたフォーミュラ設計（Markdownのドキュメントをdocumentに含む）
     """
-    # 実際の実装では、設計プロセスを詳細に文書化します
-    # この例では、モックデータを返します
-    
-    # 型チェックして適切に処理
-    formula_text = "EVC = R + (Re + Co) - I"
-    components = {}
-    
-    try:
-        # 文字列が辞書形式かチェック
-        if isinstance(base_formula, str):
-            if base_formula.strip().startswith('{'):
-                import json
-                formula_dict = json.loads(base_formula)
-                formula_text = formula_dict.get("base_formula", formula_text)
-                components = formula_dict.get("components", {})
-            else:
-                formula_text = base_formula
-        else:
-            # すでに辞書型の場合（これは起こりえないが念のため）
-            formula_text = str(base_formula)
-    except Exception as e:
-        # パースに失敗した場合はそのまま文字列として扱う
-        formula_text = str(base_formula)
-        
-    documentation = {
-        "design_process": {
-            "base_formula": {
-                "formula": formula_text,
-                "components": components,
-                "justification": "標準的なEVC計算式を採用し、各コンポーネントの重み付けを調整することで、セグメント特性を反映"
-            },
-            "segment_customization": {
-                "approach": "各セグメントの特性（価値創出ポテンシャルと実現容易性）に基づいて、コンポーネントの重み付けを調整",
-                "key_considerations": [
-                    "収益向上価値とコスト最適化価値のバランス",
-                    "導入コストへの感度",
-                    "セグメント固有のパラメータ値"
-                ]
-            },
-            "validation": {
-                "approach": "各フォーミュラの論理的整合性と現実的な結果を検証",
-                "issues_addressed": [issue for result in validation_results for issue in result.get("issues", []) if issue],
-                "recommendations_applied": [rec for result in validation_results for rec in result.get("recommendations", []) if rec]
-            }
-        },
-        "segment_formulas": {
-            formula["segment_id"]: {
-                "name": formula["segment_name"],
-                "formula": formula["base_formula"],
-                "component_weights": {
-                    "R": formula["components"]["R"]["weight"],
-                    "Re": formula["components"]["Re"]["weight"],
-                    "Co": formula["components"]["Co"]["weight"],
-                    "I": formula["components"]["I"]["weight"]
-                },
-                "justification": formula.get("adjustment_justification", "")
-            } for formula in segment_formulas
-        },
-        "usage_guidelines": {
-            "parameter_selection": "各セグメントの実際の企業データに基づいてパラメータを設定",
-            "sensitivity_analysis": "主要パラメータ（収益増加率、コスト削減率、導入年数）の変動による結果への影響を分析",
-            "interpretation": "EVCは金銭的価値を表し、正の値は投資価値があることを示す。値が大きいほど投資価値が高い。"
-        }
-    }
-    
-    return str(documentation)
+    documentation = render_formula_documentation(base_formula, segment_formulas, narrative)
+    return json.dumps(documentation, ensure_ascii=False)
 
 
 # プロンプトの定義
@@ -477,8 +380,11 @@ INSTRUCTIONS = """# システムコンテキスト
 1. 比較マトリックスを分析し、基本的なEVC計算フォーミュラを設計する
 2. 各価値要因の重み・調整値を決定し、その根拠を明確にする
 3. セグメント特性に基づいて、セグメント別のフォーミュラをカスタマイズする
+   （customize_formulas_for_segmentsで全セグメントを1回の呼び出しでカスタマイズする）
 4. フォーミュラの妥当性を検証し、必要に応じて調整する
 5. フォーミュラ設計プロセスを文書化する
+   （document_formula_designに全セグメントのフォーミュラと設計の概要を渡し、1回の呼び出しで文書化する。
+   表や検証結果はツールが生成するため、設計の概要は2〜3文にとどめる）
 6. 設計結果を構造化された形式で出力する
 
 ## 出力形式
@@ -497,6 +403,7 @@ formula_design_agent = Agent(
     tools=[
         design_evc_formula,
         customize_formula_for_segment,
+        customize_formulas_for_segments,
         validate_formula,
         document_formula_design
     ],
@@ -4,10 +4,40 @@
 このモジュールでは、EVC計算と市場ポテンシャル分析の結果を統合して、セグメント別の優先度を評価するエージェントを定義します。
 """
 
+import re
 from typing import Dict, Any, List
 # OpenAI Agents SDK
 from agents import Agent, function_tool
 from models.models import PriorityReport, CustomerSegment, MarketPotential, EVCResult
+from tools.priority_scoring import PRIORITY_WEIGHTS, normalize_growth, priority_rank
+from utils.japanese_numbers import AMOUNT_PATTERN, parse_japanese_number
+
+# extract_data_from_textで使用するセグメント情報のパターン
+_SEGMENT_PATTERNS = [
+    re.compile(r"セグメントs(\d+)\s*\((.*?)\)"), # セグメントs1 (大企業・高価値)
+    re.compile(r"セグメント:\s*(大企業・高価値|大企業・低価値|中小企業・高価値|中小企業・低価値)"), # セグメント: 大企業・高価値
+    re.compile(r"\*\*セグメント:(.*?)\*\*") # **セグメント:大企業・高価値**
+]
+
+# extract_data_from_textで使用する値の抽出パターン
+# ラベルの後の最初の金額を取り出す（「EVC値: 1.5億円」「EVC値は1.5億円です」「EVC 1,200万円」のいずれの区切りも可）
+# 金額の直前の符号も含めるため、「EVC値: ▲300万円」のような負の値も符号ごと取り出せる
+def _labeled_amount(label: str) -> re.Pattern:
+    return re.compile(rf"{label}[^\d\n]*?([-−▲△]?{AMOUNT_PATTERN})")
+
+
+_EVC_VALUE_PATTERNS = {
+    "evc_value": _labeled_amount("EVC"),
+    "reference_price": _labeled_amount("参照価格"),
+    "revenue_enhancement": _labeled_amount("収益向上価値"),
+    "cost_optimization": _labeled_amount("コスト最適化価値"),
+    "implementation_cost": _labeled_amount("導入コスト"),
+}
+_MARKET_POTENTIAL_PATTERNS = {
+    "company_count": _labeled_amount("総企業数"),
+    "acquisition_probability": _labeled_amount("調整後獲得確率"),
+    "market_potential": _labeled_amount("総市場ポテンシャル"),
+}
 
 
 @function_tool
@@ -192,13 +222,8 @@ async def calculate_priority_scores(integrated_results: List[str]) -> str:
     except Exception as e:
         logging.error(f"統合結果の処理中にエラーが発生しました: {str(e)}")
         processed_integrated_results = []
-    # 優先度スコアの計算パラメータ
-    weights = {
-        "evc_value": 0.4,          # EVC値の重み
-        "market_size": 0.2,         # 市場規模の重み
-        "acquisition_probability": 0.3,  # 獲得確率の重み
-        "growth_potential": 0.1     # 成長ポテンシャルの重み
-    }
+    # 優先度スコアの計算パラメータ（シナリオスイープと共有）
+    weights = PRIORITY_WEIGHTS
     
     # 各指標の最大値を取得（正規化のため）
     max_evc = max([result.get("evc_value", 0) for result in integrated_results]) if integrated_results else 1
@@ -220,7 +245,7 @@ async def calculate_priority_scores(integrated_results: List[str]) -> str:
         # 成長ポテンシャルの計算（市場分析から）
         market_analysis = result.get("market_analysis", {})
         growth_rate = market_analysis.get("market_growth_rate", 0)
-        normalized_growth = min(growth_rate / 0.1, 1)  # 10%以上の成長率を1として正規化
+        normalized_growth = float(normalize_growth(growth_rate))  # 10%以上の成長率を1として正規化
         
         # 優先度スコアの計算
         priority_score = (
@@ -231,23 +256,14 @@ async def calculate_priority_scores(integrated_results: List[str]) -> str:
         )
         
         # 優先度ランクの決定
-        if priority_score >= 0.8:
-            priority_rank = "最優先"
-        elif priority_score >= 0.6:
-            priority_rank = "高優先"
-        elif priority_score >= 0.4:
-            priority_rank = "中優先"
-        elif priority_score >= 0.2:
-            priority_rank = "低優先"
-        else:
-            priority_rank = "最低優先"
+        rank = priority_rank(priority_score)
         
         # 優先度スコア情報の作成
         priority_score_info = {
             "segment_id": segment_id,
             "segment_name": segment_name,
             "priority_score": priority_score,
-            "priority_rank": priority_rank,
+            "priority_rank": rank,
             "score_components": {
                 "evc_value": {
                     "raw_value": result.get("evc_value", 0),
@@ -486,22 +502,12 @@ def extract_data_from_text(text: str, data_type: str) -> Dict[str, Any]:
     Returns:
         抽出されたデータ
     """
-    import re
-    import logging
-    
     result = {}
     
-    # セグメント情報をマッチングするパターン
-    segment_patterns = [
-        r"セグメントs(\d+)\s*\((.*?)\)", # セグメントs1 (大企業・高価値)
-        r"セグメント:\s*(大企業・高価値|大企業・低価値|中小企業・高価値|中小企業・低価値)", # セグメント: 大企業・高価値
-        r"\*\*セグメント:(.*?)\*\*" # **セグメント:大企業・高価値**
-    ]
-    
     # セグメント名を抽出
     segment_name = None
-    for pattern in segment_patterns:
-        matches = re.search(pattern, text)
+    for pattern in _SEGMENT_PATTERNS:
+        matches = pattern.search(text)
         if matches:
             if len(matches.groups()) == 2:
                 segment_id = f"s{matches.group(1)}"
@@ -525,37 +531,19 @@ def extract_data_from_text(text: str, data_type: str) -> Dict[str, Any]:
         result["segment_id"] = segment_id
         result["segment_name"] = segment_name
         
-        # データタイプに基づいて、特定の値を抽出
+        # データタイプに基づいて、特定の値を抽出（金額・割合は数値に変換）
         if data_type == "EVC":
-            # EVC値を抽出
-            evc_match = re.search(r"EVC\D+(\d+[,.]?\d*億?万?円)", text)
-            if evc_match:
-                result["evc_value"] = evc_match.group(1)
-                
-            # 各要素の値を抽出
-            components = {
-                "reference_price": r"参照価格\D+(\d+[,.]?\d*億?万?円)",
-                "revenue_enhancement": r"収益向上価値\D+(\d+[,.]?\d*億?万?円)",
-                "cost_optimization": r"コスト最適化価値\D+(\d+[,.]?\d*億?万?円)",
-                "implementation_cost": r"導入コスト\D+(\d+[,.]?\d*億?万?円)"
-            }
-            
-            for key, pattern in components.items():
-                match = re.search(pattern, text)
-                if match:
-                    result[key] = match.group(1)
-                    
+            patterns = _EVC_VALUE_PATTERNS
         elif data_type == "市場ポテンシャル":
-            # 市場ポテンシャル情報を抽出
-            patterns = {
-                "company_count": r"総企業数\D+(\d+[,.]?\d*)",
-                "acquisition_probability": r"調整後獲得確率\D+(\d+)%",
-                "market_potential": r"総市場ポテンシャル\D+(\d+[,.]?\d*億?万?円)"
-            }
-            
-            for key, pattern in patterns.items():
-                match = re.search(pattern, text)
-                if match:
-                    result[key] = match.group(1)
+            patterns = _MARKET_POTENTIAL_PATTERNS
+        else:
+            patterns = {}
+
+        for key, pattern in patterns.items():
+            match = pattern.search(text)
+            if match:
+                value = parse_japanese_number(match.group(1))
+                if value is not None:
+                    result[key] = value
     
     return result
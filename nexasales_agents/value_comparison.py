@@ -13,6 +13,11 @@ import re
 # OpenAI Agents SDK
 from agents import Agent, function_tool
 from tools.evc_tools import analyze_value_factors
+from utils.japanese_numbers import AMOUNT_PATTERN, parse_japanese_number
+
+# 導入コストの記述（例: 初期500万円、3年間で1,200万円）から金額を取り出すパターン
+_INITIAL_COST_PATTERN = re.compile(rf'初期\s*({AMOUNT_PATTERN})')
+_TOTAL_COST_PATTERN = re.compile(rf'(\d+)年間で\s*({AMOUNT_PATTERN})')
 
 
 @function_tool
@@ -112,13 +117,13 @@ async def create_segment_value_matrix(
                     product = product.strip().replace('- ', '')
                     value = value.strip()
                     # 初期コストと総額を抽出
-                    initial_match = re.search(r'初期(\d+)万円', value)
-                    total_match = re.search(r'(\d+)年間で([\d,]+)万円', value)
+                    initial_match = _INITIAL_COST_PATTERN.search(value)
+                    total_match = _TOTAL_COST_PATTERN.search(value)
                     
                     result["implementation_cost"][product] = {
-                        "initial": int(initial_match.group(1)) * 10000 if initial_match else 0,
+                        "initial": parse_japanese_number(initial_match.group(1)) if initial_match else 0,
                         "monthly": 0,
-                        "total_3year": int(total_match.group(2).replace(',', '')) * 10000 if total_match else 0
+                        "total_3year": parse_japanese_number(total_match.group(2)) if total_match else 0
                     }
         
         # セグメント特異的価値の抽出
@@ -0,0 +1,11 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+テストの共通設定です。プロジェクトのルートディレクトリをPythonのパスに追加します。
+"""
+
+import os
+import sys
+
+# プロジェクトのルートディレクトリをPythonのパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
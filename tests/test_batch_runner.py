@@ -0,0 +1,71 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+バッチランナーのテストです。
+"""
+
+import asyncio
+import gc
+import weakref
+
+from workflows.batch_runner import BatchWorkflowRunner
+from workflows.result_store import SpilledStageResult, SpillingResultStore
+from workflows.segmentation_workflow import WORKFLOW_STEPS
+
+
+class _StageOutput(dict):
+    """弱参照で生存数を数えられるステップ結果です。"""
+
+
+def _resident_outputs(workflow_count, tmp_path):
+    """result_storeを指定したバッチを実行し、実行後もメモリに残るステップ結果の数を返します。"""
+    outputs = []
+
+    runner = BatchWorkflowRunner(result_store=SpillingResultStore(str(tmp_path / f"spill-{workflow_count}")))
+
+    async def fake_run_agent(agent, message, shared_context=None, interactive=True):
+        output = _StageOutput(result=f"{agent.__class__.__name__}: {message[:40]}")
+        outputs.append(weakref.ref(output))
+        return output
+
+    runner.workflow._run_agent = fake_run_agent
+    requests = [{"service_description": f"サービス{i}", "market_data": f"市場データ{i}"} for i in range(workflow_count)]
+    batch = asyncio.run(runner.run_batch(requests))
+
+    assert batch["succeeded"] == workflow_count
+    assert all(
+        isinstance(result[step["name"]], SpilledStageResult) for result in batch["results"] for step in WORKFLOW_STEPS
+    )
+    del batch
+    gc.collect()
+    return sum(1 for ref in outputs if ref() is not None), runner.stage_cache.stats()
+
+
+def test_resident_stage_outputs_stay_flat_with_result_store(tmp_path):
+    """result_storeを指定すると、ワークフロー数が増えてもメモリに残るステップ結果が増えないこと"""
+    small, small_cache = _resident_outputs(2, tmp_path)
+    large, large_cache = _resident_outputs(8, tmp_path)
+
+    assert small == large == 0
+    assert small_cache["entries"] == large_cache["entries"] == 0
+    assert large_cache["misses"] > small_cache["misses"]
+
+
+def test_stage_cache_still_shares_results_on_disk(tmp_path):
+    """ディスクのみのキャッシュでも、入力が一致するステップの結果を再利用すること"""
+    runner = BatchWorkflowRunner(result_store=SpillingResultStore(str(tmp_path / "spill")))
+    calls = []
+
+    async def fake_run_agent(agent, message, shared_context=None, interactive=True):
+        calls.append(agent)
+        return {"result": agent.__class__.__name__}
+
+    runner.workflow._run_agent = fake_run_agent
+    request = {"service_description": "サービス", "market_data": "市場データ"}
+    asyncio.run(runner.run_batch([request]))
+    first_calls = len(calls)
+    batch = asyncio.run(runner.run_batch([request]))
+
+    assert len(calls) == first_calls
+    assert batch["stage_cache"]["hits"] == first_calls
+    assert batch["stage_cache"]["entries"] == 0
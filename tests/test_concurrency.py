@@ -0,0 +1,169 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+適応型同時実行制御のテストです。
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+from utils.concurrency import AdaptiveConcurrencyController, retry_after_seconds
+
+
+def test_interactive_calls_use_reserved_slots():
+    """一括の呼び出しが実行枠を埋めていても、対話的な呼び出しは予約枠ですぐに実行されること"""
+
+    async def scenario():
+        controller = AdaptiveConcurrencyController(initial_limit=2, max_limit=2, reserved_interactive=1)
+        release_bulk = asyncio.Event()
+        started = []
+
+        async def agent_call(name, wait):
+            started.append(name)
+            if wait:
+                await release_bulk.wait()
+            return {"result": name}
+
+        bulk = [
+            asyncio.ensure_future(controller.call(agent_call, f"bulk{i}", True, interactive=False))
+            for i in range(3)
+        ]
+        await asyncio.sleep(0.01)
+        # 一括の呼び出しは予約枠を除いた1枠のみ使用する
+        assert started == ["bulk0"]
+
+        result = await asyncio.wait_for(controller.call(agent_call, "interactive", False), timeout=1)
+        assert result == {"result": "interactive"}
+
+        release_bulk.set()
+        await asyncio.gather(*bulk)
+        assert controller.metrics()["peak_in_flight"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_interactive_waiters_go_first():
+    """実行枠の空きを待つ対話的な呼び出しは、先に待っていた一括の呼び出しより先に実行されること"""
+
+    async def scenario():
+        controller = AdaptiveConcurrencyController(initial_limit=1, max_limit=1)
+        order = []
+        gate = asyncio.Event()
+
+        async def agent_call(name):
+            order.append(name)
+            if name == "first":
+                await gate.wait()
+            return {"result": name}
+
+        first = asyncio.ensure_future(controller.call(agent_call, "first"))
+        await asyncio.sleep(0.01)
+        bulk = asyncio.ensure_future(controller.call(agent_call, "bulk", interactive=False))
+        await asyncio.sleep(0.01)
+        interactive = asyncio.ensure_future(controller.call(agent_call, "interactive"))
+        await asyncio.sleep(0.01)
+        gate.set()
+        await asyncio.gather(first, bulk, interactive)
+        assert order == ["first", "interactive", "bulk"]
+
+    asyncio.run(scenario())
+
+
+def test_retry_waits_for_retry_after():
+    """レート制限の再試行は、Retry-Afterの時間だけ待ってから実行されること"""
+
+    async def scenario():
+        controller = AdaptiveConcurrencyController(max_retries=2)
+        calls = []
+
+        async def agent_call():
+            calls.append(time.perf_counter())
+            if len(calls) == 1:
+                return {"error": "429 Too Many Requests", "error_type": "rate_limited", "retry_after": 0.05}
+            return {"result": "ok"}
+
+        assert await controller.call(agent_call) == {"result": "ok"}
+        assert calls[1] - calls[0] >= 0.05
+        metrics = controller.metrics()
+        assert metrics["retries"] == 1
+        assert metrics["backoff_seconds"] == 0.05
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_is_read_from_response_headers():
+    """OpenAI SDKの例外の応答ヘッダーからRetry-Afterを取り出せること"""
+    response = SimpleNamespace(headers={"retry-after": "3"})
+    assert retry_after_seconds(SimpleNamespace(response=response)) == 3.0
+    response = SimpleNamespace(headers={"retry-after-ms": "250", "retry-after": "3"})
+    assert retry_after_seconds(SimpleNamespace(response=response)) == 0.25
+    assert retry_after_seconds(RuntimeError("boom")) is None
+
+
+def test_malformed_retry_after_ms_falls_back_to_retry_after():
+    """retry-after-msが不正な値でも、retry-afterの値が使用されること"""
+    response = SimpleNamespace(headers={"retry-after-ms": "soon", "retry-after": "3"})
+    assert retry_after_seconds(SimpleNamespace(response=response)) == 3.0
+    response = SimpleNamespace(headers={"retry-after-ms": "soon"})
+    assert retry_after_seconds(SimpleNamespace(response=response, retry_after=2)) == 2.0
+
+
+def test_interactive_streak_does_not_starve_bulk():
+    """対話的な呼び出しが続いても、max_interactive_streak回ごとに待機中の一括の呼び出しが実行されること"""
+
+    async def scenario():
+        controller = AdaptiveConcurrencyController(initial_limit=1, max_limit=1, max_interactive_streak=2)
+        order = []
+        gate = asyncio.Event()
+
+        async def agent_call(name):
+            order.append(name)
+            if name == "first":
+                await gate.wait()
+            return {"result": name}
+
+        first = asyncio.ensure_future(controller.call(agent_call, "first"))
+        await asyncio.sleep(0.01)
+        bulk = asyncio.ensure_future(controller.call(agent_call, "bulk", interactive=False))
+        await asyncio.sleep(0.01)
+        interactive = [asyncio.ensure_future(controller.call(agent_call, f"interactive{i}")) for i in range(4)]
+        await asyncio.sleep(0.01)
+        gate.set()
+        await asyncio.gather(first, bulk, *interactive)
+        assert order == ["first", "interactive0", "interactive1", "bulk", "interactive2", "interactive3"]
+
+    asyncio.run(scenario())
+
+
+def test_bulk_turn_keeps_reserved_slots_for_interactive():
+    """一括の呼び出しの番でも、対話的な呼び出しは予約枠で実行されること"""
+
+    async def scenario():
+        controller = AdaptiveConcurrencyController(
+            initial_limit=2, max_limit=2, reserved_interactive=1, max_interactive_streak=1
+        )
+        gate = asyncio.Event()
+        started = []
+
+        async def agent_call(name, wait):
+            started.append(name)
+            if wait:
+                await gate.wait()
+            return {"result": name}
+
+        holder = asyncio.ensure_future(controller.call(agent_call, "holder", True, interactive=False))
+        await asyncio.sleep(0.01)
+        bulk = asyncio.ensure_future(controller.call(agent_call, "bulk", False, interactive=False))
+        await asyncio.sleep(0.01)
+        # 2回目は一括の呼び出しの番だが、空いているのは予約枠のみのため対話的な呼び出しが実行される
+        for i in range(2):
+            result = await asyncio.wait_for(controller.call(agent_call, f"interactive{i}", False), timeout=1)
+            assert result == {"result": f"interactive{i}"}
+        assert "bulk" not in started
+
+        gate.set()
+        await asyncio.gather(holder, bulk)
+        assert started == ["holder", "interactive0", "interactive1", "bulk"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,71 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+EVC計算結果の分析のテストです。
+"""
+
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from tools.evc_analytics import VALUE_COLUMNS, EVCTable
+from tools.evc_tools import _calculate_all_segment_evc_impl
+from tools.evc_vectorized import evaluate_evc_batch
+from utils.utils import DataValidationError
+
+SEGMENT_PARAMETERS = json.dumps({
+    "s1": {"reference_price": 15000, "initial_cost": 20000, "recurring_cost": 5000, "implementation_years": 3},
+    "s2": {"reference_price": 12000, "initial_cost": 18000, "recurring_cost": 4000, "implementation_years": 2},
+    "s3": {"reference_price": 1000, "initial_cost": 2e16, "recurring_cost": 0, "implementation_years": 1},
+})
+
+
+@pytest.fixture
+def results():
+    return asyncio.run(_calculate_all_segment_evc_impl("", SEGMENT_PARAMETERS))["results"]
+
+
+def _assert_same_table(table, expected):
+    assert table.segment_ids.tolist() == expected.segment_ids.tolist()
+    assert table.segment_names.tolist() == expected.segment_names.tolist()
+    for name in VALUE_COLUMNS:
+        np.testing.assert_allclose(table.columns[name], expected.columns[name])
+
+
+def test_string_representations_match_models(results):
+    """str(EVCResult)の文字列表現から、モデルと同じ値の表を取り込めること（負の値・指数表記を含む）"""
+    expected = EVCTable.from_results(results)
+    assert expected.evc[2] < 0
+
+    _assert_same_table(EVCTable.from_results([str(result) for result in results]), expected)
+    # エージェントが複数の結果を1つの文字列として渡す場合
+    _assert_same_table(EVCTable.from_results([str(results)]), expected)
+    _assert_same_table(EVCTable.from_results([" ".join(str(result) for result in results)]), expected)
+
+
+def test_json_and_dict_inputs_match_models(results):
+    """model_dumpの辞書やJSON文字列からも、モデルと同じ値の表を取り込めること"""
+    expected = EVCTable.from_results(results)
+    _assert_same_table(EVCTable.from_results([result.model_dump() for result in results]), expected)
+    _assert_same_table(EVCTable.from_results([json.dumps([result.model_dump() for result in results])]), expected)
+
+
+def test_batch_table_matches_results_table():
+    """ベクトル化計算の結果から取り込んだ表の順位・統計が、セグメント別の結果から取り込んだ表と一致すること"""
+    params = {"reference_price": 15000, "initial_cost": [[20000.0], [18000.0], [30000.0]], "recurring_cost": 5000,
+              "implementation_years": 3}
+    batch = evaluate_evc_batch(params, ["s1", "s2", "s3"])
+    table = EVCTable.from_batch(batch)
+    expected = EVCTable.from_results(batch.to_evc_results())
+
+    _assert_same_table(table, expected)
+    assert table.rankings().tolist() == expected.rankings().tolist() == [2, 1, 3]
+    assert table.summary() == expected.summary()
+
+
+def test_rejects_uninterpretable_text():
+    """EVC計算結果として解釈できない文字列はDataValidationErrorになること"""
+    with pytest.raises(DataValidationError):
+        EVCTable.from_results(["計算結果はありません"])
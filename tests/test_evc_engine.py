@@ -0,0 +1,173 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+EVC評価計画と一括計算のテストです。
+"""
+
+import json
+
+import pytest
+
+from tools import evc_engine
+from tools.evc_engine import (
+    evaluate_evc_records,
+    get_evc_plan,
+    list_calculation_functions,
+    list_numeric_parameters,
+    register_component_calculator,
+)
+from tools.evc_tools import _calculate_evc_impl
+from utils.utils import DataValidationError
+
+PARAMETERS = {"reference_price": 15000, "initial_cost": 20000, "recurring_cost": 5000, "implementation_years": 3}
+
+
+def test_records_accept_partial_adjustments():
+    """一部のキーのみの調整係数でも、calculate_evcと同じEVCになること"""
+    params = dict(PARAMETERS, segment_adjustments={"s1": {"Re": 1.2}})
+    record = evaluate_evc_records({"s1": params})[0]
+
+    assert record.evc_value == pytest.approx(_calculate_evc_impl("s1", "", params).evc_value)
+    assert record.implementation_cost == 20000 + 5000 * 3
+
+
+# 組み込みの計算関数とカスタムコンポーネントを組み合わせた計算式
+COMPONENT_PARAMETERS = dict(
+    PARAMETERS,
+    segment_adjustments={"s1": {"Re": 1.2, "Co": 0.9, "I": 0.8}},
+    revenue_components={
+        "new_revenue": {
+            "calculation_function": "saas",
+            "parameters": ["new_customers", "average_arpu", "expansion_revenue"],
+        },
+        "retention_revenue": {
+            "calculation_function": "subscription",
+            "parameters": ["churn_reduction", "current_customers", "annual_contract_value"],
+        },
+    },
+    cost_components={
+        "direct_cost_reduction": {
+            "calculation_function": "standard",
+            "parameters": ["manual_hours", "automated_hours", "hourly_rate", "resource_savings"],
+        },
+        "custom_components": ["partner_savings"],
+    },
+    partner_savings={"formula": "Cp = 提携先による削減額", "calculated_value": 30000},
+    new_customers=12,
+    average_arpu=3000,
+    expansion_revenue=8000,
+    churn_reduction=0.05,
+    current_customers=200,
+    annual_contract_value=36000,
+    manual_hours=400,
+    automated_hours=150,
+    hourly_rate=4000,
+    resource_savings=50000,
+)
+
+
+def test_plan_matches_component_formulas():
+    """評価計画による計算結果が、コンポーネントごとの計算式に調整係数を掛けた値と一致すること"""
+    result = _calculate_evc_impl("s1", "", json.dumps(COMPONENT_PARAMETERS))
+    components = result.components
+
+    new_revenue = (12 * 3000 + 8000) * 1.2
+    retention_revenue = 0.05 * 200 * 36000 * 1.2
+    direct_cost_reduction = ((400 - 150) * 4000 + 50000) * 0.9
+    partner_savings = 30000 * 0.9
+    implementation_cost = (20000 + 5000 * 3) * 0.8
+
+    revenue_details = components.revenue_enhancement.calculation_details["components"]
+    cost_details = components.cost_optimization.calculation_details["components"]
+    assert revenue_details["new_revenue"]["value"] == pytest.approx(new_revenue)
+    assert revenue_details["retention_revenue"]["value"] == pytest.approx(retention_revenue)
+    assert cost_details["direct_cost_reduction"]["value"] == pytest.approx(direct_cost_reduction)
+    assert cost_details["partner_savings"]["value"] == pytest.approx(partner_savings)
+    assert components.implementation_cost == pytest.approx(implementation_cost)
+    assert result.evc_value == pytest.approx(
+        15000 + new_revenue + retention_revenue + direct_cost_reduction + partner_savings - implementation_cost
+    )
+
+
+def test_segments_with_same_components_share_plan():
+    """コンポーネント構成が同じセグメントは評価計画を共有し、値はセグメントごとに評価されること"""
+    other = dict(COMPONENT_PARAMETERS, new_customers=20, segment_adjustments={})
+    assert get_evc_plan(other) is get_evc_plan(COMPONENT_PARAMETERS)
+
+    first = _calculate_evc_impl("s1", "", json.dumps(COMPONENT_PARAMETERS))
+    second = _calculate_evc_impl("s1", "", json.dumps(other))
+    new_revenue = second.components.revenue_enhancement.calculation_details["components"]["new_revenue"]
+    assert new_revenue["value"] == pytest.approx(20 * 3000 + 8000)
+    assert second.evc_value != first.evc_value
+
+
+def test_records_build_the_same_models_as_calculate_evc():
+    """EVCRecordの要約とto_modelで構築したEVCResultが、calculate_evcの結果と一致すること"""
+    other = dict(COMPONENT_PARAMETERS, new_customers=20, segment_adjustments={"s2": {"Co": 1.1}})
+    records = evaluate_evc_records({"s1": COMPONENT_PARAMETERS, "s2": other})
+
+    for record, (segment_id, params) in zip(records, (("s1", COMPONENT_PARAMETERS), ("s2", other))):
+        expected = _calculate_evc_impl(segment_id, "", json.dumps(params))
+        assert record.to_model().model_dump() == expected.model_dump()
+        assert record.to_dict() == {
+            "segment_id": segment_id,
+            "segment_name": expected.segment_name,
+            "evc_value": expected.evc_value,
+            "reference_price": expected.components.reference_price,
+            "revenue_enhancement_value": expected.components.revenue_enhancement.value,
+            "cost_optimization_value": expected.components.cost_optimization.value,
+            "implementation_cost": expected.components.implementation_cost,
+        }
+
+
+@pytest.fixture
+def isolated_registry(monkeypatch):
+    """テスト中に登録した計算関数を、テスト後に登録表・評価計画のキャッシュ・メモから取り除きます。"""
+    monkeypatch.setattr(evc_engine, "_CALCULATOR_REGISTRY", dict(evc_engine._CALCULATOR_REGISTRY))
+    yield
+    evc_engine._compile_evc_plan_cached.cache_clear()
+    evc_engine.get_evc_memo().clear()
+
+
+def _marketplace_parameters():
+    return dict(
+        PARAMETERS,
+        revenue_components={
+            "new_revenue": {"calculation_function": "marketplace", "parameters": ["listings", "take_rate"]},
+        },
+        listings=100,
+        take_rate=50,
+    )
+
+
+def test_registered_calculator_is_used_by_calculate_evc(isolated_registry):
+    """登録した計算関数がcalculate_evcで使用され、一覧にも含まれること"""
+    register_component_calculator("new_revenue", "marketplace")(lambda listings, take_rate: listings * take_rate)
+
+    assert "marketplace" in list_calculation_functions("new_revenue")
+    assert {"listings", "take_rate"} <= list_numeric_parameters()
+    result = _calculate_evc_impl("s1", "", json.dumps(_marketplace_parameters()))
+    assert result.components.revenue_enhancement.value == pytest.approx(100 * 50)
+
+
+def test_replacing_calculator_clears_cached_plans_and_memo(isolated_registry):
+    """登録済みの計算関数はreplace=Trueでのみ置き換えられ、置き換え後は同じ入力でも再計算されること"""
+    parameters = json.dumps(_marketplace_parameters())
+    register_component_calculator("new_revenue", "marketplace")(lambda listings, take_rate: listings * take_rate)
+    before = _calculate_evc_impl("s1", "", parameters).components.revenue_enhancement.value
+
+    with pytest.raises(DataValidationError):
+        register_component_calculator("new_revenue", "marketplace")(lambda listings, take_rate: 0)
+    register_component_calculator("new_revenue", "marketplace", replace=True)(
+        lambda listings, take_rate: listings * take_rate * 2
+    )
+
+    after = _calculate_evc_impl("s1", "", parameters).components.revenue_enhancement.value
+    assert after == pytest.approx(before * 2)
+
+
+@pytest.mark.parametrize("component, calculation_function", [("loyalty_revenue", "standard"), ("new_revenue", "custom")])
+def test_rejects_unknown_component_or_reserved_name(isolated_registry, component, calculation_function):
+    """標準コンポーネント以外や予約済みのcalculation_functionは登録できないこと"""
+    with pytest.raises(DataValidationError):
+        register_component_calculator(component, calculation_function)
@@ -0,0 +1,98 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+EVCフォーミュラのコンパイルと検証のテストです。
+"""
+
+import json
+
+import pytest
+
+from tools.evc_formula import compile_formula
+
+SEGMENT_SPECIFIC_PARAMETERS = {
+    "annual_revenue": "1.5億円",
+    "annual_cost": 80000000,
+    "implementation_years": "3年",
+    "revenue_increase_rate": "15%",
+    "cost_reduction_rate": 0.1,
+    "reference_price": 15000,
+    "initial_cost": 20000,
+    "operation_cost": 5000,
+}
+
+
+def _formula(**overrides):
+    definition = {
+        "segment_id": "s2",
+        "base_formula": "EVC = R + (Re × Re_adj) + (Co × Co_adj) - (I × I_adj)",
+        "components": {component: {"weight": 1.0} for component in ("R", "Re", "Co", "I")},
+        "segment_specific_parameters": dict(SEGMENT_SPECIFIC_PARAMETERS),
+        "segment_adjustments": {"s2": {"Re": 1.1, "I": "1.2"}},
+    }
+    definition.update(overrides)
+    return json.dumps(definition, ensure_ascii=False)
+
+
+def test_valid_formula_normalizes_units_and_adjustments():
+    """単位付きの値を数値に変換し、指定のない調整係数のキーは1.0として扱うこと"""
+    compiled = compile_formula(_formula())
+
+    assert compiled.is_valid, compiled.issues
+    assert compiled.segment_parameters["annual_revenue"] == 150000000
+    assert compiled.segment_parameters["implementation_years"] == 3
+    assert compiled.segment_parameters["revenue_increase_rate"] == pytest.approx(0.15)
+    assert compiled.adjustments_for("s2") == {"Re": 1.1, "Co": 1.0, "I": 1.2}
+    assert compiled.resolve_adjustments({"segment_adjustments": {"s2": {"Co": 0.8}}}, "s2") == {
+        "Re": 1.1, "Co": 0.8, "I": 1.2
+    }
+    assert compile_formula(_formula()) is compiled
+
+
+@pytest.mark.parametrize(
+    "parameter, value, message",
+    [
+        ("revenue_increase_rate", 15, "0〜1の割合"),
+        ("annual_cost", -1000, "0以上"),
+        ("implementation_years", 0, "正の値"),
+        ("initial_cost", "未定", "数値である必要があります"),
+    ],
+)
+def test_rejects_parameter_out_of_unit_range(parameter, value, message):
+    """単位に合わないセグメント固有パラメータを問題として報告すること"""
+    parameters = dict(SEGMENT_SPECIFIC_PARAMETERS, **{parameter: value})
+    compiled = compile_formula(_formula(segment_specific_parameters=parameters))
+
+    assert not compiled.is_valid
+    assert any(parameter in issue and message in issue for issue in compiled.issues)
+    assert parameter not in compiled.segment_parameters
+
+
+@pytest.mark.parametrize(
+    "segment_adjustments, message",
+    [
+        ({"segment2": {"Re": 1.1}}, "セグメントID 'segment2' が不正です"),
+        ({"s2": {"X": 1.1}}, "キー 'X' は不明です"),
+        ({"s2": {"Co": 0}}, "'Co' は正の値である必要があります"),
+        ({"s2": 1.1}, "オブジェクトである必要があります"),
+    ],
+)
+def test_rejects_invalid_segment_adjustments(segment_adjustments, message):
+    """不正なセグメントIDや調整係数を問題として報告し、計算には使用しないこと"""
+    compiled = compile_formula(_formula(segment_adjustments=segment_adjustments))
+
+    assert any(message in issue for issue in compiled.issues), compiled.issues
+    assert compiled.adjustments_for("s2") == {"Re": 1.0, "Co": 1.0, "I": 1.0}
+
+
+def test_reports_missing_components_and_weights():
+    """基本フォーミュラが参照しないコンポーネントや、正でない重みを問題として報告すること"""
+    compiled = compile_formula(_formula(
+        base_formula="EVC = R + Re - I",
+        components={"R": {"weight": 1.0}, "Re": {"weight": -1}, "Co": {}, "I": {"weight": 1.0}},
+    ))
+
+    assert "基本フォーミュラがコンポーネント 'Co' を参照していません" in compiled.issues
+    assert "コンポーネント 'Re' の重みは正の値である必要があります" in compiled.issues
+    assert "コンポーネント 'Co' の重みが定義されていません" in compiled.issues
+    assert compiled.weights == {"R": 1.0, "I": 1.0}
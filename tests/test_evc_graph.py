@@ -0,0 +1,56 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+EVC依存グラフのテストです。
+"""
+
+import json
+
+import pytest
+
+from tools.evc_graph import EVCDependencyGraph
+from tools.evc_tools import _calculate_evc_impl
+from utils.utils import DataValidationError
+
+FORMULA = json.dumps({"segment_adjustments": {"s1": {"Re": 1.2, "Co": 1.0, "I": 0.8}}})
+
+PARAMETERS = {"reference_price": 15000, "initial_cost": 20000, "recurring_cost": 5000, "implementation_years": 3}
+
+
+def test_adjustments_match_full_evaluation():
+    """調整係数の入力を変更したときも、フルの計算と同じ順序で調整係数が決定されること"""
+    overridden = dict(PARAMETERS, segment_adjustments={"s1": {"I": 0.5}})
+    graph = EVCDependencyGraph({"s1": overridden}, FORMULA)
+    assert graph.evc("s1") == pytest.approx(_calculate_evc_impl("s1", FORMULA, overridden).evc_value)
+
+    # パラメータの調整係数を取り除くと、フォーミュラの調整係数に戻る
+    graph.set_parameter("segment_adjustments", {})
+    assert graph.evc("s1") == pytest.approx(_calculate_evc_impl("s1", FORMULA, dict(PARAMETERS)).evc_value)
+    assert graph.breakdown("s1")["adjustments"]["I"] == 0.8
+
+
+def test_string_values_are_coerced_like_calculate_evc():
+    """数値表現の文字列はcalculate_evcと同じく数値に変換されること"""
+    graph = EVCDependencyGraph({"s1": dict(PARAMETERS)}, FORMULA)
+    graph.set_parameter("reference_price", "2万円")
+    graph.set_parameter("segment_adjustments", {"s1": {"Re": "1.5"}})
+    graph.set_adjustment("I", "50%")
+
+    expected = _calculate_evc_impl(
+        "s1", FORMULA, dict(PARAMETERS, reference_price="2万円", segment_adjustments={"s1": {"Re": 1.5, "I": 0.5}})
+    )
+    assert graph.breakdown("s1")["reference_price"] == 20000
+    assert graph.breakdown("s1")["adjustments"] == {"Re": 1.5, "Co": 1.0, "I": 0.5}
+    assert graph.evc("s1") == pytest.approx(expected.evc_value)
+
+
+@pytest.mark.parametrize(
+    "name, value",
+    [("reference_price", "未定"), ("segment_adjustments", {"s1": {"X": 1.0}}), ("segment_adjustments", {"s1": {"I": "x"}})],
+)
+def test_invalid_values_are_rejected(name, value):
+    """数値として解釈できない値や未知の調整係数は DataValidationError になること"""
+    graph = EVCDependencyGraph({"s1": dict(PARAMETERS)}, FORMULA)
+    with pytest.raises(DataValidationError):
+        graph.set_parameter(name, value)
+    assert graph.evc("s1") == pytest.approx(_calculate_evc_impl("s1", FORMULA, dict(PARAMETERS)).evc_value)
@@ -0,0 +1,70 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+セグメント別EVC計算のメモ化のテストです。
+"""
+
+import json
+
+from tools import evc_tools
+from tools.evc_memo import EVCMemo, get_evc_memo
+from tools.evc_tools import _calculate_evc_impl
+
+FORMULA = '{"formula": "EVC = Pref + (Re × Re_adj) - (Co × Co_adj) - (I × I_adj)", "weights": {}}'
+
+PARAMETERS = {
+    "reference_price": 15000,
+    "initial_cost": 20000,
+    "recurring_cost": 5000,
+    "implementation_years": 3,
+    "segment_adjustments": {"s1": {"Re": 1.2, "Co": 1.0, "I": 0.8}},
+}
+
+
+def test_memo_hit_returns_fresh_result():
+    """メモから返した結果を変更しても、次の呼び出しの結果に影響しないこと"""
+    get_evc_memo().clear()
+    first = _calculate_evc_impl("s1", FORMULA, dict(PARAMETERS))
+    expected_value = first.evc_value
+    expected_details = first.components.revenue_enhancement.calculation_details["adjustment"]
+
+    # 呼び出し元で結果を書き換える
+    first.evc_value = -1.0
+    first.calculation_details["evc_value"] = -1.0
+    first.components.revenue_enhancement.calculation_details["adjustment"] = -1.0
+
+    second = _calculate_evc_impl("s1", FORMULA, dict(PARAMETERS))
+    assert second is not first
+    assert second.evc_value == expected_value
+    assert second.calculation_details["evc_value"] == expected_value
+    assert second.components.revenue_enhancement.calculation_details["adjustment"] == expected_details
+    assert get_evc_memo().stats()["hits"] >= 1
+
+
+def test_memo_evicts_least_recently_used():
+    """上限を超えたエントリは最も古く使われたものから破棄されること"""
+    memo = EVCMemo(max_entries=2)
+    memo.put("a", 1)
+    memo.put("b", 2)
+    assert memo.get("a") == 1
+    memo.put("c", 3)
+    assert memo.get("b") is None
+    assert memo.get_or_compute("a", lambda: 0) == 1
+    assert memo.stats()["evictions"] == 1
+
+
+def test_string_parameters_hit_skips_parsing(monkeypatch):
+    """文字列のパラメータのメモのヒットでは、パラメータを解析し直さないこと"""
+    get_evc_memo().clear()
+    parameters = json.dumps(PARAMETERS)
+    first = _calculate_evc_impl("s1", FORMULA, parameters)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("メモのヒットでパラメータが解析されました")
+
+    monkeypatch.setattr(evc_tools, "parse_parameters", fail)
+    second = _calculate_evc_impl("s1", FORMULA, parameters)
+    assert second == first
+    assert second is not first
+    second.components.cost_optimization.calculation_details["adjustment"] = -1.0
+    assert _calculate_evc_impl("s1", FORMULA, parameters) == first
@@ -0,0 +1,38 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+モンテカルロEVC計算のテストです。
+"""
+
+import pytest
+
+from tools.evc_monte_carlo import simulate_evc
+from utils.utils import DataValidationError
+
+PARAMETERS = {"reference_price": 15000, "initial_cost": 20000, "recurring_cost": 5000, "implementation_years": 3}
+
+PRICE = {"reference_price": {"type": "triangular", "min": 10000, "expected": 15000, "max": 30000}}
+
+
+def test_distribution_widens_the_evc_band():
+    """評価計画のスロットに分布を指定すると、P10 / P50 / P90 が広がること"""
+    result = simulate_evc(PARAMETERS, PRICE, segment_ids=["s1"], samples=2000, seed=1)
+    evc = result["segments"]["s1"]["evc"]
+    assert evc["p10"] < evc["p50"] < evc["p90"]
+    assert result == simulate_evc(PARAMETERS, PRICE, segment_ids=["s1"], samples=2000, seed=1)
+
+
+def test_custom_component_value_can_be_sampled():
+    """カスタムコンポーネントの計算済みの値（"名前.calculated_value"）にも分布を指定できること"""
+    params = dict(PARAMETERS, revenue_components={"custom_components": ["partner"]}, partner={"calculated_value": 1000})
+    distributions = {"partner.calculated_value": {"type": "uniform", "min": 0, "max": 2000}}
+    result = simulate_evc(params, distributions, segment_ids=["s1"], samples=2000, seed=1)
+    revenue = result["segments"]["s1"]["revenue_enhancement"]
+    assert revenue["p10"] < revenue["p90"]
+
+
+@pytest.mark.parametrize("name", ["referenc_price", "segment_adjustments", "revenue_components", "partner.calculated_value"])
+def test_distributions_on_non_slot_parameters_are_rejected(name):
+    """評価計画が参照しないパラメータへの分布の指定は DataValidationError になること"""
+    with pytest.raises(DataValidationError):
+        simulate_evc(PARAMETERS, {name: PRICE["reference_price"]}, segment_ids=["s1"], samples=10, seed=1)
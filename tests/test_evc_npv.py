@@ -0,0 +1,78 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+複数年・割引EVC（NPV-EVC）のテストです。
+"""
+
+import json
+
+import pytest
+
+from tools.evc_tools import _calculate_evc_impl, _calculate_npv_evc_impl
+
+FORMULA = json.dumps({"segment_adjustments": {"s1": {"Re": 1.2, "Co": 1.0, "I": 0.7}}})
+
+PARAMETERS = {"reference_price": 15000, "initial_cost": 20000, "recurring_cost": 5000, "implementation_years": 3}
+
+
+def test_other_segment_adjustments_keep_formula_adjustments():
+    """他のセグメントの調整係数のみを含むパラメータでも、calculate_evcと同じ調整係数を使うこと"""
+    params = dict(PARAMETERS, segment_adjustments={"s2": {"I": 2.0}})
+    result = _calculate_npv_evc_impl(FORMULA, json.dumps({"s1": params}))
+
+    assert result["segments"]["s1"]["flat_evc"] == pytest.approx(_calculate_evc_impl("s1", FORMULA, params).evc_value)
+
+
+def test_missing_base_parameters_default_to_zero():
+    """一部のセグメントで省略された基本パラメータは、calculate_evcと同じく0として計算すること"""
+    partial = {"initial_cost": 1000, "recurring_cost": 0, "implementation_years": 1}
+    result = _calculate_npv_evc_impl(FORMULA, json.dumps({"s1": PARAMETERS, "s2": partial}))
+
+    assert result["segments"]["s2"]["flat_evc"] == pytest.approx(_calculate_evc_impl("s2", FORMULA, partial).evc_value)
+
+
+def test_npv_equals_flat_evc_at_zero_discount_rate():
+    """割引率0・採用率の推移なしでは、評価期間を導入年数としたNPV-EVCが従来のEVCと一致すること"""
+    segments = {
+        "s1": PARAMETERS,
+        "s2": dict(PARAMETERS, reference_price=12000, initial_cost=18000, recurring_cost=4000),
+        "s3": dict(PARAMETERS, recurring_cost=1000, segment_adjustments={"s3": {"Re": 1.5, "I": 0.5}}),
+    }
+    result = _calculate_npv_evc_impl(FORMULA, json.dumps(segments), discount_rate=0.0)
+
+    assert result["horizon_years"] == 3
+    for segment_id, params in segments.items():
+        summary = result["segments"][segment_id]
+        expected = _calculate_evc_impl(segment_id, FORMULA, params).evc_value
+        assert summary["flat_evc"] == pytest.approx(expected)
+        assert summary["npv_evc"] == pytest.approx(expected)
+
+
+def _payback_segment(initial_cost, recurring_cost):
+    # 年間の便益は 300 / 3年 = 100
+    return {
+        "reference_price": 0,
+        "initial_cost": initial_cost,
+        "recurring_cost": recurring_cost,
+        "implementation_years": 3,
+        "revenue_components": {"custom_components": ["gain"]},
+        "gain": {"formula": "Rg = 年間100の便益", "calculated_value": 300},
+    }
+
+
+def test_payback_is_interpolated_within_the_year():
+    """累積キャッシュフローが0以上になる年の回収期間は、年内の線形補間で求めること"""
+    segments = {
+        "s1": _payback_segment(150, 0),
+        "s2": _payback_segment(150, 20),
+        "s3": _payback_segment(0, 0),
+        "s4": _payback_segment(1000, 0),
+    }
+    result = _calculate_npv_evc_impl("", json.dumps(segments))["segments"]
+
+    # 1年目末の累積は -50、2年目に 100 回収 → 1 + 50 / 100
+    assert result["s1"]["payback_years"] == pytest.approx(1.5)
+    # 純キャッシュフローは年 80、1年目末の累積は -70 → 1 + 70 / 80
+    assert result["s2"]["payback_years"] == pytest.approx(1.875)
+    assert result["s3"]["payback_years"] == 0.0
+    assert result["s4"]["payback_years"] is None
@@ -0,0 +1,76 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+損益分岐価格の計算のテストです。
+"""
+
+import json
+
+import pytest
+
+from tools import evc_engine
+from tools.evc_engine import register_component_calculator
+from tools.evc_pricing import METHOD_BISECTION, METHOD_CLOSED_FORM, solve_break_even_prices
+from tools.evc_tools import _calculate_break_even_prices_impl, _calculate_evc_impl
+
+FORMULA = json.dumps({"segment_adjustments": {"s1": {"Re": 1.2, "Co": 1.0, "I": 0.7}}})
+
+PARAMETERS = {"reference_price": 15000, "initial_cost": 20000, "recurring_cost": 5000, "implementation_years": 3}
+
+
+def test_break_even_uses_calculate_evc_adjustments():
+    """他のセグメントの調整係数のみを含むパラメータでも、損益分岐価格でのEVCが目標値になること"""
+    params = dict(PARAMETERS, segment_adjustments={"s2": {"I": 2.0}})
+    result = _calculate_break_even_prices_impl(FORMULA, json.dumps({"s1": params, "s2": PARAMETERS}))
+
+    s1 = result["segments"]["s1"]
+    assert s1["base_evc"] == pytest.approx(_calculate_evc_impl("s1", FORMULA, params).evc_value)
+    at_break_even = _calculate_evc_impl("s1", FORMULA, dict(params, recurring_cost=s1["break_even_price"]))
+    assert at_break_even.evc_value == pytest.approx(0.0, abs=1e-6)
+
+
+def test_closed_form_price_reaches_target_evc():
+    """線形なセグメントは閉形式で解き、損益分岐価格でのEVCが目標値と一致すること"""
+    segments = {
+        "s1": dict(PARAMETERS, reference_price=50000),
+        "s2": dict(PARAMETERS, reference_price=60000, segment_adjustments={"s2": {"I": 1.5}}),
+        # 価格が0でも目標値に届かないセグメントは解なし
+        "s3": dict(PARAMETERS, reference_price=12000, initial_cost=5000),
+    }
+    result = solve_break_even_prices(segments, target_evc=10000.0)
+
+    assert result["s3"]["break_even_price"] is None
+    for segment_id in ("s1", "s2"):
+        solved = result[segment_id]
+        assert solved["method"] == METHOD_CLOSED_FORM
+        params = dict(segments[segment_id], recurring_cost=solved["break_even_price"])
+        assert _calculate_evc_impl(segment_id, "", params).evc_value == pytest.approx(10000.0)
+
+
+@pytest.fixture
+def elastic_calculator(monkeypatch):
+    """価格に対して非線形な計算関数を、テストの間だけ登録します。"""
+    monkeypatch.setattr(evc_engine, "_CALCULATOR_REGISTRY", dict(evc_engine._CALCULATOR_REGISTRY))
+    # 価格が上がるほど新規顧客が減る
+    register_component_calculator("new_revenue", "elastic")(
+        lambda demand, recurring_cost: demand * 100000 / (1 + recurring_cost / 1000)
+    )
+    yield
+    evc_engine._compile_evc_plan_cached.cache_clear()
+    evc_engine.get_evc_memo().clear()
+
+
+def test_bisection_price_reaches_target_evc(elastic_calculator):
+    """価格に対して非線形なセグメントは二分法で解き、損益分岐価格でのEVCが目標値と一致すること"""
+    params = dict(
+        PARAMETERS,
+        revenue_components={
+            "new_revenue": {"calculation_function": "elastic", "parameters": ["demand", "recurring_cost"]},
+        },
+        demand=3,
+    )
+    solved = solve_break_even_prices({"s1": params})["s1"]
+
+    assert solved["method"] == METHOD_BISECTION
+    at_price = _calculate_evc_impl("s1", "", dict(params, recurring_cost=solved["break_even_price"]))
+    assert at_price.evc_value == pytest.approx(0.0, abs=1e-3)
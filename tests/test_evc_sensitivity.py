@@ -0,0 +1,49 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+EVC感応度分析のテストです。
+"""
+
+import pytest
+
+from tools.evc_sensitivity import calculate_sensitivity
+from tools.evc_vectorized import evaluate_evc_batch, stack_segment_parameters
+from utils.utils import DataValidationError
+
+PARAMETERS = {
+    "s1": {"reference_price": 15000, "initial_cost": 20000, "recurring_cost": 5000, "implementation_years": 3},
+    "s2": {"reference_price": 12000, "initial_cost": 18000, "recurring_cost": 4000, "implementation_years": 3},
+}
+
+
+def test_accepts_stacked_segment_columns():
+    """stack_segment_parametersの (セグメント数, 1) の列をそのまま分析できること"""
+    stacked = stack_segment_parameters(PARAMETERS)
+    result = calculate_sensitivity(stacked, segment_ids=list(PARAMETERS))
+
+    flat = {name: [PARAMETERS[sid][name] for sid in PARAMETERS] for name in PARAMETERS["s1"]}
+    expected = calculate_sensitivity(flat, segment_ids=list(PARAMETERS))
+    assert result == expected
+
+
+def test_rejects_unbroadcastable_shape():
+    """セグメント数とシナリオ数に揃えられない形状は DataValidationError になること"""
+    params = dict(PARAMETERS["s1"], reference_price=[1.0, 2.0, 3.0])
+    with pytest.raises(DataValidationError):
+        calculate_sensitivity(params, segment_ids=["s1", "s2"])
+
+
+def test_one_dimensional_values_follow_the_batch_rule():
+    """セグメント数とシナリオ数が一致する1次元配列は、evaluate_evc_batchと同じくシナリオ方向とみなすこと"""
+    segment_ids = ["s1", "s2", "s3"]
+    params = dict(PARAMETERS["s1"], reference_price=[10000.0, 20000.0, 30000.0])
+    # 対象のパラメータが1つの場合、シナリオ数は 1 + 2 = 3 でセグメント数と一致する
+    result = calculate_sensitivity(params, segment_ids=segment_ids, parameters=["initial_cost"], include_adjustments=False)
+
+    batch = evaluate_evc_batch(params, segment_ids, scenario_count=3)
+    assert [result["segments"][sid]["base_evc"] for sid in segment_ids] == pytest.approx(list(batch.evc[:, 0]))
+
+    column = dict(params, reference_price=[[10000.0], [20000.0], [30000.0]])
+    result = calculate_sensitivity(column, segment_ids=segment_ids, parameters=["initial_cost"], include_adjustments=False)
+    base = calculate_sensitivity(PARAMETERS["s1"], segment_ids=["s1"], parameters=["initial_cost"])["segments"]["s1"]
+    assert result["segments"]["s3"]["base_evc"] == pytest.approx(base["base_evc"] + 15000)
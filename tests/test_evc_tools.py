@@ -0,0 +1,45 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+EVC計算ツールのテストです。
+"""
+
+import asyncio
+import json
+
+from tools.evc_tools import _calculate_all_segment_evc_impl, _calculate_evc_impl, calculate_all_segment_evc
+
+FORMULA = json.dumps({"segment_adjustments": {"s2": {"Re": 1.1, "Co": 0.9, "I": 1.2}}})
+
+SEGMENT_PARAMETERS = json.dumps({
+    "s1": {"reference_price": 15000, "initial_cost": 20000, "recurring_cost": 5000, "implementation_years": 3},
+    "s2": {"reference_price": 12000, "initial_cost": 18000, "recurring_cost": 4000, "implementation_years": 2},
+})
+
+
+def test_all_segment_evc_runs_inside_event_loop():
+    """実行中のイベントループ上で全セグメントのEVCを計算し、セグメント別の計算時間を返すこと"""
+
+    async def scenario():
+        return await _calculate_all_segment_evc_impl(FORMULA, SEGMENT_PARAMETERS)
+
+    result = asyncio.run(scenario())
+
+    segments = json.loads(SEGMENT_PARAMETERS)
+    assert [r.model_dump() for r in result["results"]] == [
+        _calculate_evc_impl(segment_id, FORMULA, params).model_dump() for segment_id, params in segments.items()
+    ]
+    assert list(result["segment_timings_ms"]) == list(segments)
+    assert result["total_ms"] >= max(result["segment_timings_ms"].values())
+
+
+def test_all_segment_evc_tool_is_invoked_on_running_loop():
+    """function_toolとして呼び出しても、ネストしたイベントループを使用せずに計算できること"""
+
+    async def scenario():
+        arguments = json.dumps({"formula": FORMULA, "segment_parameters": SEGMENT_PARAMETERS})
+        return await calculate_all_segment_evc.on_invoke_tool(None, arguments)
+
+    output = asyncio.run(scenario())
+    assert "An error occurred" not in str(output)
+    assert [r.segment_id for r in output["results"]] == ["s1", "s2"]
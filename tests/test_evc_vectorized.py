@@ -0,0 +1,75 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+ベクトル化EVC計算のテストです。
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from tools.evc_tools import _calculate_evc_impl
+from tools.evc_vectorized import evaluate_evc_batch, stack_segment_parameters
+
+COMPONENTS = {
+    "revenue_components": {
+        "new_revenue": {
+            "calculation_function": "saas",
+            "parameters": ["new_customers", "average_arpu", "expansion_revenue"],
+        },
+    },
+    "cost_components": {
+        "direct_cost_reduction": {
+            "calculation_function": "standard",
+            "parameters": ["manual_hours", "automated_hours", "hourly_rate", "resource_savings"],
+        },
+    },
+}
+
+
+def _segment(reference_price, new_customers, adjustments, segment_id):
+    return dict(
+        COMPONENTS,
+        reference_price=reference_price,
+        initial_cost=20000,
+        recurring_cost=5000,
+        implementation_years=3,
+        new_customers=new_customers,
+        average_arpu=3000,
+        expansion_revenue=8000,
+        manual_hours=400,
+        automated_hours=150,
+        hourly_rate=4000,
+        resource_savings=50000,
+        segment_adjustments={segment_id: adjustments},
+    )
+
+
+SEGMENTS = {
+    "s1": _segment(15000, 12, {"Re": 1.2, "Co": 1.0, "I": 0.8}, "s1"),
+    "s2": _segment(12000, 30, {"Re": 0.9}, "s2"),
+    "s3": _segment(9000, 5, {}, "s3"),
+}
+
+
+def test_batch_matches_scalar_calculate_evc():
+    """セグメント × シナリオの各要素のEVCが、同じ値でcalculate_evcを呼び出した結果と一致すること"""
+    scenarios = [0.5, 1.0, 1.5, 2.0]
+    params = stack_segment_parameters(SEGMENTS)
+    params["average_arpu"] = np.asarray(scenarios) * 3000
+    batch = evaluate_evc_batch(params, list(SEGMENTS))
+
+    assert batch.shape == (len(SEGMENTS), len(scenarios))
+    for i, (segment_id, segment) in enumerate(SEGMENTS.items()):
+        for j, factor in enumerate(scenarios):
+            scalar = _calculate_evc_impl(segment_id, "", json.dumps(dict(segment, average_arpu=factor * 3000)))
+            assert batch.evc[i, j] == pytest.approx(scalar.evc_value)
+
+
+def test_batch_results_match_scalar_models():
+    """to_evc_resultsで構築したEVCResultが、calculate_evcの結果と一致すること"""
+    batch = evaluate_evc_batch(stack_segment_parameters(SEGMENTS), list(SEGMENTS))
+
+    for result, (segment_id, segment) in zip(batch.to_evc_results(), SEGMENTS.items()):
+        assert result.model_dump() == _calculate_evc_impl(segment_id, "", json.dumps(segment)).model_dump()
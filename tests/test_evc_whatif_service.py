@@ -0,0 +1,72 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+EVCワットイフサービスのテストです。
+"""
+
+import json
+
+import pytest
+
+from tools.evc_whatif_service import EVCWhatIfService
+
+FORMULA = json.dumps({
+    "base_formula": "EVC = R + (Re + Co) - I",
+    "segment_adjustments": {"s1": {"Re": 1.2, "Co": 1.0, "I": 0.8}},
+})
+
+COMMON = {"reference_price": 15000, "initial_cost": 20000, "recurring_cost": 5000, "implementation_years": 3}
+
+
+def test_parameter_adjustments_merge_over_formula():
+    """パラメータで指定した調整係数がフォーミュラの調整係数に上書きされ、指定のないキーはフォーミュラの値が残ること"""
+    service = EVCWhatIfService(FORMULA, {"common": COMMON, "s1": {"segment_adjustments": {"s1": {"I": 0.5}}}})
+    result = service.evaluate([{"segment_id": "s1"}])[0]
+    assert result["implementation_cost"] == (20000 + 5000 * 3) * 0.5
+
+    service = EVCWhatIfService(FORMULA, {"common": COMMON, "s1": {}})
+    result = service.evaluate([{"segment_id": "s1"}])[0]
+    assert result["implementation_cost"] == (20000 + 5000 * 3) * 0.8
+
+
+def _post(service, queries):
+    status, payload = service.handle("POST", "/whatif", json.dumps({"queries": queries}).encode("utf-8"))
+    return status, payload
+
+
+def test_overrides_are_coerced_and_restored():
+    """上書きの値は数値に変換され、問い合わせの後はグラフが元の値に戻ること"""
+    service = EVCWhatIfService(FORMULA, {"common": COMMON, "s1": {}})
+    base = service.evaluate([{"segment_id": "s1"}])[0]["evc_value"]
+
+    status, payload = _post(service, [{"segment_id": "s1", "overrides": {"reference_price": "2万円"}}])
+    assert status == 200
+    assert payload["results"][0]["evc_value"] == pytest.approx(base + 5000)
+    assert service.evaluate([{"segment_id": "s1"}])[0]["evc_value"] == base
+
+
+def test_segment_adjustments_override_is_applied():
+    """overridesのsegment_adjustmentsで調整係数が決定し直されること"""
+    service = EVCWhatIfService(FORMULA, {"common": COMMON, "s1": {}})
+    status, payload = _post(service, [{"segment_id": "s1", "overrides": {"segment_adjustments": {"s1": {"I": 2}}}}])
+    assert status == 200
+    assert payload["results"][0]["implementation_cost"] == (20000 + 5000 * 3) * 2
+    assert service.evaluate([{"segment_id": "s1"}])[0]["implementation_cost"] == (20000 + 5000 * 3) * 0.8
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        {"segment_id": "s1", "overrides": {"reference_price": "未定"}},
+        {"segment_id": "s1", "adjustments": {"I": "x"}},
+        {"segment_id": "s1", "adjustments": {"X": 1.0}},
+        {"segment_id": "s1", "overrides": {"referenc_price": 20000}},
+    ],
+)
+def test_invalid_queries_return_400(query):
+    """数値でない値や未知のパラメータ名は400になり、グラフの値は変わらないこと"""
+    service = EVCWhatIfService(FORMULA, {"common": COMMON, "s1": {}})
+    base = service.evaluate([{"segment_id": "s1"}])[0]["evc_value"]
+    status, payload = _post(service, [query])
+    assert status == 400, payload
+    assert service.evaluate([{"segment_id": "s1"}])[0]["evc_value"] == base
@@ -0,0 +1,73 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+フォーミュラ設計ツールのテストです。
+"""
+
+import ast
+import asyncio
+import json
+
+import pytest
+
+from nexasales_agents.formula_design import customize_formula_for_segment, customize_formulas_for_segments
+
+BASE_FORMULA = json.dumps({
+    "base_formula": "EVC = R + (Re + Co) - I",
+    "components": {
+        "R": {"weight": 1.0},
+        "Re": {"weight": 1.1, "description": "収益向上価値"},
+        "Co": {"weight": 1.0},
+        "I": {"weight": 0.9},
+    },
+}, ensure_ascii=False)
+
+CHARACTERISTICS = {
+    "s1": "大企業・高価値：豊富な予算、迅速な意思決定、ITリテラシーが高い",
+    "s2": {"industry": "manufacturing", "initial_cost": 450000},
+    "s3": "中小企業・高価値：限られた予算、迅速な意思決定",
+    "s4": {},
+}
+
+
+def _invoke(tool, **arguments):
+    return asyncio.run(tool.on_invoke_tool(None, json.dumps(arguments, ensure_ascii=False)))
+
+
+def _single(segment_id, characteristics):
+    if not isinstance(characteristics, str):
+        characteristics = json.dumps(characteristics, ensure_ascii=False)
+    output = _invoke(
+        customize_formula_for_segment,
+        segment_id=segment_id, base_formula=BASE_FORMULA, segment_characteristics=characteristics
+    )
+    return ast.literal_eval(output)
+
+
+@pytest.mark.parametrize(
+    "segment_characteristics",
+    [
+        json.dumps(CHARACTERISTICS, ensure_ascii=False),
+        json.dumps([dict(CHARACTERISTICS["s2"], segment_id="s2"), {"segment_id": "s4"}], ensure_ascii=False),
+        "\n".join(f"{key}: {value}" for key, value in CHARACTERISTICS.items() if isinstance(value, str)),
+    ],
+)
+def test_batch_matches_single_segment_customization(segment_characteristics):
+    """全セグメントの一括カスタマイズが、セグメントごとのcustomize_formula_for_segmentと同じフォーミュラを返すこと"""
+    formulas = json.loads(_invoke(
+        customize_formulas_for_segments, base_formula=BASE_FORMULA, segment_characteristics=segment_characteristics
+    ))
+
+    assert formulas
+    if "s2" in formulas:
+        assert formulas["s2"]["segment_specific_parameters"]["initial_cost"] == 450000
+    for segment_id, formula in formulas.items():
+        assert formula == _single(segment_id, CHARACTERISTICS[segment_id])
+
+
+def test_empty_characteristics_customize_default_segments():
+    """特性が空の場合はs1〜s4を特性なしでカスタマイズすること"""
+    formulas = json.loads(_invoke(customize_formulas_for_segments, base_formula=BASE_FORMULA, segment_characteristics=""))
+
+    assert list(formulas) == ["s1", "s2", "s3", "s4"]
+    assert formulas["s4"] == _single("s4", {})
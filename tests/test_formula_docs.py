@@ -0,0 +1,45 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+フォーミュラ設計ドキュメントの生成のテストです。
+"""
+
+import json
+
+from nexasales_agents.formula_design import _customize_formulas_for_segments_impl
+from tools.formula_docs import render_formula_documentation
+
+BASE_FORMULA = json.dumps({
+    "base_formula": "EVC = R + (Re + Co) - I",
+    "components": {component: {"weight": 1.0} for component in ("R", "Re", "Co", "I")},
+})
+
+SEGMENT_FORMULAS = _customize_formulas_for_segments_impl(
+    BASE_FORMULA, json.dumps({segment_id: {} for segment_id in ("s10", "s2", "s1", "s3")})
+)
+
+
+def test_document_does_not_depend_on_input_order_or_format():
+    """セグメントの順序や渡し方が異なっても、同じドキュメントをセグメントIDの順に生成すること"""
+    as_json = render_formula_documentation(BASE_FORMULA, json.dumps(SEGMENT_FORMULAS), "概要です。")
+    as_list = render_formula_documentation(
+        BASE_FORMULA, [str(formula) for formula in reversed(list(SEGMENT_FORMULAS.values()))], "概要です。"
+    )
+
+    assert as_json == as_list
+    assert list(as_json["segment_formulas"]) == ["s1", "s2", "s3", "s10"]
+    document = as_json["document"]
+    positions = [document.index(f"| {segment_id} |") for segment_id in ("s1", "s2", "s3", "s10")]
+    assert positions == sorted(positions)
+
+
+def test_returned_sections_do_not_change_later_documents():
+    """返された辞書を変更しても、次に同じ入力から生成するドキュメントは変わらないこと"""
+    first = render_formula_documentation(BASE_FORMULA, json.dumps(SEGMENT_FORMULAS))
+    expected = json.dumps(first, ensure_ascii=False, sort_keys=True)
+    first["segment_formulas"]["s1"]["validation"]["issues"].append("変更")
+    first["usage_guidelines"].clear()
+
+    second = render_formula_documentation(BASE_FORMULA, json.dumps(SEGMENT_FORMULAS))
+    assert json.dumps(second, ensure_ascii=False, sort_keys=True) == expected
+    assert second["design_process"]["narrative"] == ""
@@ -0,0 +1,95 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+セグメントパラメータ表のテストです。
+"""
+
+import json
+
+import pytest
+
+from tools.parameter_tables import PARAMETER_TABLE_FILES_ENV, ParameterTable, get_parameter_table, segment_type_for
+from utils.utils import DataValidationError
+
+HIGH_VALUE_ENTERPRISE = segment_type_for(is_enterprise=True, is_high_value=True)
+
+
+def test_rows_are_layered_from_general_to_specific():
+    """セグメントタイプ、業種、企業規模帯、業種と企業規模帯の行の順に重ねること"""
+    table = ParameterTable()
+    table.set_row(
+        HIGH_VALUE_ENTERPRISE, {"annual_revenue": 2000000000, "initial_cost": 600000}, industry="manufacturing"
+    )
+    table.set_row(HIGH_VALUE_ENTERPRISE, {"initial_cost": 700000, "operation_cost": 12000}, size_band="large")
+    table.set_row(HIGH_VALUE_ENTERPRISE, {"operation_cost": 15000}, industry="manufacturing", size_band="large")
+
+    layered = table.lookup(HIGH_VALUE_ENTERPRISE, "manufacturing", "large")
+    assert layered["annual_revenue"] == 2000000000
+    assert layered["initial_cost"] == 700000
+    assert layered["operation_cost"] == 15000
+    assert layered["reference_price"] == 15000
+
+    assert table.lookup(HIGH_VALUE_ENTERPRISE, "retail")["initial_cost"] == 500000
+    assert table.get(HIGH_VALUE_ENTERPRISE, "initial_cost", industry=" manufacturing ") == 600000
+    assert table.get("unknown_type", "initial_cost", default=0) == 0
+
+
+def test_set_row_invalidates_resolved_lookups():
+    """行を追加すると、重ねた結果の保持を破棄して新しい値を返すこと"""
+    table = ParameterTable()
+    assert table.get(HIGH_VALUE_ENTERPRISE, "initial_cost", industry="manufacturing") == 500000
+    table.set_row(HIGH_VALUE_ENTERPRISE, {"initial_cost": 600000}, industry="manufacturing")
+    assert table.get(HIGH_VALUE_ENTERPRISE, "initial_cost", industry="manufacturing") == 600000
+
+
+def test_csv_and_json_files_override_rows(tmp_path):
+    """CSVの空欄は上書きせず、JSONのrowsとともに組み込みの表へ重ねること"""
+    csv_path = tmp_path / "overrides.csv"
+    csv_path.write_text(
+        "segment_type,industry,size_band,annual_revenue,initial_cost\n"
+        f"{HIGH_VALUE_ENTERPRISE},manufacturing,,20億円,\n",
+        encoding="utf-8",
+    )
+    json_path = tmp_path / "overrides.json"
+    json_path.write_text(json.dumps({"rows": [
+        {"segment_type": HIGH_VALUE_ENTERPRISE, "industry": "manufacturing", "parameters": {"initial_cost": 650000}},
+    ]}), encoding="utf-8")
+
+    table = ParameterTable()
+    table.load_file(str(csv_path))
+    table.load_file(str(json_path))
+
+    layered = table.lookup(HIGH_VALUE_ENTERPRISE, "manufacturing")
+    assert layered["annual_revenue"] == 2000000000
+    assert layered["initial_cost"] == 650000
+
+
+@pytest.mark.parametrize(
+    "name, content",
+    [
+        ("bad.csv", "segment_type,annual_revenue\nhigh_value_low_barrier,未定\n"),
+        ("bad.json", '[{"industry": "manufacturing", "parameters": {}}]'),
+        ("bad.json", '{"rows": [{"segment_type": "high_value_low_barrier", "parameters": 1}]}'),
+        ("bad.json", "{"),
+    ],
+)
+def test_rejects_malformed_files(tmp_path, name, content):
+    """数値でないCSVの値や、形式が不正なJSONはDataValidationErrorになること"""
+    path = tmp_path / name
+    path.write_text(content, encoding="utf-8")
+    with pytest.raises(DataValidationError):
+        ParameterTable().load_file(str(path))
+
+
+def test_environment_files_are_loaded_into_shared_table(tmp_path, monkeypatch):
+    """PARAMETER_TABLE_FILESに指定したファイルの行が、get_parameter_tableの表に読み込まれること"""
+    path = tmp_path / "overrides.csv"
+    path.write_text(
+        f"segment_type,industry,size_band,initial_cost\n{HIGH_VALUE_ENTERPRISE},,,550000\n", encoding="utf-8"
+    )
+    monkeypatch.setenv(PARAMETER_TABLE_FILES_ENV, str(path))
+    get_parameter_table.cache_clear()
+    try:
+        assert get_parameter_table().get(HIGH_VALUE_ENTERPRISE, "initial_cost") == 550000
+    finally:
+        get_parameter_table.cache_clear()
@@ -0,0 +1,41 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+優先度評価エージェントのテキスト抽出のテストです。
+"""
+
+import pytest
+
+from nexasales_agents.priority_evaluation import extract_data_from_text
+
+
+def test_negative_amounts_keep_their_sign():
+    """「▲」「−」などの符号付きの金額が負の値として取り出されること"""
+    text = (
+        "セグメントs2 (大企業・低価値)\n"
+        "- **EVC値**: ▲300万円\n"
+        "- 参照価格：1.5万円\n"
+        "- 収益向上価値: −1,200円\n"
+        "- 導入コスト: 20万円\n"
+    )
+    data = extract_data_from_text(text, "EVC")
+    assert data["evc_value"] == -3000000
+    assert data["reference_price"] == 15000
+    assert data["revenue_enhancement"] == -1200
+    assert data["implementation_cost"] == 200000
+
+
+@pytest.mark.parametrize(
+    "line, key, expected",
+    [
+        ("EVC値は1.5億円です", "evc_value", 150000000),
+        ("EVC 1,200万円", "evc_value", 12000000),
+        ("参照価格は15,000円", "reference_price", 15000),
+        ("EVC値 - 300万円", "evc_value", 3000000),
+        ("EVC値 -300万円", "evc_value", -3000000),
+    ],
+)
+def test_labels_without_colon(line, key, expected):
+    """ラベルと金額の間に「:」がない表記からも金額が取り出されること"""
+    data = extract_data_from_text(f"セグメントs1 (大企業・高価値)\n{line}\n", "EVC")
+    assert data[key] == expected
@@ -0,0 +1,37 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+ステップ結果の退避のテストです。
+"""
+
+import asyncio
+import json
+
+from workflows.result_store import SpilledStageResult, SpillingResultStore
+from workflows.segmentation_workflow import SegmentationWorkflow, load_workflow_output
+
+
+class _FailingWorkflow(SegmentationWorkflow):
+    """2番目のステップで失敗するワークフローです（エージェントを呼び出しません）。"""
+
+    async def _run_stage(self, step, available, shared_context, interactive=True):
+        if step["name"] == "customer_segments":
+            return {"error": "failed", "result": "エージェントの実行中にエラーが発生しました"}
+        return {"result": f"{step['name']} の結果"}
+
+
+def test_failed_run_spills_results_and_saves_as_json(tmp_path):
+    """失敗した実行でもステップ結果が退避され、JSONに保存した結果から読み込めること"""
+    store = SpillingResultStore(str(tmp_path / "spill"))
+    workflow = _FailingWorkflow(result_store=store)
+    results = asyncio.run(workflow.run_workflow("サービス", "市場データ"))
+
+    assert results["status"] == "failed"
+    assert isinstance(results["service_analysis"], SpilledStageResult)
+    assert isinstance(results["customer_segments"], SpilledStageResult)
+
+    output = tmp_path / "output.json"
+    output.write_text(json.dumps(results, ensure_ascii=False), encoding="utf-8")
+    loaded = load_workflow_output(str(output))
+    assert loaded["service_analysis"] == {"result": "service_analysis の結果"}
+    assert loaded["customer_segments"]["error"] == "failed"
@@ -0,0 +1,34 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+シナリオスイープのテストです。
+"""
+
+import pytest
+
+from utils.utils import DataValidationError
+from workflows.scenario_sweep import ScenarioGrid, ScenarioSweepRunner, load_sweep_columns
+
+SEGMENTS = {
+    "s1": {"reference_price": 15000, "initial_cost": 20000, "recurring_cost": 5000, "implementation_years": 3,
+           "company_count": 1000, "acquisition_probability": 0.1, "market_growth_rate": 0.05},
+    "s2": {"reference_price": 12000, "initial_cost": 10000, "recurring_cost": 3000, "implementation_years": 3,
+           "company_count": 500, "acquisition_probability": 0.2, "market_growth_rate": 0.12},
+}
+
+
+def test_market_axes_override_baseline(tmp_path):
+    """市場ポテンシャルの入力をグリッドの軸にすると、基準値ではなく軸の値で評価されること"""
+    runner = ScenarioSweepRunner(SEGMENTS, workers=1)
+    runner.run(ScenarioGrid({"company_count": [10, 2000]}), str(tmp_path))
+    columns = load_sweep_columns(str(tmp_path))
+    evc = columns["evc.s1"][0]
+    assert list(columns["potential.s1"]) == pytest.approx([10 * 0.1 * evc, 2000 * 0.1 * evc])
+
+
+@pytest.mark.parametrize("axis", ["referenc_price", "segment_adjustments.X"])
+def test_unknown_axis_is_rejected(tmp_path, axis):
+    """評価に使用されない軸名はエラーになること"""
+    runner = ScenarioSweepRunner(SEGMENTS, workers=1)
+    with pytest.raises(DataValidationError):
+        runner.run(ScenarioGrid({axis: [1.0]}), str(tmp_path))
@@ -0,0 +1,92 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+優先度付きジョブスケジューラーのテストです。
+"""
+
+import asyncio
+
+from workflows.scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, WorkflowScheduler
+
+
+def _gated_scheduler(**kwargs):
+    """ワークフローの実行をゲートで止められるスケジューラーを返します。"""
+    scheduler = WorkflowScheduler(**kwargs)
+    gates = {}
+    started = []
+
+    async def fake_run_workflow(service_description, market_data, interactive=True):
+        started.append(service_description)
+        gate = gates.setdefault(service_description, asyncio.Event())
+        await gate.wait()
+        return {"service_description": service_description, "interactive": interactive}
+
+    def release(name):
+        gates.setdefault(name, asyncio.Event()).set()
+
+    scheduler.workflow.run_workflow = fake_run_workflow
+    return scheduler, started, release
+
+
+def test_bulk_jobs_leave_reserved_slots_for_interactive():
+    """一括ジョブは予約枠を使用せず、後から投入された対話ジョブがすぐに起動されること"""
+
+    async def scenario():
+        scheduler, started, release = _gated_scheduler(max_workflows=3, reserved_interactive=1)
+        bulk = [scheduler.submit(f"bulk{i}", "", PRIORITY_BULK) for i in range(4)]
+        await asyncio.sleep(0.01)
+        assert started == ["bulk0", "bulk1"]
+        assert scheduler.stats()["classes"][PRIORITY_BULK]["queued"] == 2
+
+        interactive = scheduler.submit("interactive", "", PRIORITY_INTERACTIVE)
+        await asyncio.sleep(0.01)
+        assert started[-1] == "interactive"
+        release("interactive")
+        assert (await interactive)["interactive"] is True
+
+        for i in range(4):
+            release(f"bulk{i}")
+        results = await asyncio.gather(*bulk)
+        assert [result["interactive"] for result in results] == [False] * 4
+
+    asyncio.run(scenario())
+
+
+def test_aging_lets_waiting_bulk_job_run_first():
+    """長く待った一括ジョブは、後から投入された対話ジョブより先に起動されること"""
+
+    async def scenario(aging_interval):
+        scheduler, started, release = _gated_scheduler(
+            max_workflows=1, reserved_interactive=0, aging_interval=aging_interval
+        )
+        jobs = [scheduler.submit("first", "", PRIORITY_INTERACTIVE)]
+        await asyncio.sleep(0.01)
+        jobs.append(scheduler.submit("bulk", "", PRIORITY_BULK))
+        await asyncio.sleep(0.2)
+        jobs.append(scheduler.submit("interactive", "", PRIORITY_INTERACTIVE))
+        for name in ("first", "bulk", "interactive"):
+            release(name)
+        await asyncio.gather(*jobs)
+        return started
+
+    # 待ち時間 0.2秒 / 0.01秒 = 20段階の引き上げで、一括クラスの基本優先度（10）を上回る
+    assert asyncio.run(scenario(0.01)) == ["first", "bulk", "interactive"]
+    # エージングが効かなければ対話ジョブが先に起動される
+    assert asyncio.run(scenario(3600.0)) == ["first", "interactive", "bulk"]
+
+
+def test_tenants_are_served_round_robin():
+    """同じクラス内では、大量投入したテナントと他のテナントのジョブが交互に起動されること"""
+
+    async def scenario():
+        scheduler, started, release = _gated_scheduler(max_workflows=2, reserved_interactive=1)
+        jobs = [scheduler.submit("holder", "", PRIORITY_BULK, tenant_id="a")]
+        await asyncio.sleep(0.01)
+        jobs += [scheduler.submit(f"a{i}", "", PRIORITY_BULK, tenant_id="a") for i in range(3)]
+        jobs.append(scheduler.submit("b0", "", PRIORITY_BULK, tenant_id="b"))
+        for name in ("holder", "a0", "a1", "a2", "b0"):
+            release(name)
+        await asyncio.gather(*jobs)
+        assert started == ["holder", "a0", "b0", "a1", "a2"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,41 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+セグメント別パラメータの解析のテストです。
+"""
+
+import pytest
+
+from tools.segment_parameters import parse_parameters, parse_segment_parameters
+from utils.utils import DataValidationError
+
+
+def test_numeric_strings_are_converted():
+    """数値のパラメータに文字列で指定された数値表現が数値に変換されること"""
+    segments = parse_segment_parameters({"s1": {"reference_price": "15000", "new_customers": "10"}})
+    assert segments == {"s1": {"reference_price": 15000, "new_customers": 10}}
+
+    table = "segment_id | reference_price | new_customers\ns1 | 1.5億円 | 10\n"
+    assert parse_segment_parameters(table)["s1"]["reference_price"] == 150000000
+
+
+def test_non_numeric_value_is_rejected():
+    """数値のパラメータに数値として解釈できない値を指定するとエラーになること"""
+    with pytest.raises(DataValidationError):
+        parse_segment_parameters({"s1": {"reference_price": "未定"}})
+
+
+def test_markdown_table_with_trailing_empty_cell():
+    """Markdownの表の末尾の空のセルが列数の不一致にならないこと"""
+    table = "| segment_id | reference_price |\n|---|---|\n| s1 | 15000 | |\n"
+    assert parse_segment_parameters(table) == {"s1": {"reference_price": 15000}}
+
+
+def test_legacy_format_keeps_grouped_numbers():
+    """従来形式で桁区切りの数値がカンマで分割されず、引用符を省略した形式も解析できること"""
+    quoted = "s1: 'reference_price: 1,000,000, new_customers: 10', s2: 'reference_price: 12000'"
+    unquoted = "s1: reference_price: 1,000,000, new_customers: 10, s2: reference_price: 12000"
+    expected = {"s1": {"reference_price": 1000000, "new_customers": 10}, "s2": {"reference_price": 12000}}
+    assert parse_segment_parameters(quoted) == expected
+    assert parse_segment_parameters(unquoted) == expected
+    assert parse_parameters("reference_price: 1,000,000, new_customers: 10") == expected["s1"]
@@ -0,0 +1,67 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+セグメンテーションワークフローのテストです。
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from utils.utils import WorkflowError
+from workflows.segmentation_workflow import WORKFLOW_STEPS, extract_data_from_text, get_segmentation_workflow
+
+
+def test_negative_segment_evc_keeps_its_sign():
+    """セグメント別のEVCが負の場合も符号ごと取り出されること"""
+    evc_text = "セグメント1: 1.5億円\nセグメント2: ▲300万円\nSegment 3: -1,200円"
+    data = json.loads(extract_data_from_text(evc_text, "市場データなし"))
+    assert data["economic_value"] == {"segment_1": 150000000, "segment_2": -3000000, "segment_3": -1200}
+
+
+def _recording_workflow():
+    """エージェントを呼び出さず、実行したステップのエージェントを記録するワークフローを返します。"""
+    workflow = get_segmentation_workflow()
+    agent_steps = {id(getattr(workflow, step["agent"])): step["name"] for step in WORKFLOW_STEPS}
+    called = []
+
+    async def fake_run_agent(agent, message, shared_context=None, interactive=True):
+        called.append(agent_steps[id(agent)])
+        return {"result": f"{agent_steps[id(agent)]}の再実行結果"}
+
+    workflow._run_agent = fake_run_agent
+    return workflow, called
+
+
+def test_replay_reruns_only_from_stage_onwards():
+    """replay_workflowは指定したステップ以降のみを実行し、前半のステップ結果は以前の結果から復元すること"""
+    workflow, called = _recording_workflow()
+    previous = {step["name"]: {"result": f"{step['name']}の以前の結果"} for step in WORKFLOW_STEPS}
+    previous["workflow_id"] = "previous"
+
+    result = asyncio.run(workflow.replay_workflow(previous, "formula_designs", market_data="市場データ"))
+
+    step_names = [step["name"] for step in WORKFLOW_STEPS]
+    rerun = step_names[step_names.index("formula_designs"):]
+    assert called == rerun
+    assert result["status"] == "success"
+    assert result["replayed_from"] == {"workflow_id": "previous", "stage": "formula_designs"}
+    assert result["customer_segments"] == previous["customer_segments"]
+    assert all(result[name] == {"result": f"{name}の再実行結果"} for name in rerun)
+
+
+@pytest.mark.parametrize(
+    "from_stage, previous, market_data",
+    [
+        ("unknown_stage", {}, "市場データ"),
+        ("formula_designs", {"value_comparisons": {"result": "価値比較"}}, "市場データ"),
+        ("formula_designs", {"value_comparisons": {"result": "価値比較"}, "customer_segments": {"result": "顧客"}}, ""),
+    ],
+)
+def test_replay_rejects_missing_inputs(from_stage, previous, market_data):
+    """未知のステップ名や、再実行に必要な結果・入力の不足はエージェントを呼び出す前にWorkflowErrorになること"""
+    workflow, called = _recording_workflow()
+    with pytest.raises(WorkflowError):
+        asyncio.run(workflow.replay_workflow(previous, from_stage, market_data=market_data))
+    assert called == []
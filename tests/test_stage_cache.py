@@ -0,0 +1,57 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+ステップキャッシュのテストです。
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from workflows.stage_cache import StageCache, compute_stage_key
+
+AGENT = SimpleNamespace(name="SegmentationAgent", instructions="市場をセグメントに分割してください。")
+
+
+def test_stage_key_ignores_whitespace_differences():
+    """空白や改行の違いのみの入力は同じキャッシュキーになること"""
+    key = compute_stage_key("segmentation", AGENT, {"market_data": "市場規模: 100億円\n成長率: 5%"})
+    assert key == compute_stage_key("segmentation", AGENT, {"market_data": "  市場規模: 100億円   成長率: 5% "})
+    assert key != compute_stage_key("segmentation", AGENT, {"market_data": "市場規模: 200億円 成長率: 5%"})
+
+
+def test_concurrent_identical_stages_are_computed_once():
+    """同じキーの計算が並行して要求された場合は、1回だけ計算して結果を共有すること"""
+
+    async def scenario():
+        cache = StageCache()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"result": "segments"}
+
+        results = await asyncio.gather(*(cache.get_or_compute("key", compute) for _ in range(3)))
+        assert results == [{"result": "segments"}] * 3
+        assert await cache.get_or_compute("key", compute) == {"result": "segments"}
+        return len(calls), cache.stats()
+
+    calls, stats = asyncio.run(scenario())
+    assert calls == 1
+    assert (stats["misses"], stats["shared"], stats["hits"]) == (1, 2, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    """上限を超えると最も古く使われたエントリから削除し、エラーを含む結果は保存しないこと"""
+    cache = StageCache(max_entries=2)
+    cache.put("a", {"result": "a"})
+    cache.put("b", {"result": "b"})
+    cache.get("a")
+    cache.put("c", {"result": "c"})
+    cache.put("d", {"error": "失敗しました"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"result": "a"}
+    assert cache.get("c") == {"result": "c"}
+    assert cache.get("d") is None
+    assert cache.stats()["entries"] == 2
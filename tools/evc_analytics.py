@@ -0,0 +1,390 @@
+"""
+NexaSales顧客セグメンテーションシステムのEVC計算結果の分析
+
+このモジュールでは、EVC計算結果を一度だけ列指向の表（EVCTable）に取り込み、要約統計、コンポーネントの寄与率、
+セグメントの順位をNumPyの配列演算でまとめて計算する機能を提供します。
+取り込めるのは、EVCResultモデル、EVCRecord、辞書（EVCResult.model_dumpまたはEVCRecord.to_dictの形式）、
+それらのJSON文字列や文字列表現（エージェントがツールに渡す形式）、およびベクトル化計算の結果（EVCBatchResult）です。
+"""
+
+import ast
+import json
+import re
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+from models.models import EVCResult
+from tools.evc_engine import SEGMENT_NAMES, EVCRecord
+from tools.evc_vectorized import EVCBatchResult
+from utils.utils import DataValidationError
+
+# 表の数値列
+VALUE_COLUMNS = ("evc_value", "reference_price", "revenue_enhancement", "cost_optimization", "implementation_cost")
+
+# EVCResultの文字列表現（str(EVCResult)）から値を取り出すパターン
+_NUMBER = r"(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)"
+_RECORD_START_PATTERN = re.compile(r"segment_id=['\"]")
+_REPR_PATTERNS = {
+    "segment_id": re.compile(r"segment_id=['\"]([^'\"]*)['\"]"),
+    "segment_name": re.compile(r"segment_name=['\"]([^'\"]*)['\"]"),
+    "evc_value": re.compile(rf"evc_value={_NUMBER}"),
+    "reference_price": re.compile(rf"reference_price={_NUMBER}"),
+    "revenue_enhancement": re.compile(rf"revenue_enhancement=ValueComponent\(.*?, value={_NUMBER}", re.DOTALL),
+    "cost_optimization": re.compile(rf"cost_optimization=ValueComponent\(.*?, value={_NUMBER}", re.DOTALL),
+    "implementation_cost": re.compile(rf"\bimplementation_cost={_NUMBER}"),
+}
+
+
+def _component_value(value: Any) -> float:
+    if isinstance(value, dict):
+        value = value.get("value", 0)
+    return float(value or 0)
+
+
+def _row_from_dict(data: Dict[str, Any]) -> Dict[str, Any]:
+    components = data.get("components") or {}
+    return {
+        "segment_id": str(data.get("segment_id", "")),
+        "segment_name": data.get("segment_name"),
+        "evc_value": float(data.get("evc_value") or 0),
+        "reference_price": float(components.get("reference_price", data.get("reference_price")) or 0),
+        "revenue_enhancement": _component_value(
+            components.get("revenue_enhancement", data.get("revenue_enhancement_value"))
+        ),
+        "cost_optimization": _component_value(
+            components.get("cost_optimization", data.get("cost_optimization_value"))
+        ),
+        "implementation_cost": float(components.get("implementation_cost", data.get("implementation_cost")) or 0),
+    }
+
+
+def _rows_from_text(text: str) -> List[Dict[str, Any]]:
+    text = text.strip()
+    if text.startswith(("{", "[")):
+        for parse in (json.loads, ast.literal_eval):
+            try:
+                return list(_rows_from_items([parse(text)]))
+            except (ValueError, SyntaxError, TypeError):
+                continue
+
+    # EVCResultの文字列表現（複数の結果を含む場合はsegment_id=の位置で区切る）
+    starts = [match.start() for match in _RECORD_START_PATTERN.finditer(text)]
+    rows = []
+    for start, end in zip(starts, starts[1:] + [len(text)]):
+        chunk = text[start:end]
+        row = {}
+        for key, pattern in _REPR_PATTERNS.items():
+            match = pattern.search(chunk)
+            if match:
+                row[key] = match.group(1)
+        if "evc_value" in row:
+            rows.append(_row_from_dict({
+                "segment_id": row["segment_id"],
+                "segment_name": row.get("segment_name"),
+                "evc_value": row["evc_value"],
+                "reference_price": row.get("reference_price"),
+                "revenue_enhancement_value": row.get("revenue_enhancement"),
+                "cost_optimization_value": row.get("cost_optimization"),
+                "implementation_cost": row.get("implementation_cost"),
+            }))
+    if not rows:
+        raise DataValidationError(f"EVC計算結果として解釈できません: {text[:50]}")
+    return rows
+
+
+def _rows_from_items(items: Iterable[Any]) -> Iterable[Dict[str, Any]]:
+    for item in items:
+        if isinstance(item, EVCResult):
+            yield _row_from_dict(item.model_dump())
+        elif isinstance(item, EVCRecord):
+            yield _row_from_dict(item.to_dict())
+        elif isinstance(item, dict):
+            if "results" in item and "segment_id" not in item:
+                # calculate_all_segment_evcの出力
+                yield from _rows_from_items(item["results"])
+            else:
+                yield _row_from_dict(item)
+        elif isinstance(item, (list, tuple)):
+            yield from _rows_from_items(item)
+        elif isinstance(item, str):
+            yield from _rows_from_text(item)
+        else:
+            raise DataValidationError(f"EVC計算結果の型が不正です: {type(item).__name__}")
+
+
+class EVCTable:
+    """EVC計算結果の列指向の表です。
+
+    各列は行数と同じ長さの配列で、1行が1つのセグメント × シナリオの結果です。
+    """
+
+    def __init__(self, segment_labels: np.ndarray, segment_codes: np.ndarray, segment_names: np.ndarray,
+                 scenarios: np.ndarray, columns: Dict[str, np.ndarray], scenario_count: int = 0):
+        # セグメントは行ごとの整数コードと、コードに対応するIDと名前の配列で保持する
+        self.segment_labels = segment_labels
+        self.segment_codes = segment_codes
+        self.segment_label_names = segment_names
+        self.scenarios = scenarios
+        self.columns = columns
+        # シナリオごとに全セグメントの行が同じ順で並ぶ場合のシナリオ数（0の場合は並びを仮定しない）
+        self._scenario_count = scenario_count
+
+    @classmethod
+    def from_results(cls, results: Iterable[Any]) -> "EVCTable":
+        """EVC計算結果を表に取り込みます。
+
+        Args:
+            results: EVCResult、EVCRecord、辞書、またはそれらの文字列表現のリスト
+
+        Returns:
+            EVC計算結果の表
+
+        Raises:
+            DataValidationError: 解釈できない結果が含まれる場合
+        """
+        rows = list(_rows_from_items(results))
+        codes: Dict[str, int] = {}
+        names: List[str] = []
+        segment_codes = np.empty(len(rows), dtype=np.int64)
+        for i, row in enumerate(rows):
+            segment_id = row["segment_id"]
+            if segment_id not in codes:
+                codes[segment_id] = len(codes)
+                names.append(row["segment_name"] or SEGMENT_NAMES.get(segment_id, f"セグメント {segment_id}"))
+            segment_codes[i] = codes[segment_id]
+        columns = {name: np.fromiter((row[name] for row in rows), dtype=float, count=len(rows)) for name in VALUE_COLUMNS}
+        return cls(
+            np.array(list(codes), dtype=object), segment_codes, np.array(names, dtype=object),
+            np.zeros(len(rows), dtype=np.int64), columns
+        )
+
+    @classmethod
+    def from_batch(cls, batch: EVCBatchResult) -> "EVCTable":
+        """ベクトル化計算の結果（セグメント × シナリオ）を表に取り込みます。
+
+        Args:
+            batch: ベクトル化EVC計算の結果
+
+        Returns:
+            EVC計算結果の表（行はシナリオごとにセグメント順）
+        """
+        segment_count, scenario_count = batch.shape
+        names = np.array(
+            [SEGMENT_NAMES.get(segment_id, f"セグメント {segment_id}") for segment_id in batch.segment_ids], dtype=object
+        )
+        sources = {
+            "evc_value": batch.evc,
+            "reference_price": batch.reference_price,
+            "revenue_enhancement": batch.revenue_enhancement,
+            "cost_optimization": batch.cost_optimization,
+            "implementation_cost": batch.implementation_cost,
+        }
+        columns = {name: np.ascontiguousarray(np.asarray(values, dtype=float).T).reshape(-1) for name, values in sources.items()}
+        return cls(
+            np.array(batch.segment_ids, dtype=object), np.tile(np.arange(segment_count), scenario_count), names,
+            np.repeat(np.arange(scenario_count, dtype=np.int64), segment_count), columns, scenario_count
+        )
+
+    def __len__(self) -> int:
+        return len(self.segment_codes)
+
+    @property
+    def segment_ids(self) -> np.ndarray:
+        return self.segment_labels[self.segment_codes]
+
+    @property
+    def segment_names(self) -> np.ndarray:
+        return self.segment_label_names[self.segment_codes]
+
+    @property
+    def evc(self) -> np.ndarray:
+        return self.columns["evc_value"]
+
+    def contribution_shares(self) -> Dict[str, np.ndarray]:
+        """行ごとのコンポーネントの寄与率を計算します。
+
+        参照価格・収益向上価値・コスト最適化価値はそれらの合計に対する比率、
+        導入コストは合計に導入コストを加えた値に対する比率です（分母が0以下の場合は0）。
+
+        Returns:
+            コンポーネント名 -> 寄与率の配列
+        """
+        positive = self.columns["reference_price"] + self.columns["revenue_enhancement"] + self.columns["cost_optimization"]
+        gross = positive + self.columns["implementation_cost"]
+
+        def share(values: np.ndarray, total: np.ndarray) -> np.ndarray:
+            return np.divide(values, total, out=np.zeros(len(self)), where=total > 0)
+
+        shares = {name: share(self.columns[name], positive)
+                  for name in ("reference_price", "revenue_enhancement", "cost_optimization")}
+        shares["implementation_cost"] = share(self.columns["implementation_cost"], gross)
+        return shares
+
+    def rankings(self) -> np.ndarray:
+        """シナリオごとのEVCの順位（1が最大）を行ごとに返します。
+
+        Returns:
+            順位の配列
+        """
+        ranks = np.empty(len(self), dtype=np.int64)
+        if self._scenario_count:
+            # シナリオごとにセグメントが同じ順で並ぶ場合は (シナリオ数, セグメント数) の行列で並べ替える
+            grid = self.evc.reshape(self._scenario_count, -1)
+            order = np.argsort(-grid, axis=1, kind="stable")
+            rank_grid = np.empty_like(order)
+            np.put_along_axis(rank_grid, order, np.arange(1, grid.shape[1] + 1)[np.newaxis, :], axis=1)
+            return rank_grid.reshape(-1)
+
+        order = np.lexsort((-self.evc, self.scenarios))
+        # シナリオの先頭行からの位置が順位になる
+        sorted_scenarios = self.scenarios[order]
+        group_starts = np.searchsorted(sorted_scenarios, sorted_scenarios, side="left")
+        ranks[order] = np.arange(len(self)) - group_starts + 1
+        return ranks
+
+    def summary(self) -> Dict[str, Any]:
+        """表全体のEVCの要約統計を返します。
+
+        Returns:
+            max / min / mean / std / range と、最大EVCの行のセグメント
+        """
+        if not len(self):
+            return {"rows": 0, "max_evc": 0, "min_evc": 0, "average_evc": 0, "std_evc": 0, "evc_range": 0,
+                    "max_segment_id": None, "max_segment_name": None}
+        best = int(np.argmax(self.evc))
+        max_evc = float(self.evc[best])
+        min_evc = float(self.evc.min())
+        return {
+            "rows": len(self),
+            "max_evc": max_evc,
+            "min_evc": min_evc,
+            "average_evc": float(self.evc.mean()),
+            "std_evc": float(self.evc.std()),
+            "evc_range": max_evc - min_evc,
+            "max_segment_id": self.segment_labels[self.segment_codes[best]],
+            "max_segment_name": self.segment_label_names[self.segment_codes[best]],
+        }
+
+    def segment_statistics(self) -> Dict[str, Dict[str, float]]:
+        """セグメントごとのEVCの統計（シナリオをまたいだ平均・最小・最大と1位になった割合）を返します。
+
+        Returns:
+            セグメントID -> {mean, min, max, top_share} の辞書
+        """
+        codes = self.segment_codes
+        label_count = len(self.segment_labels)
+        counts = np.bincount(codes, minlength=label_count)
+        means = np.bincount(codes, weights=self.evc, minlength=label_count) / np.maximum(counts, 1)
+        top_counts = np.bincount(codes, weights=(self.rankings() == 1), minlength=label_count)
+        if self._scenario_count:
+            grid = self.evc.reshape(self._scenario_count, -1)
+            minimums, maximums = grid.min(axis=0), grid.max(axis=0)
+        else:
+            order = np.argsort(codes, kind="stable")
+            starts = np.searchsorted(codes[order], np.arange(label_count))
+            present = counts > 0
+            minimums = np.full(label_count, np.nan)
+            maximums = np.full(label_count, np.nan)
+            minimums[present] = np.minimum.reduceat(self.evc[order], starts[present])
+            maximums[present] = np.maximum.reduceat(self.evc[order], starts[present])
+        return {
+            segment_id: {
+                "mean": float(means[i]),
+                "min": float(minimums[i]),
+                "max": float(maximums[i]),
+                "top_share": float(top_counts[i] / counts[i]) if counts[i] else 0.0,
+            }
+            for i, segment_id in enumerate(self.segment_labels)
+            if counts[i]
+        }
+
+    def analyze(self) -> Dict[str, Any]:
+        """analyze_evc_resultsの分析結果を構築します。
+
+        セグメント別の比較と寄与度は1行ごと（単一シナリオの結果を想定）に出力します。
+
+        Returns:
+            summary / segment_comparison / component_contributions / rankings / key_insights を含む辞書
+        """
+        summary = self.summary()
+        max_evc = summary["max_evc"]
+        min_evc = summary["min_evc"]
+        avg_evc = summary["average_evc"]
+        shares = self.contribution_shares()
+        ranks = self.rankings()
+        safe_avg = avg_evc if avg_evc > 0 else 1.0
+        safe_max = max_evc if max_evc > 0 else 1.0
+        relative_to_average = self.evc / safe_avg if avg_evc > 0 else np.zeros(len(self))
+        percentage_of_max = self.evc / safe_max if max_evc > 0 else np.zeros(len(self))
+
+        segment_comparison = {}
+        component_contributions = {}
+        segment_names = self.segment_names
+        for i, segment_id in enumerate(self.segment_ids.tolist()):
+            segment_comparison[segment_id] = {
+                "evc_value": float(self.evc[i]),
+                "relative_to_average": float(relative_to_average[i]),
+                "percentage_of_max": float(percentage_of_max[i]),
+                "rank": int(ranks[i]),
+            }
+            component_contributions[segment_id] = {
+                name: {
+                    "value": float(self.columns[name][i]),
+                    ("percentage_of_total" if name == "implementation_cost" else "percentage"): float(shares[name][i]),
+                }
+                for name in ("reference_price", "revenue_enhancement", "cost_optimization", "implementation_cost")
+            }
+
+        key_insights = []
+        if len(self):
+            revenue_leader = int(np.argmax(shares["revenue_enhancement"]))
+            cost_leader = int(np.argmax(shares["implementation_cost"]))
+            key_insights = [
+                f"最も高いEVC値を持つセグメントは「{summary['max_segment_name']}」で、値は{max_evc:,.0f}円です。",
+                f"セグメント間のEVC値の差は{max_evc - min_evc:,.0f}円で、これは最大値の{(max_evc - min_evc) / max_evc * 100 if max_evc > 0 else 0:.1f}%に相当します。",
+                f"収益向上価値の寄与率が最も高いセグメントは「{segment_names[revenue_leader]}」"
+                f"（{shares['revenue_enhancement'][revenue_leader] * 100:.1f}%）です。",
+                f"導入コストの比率が最も高いセグメントは「{segment_names[cost_leader]}」"
+                f"（{shares['implementation_cost'][cost_leader] * 100:.1f}%）です。",
+            ]
+
+        return {
+            "summary": {
+                "max_evc": {
+                    "value": max_evc,
+                    "segment_id": summary["max_segment_id"],
+                    "segment_name": summary["max_segment_name"]
+                },
+                "min_evc": min_evc,
+                "average_evc": avg_evc,
+                "evc_range": summary["evc_range"]
+            },
+            "segment_comparison": segment_comparison,
+            "component_contributions": component_contributions,
+            "key_insights": key_insights
+        }
+
+    def visualization_data(self) -> Dict[str, Any]:
+        """visualize_evc_resultsの視覚化用データを構築します。
+
+        Returns:
+            segment_evc_values を含む辞書
+        """
+        segment_ids = self.segment_ids
+        segment_names = self.segment_names
+        return {
+            "segment_evc_values": [
+                {
+                    "segment_id": segment_ids[i],
+                    "segment_name": segment_names[i],
+                    "evc_value": float(self.evc[i]),
+                    "components": {
+                        "reference_price": float(self.columns["reference_price"][i]),
+                        "revenue_enhancement": float(self.columns["revenue_enhancement"][i]),
+                        "cost_optimization": float(self.columns["cost_optimization"][i]),
+                        "implementation_cost": float(self.columns["implementation_cost"][i])
+                    }
+                } for i in range(len(self))
+            ]
+        }
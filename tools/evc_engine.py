@@ -0,0 +1,729 @@
+"""
+NexaSales顧客セグメンテーションシステムのEVC計算エンジン
+
+このモジュールでは、calculate_evcが受け取るコンポーネント設定（revenue_components / cost_components）を
+一度だけ評価計画（EVCPlan）にコンパイルし、セグメントやシナリオをまたいで再利用する仕組みを提供します。
+評価計画はコンポーネント計算関数の登録表と、パラメータスロットを参照する平坦な演算リストで構成されるため、
+評価のたびに設定を読み直したり、calculation_functionの分岐をたどったりする必要がありません。
+
+新しい業種向けの計算関数は、register_component_calculatorで登録します。
+
+    @register_component_calculator("new_revenue", "marketplace")
+    def marketplace_new_revenue(new_sellers, gross_merchandise_value, take_rate):
+        return new_sellers * gross_merchandise_value * take_rate
+"""
+
+import hashlib
+import inspect
+import json
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from models.models import EVCComponents, EVCResult, ValueComponent
+from tools.evc_memo import get_evc_memo
+from utils.utils import DataValidationError
+
+# 調整係数のグループ
+REVENUE_GROUP = "Re"
+COST_GROUP = "Co"
+IMPLEMENTATION_GROUP = "I"
+DEFAULT_ADJUSTMENTS = {REVENUE_GROUP: 1.0, COST_GROUP: 1.0, IMPLEMENTATION_GROUP: 1.0}
+
+# 評価順（calculate_evcの従来の計算順と同じ）
+REVENUE_COMPONENTS = ("new_revenue", "retention_revenue", "pricing_revenue", "transaction_revenue")
+COST_COMPONENTS = ("direct_cost_reduction", "quality_cost_reduction", "risk_cost_reduction", "time_cost_reduction")
+
+# すべての評価計画が先頭に持つ基本パラメータのスロット
+BASE_PARAMETERS = ("reference_price", "initial_cost", "recurring_cost", "implementation_years")
+
+IMPLEMENTATION_COST_FORMULA = "I = initial_cost + recurring_cost × implementation_years"
+EVC_FORMULA = "EVC = R + (Re + Co) - I"
+
+# セグメント名のマッピング
+SEGMENT_NAMES = {
+    "s1": "大企業・高価値",
+    "s2": "大企業・低価値",
+    "s3": "中小企業・高価値",
+    "s4": "中小企業・低価値"
+}
+
+# 計算済みの値をそのまま使用するcalculation_function（すべての標準コンポーネントで共通）
+CUSTOM_CALCULATION_FUNCTION = "custom"
+
+
+class ComponentCalculator(NamedTuple):
+    """登録済みのコンポーネント計算関数です。"""
+
+    component: str
+    calculation_function: str
+    # 計算関数の引数の順に並べた必須パラメータ
+    parameters: Tuple[str, ...]
+    function: Callable[..., Any]
+
+
+# 組み込みのコンポーネント計算関数
+# (コンポーネント名, calculation_function) -> (必須パラメータ, 計算関数)
+# 計算関数は四則演算のみで構成し、スカラーでもNumPy配列でも評価できるようにする
+_BUILTIN_CALCULATORS: Dict[Tuple[str, str], Tuple[Tuple[str, ...], Callable[..., Any]]] = {
+    # 新規収益（Rn）
+    ("new_revenue", "standard"): (
+        ("new_customers", "average_customer_value", "new_products", "product_revenue"),
+        lambda new_customers, average_customer_value, new_products, product_revenue:
+            new_customers * average_customer_value + new_products * product_revenue,
+    ),
+    ("new_revenue", "saas"): (
+        ("new_customers", "average_arpu", "expansion_revenue"),
+        lambda new_customers, average_arpu, expansion_revenue:
+            new_customers * average_arpu + expansion_revenue,
+    ),
+    ("new_revenue", "manufacturing"): (
+        ("new_clients", "units_per_client", "unit_price"),
+        lambda new_clients, units_per_client, unit_price:
+            new_clients * units_per_client * unit_price,
+    ),
+    # 既存顧客維持による収益（Rr）
+    ("retention_revenue", "standard"): (
+        ("retained_customers", "customer_lifetime_value"),
+        lambda retained_customers, customer_lifetime_value:
+            retained_customers * customer_lifetime_value,
+    ),
+    ("retention_revenue", "subscription"): (
+        ("churn_reduction", "current_customers", "annual_contract_value"),
+        lambda churn_reduction, current_customers, annual_contract_value:
+            churn_reduction * current_customers * annual_contract_value,
+    ),
+    # 価格最適化による収益（Rp）
+    ("pricing_revenue", "standard"): (
+        ("price_increase", "customer_base", "revenue_per_customer"),
+        lambda price_increase, customer_base, revenue_per_customer:
+            price_increase * customer_base * revenue_per_customer,
+    ),
+    ("pricing_revenue", "premium"): (
+        ("price_premium", "target_segment_size", "revenue_per_customer"),
+        lambda price_premium, target_segment_size, revenue_per_customer:
+            price_premium * target_segment_size * revenue_per_customer,
+    ),
+    # 取引頻度向上による収益（Rt）
+    ("transaction_revenue", "standard"): (
+        ("transaction_increase", "customer_base", "average_transaction_value"),
+        lambda transaction_increase, customer_base, average_transaction_value:
+            transaction_increase * customer_base * average_transaction_value,
+    ),
+    # 直接コスト削減（Cd）
+    ("direct_cost_reduction", "standard"): (
+        ("manual_hours", "automated_hours", "hourly_rate", "resource_savings"),
+        lambda manual_hours, automated_hours, hourly_rate, resource_savings:
+            (manual_hours - automated_hours) * hourly_rate + resource_savings,
+    ),
+    ("direct_cost_reduction", "cloud_migration"): (
+        ("infrastructure_cost_current", "infrastructure_cost_cloud", "maintenance_reduction"),
+        lambda infrastructure_cost_current, infrastructure_cost_cloud, maintenance_reduction:
+            (infrastructure_cost_current - infrastructure_cost_cloud) + maintenance_reduction,
+    ),
+    # 品質関連コスト削減（Cq）
+    ("quality_cost_reduction", "standard"): (
+        ("defect_reduction", "defect_cost", "complaint_reduction", "complaint_cost"),
+        lambda defect_reduction, defect_cost, complaint_reduction, complaint_cost:
+            defect_reduction * defect_cost + complaint_reduction * complaint_cost,
+    ),
+    ("quality_cost_reduction", "six_sigma"): (
+        ("sigma_improvement", "defect_rate_reduction", "quality_cost_per_defect", "production_volume"),
+        lambda sigma_improvement, defect_rate_reduction, quality_cost_per_defect, production_volume:
+            defect_rate_reduction * quality_cost_per_defect * production_volume,
+    ),
+    # リスク関連コスト削減（Cr）
+    ("risk_cost_reduction", "standard"): (
+        ("risk_reduction_factor", "risk_exposure_value"),
+        lambda risk_reduction_factor, risk_exposure_value:
+            risk_reduction_factor * risk_exposure_value,
+    ),
+    ("risk_cost_reduction", "compliance"): (
+        ("compliance_penalty_reduction", "incident_probability_reduction", "average_incident_cost"),
+        lambda compliance_penalty_reduction, incident_probability_reduction, average_incident_cost:
+            compliance_penalty_reduction + incident_probability_reduction * average_incident_cost,
+    ),
+    # 時間関連コスト削減（Ct）
+    ("time_cost_reduction", "standard"): (
+        ("decision_time_savings", "opportunity_cost_rate"),
+        lambda decision_time_savings, opportunity_cost_rate:
+            decision_time_savings * opportunity_cost_rate,
+    ),
+    ("time_cost_reduction", "process_improvement"): (
+        ("process_time_reduction", "process_frequency", "employee_cost_per_hour"),
+        lambda process_time_reduction, process_frequency, employee_cost_per_hour:
+            process_time_reduction * process_frequency * employee_cost_per_hour / 60,
+    ),
+}
+
+# コンポーネント計算関数の登録表
+_CALCULATOR_REGISTRY: Dict[Tuple[str, str], ComponentCalculator] = {
+    key: ComponentCalculator(key[0], key[1], parameters, function)
+    for key, (parameters, function) in _BUILTIN_CALCULATORS.items()
+}
+
+_CUSTOM_CALCULATOR = ComponentCalculator(
+    "", CUSTOM_CALCULATION_FUNCTION, ("calculated_value",), lambda calculated_value: calculated_value
+)
+
+
+def register_component_calculator(
+    component: str,
+    calculation_function: str,
+    parameters: Optional[Tuple[str, ...]] = None,
+    replace: bool = False
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """コンポーネント計算関数を登録するデコレータを返します。
+
+    必須パラメータを省略した場合は、計算関数の引数名を必須パラメータとします。
+    ベクトル化した一括計算でも使用されるため、計算関数はスカラーでもNumPy配列でも評価できるように記述します。
+    登録すると、コンパイル済みの評価計画のキャッシュとEVC計算のメモを破棄します。
+
+    Args:
+        component: コンポーネント名（REVENUE_COMPONENTSまたはCOST_COMPONENTSのいずれか）
+        calculation_function: calculation_functionの名前
+        parameters: 計算関数の引数の順に並べた必須パラメータ
+        replace: 登録済みの計算関数を置き換えるか
+
+    Returns:
+        計算関数をそのまま返すデコレータ
+
+    Raises:
+        DataValidationError: コンポーネント名が不正な場合、または登録済みの計算関数と重複する場合
+    """
+    if component not in REVENUE_COMPONENTS + COST_COMPONENTS:
+        raise DataValidationError(f"コンポーネント {component} は標準コンポーネントではありません")
+    if calculation_function == CUSTOM_CALCULATION_FUNCTION:
+        raise DataValidationError(f"calculation_function {CUSTOM_CALCULATION_FUNCTION} は予約されています")
+
+    def decorator(function: Callable[..., Any]) -> Callable[..., Any]:
+        key = (component, calculation_function)
+        if key in _CALCULATOR_REGISTRY and not replace:
+            raise DataValidationError(f"計算関数 {component}/{calculation_function} は登録済みです")
+        required = tuple(parameters) if parameters is not None else tuple(inspect.signature(function).parameters)
+        _CALCULATOR_REGISTRY[key] = ComponentCalculator(component, calculation_function, required, function)
+        # 登録前にコンパイルした評価計画と、その計画で計算したEVCのメモは新しい計算関数を含まないため破棄する
+        _compile_evc_plan_cached.cache_clear()
+        get_evc_memo().clear()
+        return function
+
+    return decorator
+
+
+def get_component_calculator(component: str, calculation_function: Optional[str]) -> Optional[ComponentCalculator]:
+    """コンポーネントとcalculation_functionに対応する計算関数を取得します。
+
+    Args:
+        component: コンポーネント名
+        calculation_function: calculation_functionの名前
+
+    Returns:
+        登録済みの計算関数（未登録の場合はNone）
+    """
+    if calculation_function == CUSTOM_CALCULATION_FUNCTION:
+        return _CUSTOM_CALCULATOR
+    return _CALCULATOR_REGISTRY.get((component, calculation_function))
+
+
+def list_calculation_functions(component: str) -> Tuple[str, ...]:
+    """コンポーネントで使用できるcalculation_functionの一覧を返します。
+
+    Args:
+        component: コンポーネント名
+
+    Returns:
+        calculation_functionの名前（"custom"を含む）
+    """
+    names = [name for registered, name in _CALCULATOR_REGISTRY if registered == component]
+    return tuple(names) + (CUSTOM_CALCULATION_FUNCTION,)
+
+
+def list_numeric_parameters() -> frozenset:
+    """評価計画のスロットとして数値を受け取るパラメータ名の一覧を返します。
+
+    基本パラメータと、登録済みのすべてのコンポーネント計算関数の必須パラメータを含みます。
+
+    Returns:
+        パラメータ名の集合
+    """
+    names = set(BASE_PARAMETERS)
+    for calculator in _CALCULATOR_REGISTRY.values():
+        names.update(calculator.parameters)
+    return frozenset(names)
+
+
+class EVCOperation:
+    """評価計画の1演算（1コンポーネントの計算）です。"""
+
+    __slots__ = ("component", "group", "calculator", "slot_indices", "formula", "parameter_slots")
+
+    def __init__(self, component: str, group: str, calculator: Callable[..., Any], slot_indices: Tuple[int, ...],
+                 formula: Optional[str], parameter_slots: Tuple[Tuple[str, int], ...]):
+        self.component = component
+        self.group = group
+        self.calculator = calculator
+        # 計算関数の引数に対応するスロット位置
+        self.slot_indices = slot_indices
+        self.formula = formula
+        # 計算詳細に記録する（設定に列挙された）パラメータ名とスロット位置
+        self.parameter_slots = parameter_slots
+
+
+class EVCPlan:
+    """コンパイル済みのEVC評価計画です。
+
+    スロットはパラメータ名の一覧で、先頭はBASE_PARAMETERSです。
+    bindでパラメータ辞書をスロット順の値リストに変換し、evaluate_valuesで演算リストを順に評価します。
+    skipped_componentsには、コンパイル時に計算対象外としたコンポーネントと、その理由（不足しているパラメータ、
+    または未登録のcalculation_function）を記録します。
+    """
+
+    __slots__ = ("plan_id", "slots", "slot_index", "operations", "skipped_components")
+
+    def __init__(self, plan_id: str, slots: Tuple[str, ...], operations: Tuple[EVCOperation, ...],
+                 skipped_components: Optional[Dict[str, str]] = None):
+        self.plan_id = plan_id
+        self.slots = slots
+        self.slot_index = {name: index for index, name in enumerate(slots)}
+        self.operations = operations
+        self.skipped_components = skipped_components or {}
+
+    @property
+    def revenue_operations(self) -> Tuple[EVCOperation, ...]:
+        return tuple(op for op in self.operations if op.group == REVENUE_GROUP)
+
+    @property
+    def cost_operations(self) -> Tuple[EVCOperation, ...]:
+        return tuple(op for op in self.operations if op.group == COST_GROUP)
+
+    def bind(self, params: Dict[str, Any]) -> List[Any]:
+        """パラメータ辞書をスロット順の値リストに変換します。
+
+        "名前.キー"形式のスロットは、カスタムコンポーネントの設定（params[名前][キー]）を参照します。
+
+        Args:
+            params: パラメータ辞書
+
+        Returns:
+            スロット順の値リスト
+        """
+        values = []
+        for name in self.slots:
+            if "." in name:
+                owner, key = name.split(".", 1)
+                config = params.get(owner)
+                values.append(config.get(key) if isinstance(config, dict) else None)
+            else:
+                values.append(params.get(name))
+        return values
+
+    def evaluate_values(self, values: List[Any], adjustments: Dict[str, Any]) -> Dict[str, Any]:
+        """スロット順の値リストから EVC とその内訳を計算します。
+
+        Args:
+            values: bindで得たスロット順の値リスト（NumPy配列でも可）
+            adjustments: Re / Co / I の調整係数
+
+        Returns:
+            EVCの内訳を含む辞書
+        """
+        revenue_components = {}
+        cost_components = {}
+        for op in self.operations:
+            args = [values[index] for index in op.slot_indices]
+            # 値が与えられていないパラメータがあるコンポーネントは計算しない
+            if any(arg is None for arg in args):
+                continue
+            value = op.calculator(*args) * adjustments[op.group]
+            if op.group == REVENUE_GROUP:
+                revenue_components[op.component] = value
+            else:
+                cost_components[op.component] = value
+
+        reference_price = values[0] if values[0] is not None else 0
+        initial_cost = values[1] if values[1] is not None else 0
+        recurring_cost = values[2] if values[2] is not None else 0
+        implementation_years = values[3] if values[3] is not None else 0
+
+        revenue_enhancement_value = sum(revenue_components.values()) if revenue_components else 0
+        cost_optimization_value = sum(cost_components.values()) if cost_components else 0
+        implementation_cost_value = (initial_cost + recurring_cost * implementation_years) * adjustments[IMPLEMENTATION_GROUP]
+        evc_value = reference_price + (revenue_enhancement_value + cost_optimization_value) - implementation_cost_value
+
+        return {
+            "evc_value": evc_value,
+            "reference_price": reference_price,
+            "revenue_enhancement_value": revenue_enhancement_value,
+            "cost_optimization_value": cost_optimization_value,
+            "implementation_cost": implementation_cost_value,
+            "revenue_components": revenue_components,
+            "cost_components": cost_components,
+            "initial_cost": initial_cost,
+            "recurring_cost": recurring_cost,
+            "implementation_years": implementation_years,
+            "adjustments": adjustments,
+        }
+
+    def evaluate(self, params: Dict[str, Any], adjustments: Dict[str, Any]) -> Dict[str, Any]:
+        """パラメータ辞書から EVC とその内訳を計算します。
+
+        Args:
+            params: パラメータ辞書
+            adjustments: Re / Co / I の調整係数
+
+        Returns:
+            EVCの内訳を含む辞書
+        """
+        return self.evaluate_values(self.bind(params), adjustments)
+
+
+def extract_formula_spec(params: Dict[str, Any]) -> Dict[str, Any]:
+    """パラメータ辞書から評価計画のコンパイルに必要な設定のみを取り出します。
+
+    Args:
+        params: calculate_evcのパラメータ辞書
+
+    Returns:
+        revenue_components / cost_components とカスタムコンポーネントの設定
+    """
+    spec = {
+        "revenue_components": params.get("revenue_components") or {},
+        "cost_components": params.get("cost_components") or {},
+        "custom": {},
+    }
+    for group_key in ("revenue_components", "cost_components"):
+        for component_name in spec[group_key].get("custom_components", []) or []:
+            config = params.get(component_name)
+            if isinstance(config, dict):
+                # 計算済みの値はパラメータとしてスロットから参照するため、設定からは除く
+                spec["custom"][component_name] = {k: v for k, v in config.items() if k != "calculated_value"}
+    return spec
+
+
+def compile_evc_plan(spec: Dict[str, Any]) -> EVCPlan:
+    """コンポーネント設定を評価計画にコンパイルします。
+
+    calculation_functionの分岐と必須パラメータの確認はここで一度だけ行い、
+    適用可能なコンポーネントのみを演算リストに含めます。
+
+    Args:
+        spec: extract_formula_specで取り出した設定
+
+    Returns:
+        評価計画
+    """
+    slots: List[str] = list(BASE_PARAMETERS)
+    slot_index = {name: index for index, name in enumerate(slots)}
+
+    def slot_of(name: str) -> int:
+        if name not in slot_index:
+            slot_index[name] = len(slots)
+            slots.append(name)
+        return slot_index[name]
+
+    operations: List[EVCOperation] = []
+    skipped: Dict[str, str] = {}
+    groups = (
+        (REVENUE_GROUP, spec.get("revenue_components") or {}, REVENUE_COMPONENTS),
+        (COST_GROUP, spec.get("cost_components") or {}, COST_COMPONENTS),
+    )
+    for group, component_config, component_names in groups:
+        for component_name in component_names:
+            if component_name not in component_config:
+                continue
+            config = component_config[component_name] or {}
+            listed = list(config.get("parameters", []) or [])
+            calculator = get_component_calculator(component_name, config.get("calculation_function"))
+            if calculator is None:
+                skipped[component_name] = f"calculation_function {config.get('calculation_function')} は未登録です"
+                continue
+            # 必須パラメータが設定に列挙されていないコンポーネントは計算対象外
+            missing = [name for name in calculator.parameters if name not in listed]
+            if missing:
+                skipped[component_name] = f"必須パラメータが不足しています: {', '.join(missing)}"
+                continue
+            operations.append(EVCOperation(
+                component=component_name,
+                group=group,
+                calculator=calculator.function,
+                slot_indices=tuple(slot_of(name) for name in calculator.parameters),
+                formula=config.get("formula"),
+                parameter_slots=tuple((name, slot_of(name)) for name in listed),
+            ))
+
+        # カスタムコンポーネント（設定はパラメータ辞書の同名キーに格納される）
+        for component_name in component_config.get("custom_components", []) or []:
+            config = (spec.get("custom") or {}).get(component_name)
+            if config is None:
+                continue
+            listed = list(config.get("parameters", []) or [])
+            operations.append(EVCOperation(
+                component=component_name,
+                group=group,
+                calculator=_CUSTOM_CALCULATOR.function,
+                slot_indices=(slot_of(f"{component_name}.calculated_value"),),
+                formula=config.get("formula"),
+                parameter_slots=tuple((name, slot_of(name)) for name in listed),
+            ))
+
+    canonical = json.dumps(spec, ensure_ascii=False, sort_keys=True, default=str)
+    plan_id = hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+    return EVCPlan(plan_id, tuple(slots), tuple(operations), skipped)
+
+
+@lru_cache(maxsize=256)
+def _compile_evc_plan_cached(canonical_spec: str) -> EVCPlan:
+    return compile_evc_plan(json.loads(canonical_spec))
+
+
+def get_evc_plan(params: Dict[str, Any]) -> EVCPlan:
+    """パラメータ辞書に対応する評価計画を取得します（同じ設定はコンパイル済みの計画を再利用）。
+
+    Args:
+        params: calculate_evcのパラメータ辞書
+
+    Returns:
+        評価計画
+    """
+    spec = extract_formula_spec(params)
+    return _compile_evc_plan_cached(json.dumps(spec, ensure_ascii=False, sort_keys=True, default=str))
+
+
+def resolve_adjustments(params: Dict[str, Any], segment_id: str) -> Dict[str, Any]:
+    """パラメータ辞書からセグメントの調整係数を取得します。
+
+    一部のキーのみを指定した調整係数では、指定のないキーを1.0とします。
+
+    Args:
+        params: calculate_evcのパラメータ辞書
+        segment_id: セグメントID
+
+    Returns:
+        Re / Co / I の調整係数
+    """
+    segment_adjustments = params.get("segment_adjustments") or {}
+    return dict(DEFAULT_ADJUSTMENTS, **(segment_adjustments.get(segment_id) or {}))
+
+
+def _copy_details(value: Any) -> Any:
+    # 計算詳細の辞書・リストを再帰的に複製する（数値や文字列はそのまま共有する）
+    if isinstance(value, dict):
+        return {key: _copy_details(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy_details(item) for item in value]
+    return value
+
+
+def _copy_value_component(component: ValueComponent) -> ValueComponent:
+    return ValueComponent.model_construct(
+        name=component.name,
+        description=component.description,
+        formula=component.formula,
+        value=component.value,
+        calculation_details=_copy_details(component.calculation_details)
+    )
+
+
+def copy_evc_result(result: EVCResult) -> EVCResult:
+    """検証済みのEVCResultを、検証を省略して複製します。
+
+    計算詳細の辞書も複製するため、返したモデルを変更しても元のモデルには影響しません。
+
+    Args:
+        result: 検証済みのEVC計算結果
+
+    Returns:
+        複製したEVC計算結果
+    """
+    components = result.components
+    return EVCResult.model_construct(
+        segment_id=result.segment_id,
+        segment_name=result.segment_name,
+        evc_value=result.evc_value,
+        components=EVCComponents.model_construct(
+            reference_price=components.reference_price,
+            revenue_enhancement=_copy_value_component(components.revenue_enhancement),
+            cost_optimization=_copy_value_component(components.cost_optimization),
+            implementation_cost=components.implementation_cost
+        ),
+        calculation_details=_copy_details(result.calculation_details)
+    )
+
+
+def build_evc_result(plan: EVCPlan, segment_id: str, values: List[Any], breakdown: Dict[str, Any]) -> EVCResult:
+    """評価結果からEVCResultモデルを構築します。
+
+    Args:
+        plan: 評価に使用した計画
+        segment_id: セグメントID
+        values: bindで得たスロット順の値リスト
+        breakdown: evaluate_valuesの戻り値
+
+    Returns:
+        EVC計算結果
+    """
+    adjustments = breakdown["adjustments"]
+
+    def component_details(components: Dict[str, Any], operations: Tuple[EVCOperation, ...]) -> Dict[str, Any]:
+        by_name = {op.component: op for op in operations}
+        details = {}
+        for component_name, value in components.items():
+            op = by_name[component_name]
+            details[component_name] = {
+                "value": value,
+                "formula": op.formula,
+                "parameters": {name: values[index] for name, index in op.parameter_slots}
+            }
+        return details
+
+    revenue_components = breakdown["revenue_components"]
+    revenue_enhancement_value = breakdown["revenue_enhancement_value"]
+    revenue_formula = "Re = " + " + ".join(revenue_components.keys())
+    revenue_enhancement = ValueComponent(
+        name="収益向上価値",
+        description="サービス導入による売上向上効果",
+        formula=revenue_formula,
+        value=revenue_enhancement_value,
+        calculation_details={
+            "formula": revenue_formula,
+            "total_value": revenue_enhancement_value,
+            "components": component_details(revenue_components, plan.revenue_operations),
+            "adjustment": adjustments[REVENUE_GROUP]
+        }
+    )
+
+    cost_components = breakdown["cost_components"]
+    cost_optimization_value = breakdown["cost_optimization_value"]
+    cost_formula = "Co = " + " + ".join(cost_components.keys())
+    cost_optimization = ValueComponent(
+        name="コスト最適化価値",
+        description="サービス導入によるコスト削減効果",
+        formula=cost_formula,
+        value=cost_optimization_value,
+        calculation_details={
+            "formula": cost_formula,
+            "total_value": cost_optimization_value,
+            "components": component_details(cost_components, plan.cost_operations),
+            "adjustment": adjustments[COST_GROUP]
+        }
+    )
+
+    implementation_cost_value = breakdown["implementation_cost"]
+    implementation_cost_obj = ValueComponent(
+        name="導入コスト",
+        description="サービス導入に必要なコスト",
+        formula=IMPLEMENTATION_COST_FORMULA,
+        value=implementation_cost_value,
+        calculation_details={
+            "formula": IMPLEMENTATION_COST_FORMULA,
+            "total_value": implementation_cost_value,
+            "components": {
+                "initial_cost": breakdown["initial_cost"],
+                "recurring_cost": breakdown["recurring_cost"] * breakdown["implementation_years"]
+            },
+            "adjustment": adjustments[IMPLEMENTATION_GROUP]
+        }
+    )
+
+    components = EVCComponents(
+        reference_price=breakdown["reference_price"],
+        revenue_enhancement=revenue_enhancement,
+        cost_optimization=cost_optimization,
+        implementation_cost=implementation_cost_value
+    )
+
+    evc_value = breakdown["evc_value"]
+    return EVCResult(
+        segment_id=segment_id,
+        segment_name=SEGMENT_NAMES.get(segment_id, f"セグメント {segment_id}"),
+        evc_value=evc_value,
+        components=components,
+        calculation_details={
+            "formula": EVC_FORMULA,
+            "evc_value": evc_value,
+            "reference_price": breakdown["reference_price"],
+            "revenue_enhancement_value": revenue_enhancement_value,
+            "cost_optimization_value": cost_optimization_value,
+            "implementation_cost": implementation_cost_value
+        }
+    )
+
+
+class EVCRecord:
+    """大量計算用の軽量なEVC計算結果です。
+
+    EVCResultのようにpydanticの検証やcalculation_detailsの構築を行わず、評価結果の参照のみを保持します。
+    APIの境界でto_modelを呼び出したときに初めてEVCResultを構築して検証します。
+    """
+
+    __slots__ = ("segment_id", "evc_value", "reference_price", "revenue_enhancement_value",
+                 "cost_optimization_value", "implementation_cost", "_plan", "_values", "_breakdown")
+
+    def __init__(self, plan: EVCPlan, segment_id: str, values: List[Any], breakdown: Dict[str, Any]):
+        self.segment_id = segment_id
+        self.evc_value = breakdown["evc_value"]
+        self.reference_price = breakdown["reference_price"]
+        self.revenue_enhancement_value = breakdown["revenue_enhancement_value"]
+        self.cost_optimization_value = breakdown["cost_optimization_value"]
+        self.implementation_cost = breakdown["implementation_cost"]
+        self._plan = plan
+        self._values = values
+        self._breakdown = breakdown
+
+    @property
+    def segment_name(self) -> str:
+        return SEGMENT_NAMES.get(self.segment_id, f"セグメント {self.segment_id}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """EVCと主要な内訳の辞書表現を返します。
+
+        Returns:
+            EVC計算結果の要約
+        """
+        return {
+            "segment_id": self.segment_id,
+            "segment_name": self.segment_name,
+            "evc_value": self.evc_value,
+            "reference_price": self.reference_price,
+            "revenue_enhancement_value": self.revenue_enhancement_value,
+            "cost_optimization_value": self.cost_optimization_value,
+            "implementation_cost": self.implementation_cost,
+        }
+
+    def to_model(self) -> EVCResult:
+        """検証済みのEVCResultモデルを構築します。
+
+        Returns:
+            EVC計算結果
+        """
+        return build_evc_result(self._plan, self.segment_id, self._values, self._breakdown)
+
+    def __repr__(self) -> str:
+        return f"EVCRecord(segment_id={self.segment_id!r}, evc_value={self.evc_value!r})"
+
+
+def evaluate_evc_records(params_by_segment: Dict[str, Dict[str, Any]]) -> List[EVCRecord]:
+    """セグメントごとのパラメータから軽量なEVC計算結果を一括で計算します。
+
+    Args:
+        params_by_segment: セグメントID -> calculate_evcと同じ形式のパラメータ辞書
+
+    Returns:
+        セグメントごとのEVC計算結果（EVCRecord）
+    """
+    records = []
+    # 同じコンポーネント設定オブジェクトを共有するセグメントでは、設定の正規化も省いて計画を再利用する
+    plans_by_config: Dict[Tuple[int, int], EVCPlan] = {}
+    for segment_id, params in params_by_segment.items():
+        revenue_config = params.get("revenue_components") or {}
+        cost_config = params.get("cost_components") or {}
+        if revenue_config.get("custom_components") or cost_config.get("custom_components"):
+            plan = get_evc_plan(params)
+        else:
+            config_key = (id(revenue_config), id(cost_config))
+            plan = plans_by_config.get(config_key)
+            if plan is None:
+                plan = plans_by_config[config_key] = get_evc_plan(params)
+        values = plan.bind(params)
+        breakdown = plan.evaluate_values(values, resolve_adjustments(params, segment_id))
+        records.append(EVCRecord(plan, segment_id, values, breakdown))
+    return records
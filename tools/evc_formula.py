@@ -0,0 +1,307 @@
+"""
+NexaSales顧客セグメンテーションシステムのEVCフォーミュラのコンパイル
+
+このモジュールでは、フォーミュラ設計エージェントが出力するフォーミュラ（design_evc_formula /
+customize_formula_for_segmentの出力）を一度だけ解析・検証し、コンパイル済みのフォーミュラ（CompiledFormula）に
+変換する仕組みを提供します。validate_formulaとcalculate_evcは同じコンパイル済みのフォーミュラを共有するため、
+ツールの呼び出しごとにフォーミュラの文字列を解析し直す必要がありません。
+
+検証では、必須コンポーネントと重み、セグメント固有パラメータの網羅性と単位（金額・割合・年数）、
+segment_adjustmentsのセグメントIDと調整係数のキーを確認します。
+"""
+
+import ast
+import hashlib
+import json
+import logging
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from tools.evc_engine import COST_GROUP, DEFAULT_ADJUSTMENTS, IMPLEMENTATION_GROUP, REVENUE_GROUP
+from utils.japanese_numbers import parse_japanese_number
+
+# 必須コンポーネント
+REQUIRED_COMPONENTS = ("R", "Re", "Co", "I")
+
+# セグメント固有パラメータと単位
+UNIT_YEN = "円"
+UNIT_RATE = "割合"
+UNIT_YEARS = "年"
+SEGMENT_PARAMETER_UNITS = {
+    "annual_revenue": UNIT_YEN,
+    "annual_cost": UNIT_YEN,
+    "implementation_years": UNIT_YEARS,
+    "revenue_increase_rate": UNIT_RATE,
+    "cost_reduction_rate": UNIT_RATE,
+    "reference_price": UNIT_YEN,
+    "initial_cost": UNIT_YEN,
+    "operation_cost": UNIT_YEN,
+}
+
+# segment_adjustmentsで使用できる調整係数のキー
+ADJUSTMENT_KEYS = (REVENUE_GROUP, COST_GROUP, IMPLEMENTATION_GROUP)
+
+_SEGMENT_ID_PATTERN = re.compile(r"^s\d+$")
+_FORMULA_SYMBOL_PATTERN = re.compile(r"(?<![A-Za-z])(Re|Co|R|I)(?![A-Za-z])")
+
+
+def parse_formula_text(formula: Any) -> Dict[str, Any]:
+    """フォーミュラの文字列を辞書に変換します。
+
+    JSON、Pythonの辞書表記（str(dict)の出力）、シングルクォートを置き換えたJSONの順に解析を試み、
+    "EVC = ..." のような数式のみの文字列は、重みがすべて1.0のフォーミュラとして扱います。
+
+    Args:
+        formula: フォーミュラ（文字列または辞書）
+
+    Returns:
+        フォーミュラの辞書（解析できない場合は空の辞書）
+    """
+    if isinstance(formula, dict):
+        return formula
+    if not isinstance(formula, str):
+        return {}
+
+    text = formula.strip()
+    if not text:
+        return {}
+    if text.startswith("{") and text.endswith("}"):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            pass
+        try:
+            parsed = ast.literal_eval(text)
+            if isinstance(parsed, dict):
+                return parsed
+        except (ValueError, SyntaxError):
+            pass
+        try:
+            return json.loads(text.replace("'", "\"").replace("\n", " "))
+        except json.JSONDecodeError as e:
+            logging.error(f"フォーミュラのパースに失敗しました: {str(e)}")
+            return {}
+
+    if "=" in text:
+        # シンプルな数式としてのみ処理
+        return {
+            "base_formula": text,
+            "components": {component: {"weight": 1.0} for component in REQUIRED_COMPONENTS},
+            "segment_specific_parameters": {}
+        }
+
+    logging.warning(f"フォーミュラのフォーマットが認識できません: {text[:50]}")
+    return {}
+
+
+def _as_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        return parse_japanese_number(value)
+    return None
+
+
+class CompiledFormula:
+    """解析・検証済みのEVCフォーミュラです。
+
+    weightsとsegment_adjustmentsには検証を通過した数値のみを保持し、
+    issuesとrecommendationsには検証で見つかった問題と推奨事項を保持します。
+    """
+
+    __slots__ = (
+        "formula_id", "definition", "segment_id", "base_formula", "weights",
+        "segment_parameters", "segment_adjustments", "issues", "recommendations"
+    )
+
+    def __init__(self, formula_id: str, definition: Dict[str, Any]):
+        self.formula_id = formula_id
+        self.definition = definition
+        self.segment_id = definition.get("segment_id")
+        self.base_formula = definition.get("base_formula")
+        self.weights: Dict[str, float] = {}
+        self.segment_parameters: Dict[str, float] = {}
+        self.segment_adjustments: Dict[str, Dict[str, float]] = {}
+        self.issues: List[str] = []
+        self.recommendations: List[str] = []
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.issues
+
+    def adjustments_for(self, segment_id: str) -> Dict[str, float]:
+        """セグメントの調整係数を返します（定義されていないキーは1.0）。
+
+        Args:
+            segment_id: セグメントID
+
+        Returns:
+            Re / Co / I の調整係数
+        """
+        return dict(DEFAULT_ADJUSTMENTS, **self.segment_adjustments.get(segment_id, {}))
+
+    def resolve_adjustments(self, params: Dict[str, Any], segment_id: str) -> Dict[str, Any]:
+        """計算に使用するセグメントの調整係数を決定します。
+
+        パラメータのsegment_adjustmentsにセグメントの調整係数があればその値、なければフォーミュラの検証済みの
+        調整係数を使用します（キーごとに決定し、どちらにもないキーは1.0）。
+        calculate_evc・EVC依存グラフ・ワットイフサービスは、この順序で調整係数を決定します。
+
+        Args:
+            params: calculate_evcのパラメータ辞書
+            segment_id: セグメントID
+
+        Returns:
+            Re / Co / I の調整係数
+        """
+        overrides = (params.get("segment_adjustments") or {}).get(segment_id) or {}
+        return dict(self.adjustments_for(segment_id), **overrides)
+
+    def to_validation_result(self) -> Dict[str, Any]:
+        """validate_formulaの検証結果の形式に変換します。
+
+        Returns:
+            is_valid / issues / recommendations / formula_id を含む辞書
+        """
+        return {
+            "is_valid": self.is_valid,
+            "issues": list(self.issues),
+            "recommendations": list(self.recommendations),
+            "formula_id": self.formula_id
+        }
+
+
+def _validate_components(compiled: CompiledFormula, definition: Dict[str, Any]) -> None:
+    if "base_formula" not in definition:
+        compiled.issues.append("基本フォーミュラが定義されていません")
+    else:
+        symbols = set(_FORMULA_SYMBOL_PATTERN.findall(str(definition["base_formula"])))
+        for component in REQUIRED_COMPONENTS:
+            if component not in symbols:
+                compiled.issues.append(f"基本フォーミュラがコンポーネント '{component}' を参照していません")
+
+    if "components" not in definition:
+        compiled.issues.append("フォーミュラのコンポーネントが定義されていません")
+
+    components = definition.get("components") or {}
+    for component in REQUIRED_COMPONENTS:
+        if component not in components:
+            compiled.issues.append(f"必須コンポーネント '{component}' が定義されていません")
+            continue
+        component_data = components[component] or {}
+        if "weight" not in component_data:
+            compiled.issues.append(f"コンポーネント '{component}' の重みが定義されていません")
+            continue
+        weight = _as_number(component_data["weight"])
+        if weight is None or weight <= 0:
+            compiled.issues.append(f"コンポーネント '{component}' の重みは正の値である必要があります")
+        else:
+            compiled.weights[component] = weight
+
+
+def _validate_segment_parameters(compiled: CompiledFormula, definition: Dict[str, Any]) -> None:
+    segment_params = definition.get("segment_specific_parameters") or {}
+    for param, unit in SEGMENT_PARAMETER_UNITS.items():
+        if param not in segment_params:
+            compiled.issues.append(f"必須パラメータ '{param}' が定義されていません")
+            continue
+        raw = segment_params[param]
+        value = _as_number(raw)
+        if value is None:
+            compiled.issues.append(f"パラメータ '{param}' は数値である必要があります: {raw}")
+            continue
+        # 単位の整合性（割合は0〜1の小数、金額は0以上、年数は正の値）
+        if unit == UNIT_RATE and not 0 <= value <= 1:
+            compiled.issues.append(
+                f"パラメータ '{param}' は0〜1の割合で指定する必要があります（パーセント表記の場合は%を付けてください）: {raw}"
+            )
+        elif unit == UNIT_YEN and value < 0:
+            compiled.issues.append(f"パラメータ '{param}' の金額は0以上である必要があります: {raw}")
+        elif unit == UNIT_YEARS and value <= 0:
+            compiled.issues.append(f"パラメータ '{param}' の年数は正の値である必要があります: {raw}")
+        else:
+            compiled.segment_parameters[param] = value
+
+
+def _validate_segment_adjustments(compiled: CompiledFormula, definition: Dict[str, Any]) -> None:
+    segment_adjustments = definition.get("segment_adjustments")
+    if segment_adjustments is None:
+        return
+    if not isinstance(segment_adjustments, dict):
+        compiled.issues.append("segment_adjustmentsはセグメントIDをキーとするオブジェクトである必要があります")
+        return
+
+    for segment_id, adjustments in segment_adjustments.items():
+        if not _SEGMENT_ID_PATTERN.match(str(segment_id)):
+            compiled.issues.append(f"segment_adjustmentsのセグメントID '{segment_id}' が不正です（s1, s2, ... の形式）")
+            continue
+        if not isinstance(adjustments, dict):
+            compiled.issues.append(f"セグメント '{segment_id}' の調整係数はオブジェクトである必要があります")
+            continue
+        validated = {}
+        for key, raw in adjustments.items():
+            value = _as_number(raw)
+            if key not in ADJUSTMENT_KEYS:
+                compiled.issues.append(
+                    f"セグメント '{segment_id}' の調整係数のキー '{key}' は不明です（{' / '.join(ADJUSTMENT_KEYS)}）"
+                )
+            elif value is None or value <= 0:
+                compiled.issues.append(f"セグメント '{segment_id}' の調整係数 '{key}' は正の値である必要があります: {raw}")
+            else:
+                validated[key] = value
+        compiled.segment_adjustments[segment_id] = validated
+
+
+def _add_recommendations(compiled: CompiledFormula) -> None:
+    if compiled.segment_id == "s4":  # 中小企業・低価値
+        if compiled.weights.get("I", 1.0) < 1.2:
+            compiled.recommendations.append(
+                "中小企業・低価値セグメントでは、導入コストの重みをより高く設定することを検討してください"
+            )
+
+    if compiled.segment_id == "s1":  # 大企業・高価値
+        if compiled.weights.get("Re", 1.0) < 1.1:
+            compiled.recommendations.append(
+                "大企業・高価値セグメントでは、収益向上価値の重みをより高く設定することを検討してください"
+            )
+
+
+def _compile(definition: Dict[str, Any], formula_id: str) -> CompiledFormula:
+    compiled = CompiledFormula(formula_id, definition)
+    _validate_components(compiled, definition)
+    _validate_segment_parameters(compiled, definition)
+    _validate_segment_adjustments(compiled, definition)
+    _add_recommendations(compiled)
+    return compiled
+
+
+@lru_cache(maxsize=256)
+def _compile_formula_text(text: str) -> CompiledFormula:
+    definition = parse_formula_text(text)
+    canonical = json.dumps(definition, ensure_ascii=False, sort_keys=True, default=str)
+    return _compile(definition, hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16])
+
+
+def compile_formula(formula: Any) -> CompiledFormula:
+    """フォーミュラを解析・検証し、コンパイル済みのフォーミュラを返します。
+
+    同じ文字列のフォーミュラはコンパイル済みのものを再利用するため、
+    validate_formulaとcalculate_evcで同じフォーミュラを渡しても解析は一度だけです。
+    コンパイル済みのフォーミュラは共有されるため、変更しないでください。
+
+    Args:
+        formula: フォーミュラ（文字列、辞書、またはコンパイル済みのフォーミュラ）
+
+    Returns:
+        コンパイル済みのフォーミュラ
+    """
+    if isinstance(formula, CompiledFormula):
+        return formula
+    if isinstance(formula, dict):
+        canonical = json.dumps(formula, ensure_ascii=False, sort_keys=True, default=str)
+        return _compile_formula_text(canonical)
+    return _compile_formula_text(formula if isinstance(formula, str) else "")
+
@@ -0,0 +1,383 @@
+"""
+NexaSales顧客セグメンテーションシステムのEVC依存グラフ
+
+このモジュールでは、EVC計算を依存グラフとして保持し、パラメータの変更時に影響を受けるノードだけを
+再計算する機能を提供します。グラフは次の依存関係で構成されます。
+
+    パラメータ -> コンポーネント -> Re / Co      -> EVC
+    initial_cost / recurring_cost / implementation_years -> I -> EVC
+    reference_price -> EVC
+    調整係数（Re / Co / I） -> Re / Co / I
+    segment_adjustments / フォーミュラ -> 調整係数
+
+コンポーネントは調整前の値を保持し、Re / Co / I は「調整前の合計 × 調整係数」で求めるため、
+1つのパラメータや調整係数を変更しても、再計算はそのパラメータを参照するコンポーネントと
+その下流のノードに限られます（セグメントあたりの再計算量はセグメント数に依存しません）。
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from models.models import EVCResult
+from tools.evc_engine import (
+    BASE_PARAMETERS,
+    COST_GROUP,
+    DEFAULT_ADJUSTMENTS,
+    IMPLEMENTATION_GROUP,
+    REVENUE_GROUP,
+    EVCPlan,
+    build_evc_result,
+    get_evc_plan,
+    list_numeric_parameters,
+)
+from tools.evc_formula import CompiledFormula, compile_formula
+from tools.segment_parameters import coerce_numeric_value
+from utils.utils import DataValidationError
+
+_REFERENCE_PRICE_SLOT = 0
+_IMPLEMENTATION_SLOTS = (1, 2, 3)
+
+
+@lru_cache(maxsize=256)
+def _plan_dependents(plan: EVCPlan) -> Dict[int, Tuple[int, ...]]:
+    # スロット位置 -> そのスロットを引数に取る演算の位置
+    dependents: Dict[int, List[int]] = {}
+    for op_index, op in enumerate(plan.operations):
+        for slot in set(op.slot_indices):
+            dependents.setdefault(slot, []).append(op_index)
+    return {slot: tuple(op_indices) for slot, op_indices in dependents.items()}
+
+
+def _coerce_segment_adjustments(value: Any) -> Dict[str, Dict[str, Any]]:
+    # segment_adjustmentsの値を検査し、調整係数の数値表現を数値に変換する
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise DataValidationError("segment_adjustmentsはセグメントID -> 調整係数のオブジェクトである必要があります")
+    coerced = {}
+    for segment_id, adjustments in value.items():
+        if not isinstance(adjustments, dict):
+            raise DataValidationError(f"セグメント {segment_id} の調整係数はオブジェクトである必要があります")
+        unknown = [group for group in adjustments if group not in DEFAULT_ADJUSTMENTS]
+        if unknown:
+            raise DataValidationError(f"調整係数のグループ {', '.join(unknown)} は Re / Co / I のいずれかである必要があります")
+        coerced[segment_id] = {
+            group: coerce_numeric_value(f"segment_adjustments.{group}", factor, segment_id)
+            for group, factor in adjustments.items()
+        }
+    return coerced
+
+
+class _SegmentNode:
+    """1セグメント分の依存グラフのノード値です。"""
+
+    __slots__ = ("plan", "params", "values", "adjustments", "raw_components", "raw_totals",
+                 "implementation_raw", "evc")
+
+    def __init__(self, plan: EVCPlan, params: Dict[str, Any], adjustments: Dict[str, Any]):
+        self.plan = plan
+        self.params = params
+        self.values = plan.bind(params)
+        self.adjustments = dict(DEFAULT_ADJUSTMENTS, **adjustments)
+        # 演算ごとの調整前の値（計算対象外の場合はNone）
+        self.raw_components: List[Optional[float]] = [None] * len(plan.operations)
+        self.raw_totals = {REVENUE_GROUP: 0.0, COST_GROUP: 0.0}
+        self.implementation_raw = 0.0
+        self.evc = 0.0
+
+
+class EVCDependencyGraph:
+    """セグメントごとのEVC計算を依存グラフとして保持し、変更箇所のみを再計算するクラスです。"""
+
+    def __init__(self, params_by_segment: Dict[str, Dict[str, Any]], formula: Any = None):
+        """
+        依存グラフを構築し、全ノードを一度計算します。
+
+        調整係数はcalculate_evcと同じ順序（パラメータのsegment_adjustments、なければフォーミュラの調整係数）で決定します。
+
+        Args:
+            params_by_segment: セグメントID -> calculate_evcと同じ形式のパラメータ辞書
+            formula: EVC計算フォーミュラ（文字列、辞書、またはコンパイル済みのフォーミュラ。省略時は調整係数1.0）
+        """
+        self.formula: CompiledFormula = compile_formula(formula)
+        self._nodes: Dict[str, _SegmentNode] = {}
+        self.component_evaluations = 0
+        self.evc_evaluations = 0
+        for segment_id, params in params_by_segment.items():
+            params = dict(params)
+            node = _SegmentNode(get_evc_plan(params), params, self.formula.resolve_adjustments(params, segment_id))
+            for op_index in range(len(node.plan.operations)):
+                self._recompute_component(node, op_index)
+            for group in (REVENUE_GROUP, COST_GROUP):
+                self._recompute_total(node, group)
+            self._recompute_implementation(node)
+            self._recompute_evc(node)
+            self._nodes[segment_id] = node
+
+    @property
+    def segment_ids(self) -> List[str]:
+        return list(self._nodes)
+
+    def _node(self, segment_id: str) -> _SegmentNode:
+        node = self._nodes.get(segment_id)
+        if node is None:
+            raise DataValidationError(f"セグメント {segment_id} は依存グラフに含まれていません")
+        return node
+
+    def _recompute_component(self, node: _SegmentNode, op_index: int) -> None:
+        op = node.plan.operations[op_index]
+        args = [node.values[slot] for slot in op.slot_indices]
+        node.raw_components[op_index] = None if any(arg is None for arg in args) else op.calculator(*args)
+        self.component_evaluations += 1
+
+    def _recompute_total(self, node: _SegmentNode, group: str) -> None:
+        # グループ内のコンポーネント数は設定で決まる定数のため、差分更新ではなく合計し直して誤差の蓄積を避ける
+        node.raw_totals[group] = sum(
+            value for op, value in zip(node.plan.operations, node.raw_components)
+            if op.group == group and value is not None
+        )
+
+    def _recompute_implementation(self, node: _SegmentNode) -> None:
+        initial_cost, recurring_cost, implementation_years = (
+            node.values[slot] if node.values[slot] is not None else 0 for slot in _IMPLEMENTATION_SLOTS
+        )
+        node.implementation_raw = initial_cost + recurring_cost * implementation_years
+
+    def _recompute_evc(self, node: _SegmentNode) -> None:
+        reference_price = node.values[_REFERENCE_PRICE_SLOT]
+        node.evc = (
+            (reference_price if reference_price is not None else 0)
+            + node.raw_totals[REVENUE_GROUP] * node.adjustments[REVENUE_GROUP]
+            + node.raw_totals[COST_GROUP] * node.adjustments[COST_GROUP]
+            - node.implementation_raw * node.adjustments[IMPLEMENTATION_GROUP]
+        )
+        self.evc_evaluations += 1
+
+    def _target_nodes(self, segment_ids: Optional[Sequence[str]]) -> List[Tuple[str, _SegmentNode]]:
+        if segment_ids is None:
+            return list(self._nodes.items())
+        return [(segment_id, self._node(segment_id)) for segment_id in segment_ids]
+
+    def set_parameter(self, name: str, value: Any, segment_ids: Optional[Sequence[str]] = None) -> Dict[str, float]:
+        """パラメータを変更し、影響を受けるノードのみを再計算します。
+
+        コンポーネント設定（revenue_components / cost_components など）の変更は評価計画が変わるため、
+        依存グラフを構築し直してください。
+        segment_adjustmentsを変更した場合は、構築時と同じ順序で調整係数を決定し直し、EVCのみを再計算します。
+        数値のパラメータと調整係数の文字列の値（「2万円」など）は、calculate_evcと同じ規則で数値に変換します。
+
+        Args:
+            name: パラメータ名（カスタムコンポーネントの計算済みの値は "名前.calculated_value"）
+            value: 新しい値
+            segment_ids: 変更するセグメントID（省略時は全セグメント）
+
+        Returns:
+            再計算したセグメントID -> EVC値
+
+        Raises:
+            DataValidationError: 評価計画を変更するパラメータが指定された場合、または値が数値として解釈できない場合
+        """
+        if name in ("revenue_components", "cost_components"):
+            raise DataValidationError(f"{name} の変更は依存グラフを構築し直す必要があります")
+        if name == "segment_adjustments":
+            value = _coerce_segment_adjustments(value)
+        elif name in list_numeric_parameters() or any(name in node.plan.slot_index for node in self._nodes.values()):
+            value = coerce_numeric_value(name, value)
+
+        updated = {}
+        for segment_id, node in self._target_nodes(segment_ids):
+            if name == "segment_adjustments":
+                # 調整係数はフルの計算と同じ順序（パラメータ、なければフォーミュラ）で決定し直す
+                node.params[name] = value
+                adjustments = self.formula.resolve_adjustments(node.params, segment_id)
+                if adjustments != node.adjustments:
+                    node.adjustments = adjustments
+                    self._recompute_evc(node)
+                    updated[segment_id] = node.evc
+                continue
+            if "." in name:
+                owner, key = name.split(".", 1)
+                node.params[owner] = dict(node.params.get(owner) or {}, **{key: value})
+            else:
+                node.params[name] = value
+
+            slot = node.plan.slot_index.get(name)
+            if slot is None:
+                # このセグメントのEVCが参照しないパラメータ
+                continue
+            if node.values[slot] == value:
+                continue
+            node.values[slot] = value
+
+            groups = set()
+            for op_index in _plan_dependents(node.plan).get(slot, ()):
+                self._recompute_component(node, op_index)
+                groups.add(node.plan.operations[op_index].group)
+            for group in groups:
+                self._recompute_total(node, group)
+            if slot in _IMPLEMENTATION_SLOTS:
+                self._recompute_implementation(node)
+            self._recompute_evc(node)
+            updated[segment_id] = node.evc
+        return updated
+
+    def set_adjustment(self, group: str, value: Any, segment_ids: Optional[Sequence[str]] = None) -> Dict[str, float]:
+        """調整係数を変更し、EVCのみを再計算します。
+
+        Args:
+            group: 調整係数のグループ（"Re" / "Co" / "I"）
+            value: 新しい係数（数値表現の文字列も可）
+            segment_ids: 変更するセグメントID（省略時は全セグメント）
+
+        Returns:
+            再計算したセグメントID -> EVC値
+
+        Raises:
+            DataValidationError: 未知のグループが指定された場合、または係数が数値として解釈できない場合
+        """
+        if group not in DEFAULT_ADJUSTMENTS:
+            raise DataValidationError(f"調整係数のグループ {group} は Re / Co / I のいずれかである必要があります")
+        value = coerce_numeric_value(f"segment_adjustments.{group}", value)
+        if value is None:
+            raise DataValidationError(f"調整係数 {group} の値がありません")
+
+        updated = {}
+        for segment_id, node in self._target_nodes(segment_ids):
+            if node.adjustments[group] == value:
+                continue
+            node.adjustments[group] = value
+            self._recompute_evc(node)
+            updated[segment_id] = node.evc
+        return updated
+
+    def evaluate_what_if(
+        self,
+        segment_id: str,
+        overrides: Optional[Dict[str, Any]] = None,
+        adjustments: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """パラメータと調整係数を一時的に変更したときのEVCの内訳を返します。
+
+        変更はset_parameter / set_adjustmentと同じく影響を受けるノードのみを再計算し、
+        内訳を取得した後（エラーの場合も含む）、ノードの値を変更前の状態に戻します。
+
+        Args:
+            segment_id: セグメントID
+            overrides: パラメータ名 -> 値（segment_adjustmentsも可）
+            adjustments: 調整係数のグループ -> 係数（overridesの適用後に上書き）
+
+        Returns:
+            EVCの内訳を含む辞書（breakdownと同じ形式）
+
+        Raises:
+            DataValidationError: パラメータや調整係数が不正な場合
+        """
+        node = self._node(segment_id)
+        # set_parameterはparamsの値を置き換えるのみで、値の辞書自体は変更しないため浅いコピーで足りる
+        saved = (dict(node.params), list(node.values), dict(node.adjustments), list(node.raw_components),
+                 dict(node.raw_totals), node.implementation_raw, node.evc)
+        try:
+            for name, value in (overrides or {}).items():
+                self.set_parameter(name, value, [segment_id])
+            for group, value in (adjustments or {}).items():
+                self.set_adjustment(group, value, [segment_id])
+            return self.breakdown(segment_id)
+        finally:
+            (node.params, node.values, node.adjustments, node.raw_components,
+             node.raw_totals, node.implementation_raw, node.evc) = saved
+
+    def plan(self, segment_id: str) -> EVCPlan:
+        """セグメントの評価計画を返します。
+
+        Args:
+            segment_id: セグメントID
+
+        Returns:
+            評価計画
+        """
+        return self._node(segment_id).plan
+
+    def parameters(self, segment_id: str) -> Dict[str, Any]:
+        """セグメントの現在のパラメータ辞書のコピーを返します。
+
+        Args:
+            segment_id: セグメントID
+
+        Returns:
+            パラメータ辞書
+        """
+        return dict(self._node(segment_id).params)
+
+    def evc(self, segment_id: str) -> float:
+        """セグメントのEVC値を返します。
+
+        Args:
+            segment_id: セグメントID
+
+        Returns:
+            EVC値
+        """
+        return self._node(segment_id).evc
+
+    def evc_values(self) -> Dict[str, float]:
+        """全セグメントのEVC値を返します。
+
+        Returns:
+            セグメントID -> EVC値
+        """
+        return {segment_id: node.evc for segment_id, node in self._nodes.items()}
+
+    def breakdown(self, segment_id: str) -> Dict[str, Any]:
+        """セグメントのEVCの内訳を返します（EVCPlan.evaluate_valuesと同じ形式）。
+
+        Args:
+            segment_id: セグメントID
+
+        Returns:
+            EVCの内訳を含む辞書
+        """
+        node = self._node(segment_id)
+        components = {REVENUE_GROUP: {}, COST_GROUP: {}}
+        for op, value in zip(node.plan.operations, node.raw_components):
+            if value is not None:
+                components[op.group][op.component] = value * node.adjustments[op.group]
+        reference_price, initial_cost, recurring_cost, implementation_years = (
+            node.values[slot] if node.values[slot] is not None else 0 for slot in range(len(BASE_PARAMETERS))
+        )
+        return {
+            "evc_value": node.evc,
+            "reference_price": reference_price,
+            "revenue_enhancement_value": node.raw_totals[REVENUE_GROUP] * node.adjustments[REVENUE_GROUP],
+            "cost_optimization_value": node.raw_totals[COST_GROUP] * node.adjustments[COST_GROUP],
+            "implementation_cost": node.implementation_raw * node.adjustments[IMPLEMENTATION_GROUP],
+            "revenue_components": components[REVENUE_GROUP],
+            "cost_components": components[COST_GROUP],
+            "initial_cost": initial_cost,
+            "recurring_cost": recurring_cost,
+            "implementation_years": implementation_years,
+            "adjustments": dict(node.adjustments),
+        }
+
+    def to_evc_result(self, segment_id: str) -> EVCResult:
+        """セグメントのEVCResultモデルを構築します。
+
+        Args:
+            segment_id: セグメントID
+
+        Returns:
+            EVC計算結果
+        """
+        node = self._node(segment_id)
+        return build_evc_result(node.plan, segment_id, node.values, self.breakdown(segment_id))
+
+    def stats(self) -> Dict[str, int]:
+        """これまでに再計算したノード数を返します。
+
+        Returns:
+            統計情報の辞書
+        """
+        return {
+            "segments": len(self._nodes),
+            "component_evaluations": self.component_evaluations,
+            "evc_evaluations": self.evc_evaluations,
+        }
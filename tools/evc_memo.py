@@ -0,0 +1,179 @@
+"""
+NexaSales顧客セグメンテーションシステムのセグメント別EVC計算のメモ化
+
+このモジュールでは、calculate_evcの検証済みの評価結果（EVCResult）を保持する、上限付きのLRUメモを提供します。
+文字列のパラメータは、コンパイル済みフォーミュラのID・セグメントID・解析前のパラメータ文字列をキーとするため、
+ワークフローの再実行や同じプロセス内の兄弟ワークフローで同じパラメータのセグメントが現れた場合に、
+パラメータの解析・評価計画の取得・評価・モデルの検証をすべて省略できます。
+辞書のパラメータは、検査後のパラメータと調整係数を正規化したフィンガープリント（evc_fingerprint）をキーとします。
+メモが保持する結果は変更されず、呼び出し元には呼び出しごとに検証を省略した複製を返します。
+
+メモはスレッドセーフで、プロセス内のすべてのワークフローで共有されます（get_evc_memo）。
+環境変数 EVC_MEMO_MAX_ENTRIES でエントリ数の上限を指定でき、0を指定するとメモ化を無効にします。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# エントリ数の上限を指定する環境変数
+EVC_MEMO_MAX_ENTRIES_ENV = "EVC_MEMO_MAX_ENTRIES"
+
+# 既定のエントリ数の上限
+DEFAULT_EVC_MEMO_MAX_ENTRIES = 4096
+
+logger = logging.getLogger(__name__)
+
+
+def evc_fingerprint(formula_id: str, segment_id: str, adjustments: Dict[str, Any],
+                    params: Dict[str, Any]) -> Optional[str]:
+    """EVC計算のメモのキーとなるフィンガープリントを計算します。
+
+    パラメータのsegment_adjustmentsは計算に使用するセグメントの調整係数（adjustments）に置き換えるため、
+    他のセグメントの調整係数の違いはキーに影響しません。
+
+    Args:
+        formula_id: コンパイル済みフォーミュラのID
+        segment_id: セグメントID
+        adjustments: セグメントに適用する Re / Co / I の調整係数
+        params: calculate_evcのパラメータ辞書
+
+    Returns:
+        SHA-256のハッシュ文字列（JSONに変換できない値を含む場合はNone）
+    """
+    payload = {
+        "formula_id": formula_id,
+        "segment_id": segment_id,
+        "adjustments": adjustments,
+        "params": {key: value for key, value in params.items() if key != "segment_adjustments"},
+    }
+    try:
+        canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class EVCMemo:
+    """セグメント別EVC計算の結果を保持する、スレッドセーフな上限付きLRUメモです。
+
+    計算はロックの外で行うため、同じキーの計算が並行した場合はそれぞれ計算し、先に保存された結果を共有します。
+    保持する値は呼び出し元の間で共有されるため、変更されない値（評価結果のスナップショットなど）を保存し、
+    呼び出し元に渡す可変なオブジェクトは取得のたびに構築してください。
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_EVC_MEMO_MAX_ENTRIES):
+        """
+        メモを初期化します。
+
+        Args:
+            max_entries: 保持するエントリ数の上限（0の場合はメモ化しない）
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "uncacheable": 0}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """メモ済みの結果を取得します。
+
+        Args:
+            key: フィンガープリントなどのキー
+
+        Returns:
+            メモ済みの結果（存在しない場合はNone）
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any) -> Any:
+        """結果をメモに保存します。
+
+        Args:
+            key: フィンガープリントなどのキー
+            value: 計算結果
+
+        Returns:
+            保存された結果（同じキーの結果が先に保存されていた場合はその結果）
+        """
+        if self.max_entries <= 0:
+            return value
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                self._entries.move_to_end(key)
+                return existing
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+            return value
+
+    def get_or_compute(self, key: Optional[Hashable], compute: Callable[[], Any]) -> Any:
+        """メモ済みの結果を返すか、計算して保存します。
+
+        Args:
+            key: フィンガープリントなどのキー（Noneの場合はメモ化せずに計算）
+            compute: 結果を計算する関数
+
+        Returns:
+            計算結果
+        """
+        if key is None or self.max_entries <= 0:
+            with self._lock:
+                self._stats["uncacheable"] += 1
+            return compute()
+
+        cached = self.get(key)
+        with self._lock:
+            self._stats["hits" if cached is not None else "misses"] += 1
+        if cached is not None:
+            return cached
+        return self.put(key, compute())
+
+    def clear(self) -> None:
+        """メモ済みの結果をすべて破棄します（統計は保持します）。"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """メモのヒット率などの統計を返します。
+
+        Returns:
+            統計情報の辞書
+        """
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+            }
+
+
+@lru_cache(maxsize=1)
+def get_evc_memo() -> EVCMemo:
+    """プロセス内で共有するEVC計算のメモを返します。
+
+    エントリ数の上限はEVC_MEMO_MAX_ENTRIESで指定します（不正な値の場合は既定値）。
+
+    Returns:
+        EVC計算のメモ
+    """
+    raw = os.environ.get(EVC_MEMO_MAX_ENTRIES_ENV, "").strip()
+    max_entries = DEFAULT_EVC_MEMO_MAX_ENTRIES
+    if raw:
+        try:
+            max_entries = int(raw)
+        except ValueError:
+            logger.warning(f"{EVC_MEMO_MAX_ENTRIES_ENV} の値が不正です: {raw}")
+    return EVCMemo(max_entries)
@@ -0,0 +1,239 @@
+"""
+NexaSales顧客セグメンテーションシステムのモンテカルロEVC計算
+
+このモジュールでは、EVCパラメータに確率分布を与えてEVCの分布を推定する機能を提供します。
+各パラメータは三角分布（min / expected / max）、対数正規分布、一様分布で指定でき、
+ガウスコピュラでパラメータ間の相関を持たせた標本をベクトル化して生成します。
+生成した標本はevc_vectorizedでセグメント × 標本の配列として一括評価し、
+P10 / P50 / P90 のEVCとコンポーネント別の寄与を返します。
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from tools.evc_engine import get_evc_plan
+from tools.evc_vectorized import DEFAULT_SEGMENT_IDS, EVCBatchResult, evaluate_evc_batch
+from utils.utils import DataValidationError
+
+DISTRIBUTION_TRIANGULAR = "triangular"
+DISTRIBUTION_LOGNORMAL = "lognormal"
+DISTRIBUTION_UNIFORM = "uniform"
+
+DEFAULT_SAMPLES = 100_000
+PERCENTILES = (10, 50, 90)
+
+# 分布を指定できない（評価計画のスロットではない）パラメータ
+_NON_SLOT_PARAMETERS = ("segment_adjustments", "revenue_components", "cost_components")
+
+
+def _normal_cdf(z: np.ndarray) -> np.ndarray:
+    # 標準正規分布の累積分布関数（Abramowitz & Stegun 7.1.26 による誤差関数の近似、誤差 1.5e-7 以下）
+    x = np.abs(z) / np.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-x * x)
+    return 0.5 * (1.0 + np.sign(z) * erf)
+
+
+def _validate_distribution(name: str, spec: Dict[str, Any]) -> str:
+    kind = spec.get("type", DISTRIBUTION_TRIANGULAR)
+    if kind == DISTRIBUTION_TRIANGULAR:
+        if not all(key in spec for key in ("min", "expected", "max")):
+            raise DataValidationError(f"パラメータ {name} の三角分布には min / expected / max が必要です")
+        if not spec["min"] <= spec["expected"] <= spec["max"]:
+            raise DataValidationError(f"パラメータ {name} の三角分布は min <= expected <= max である必要があります")
+    elif kind == DISTRIBUTION_UNIFORM:
+        if not all(key in spec for key in ("min", "max")) or spec["min"] > spec["max"]:
+            raise DataValidationError(f"パラメータ {name} の一様分布には min <= max の min / max が必要です")
+    elif kind == DISTRIBUTION_LOGNORMAL:
+        if "sigma" not in spec or not any(key in spec for key in ("median", "mean")):
+            raise DataValidationError(f"パラメータ {name} の対数正規分布には sigma と median または mean が必要です")
+        if spec["sigma"] < 0:
+            raise DataValidationError(f"パラメータ {name} の対数正規分布の sigma は0以上である必要があります")
+    else:
+        raise DataValidationError(f"パラメータ {name} の分布 {kind} には対応していません")
+    return kind
+
+
+def _transform(kind: str, spec: Dict[str, Any], z: np.ndarray) -> np.ndarray:
+    # 相関付きの標準正規標本 z を指定の分布に変換する
+    if kind == DISTRIBUTION_LOGNORMAL:
+        sigma = float(spec["sigma"])
+        if "median" in spec:
+            mu = np.log(float(spec["median"]))
+        else:
+            # 平均値から位置パラメータを求める（E[X] = exp(mu + sigma^2 / 2)）
+            mu = np.log(float(spec["mean"])) - sigma * sigma / 2.0
+        return np.exp(mu + sigma * z)
+
+    u = _normal_cdf(z)
+    low = float(spec["min"])
+    high = float(spec["max"])
+    if kind == DISTRIBUTION_UNIFORM or high == low:
+        return low + (high - low) * u
+
+    # 三角分布の逆累積分布関数
+    mode = float(spec["expected"])
+    split = (mode - low) / (high - low)
+    left = low + np.sqrt(u * (high - low) * (mode - low))
+    right = high - np.sqrt((1.0 - u) * (high - low) * (high - mode))
+    return np.where(u < split, left, right)
+
+
+def _correlation_matrix(names: List[str], correlations: Any) -> np.ndarray:
+    matrix = np.eye(len(names))
+    if not correlations:
+        return matrix
+    index = {name: i for i, name in enumerate(names)}
+    # [["a", "b", 0.5], ...] または {"a": {"b": 0.5}} の形式を受け付ける
+    if isinstance(correlations, dict):
+        pairs = [(a, b, rho) for a, row in correlations.items() for b, rho in row.items()]
+    else:
+        pairs = [tuple(pair) for pair in correlations]
+    for a, b, rho in pairs:
+        if a not in index or b not in index:
+            raise DataValidationError(f"相関を指定したパラメータ {a} / {b} に分布が指定されていません")
+        if not -1.0 <= rho <= 1.0:
+            raise DataValidationError(f"パラメータ {a} / {b} の相関係数は -1 〜 1 である必要があります")
+        matrix[index[a], index[b]] = matrix[index[b], index[a]] = rho
+    return matrix
+
+
+def draw_correlated_samples(
+    distributions: Dict[str, Dict[str, Any]],
+    shape: tuple,
+    correlations: Any = None,
+    seed: Optional[int] = None
+) -> Dict[str, np.ndarray]:
+    """相関付きのパラメータ標本を生成します。
+
+    Args:
+        distributions: パラメータ名 -> 分布指定（type / min / expected / max / median / mean / sigma）
+        shape: 各パラメータの標本配列の形状
+        correlations: 正規コピュラ上のパラメータ間の相関係数（[[a, b, rho], ...] または {a: {b: rho}}）
+        seed: 乱数シード
+
+    Returns:
+        パラメータ名 -> 標本配列 の辞書
+
+    Raises:
+        DataValidationError: 分布や相関の指定が不正な場合
+    """
+    names = list(distributions)
+    kinds = [_validate_distribution(name, distributions[name]) for name in names]
+    if not names:
+        return {}
+
+    matrix = _correlation_matrix(names, correlations)
+    try:
+        cholesky = np.linalg.cholesky(matrix)
+    except np.linalg.LinAlgError:
+        raise DataValidationError("相関行列が正定値ではありません")
+
+    rng = np.random.default_rng(seed)
+    size = int(np.prod(shape))
+    z = rng.standard_normal((len(names), size))
+    z = cholesky @ z
+
+    return {
+        name: _transform(kind, distributions[name], z[i]).reshape(shape)
+        for i, (name, kind) in enumerate(zip(names, kinds))
+    }
+
+
+def _validate_targets(params: Dict[str, Any], names: Sequence[str]) -> None:
+    # 分布を指定したパラメータが評価計画のスロットであることを確認する（標本の生成前に検査する）
+    slots = set(get_evc_plan(params).slots)
+    for name in names:
+        if name in _NON_SLOT_PARAMETERS:
+            raise DataValidationError(f"{name} には分布を指定できません（数値のパラメータを指定してください）")
+        if name not in slots:
+            raise DataValidationError(f"パラメータ {name} はEVCの評価計画で使用されていないため、分布を指定できません")
+
+
+def _apply_samples(params: Dict[str, Any], samples: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    # 標本を評価計画のスロットに差し込んだパラメータ辞書を作る
+    sampled = dict(params)
+    for name, values in samples.items():
+        if "." in name:
+            # カスタムコンポーネントの計算済みの値
+            owner, key = name.split(".", 1)
+            sampled[owner] = dict(sampled[owner], **{key: values})
+        else:
+            sampled[name] = values
+    return sampled
+
+
+def _percentile_summary(values: np.ndarray) -> Dict[str, float]:
+    p10, p50, p90 = np.percentile(values, PERCENTILES)
+    return {"p10": float(p10), "p50": float(p50), "p90": float(p90), "mean": float(values.mean())}
+
+
+def summarize_simulation(batch: EVCBatchResult) -> Dict[str, Dict[str, Any]]:
+    """モンテカルロ標本の評価結果をセグメントごとのパーセンタイルに集計します。
+
+    Args:
+        batch: evaluate_evc_batchの評価結果
+
+    Returns:
+        セグメントID -> EVCとコンポーネント別寄与のパーセンタイル
+    """
+    summary = {}
+    for i, segment_id in enumerate(batch.segment_ids):
+        summary[segment_id] = {
+            "evc": _percentile_summary(batch.evc[i]),
+            "reference_price": _percentile_summary(batch.reference_price[i]),
+            "revenue_enhancement": _percentile_summary(batch.revenue_enhancement[i]),
+            "cost_optimization": _percentile_summary(batch.cost_optimization[i]),
+            "implementation_cost": _percentile_summary(batch.implementation_cost[i]),
+            "components": {
+                name: _percentile_summary(np.broadcast_to(value, batch.shape)[i])
+                for name, value in {**batch.revenue_components, **batch.cost_components}.items()
+            },
+            "probability_negative": float((batch.evc[i] < 0).mean()),
+        }
+    return summary
+
+
+def simulate_evc(
+    params: Dict[str, Any],
+    distributions: Dict[str, Dict[str, Any]],
+    segment_ids: Optional[Sequence[str]] = None,
+    samples: int = DEFAULT_SAMPLES,
+    correlations: Any = None,
+    seed: Optional[int] = None
+) -> Dict[str, Any]:
+    """パラメータの確率分布からEVCの分布を推定します。
+
+    分布を指定したパラメータは標本で置き換え、それ以外はparamsの値（点推定）をそのまま使用します。
+    分布を指定できるのは評価計画が参照する数値のパラメータ（カスタムコンポーネントの "名前.calculated_value" を含む）のみです。
+
+    Args:
+        params: calculate_evcと同じ形式のパラメータ辞書
+        distributions: パラメータ名 -> 分布指定
+        segment_ids: 計算するセグメントID（省略時はs1〜s4）
+        samples: セグメントあたりの標本数
+        correlations: パラメータ間の相関
+        seed: 乱数シード
+
+    Returns:
+        標本数とセグメントごとのパーセンタイル（P10 / P50 / P90）
+
+    Raises:
+        DataValidationError: 分布や相関の指定が不正な場合、または評価計画が参照しないパラメータに分布を指定した場合
+    """
+    if samples < 1:
+        raise DataValidationError("標本数は1以上である必要があります")
+
+    segment_ids = list(segment_ids or DEFAULT_SEGMENT_IDS)
+    shape = (len(segment_ids), samples)
+    _validate_targets(params, list(distributions))
+    sampled = _apply_samples(params, draw_correlated_samples(distributions, shape, correlations, seed))
+
+    batch = evaluate_evc_batch(sampled, segment_ids, scenario_count=samples)
+    return {
+        "samples": samples,
+        "percentiles": list(PERCENTILES),
+        "segments": summarize_simulation(batch),
+    }
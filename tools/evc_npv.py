@@ -0,0 +1,206 @@
+"""
+NexaSales顧客セグメンテーションシステムの複数年・割引EVC計算
+
+このモジュールでは、EVCを導入期間の年ごとのキャッシュフローに展開し、割引率と導入の立ち上がり（採用率の推移）を
+反映した正味現在価値ベースのEVC（NPV-EVC）と回収期間を計算する機能を提供します。
+
+各コンポーネントの値は導入期間全体の合計とみなし、年あたりの価値（合計 / 導入年数）に各年の採用率を掛けて
+年ごとの便益とします。導入コストは初期費用を0年目、運用コストを各年に計上します。
+割引率0・立ち上がりなし・評価期間 = 導入年数の場合、NPV-EVCは従来のEVCと一致します。
+
+キャッシュフローは (セグメント数, シナリオ数, 年数) の配列で一度に計算し、評価期間ごとの累積値を保持するため、
+1回の計算で1年後・3年後・5年後などの複数の評価期間の結果が得られます。
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from tools.evc_engine import IMPLEMENTATION_GROUP
+from tools.evc_vectorized import DEFAULT_SEGMENT_IDS, EVCBatchResult, evaluate_evc_batch
+from utils.utils import DataValidationError
+
+AdoptionRamp = Union[Sequence[float], Dict[str, Sequence[float]]]
+
+
+class NPVEVCResult:
+    """複数年・割引EVC計算の結果です。
+
+    evc_by_horizonとcash_flowsの形状は (セグメント数, シナリオ数, 年数)、
+    npv_evcとpayback_yearsの形状は (セグメント数, シナリオ数) です。
+    """
+
+    def __init__(self, batch: EVCBatchResult, years: np.ndarray, discount_rate: np.ndarray,
+                 cash_flows: Dict[str, np.ndarray], initial_investment: np.ndarray,
+                 evc_by_horizon: np.ndarray, payback_years: np.ndarray):
+        self.batch = batch
+        self.segment_ids = batch.segment_ids
+        # 評価期間（1年目〜最終年）
+        self.years = years
+        self.discount_rate = discount_rate
+        self.cash_flows = cash_flows
+        self.initial_investment = initial_investment
+        self.evc_by_horizon = evc_by_horizon
+        self.npv_evc = evc_by_horizon[..., -1]
+        self.payback_years = payback_years
+
+    @property
+    def flat_evc(self) -> np.ndarray:
+        return self.batch.evc
+
+    def at_horizon(self, years: int) -> np.ndarray:
+        """指定した評価期間のNPV-EVCを返します。
+
+        Args:
+            years: 評価期間（年）
+
+        Returns:
+            NPV-EVC（セグメント数, シナリオ数）
+
+        Raises:
+            DataValidationError: 評価期間が計算した範囲外の場合
+        """
+        if not 1 <= years <= len(self.years):
+            raise DataValidationError(f"評価期間は1〜{len(self.years)}年で指定してください: {years}")
+        return self.evc_by_horizon[..., years - 1]
+
+    def summary(self, scenario: int = 0) -> Dict[str, Dict[str, Any]]:
+        """指定したシナリオの結果をセグメントごとにまとめます。
+
+        Args:
+            scenario: シナリオの位置
+
+        Returns:
+            セグメントID -> {npv_evc, flat_evc, payback_years, evc_by_horizon, cash_flows} の辞書
+            （回収できない場合のpayback_yearsはNone）
+        """
+        summary = {}
+        for i, segment_id in enumerate(self.segment_ids):
+            payback = float(self.payback_years[i, scenario])
+            summary[segment_id] = {
+                "npv_evc": float(self.npv_evc[i, scenario]),
+                "flat_evc": float(self.flat_evc[i, scenario]),
+                "payback_years": None if math.isnan(payback) else payback,
+                "discount_rate": float(self.discount_rate[i, scenario]),
+                "evc_by_horizon": {
+                    int(year): float(self.evc_by_horizon[i, scenario, index])
+                    for index, year in enumerate(self.years)
+                },
+                "cash_flows": {
+                    "initial_investment": float(self.initial_investment[i, scenario]),
+                    **{name: flows[i, scenario].tolist() for name, flows in self.cash_flows.items()},
+                },
+            }
+        return summary
+
+
+def _ramp_matrix(adoption_ramp: Optional[AdoptionRamp], segment_ids: List[str], horizon: int) -> np.ndarray:
+    # 採用率の推移を (セグメント数, 1, 年数) の配列にする（指定より長い期間は最後の値を継続）
+    def expand(ramp: Sequence[float], name: str) -> np.ndarray:
+        try:
+            values = np.asarray(ramp, dtype=float).reshape(-1)
+        except (TypeError, ValueError):
+            raise DataValidationError(f"採用率の推移 {name} は数値のリストである必要があります")
+        if values.size == 0:
+            return np.ones(horizon)
+        if (values < 0).any():
+            raise DataValidationError(f"採用率の推移 {name} に負の値は指定できません")
+        if values.size < horizon:
+            values = np.concatenate([values, np.full(horizon - values.size, values[-1])])
+        return values[:horizon]
+
+    if adoption_ramp is None:
+        return np.ones((1, 1, horizon))
+    if isinstance(adoption_ramp, dict):
+        rows = [expand(adoption_ramp.get(segment_id, ()), segment_id) for segment_id in segment_ids]
+        return np.stack(rows)[:, np.newaxis, :]
+    return expand(adoption_ramp, "adoption_ramp")[np.newaxis, np.newaxis, :]
+
+
+def _payback_years(cumulative: np.ndarray, present_values: np.ndarray, initial_investment: np.ndarray) -> np.ndarray:
+    # 累積キャッシュフローが初めて0以上になる年を、年内は線形補間して求める（回収できない場合はNaN）
+    previous = np.concatenate([-initial_investment[..., np.newaxis], cumulative[..., :-1]], axis=-1)
+    recovered = cumulative >= 0
+    first = np.argmax(recovered, axis=-1)
+    previous_at = np.take_along_axis(previous, first[..., np.newaxis], axis=-1)[..., 0]
+    flow_at = np.take_along_axis(present_values, first[..., np.newaxis], axis=-1)[..., 0]
+    safe_flow = np.where(flow_at > 0, flow_at, 1.0)
+    fraction = np.where(previous_at < 0, np.clip(-previous_at / safe_flow, 0.0, 1.0), 0.0)
+    payback = np.where(previous_at >= 0, first.astype(float), first + fraction)
+    payback = np.where(initial_investment <= 0, 0.0, payback)
+    return np.where(recovered.any(axis=-1) | (initial_investment <= 0), payback, np.nan)
+
+
+def evaluate_npv_evc(
+    params: Dict[str, Any],
+    segment_ids: Optional[Sequence[str]] = None,
+    discount_rate: Any = 0.0,
+    adoption_ramp: Optional[AdoptionRamp] = None,
+    horizon: Optional[int] = None,
+    scenario_count: Optional[int] = None
+) -> NPVEVCResult:
+    """セグメント × シナリオのNPV-EVCと回収期間をベクトル化して計算します。
+
+    Args:
+        params: calculate_evcと同じ形式のパラメータ辞書（値は配列でも可。evaluate_evc_batchを参照）
+        segment_ids: 計算するセグメントID（省略時はs1〜s4）
+        discount_rate: 年率の割引率（スカラー、または (セグメント数, シナリオ数) に揃えられる配列）
+        adoption_ramp: 1年目からの採用率の推移（例: [0.3, 0.7, 1.0]）。セグメントID -> 推移の辞書でも指定でき、
+            省略時は1年目から採用率1.0
+        horizon: 評価期間（年）。省略時は導入年数の最大値
+        scenario_count: シナリオ数（省略時はパラメータ配列の形状から推定）
+
+    Returns:
+        複数年・割引EVC計算の結果
+
+    Raises:
+        DataValidationError: 割引率や採用率の推移、評価期間が不正な場合
+    """
+    segment_ids = list(segment_ids or DEFAULT_SEGMENT_IDS)
+    batch = evaluate_evc_batch(params, segment_ids, scenario_count)
+    shape = batch.shape
+
+    try:
+        rate = np.broadcast_to(np.asarray(discount_rate, dtype=float), shape)
+    except (TypeError, ValueError):
+        raise DataValidationError(f"割引率の形状を {shape} に揃えられません")
+    if (rate <= -1).any():
+        raise DataValidationError("割引率は-1より大きい値である必要があります")
+
+    implementation_years = batch.implementation_years
+    if horizon is None:
+        horizon = max(1, int(math.ceil(float(implementation_years.max())))) if implementation_years.size else 1
+    if horizon < 1:
+        raise DataValidationError(f"評価期間は1年以上で指定してください: {horizon}")
+    years = np.arange(1, horizon + 1)
+
+    # 各年のうち導入期間に含まれる割合（端数の年は按分）
+    active = np.clip(implementation_years[..., np.newaxis] - (years - 1), 0.0, 1.0)
+    safe_years = np.where(implementation_years > 0, implementation_years, 1.0)
+    annual_benefit = np.where(
+        implementation_years > 0, (batch.revenue_enhancement + batch.cost_optimization) / safe_years, 0.0
+    )
+    implementation_factor = batch.adjustments[IMPLEMENTATION_GROUP]
+
+    benefit = annual_benefit[..., np.newaxis] * _ramp_matrix(adoption_ramp, segment_ids, horizon) * active
+    recurring_cost = (batch.recurring_cost * implementation_factor)[..., np.newaxis] * active
+    net = benefit - recurring_cost
+    discount_factors = (1.0 + rate[..., np.newaxis]) ** -years
+    present_values = net * discount_factors
+    initial_investment = np.asarray(batch.initial_cost * implementation_factor, dtype=float)
+
+    # 投資の累積キャッシュフロー（参照価格を含まない）と、評価期間ごとのNPV-EVC
+    cumulative = np.cumsum(present_values, axis=-1) - initial_investment[..., np.newaxis]
+    evc_by_horizon = batch.reference_price[..., np.newaxis] + cumulative
+
+    cash_flows = {
+        "benefit": benefit,
+        "recurring_cost": recurring_cost,
+        "net": net,
+        "present_value": present_values,
+    }
+    return NPVEVCResult(
+        batch, years, rate, cash_flows, initial_investment, evc_by_horizon,
+        _payback_years(cumulative, present_values, initial_investment)
+    )
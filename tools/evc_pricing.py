@@ -0,0 +1,312 @@
+"""
+NexaSales顧客セグメンテーションシステムの損益分岐価格の計算
+
+このモジュールでは、価格に当たるパラメータ（既定は年間の運用コスト recurring_cost）を変化させたときに、
+各セグメントのEVCが目標値（既定は0）に達する損益分岐価格と、優先度ランクが切り替わる閾値価格を
+全セグメントまとめて計算する機能を提供します。
+
+パラメータは評価計画に一度だけバインドし、価格のスロットだけを差し替えて評価計画の演算のみを評価します。
+EVCが価格に対して線形なセグメント（組み込みのコンポーネントのみの場合など）は3点の評価から閉形式で解き、
+非線形なセグメント（カスタムコンポーネントが価格を参照する場合など）は全セグメント同時の二分法で解きます。
+"""
+
+import math
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from tools.evc_engine import get_evc_plan
+from tools.evc_vectorized import EVCBatchInputs, bind_evc_batch, stack_segment_parameters
+from tools.priority_scoring import PRIORITY_RANKS, PRIORITY_WEIGHTS, score_priorities
+from utils.utils import DataValidationError
+
+# 既定の価格パラメータ（年間の運用コスト）
+DEFAULT_PRICE_PARAMETER = "recurring_cost"
+
+# 解法の種類
+METHOD_CLOSED_FORM = "closed_form"
+METHOD_BISECTION = "bisection"
+
+# 線形とみなす相対誤差
+_LINEARITY_TOLERANCE = 1e-9
+# 二分法の探索区間を広げる最大回数（上限は初期値の2^64倍）
+_MAX_BRACKET_EXPANSIONS = 64
+
+
+class BreakEvenSolver:
+    """バインド済みの入力に対して、価格パラメータとEVCの関係を全セグメント同時に解きます。
+
+    価格とEVCの関係が線形かどうかはセグメントごとに一度だけ判定し、
+    線形なセグメントの切片と傾きを保持して、目標値を変えた求解を評価なしで行います。
+    """
+
+    def __init__(self, inputs: EVCBatchInputs, price_parameter: str = DEFAULT_PRICE_PARAMETER,
+                 lower_bound: float = 0.0, tolerance: float = 1e-6, max_iterations: int = 200):
+        """
+        ソルバーを初期化します。
+
+        Args:
+            inputs: シナリオ数1でバインドした入力
+            price_parameter: 価格に当たるパラメータ名
+            lower_bound: 価格の下限（これを下回る解はNaN）
+            tolerance: 二分法の相対許容誤差
+            max_iterations: 二分法の最大反復回数
+
+        Raises:
+            DataValidationError: 価格パラメータが評価計画で使用されていない、または入力のシナリオ数が1でない場合
+        """
+        if price_parameter not in inputs.plan.slot_index:
+            raise DataValidationError(f"価格パラメータ {price_parameter} は評価計画で使用されていません")
+        if inputs.shape[1] != 1:
+            raise DataValidationError("損益分岐価格はシナリオ数1の入力に対して計算します")
+        self.inputs = inputs
+        self.price_parameter = price_parameter
+        self.lower_bound = float(lower_bound)
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+
+        base = inputs.values[inputs.plan.slot_index[price_parameter]]
+        self.base_price = np.zeros(len(inputs.segment_ids)) if base is None else np.asarray(base, dtype=float)[:, 0]
+        self.base_evc = self.evc_at(self.base_price)
+
+        # 価格0・1・基準価格の2倍（少なくとも2）の3点を1回で評価し、線形性を判定する
+        probe = np.column_stack([
+            np.zeros_like(self.base_price),
+            np.ones_like(self.base_price),
+            np.maximum(2.0 * np.abs(self.base_price), 2.0),
+        ])
+        evc = self.evc_at(probe)
+        self.intercept = evc[:, 0]
+        self.slope = evc[:, 1] - evc[:, 0]
+        predicted = self.intercept + self.slope * probe[:, 2]
+        scale = np.maximum(np.maximum(np.abs(evc).max(axis=1), np.abs(predicted)), 1.0)
+        self.linear = np.abs(evc[:, 2] - predicted) <= _LINEARITY_TOLERANCE * scale
+        self.evaluations = 2
+
+    def evc_at(self, prices: np.ndarray) -> np.ndarray:
+        """価格を差し替えたEVCを評価します。
+
+        Args:
+            prices: 価格（(セグメント数,) または (セグメント数, k)）
+
+        Returns:
+            EVC（pricesと同じ形状）
+        """
+        prices = np.asarray(prices, dtype=float)
+        evc = self.inputs.evaluate_evc({self.price_parameter: prices})
+        evc = np.broadcast_to(evc, prices.shape if prices.ndim == 2 else prices.shape + (1,))
+        return evc if prices.ndim == 2 else evc[:, 0]
+
+    def solve(self, target_evc: Any = 0.0) -> Dict[str, np.ndarray]:
+        """EVCが目標値になる価格を全セグメント同時に求めます。
+
+        Args:
+            target_evc: 目標のEVC（スカラーまたはセグメント数の配列。NaNのセグメントは解かない）
+
+        Returns:
+            price（解けない場合はNaN）とmethod（解法の種類）の辞書
+        """
+        target = np.broadcast_to(np.asarray(target_evc, dtype=float), self.base_price.shape)
+        prices = np.full(self.base_price.shape, np.nan)
+        solvable = ~np.isnan(target)
+
+        # 線形なセグメントは閉形式で解く（傾きが0の場合は解なし）
+        closed = solvable & self.linear & (self.slope != 0)
+        safe_slope = np.where(closed, self.slope, 1.0)
+        prices = np.where(closed, (target - self.intercept) / safe_slope, prices)
+
+        bisect = solvable & ~self.linear
+        if bisect.any():
+            prices = np.where(bisect, self._bisect(target, bisect), prices)
+
+        prices = np.where(prices >= self.lower_bound, prices, np.nan)
+        methods = np.where(self.linear, METHOD_CLOSED_FORM, METHOD_BISECTION)
+        return {"price": prices, "method": methods}
+
+    def _bisect(self, target: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        # 下限から始めて上端を倍々に広げ、符号が変わる区間を全セグメント同時に二分する
+        lo = np.full(target.shape, self.lower_bound)
+        f_lo = self.evc_at(lo) - target
+        hi = np.maximum(np.maximum(self.base_price, lo + 1.0), 1.0)
+        f_hi = self.evc_at(hi) - target
+        self.evaluations += 2
+        for _ in range(_MAX_BRACKET_EXPANSIONS):
+            expand = mask & (np.sign(f_hi) == np.sign(f_lo)) & (f_lo != 0)
+            if not expand.any():
+                break
+            hi = np.where(expand, lo + (hi - lo) * 2.0, hi)
+            f_hi = np.where(expand, self.evc_at(hi) - target, f_hi)
+            self.evaluations += 1
+
+        bracketed = mask & ((np.sign(f_hi) != np.sign(f_lo)) | (f_lo == 0))
+        hi = np.where(f_lo == 0, lo, hi)
+        for _ in range(self.max_iterations):
+            active = bracketed & (hi - lo > self.tolerance * np.maximum(np.abs(hi), 1.0))
+            if not active.any():
+                break
+            mid = (lo + hi) / 2.0
+            f_mid = self.evc_at(mid) - target
+            self.evaluations += 1
+            # 中点の符号が下端と同じなら下端を、異なれば上端を中点に移す
+            move_lo = active & (np.sign(f_mid) == np.sign(f_lo))
+            move_hi = active & ~move_lo
+            lo = np.where(move_lo, mid, lo)
+            f_lo = np.where(move_lo, f_mid, f_lo)
+            hi = np.where(move_hi, mid, hi)
+        return np.where(bracketed, (lo + hi) / 2.0, np.nan)
+
+
+def _segment_array(values: Optional[Dict[str, Any]], params_by_segment: Dict[str, Dict[str, Any]], name: str,
+                   default: float = 0.0) -> np.ndarray:
+    # 引数の辞書を優先し、省略時は各セグメントのパラメータの同名キーを使用する
+    try:
+        if values is not None:
+            return np.array([float(values.get(segment_id, default)) for segment_id in params_by_segment])
+        return np.array([float(params.get(name, default)) for params in params_by_segment.values()])
+    except (TypeError, ValueError):
+        raise DataValidationError(f"{name} はセグメントID -> 数値の辞書で指定してください")
+
+
+def _rank_flip_targets(evc: np.ndarray, market_size: np.ndarray, acquisition_probability: np.ndarray,
+                       growth_rate: np.ndarray, weights: Dict[str, float]) -> Dict[str, np.ndarray]:
+    # 他のセグメントのEVCを固定したとき、各セグメントの優先度ランクが切り替わるEVCを求める。
+    # スコアはEVC / max(EVC, 他セグメントの最大EVC) に比例するため、他セグメントの最大EVCが正で
+    # 必要な正規化EVCが1以下であれば、EVC = 正規化EVC × 他セグメントの最大EVC で切り替わる
+    scores = score_priorities(evc, market_size, acquisition_probability, growth_rate, weights)
+    count = len(evc)
+    if count > 1:
+        order = np.argsort(evc)
+        others_max = np.where(np.arange(count) == order[-1], evc[order[-2]], evc[order[-1]])
+    else:
+        others_max = np.zeros(count)
+    # EVC以外の指標の寄与（EVCがすべて0のときのスコア）
+    other_terms = score_priorities(np.zeros_like(evc), market_size, acquisition_probability, growth_rate, weights)
+
+    thresholds = np.array([threshold for threshold, _ in PRIORITY_RANKS])
+    # 現在のランクの位置（0が最上位）
+    rank_index = np.array([
+        next(index for index, threshold in enumerate(thresholds) if score >= threshold) for score in scores
+    ])
+
+    def evc_for_score(score_target: np.ndarray) -> np.ndarray:
+        normalized = (score_target - other_terms) / weights["evc_value"] if weights["evc_value"] else np.nan
+        feasible = np.isfinite(score_target) & (others_max > 0) & (normalized <= 1.0)
+        return np.where(feasible, normalized * others_max, np.nan)
+
+    # 下位ランクへの切り替わり: 現在のランクの下限スコア（最下位ランクは切り替わらない）
+    drop_score = thresholds[rank_index]
+    drop_score = np.where(np.isfinite(drop_score), drop_score, np.nan)
+    # 上位ランクへの切り替わり: 1つ上のランクの下限スコア（最上位ランクは切り替わらない）
+    raise_score = np.where(rank_index > 0, thresholds[np.maximum(rank_index - 1, 0)], np.nan)
+    return {
+        "score": scores,
+        "rank_index": rank_index,
+        "drop_evc": evc_for_score(drop_score),
+        "raise_evc": evc_for_score(raise_score),
+    }
+
+
+def _as_optional(value: float) -> Optional[float]:
+    return None if math.isnan(value) else float(value)
+
+
+def solve_break_even_prices(
+    params_by_segment: Dict[str, Dict[str, Any]],
+    price_parameter: str = DEFAULT_PRICE_PARAMETER,
+    target_evc: Any = 0.0,
+    market_size: Optional[Dict[str, Any]] = None,
+    acquisition_probability: Optional[Dict[str, Any]] = None,
+    market_growth_rate: Optional[Dict[str, Any]] = None,
+    weights: Optional[Dict[str, float]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """全セグメントの損益分岐価格と、優先度ランクが切り替わる閾値価格を計算します。
+
+    コンポーネント設定が同じセグメント（get_evc_planのplan_idが同じ）をまとめてバインドし、
+    まとめたセグメントごとに1つのソルバーで全セグメントを同時に解きます。
+    閾値価格は、他のセグメントを現在の価格に固定し、対象セグメントの価格だけを変えたときに
+    優先度ランク（PRIORITY_RANKS）が1つ下がる価格と1つ上がる価格です。
+
+    Args:
+        params_by_segment: セグメントID -> calculate_evcのパラメータ辞書
+        price_parameter: 価格に当たるパラメータ名（既定は recurring_cost）
+        target_evc: 損益分岐とみなすEVC（スカラーまたはセグメントID -> 値の辞書。既定は0）
+        market_size: セグメントID -> 市場規模（省略時は各セグメントのパラメータのmarket_size、なければ0）
+        acquisition_probability: セグメントID -> 獲得確率（省略時はパラメータのacquisition_probability）
+        market_growth_rate: セグメントID -> 市場成長率（省略時はパラメータのmarket_growth_rate）
+        weights: 優先度スコアの重み（省略時はPRIORITY_WEIGHTS）
+
+    Returns:
+        セグメントID -> {base_price, base_evc, break_even_price, method, priority_score, priority_rank,
+        rank_drop, rank_raise} の辞書（解がない価格はNone）
+
+    Raises:
+        DataValidationError: パラメータが不正、または価格パラメータが評価計画で使用されていない場合
+    """
+    segment_ids = list(params_by_segment)
+    if not segment_ids:
+        return {}
+
+    groups: Dict[str, List[int]] = {}
+    for index, params in enumerate(params_by_segment.values()):
+        groups.setdefault(get_evc_plan(params).plan_id, []).append(index)
+    solvers = []
+    for indices in groups.values():
+        group = {segment_ids[index]: params_by_segment[segment_ids[index]] for index in indices}
+        inputs = bind_evc_batch(stack_segment_parameters(group), list(group), scenario_count=1)
+        solvers.append((np.array(indices), BreakEvenSolver(inputs, price_parameter)))
+
+    def gather(attribute: str, dtype: Any = float) -> np.ndarray:
+        values = np.empty(len(segment_ids), dtype=dtype)
+        for indices, solver in solvers:
+            values[indices] = getattr(solver, attribute)
+        return values
+
+    def solve(targets: np.ndarray) -> np.ndarray:
+        prices = np.empty(len(segment_ids))
+        for indices, solver in solvers:
+            prices[indices] = solver.solve(targets[indices])["price"]
+        return prices
+
+    if isinstance(target_evc, dict):
+        target = _segment_array(target_evc, params_by_segment, "target_evc")
+    else:
+        target = np.full(len(segment_ids), float(target_evc))
+    base_evc = gather("base_evc")
+    base_price = gather("base_price")
+    linear = gather("linear", bool)
+
+    weights = weights or PRIORITY_WEIGHTS
+    flips = _rank_flip_targets(
+        base_evc,
+        _segment_array(market_size, params_by_segment, "market_size"),
+        _segment_array(acquisition_probability, params_by_segment, "acquisition_probability"),
+        _segment_array(market_growth_rate, params_by_segment, "market_growth_rate"),
+        weights,
+    )
+    # 線形なセグメントは保持した切片と傾きから解くため、EVCの再評価は二分法のセグメントのみ
+    break_even_prices = solve(target)
+    drop_prices = solve(flips["drop_evc"])
+    raise_prices = solve(flips["raise_evc"])
+
+    results = {}
+    for i, segment_id in enumerate(segment_ids):
+        rank_index = int(flips["rank_index"][i])
+        results[segment_id] = {
+            "price_parameter": price_parameter,
+            "base_price": float(base_price[i]),
+            "base_evc": float(base_evc[i]),
+            "target_evc": float(target[i]),
+            "break_even_price": _as_optional(float(break_even_prices[i])),
+            "method": METHOD_CLOSED_FORM if linear[i] else METHOD_BISECTION,
+            "priority_score": float(flips["score"][i]),
+            "priority_rank": PRIORITY_RANKS[rank_index][1],
+            "rank_drop": {
+                "price": _as_optional(float(drop_prices[i])),
+                "to_rank": PRIORITY_RANKS[rank_index + 1][1] if rank_index + 1 < len(PRIORITY_RANKS) else None,
+            },
+            "rank_raise": {
+                "price": _as_optional(float(raise_prices[i])),
+                "to_rank": PRIORITY_RANKS[rank_index - 1][1] if rank_index > 0 else None,
+            },
+        }
+    return results
@@ -0,0 +1,131 @@
+"""
+NexaSales顧客セグメンテーションシステムのEVC感応度分析
+
+このモジュールでは、EVCに対する各パラメータの弾力性とトルネード図用のデータを計算する機能を提供します。
+基準値のシナリオと、各パラメータを ±step だけ動かしたシナリオを1つの (セグメント数, シナリオ数) 配列に並べ、
+evc_vectorizedで一度に評価します。EVCのコンポーネントはパラメータの多重線形式のため、
+中心差分による弾力性は解析的な値と一致します。
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from tools.evc_engine import BASE_PARAMETERS, DEFAULT_ADJUSTMENTS, get_evc_plan
+from tools.evc_vectorized import DEFAULT_SEGMENT_IDS, as_scenario_grid, evaluate_evc_batch
+from utils.utils import DataValidationError
+
+DEFAULT_STEP = 0.1
+
+
+def _sensitivity_targets(params: Dict[str, Any], include_adjustments: bool) -> List[str]:
+    # 評価計画が参照し、値が与えられているパラメータを対象にする
+    plan = get_evc_plan(params)
+    targets = [name for name, value in zip(plan.slots, plan.bind(params)) if value is not None]
+    if include_adjustments:
+        targets.extend(f"segment_adjustments.{group}" for group in DEFAULT_ADJUSTMENTS)
+    return targets
+
+
+def calculate_sensitivity(
+    params: Dict[str, Any],
+    segment_ids: Optional[Sequence[str]] = None,
+    step: float = DEFAULT_STEP,
+    parameters: Optional[Sequence[str]] = None,
+    include_adjustments: bool = True
+) -> Dict[str, Any]:
+    """各パラメータのEVC弾力性とトルネード図用のデータを計算します。
+
+    Args:
+        params: calculate_evcと同じ形式のパラメータ辞書（値はスカラーまたはセグメント別の配列。
+            配列の形状はevaluate_evc_batchと同じ規則で解釈するため、セグメント別の値は (セグメント数, 1) の列で指定すると確実です）
+        segment_ids: 計算するセグメントID（省略時はs1〜s4）
+        step: パラメータを動かす相対幅（0.1 なら ±10%）
+        parameters: 対象とするパラメータ名（省略時は評価計画が参照するすべてのパラメータと調整係数）
+        include_adjustments: segment_adjustmentsの係数（Re / Co / I）を対象に含めるか
+
+    Returns:
+        セグメントごとの基準EVCと、振れ幅の大きい順に並べたパラメータ別の感応度
+
+    Raises:
+        DataValidationError: stepが不正な場合や、パラメータが数値でない場合
+    """
+    if not 0 < step < 1:
+        raise DataValidationError("stepは0より大きく1未満である必要があります")
+
+    segment_ids = list(segment_ids or DEFAULT_SEGMENT_IDS)
+    targets = list(parameters) if parameters is not None else _sensitivity_targets(params, include_adjustments)
+    segment_count = len(segment_ids)
+    # シナリオ0が基準値、シナリオ 2k+1 / 2k+2 がパラメータkの +step / -step
+    scenario_count = 1 + 2 * len(targets)
+    shape = (segment_count, scenario_count)
+    factors = np.ones(scenario_count)
+
+    perturbed = dict(params)
+    segment_adjustments = {
+        segment_id: dict((params.get("segment_adjustments") or {}).get(segment_id, DEFAULT_ADJUSTMENTS))
+        for segment_id in segment_ids
+    }
+    base_values = {}
+
+    for k, name in enumerate(targets):
+        factors[:] = 1.0
+        factors[1 + 2 * k] = 1.0 + step
+        factors[2 + 2 * k] = 1.0 - step
+
+        if name.startswith("segment_adjustments."):
+            group = name.split(".", 1)[1]
+            # セグメントごとの係数は (セグメント数, 1) の列として明示する
+            column = np.array(
+                [[segment_adjustments[segment_id].get(group, DEFAULT_ADJUSTMENTS[group])] for segment_id in segment_ids],
+                dtype=float
+            )
+            grid = as_scenario_grid(name, column, shape) * factors
+            for i, segment_id in enumerate(segment_ids):
+                segment_adjustments[segment_id][group] = grid[i]
+            base_values[name] = grid[:, 0]
+            continue
+
+        if "." in name:
+            # カスタムコンポーネントの計算済みの値
+            owner, key = name.split(".", 1)
+            config = params.get(owner)
+            if not isinstance(config, dict) or config.get(key) is None:
+                raise DataValidationError(f"パラメータ {name} の値がありません")
+            grid = as_scenario_grid(name, config[key], shape) * factors
+            perturbed[owner] = dict(config, **{key: grid})
+        else:
+            value = params.get(name, 0 if name in BASE_PARAMETERS else None)
+            if value is None:
+                raise DataValidationError(f"パラメータ {name} の値がありません")
+            grid = as_scenario_grid(name, value, shape) * factors
+            perturbed[name] = grid
+        base_values[name] = grid[:, 0]
+
+    perturbed["segment_adjustments"] = segment_adjustments
+    batch = evaluate_evc_batch(perturbed, segment_ids, scenario_count=scenario_count)
+
+    segments = {}
+    for i, segment_id in enumerate(segment_ids):
+        base_evc = float(batch.evc[i, 0])
+        rows = []
+        for k, name in enumerate(targets):
+            high_evc = float(batch.evc[i, 1 + 2 * k])
+            low_evc = float(batch.evc[i, 2 + 2 * k])
+            base_value = float(base_values[name][i])
+            # 弾力性 = (ΔEVC / EVC) / (Δx / x)
+            elasticity = (high_evc - low_evc) / (2 * step * base_evc) if base_evc else 0.0
+            rows.append({
+                "parameter": name,
+                "base_value": base_value,
+                "low_value": base_value * (1 - step),
+                "high_value": base_value * (1 + step),
+                "low_evc": low_evc,
+                "high_evc": high_evc,
+                "swing": abs(high_evc - low_evc),
+                "elasticity": elasticity,
+            })
+        rows.sort(key=lambda row: row["swing"], reverse=True)
+        segments[segment_id] = {"base_evc": base_evc, "tornado": rows}
+
+    return {"step": step, "scenario_count": scenario_count, "segments": segments}
@@ -5,10 +5,21 @@ NexaSales顧客セグメンテーションシステムのEVC計算ツール関
 各種価値要素の計算、フォーミュラ設計、セグメント別の計算などの機能を提供します。
 """
 
-from typing import Any, Dict, List, Optional
+import math
+import time
+from typing import Any, Dict, Union
 # OpenAI Agents SDK
 from agents import function_tool
-from models.models import EVCComponents, EVCResult, ValueComponent
+from models.models import EVCResult
+from tools.evc_engine import build_evc_result, copy_evc_result, get_evc_plan
+from tools.evc_formula import CompiledFormula, compile_formula
+from tools.evc_memo import evc_fingerprint, get_evc_memo
+from tools.evc_npv import evaluate_npv_evc
+from tools.evc_pricing import DEFAULT_PRICE_PARAMETER, solve_break_even_prices
+from tools.evc_vectorized import stack_segment_parameters
+from tools.segment_parameters import parse_parameters, parse_segment_parameters
+from utils.japanese_numbers import parse_japanese_number
+from utils.utils import DataValidationError
 
 
 @function_tool
@@ -57,6 +68,48 @@ async def design_evc_formula(comparison_matrix: str) -> str:
     }"""
 
 
+# 内部実装（同期）
+def _calculate_evc_impl(segment_id: str, formula: Union[str, CompiledFormula], parameters: str) -> EVCResult:
+    """設計されたフォーミュラに基づいて特定セグメントのEVCを計算します - 内部実装
+
+    Args:
+        segment_id: セグメントID
+        formula: EVC計算フォーミュラ（文字列またはコンパイル済みのフォーミュラ）
+        parameters: 計算に使用するパラメータ
+
+    Returns:
+        EVC計算結果
+
+    Raises:
+        DataValidationError: パラメータの形式が不正な場合
+    """
+    compiled_formula = compile_formula(formula)
+    if isinstance(parameters, str):
+        # 文字列のパラメータは解析前の文字列をメモのキーとし、メモにあれば解析・評価・モデルの検証をすべて省略する
+        params_dict = None
+        key = (compiled_formula.formula_id, segment_id, parameters)
+    else:
+        # 辞書のパラメータは検査・正規化したフィンガープリントをキーとする
+        params_dict = parse_parameters(parameters, segment_id)
+        key = evc_fingerprint(
+            compiled_formula.formula_id, segment_id, compiled_formula.resolve_adjustments(params_dict, segment_id),
+            params_dict
+        )
+
+    def compute() -> EVCResult:
+        # パラメータを辞書に変換する（セグメント別パラメータと同じ解析・スキーマ検査を行う）
+        params = params_dict if params_dict is not None else parse_parameters(parameters, segment_id)
+        # セグメント調整を適用（パラメータになければフォーミュラの検証済みの調整係数、どちらにもなければデフォルト値）
+        adjustments = compiled_formula.resolve_adjustments(params, segment_id)
+        # コンポーネント設定をコンパイル済みの評価計画に変換し（同じ設定は計画を再利用）、計画に沿ってEVCを計算する
+        plan = get_evc_plan(params)
+        values = plan.bind(params)
+        return build_evc_result(plan, segment_id, values, plan.evaluate_values(values, adjustments))
+
+    # メモは検証済みのEVCResultを保持し、呼び出しごとに検証を省略した複製を返す（返した結果を変更してもメモには影響しない）
+    return copy_evc_result(get_evc_memo().get_or_compute(key, compute))
+
+
 @function_tool
 async def calculate_evc(segment_id: str, formula: str, parameters: str) -> EVCResult:
     """設計されたフォーミュラに基づいて特定セグメントのEVCを計算します。
@@ -69,587 +122,204 @@ async def calculate_evc(segment_id: str, formula: str, parameters: str) -> EVCRe
     Returns:
         EVC計算結果
     """
-    import logging
-    import json
-    import re
-    
-    # パラメータを辞書に変換する
-    params_dict = {}
-    if isinstance(parameters, dict):
-        params_dict = parameters
-    elif isinstance(parameters, str):
-        try:
-            # JSON形式の場合は解析
-            if parameters.strip().startswith('{') and parameters.strip().endswith('}'):
-                try:
-                    params_dict = json.loads(parameters)
-                except json.JSONDecodeError:
-                    # シングルクォートをダブルクォートに変換するなどの修正を試みる
-                    try:
-                        fixed_json = parameters.replace("'", "\"").replace("\n", " ")
-                        params_dict = json.loads(fixed_json)
-                    except json.JSONDecodeError:
-                        logging.warning(f"パラメータのJSON解析に失敗しました: {parameters[:50]}...")
-            else:
-                # キー値形式の場合は解析 (例: "売上増加率: 0.10, 年間売上: 100000000, ...")
-                pairs = parameters.split(',')
-                for pair in pairs:
-                    if ':' in pair:
-                        key, value = pair.split(':', 1)
-                        key = key.strip()
-                        value = value.strip()
-                        
-                        # 値を適切な型に変換
-                        try:
-                            # 数値の場合
-                            if re.match(r'^[\d.]+$', value):
-                                if '.' in value:
-                                    value = float(value)
-                                else:
-                                    value = int(value)
-                        except ValueError:
-                            pass  # 変換に失敗した場合は文字列のまま
-                        
-                        params_dict[key] = value
-        except Exception as e:
-            logging.error(f"パラメータの解析中にエラーが発生しました: {str(e)}")
-    
-    # セグメント特定のパラメータを設定
-    # ここから下はパラメータが辞書型として処理される
-    
-    # 基本パラメータの動的取得
-    # 参照価格はパラメータから動的に取得
-    reference_price = params_dict.get("reference_price", 0)
-    
-    # セグメントに基づく調整係数をパラメータから動的に取得
-    segment_adjustments = params_dict.get("segment_adjustments", {})
-    
-    # セグメント調整を適用、存在しない場合はデフォルト値を使用
-    default_adjustments = {"Re": 1.0, "Co": 1.0, "I": 1.0}
-    adjustments = segment_adjustments.get(segment_id, default_adjustments)
-    
-    # 収益向上価値の動的計算を行う
-    implementation_years = params_dict.get("implementation_years")
-    annual_revenue = params_dict.get("annual_revenue")
-    
-    # 収益向上価値の計算式を動的に決定
-    service_type = params_dict.get("service_type")
-    industry = params_dict.get("industry")
-    
-    # 完全に動的な計算構造を作成
-    revenue_components = {}
-    revenue_formulas = {}
-    revenue_parameters = {}
-    
-    # サービスタイプごとの変数名を取得
-    component_config = params_dict.get("revenue_components", {})
-    
-    # 新規収益（Rn）の動的パラメータ設定
-    if "new_revenue" in component_config:
-        config = component_config["new_revenue"]
-        formula = config.get("formula")
-        revenue_formulas["new_revenue"] = formula
-        
-        # 必要なパラメータを取得
-        param_values = {}
-        for param in config.get("parameters", []):
-            param_values[param] = params_dict.get(param)
-        revenue_parameters["new_revenue"] = param_values
-        
-        # 計算ロジックを動的に適用
-        calculation_function = config.get("calculation_function")
-        if calculation_function == "standard":
-            if all(k in param_values for k in ["new_customers", "average_customer_value", "new_products", "product_revenue"]):
-                revenue_components["new_revenue"] = (
-                    param_values["new_customers"] * param_values["average_customer_value"] + 
-                    param_values["new_products"] * param_values["product_revenue"]
-                ) * adjustments["Re"]
-        elif calculation_function == "saas":
-            if all(k in param_values for k in ["new_customers", "average_arpu", "expansion_revenue"]):
-                revenue_components["new_revenue"] = (
-                    param_values["new_customers"] * param_values["average_arpu"] + 
-                    param_values["expansion_revenue"]
-                ) * adjustments["Re"]
-        elif calculation_function == "manufacturing":
-            if all(k in param_values for k in ["new_clients", "units_per_client", "unit_price"]):
-                revenue_components["new_revenue"] = (
-                    param_values["new_clients"] * param_values["units_per_client"] * 
-                    param_values["unit_price"]
-                ) * adjustments["Re"]
-        elif calculation_function == "custom":
-            # カスタム計算の場合、直接計算結果を受け取る
-            if "calculated_value" in param_values:
-                revenue_components["new_revenue"] = param_values["calculated_value"] * adjustments["Re"]
-    
-    # 既存顧客維持による収益（Rr）の動的計算
-    if "retention_revenue" in component_config:
-        config = component_config["retention_revenue"]
-        formula = config.get("formula")
-        revenue_formulas["retention_revenue"] = formula
-        
-        # 必要なパラメータを取得
-        param_values = {}
-        for param in config.get("parameters", []):
-            param_values[param] = params_dict.get(param)
-        revenue_parameters["retention_revenue"] = param_values
-        
-        # 計算ロジックを動的に適用
-        calculation_function = config.get("calculation_function")
-        if calculation_function == "standard":
-            if all(k in param_values for k in ["retained_customers", "customer_lifetime_value"]):
-                revenue_components["retention_revenue"] = (
-                    param_values["retained_customers"] * param_values["customer_lifetime_value"]
-                ) * adjustments["Re"]
-        elif calculation_function == "subscription":
-            if all(k in param_values for k in ["churn_reduction", "current_customers", "annual_contract_value"]):
-                revenue_components["retention_revenue"] = (
-                    param_values["churn_reduction"] * param_values["current_customers"] * 
-                    param_values["annual_contract_value"]
-                ) * adjustments["Re"]
-        elif calculation_function == "custom":
-            if "calculated_value" in param_values:
-                revenue_components["retention_revenue"] = param_values["calculated_value"] * adjustments["Re"]
-    
-    # 価格最適化による収益（Rp）の動的計算
-    if "pricing_revenue" in component_config:
-        config = component_config["pricing_revenue"]
-        formula = config.get("formula")
-        revenue_formulas["pricing_revenue"] = formula
-        
-        # 必要なパラメータを取得
-        param_values = {}
-        for param in config.get("parameters", []):
-            param_values[param] = params_dict.get(param)
-        revenue_parameters["pricing_revenue"] = param_values
-        
-        # 計算ロジックを動的に適用
-        calculation_function = config.get("calculation_function")
-        if calculation_function == "standard":
-            if all(k in param_values for k in ["price_increase", "customer_base", "revenue_per_customer"]):
-                revenue_components["pricing_revenue"] = (
-                    param_values["price_increase"] * param_values["customer_base"] * 
-                    param_values["revenue_per_customer"]
-                ) * adjustments["Re"]
-        elif calculation_function == "premium":
-            if all(k in param_values for k in ["price_premium", "target_segment_size", "revenue_per_customer"]):
-                revenue_components["pricing_revenue"] = (
-                    param_values["price_premium"] * param_values["target_segment_size"] * 
-                    param_values["revenue_per_customer"]
-                ) * adjustments["Re"]
-        elif calculation_function == "custom":
-            if "calculated_value" in param_values:
-                revenue_components["pricing_revenue"] = param_values["calculated_value"] * adjustments["Re"]
-    
-    # 取引頻度向上による収益（Rt）の動的計算
-    if "transaction_revenue" in component_config:
-        config = component_config["transaction_revenue"]
-        formula = config.get("formula")
-        revenue_formulas["transaction_revenue"] = formula
-        
-        # 必要なパラメータを取得
-        param_values = {}
-        for param in config.get("parameters", []):
-            param_values[param] = params_dict.get(param)
-        revenue_parameters["transaction_revenue"] = param_values
-        
-        # 計算ロジックを動的に適用
-        calculation_function = config.get("calculation_function")
-        if calculation_function == "standard":
-            if all(k in param_values for k in ["transaction_increase", "customer_base", "average_transaction_value"]):
-                revenue_components["transaction_revenue"] = (
-                    param_values["transaction_increase"] * param_values["customer_base"] * 
-                    param_values["average_transaction_value"]
-                ) * adjustments["Re"]
-        elif calculation_function == "custom":
-            if "calculated_value" in param_values:
-                revenue_components["transaction_revenue"] = param_values["calculated_value"] * adjustments["Re"]
-    
-    # カスタムコンポーネントを動的に追加
-    custom_components = component_config.get("custom_components", [])
-    for component_name in custom_components:
-        if component_name in parameters:
-            config = parameters[component_name]
-            formula = config.get("formula")
-            revenue_formulas[component_name] = formula
-            
-            # カスタムコンポーネントのパラメータを取得
-            param_values = {}
-            for param in config.get("parameters", []):
-                param_values[param] = params_dict.get(param)
-            revenue_parameters[component_name] = param_values
-            
-            # 計算値を取得
-            if "calculated_value" in config:
-                revenue_components[component_name] = config["calculated_value"] * adjustments["Re"]
-    
-    # 収益向上価値の総額計算
-    revenue_enhancement_value = sum(revenue_components.values()) if revenue_components else 0
-    
-    # コスト最適化価値の動的計算を行う
-    annual_cost = params_dict.get("annual_cost")
-    
-    # 完全に動的なコスト計算構造を作成
-    cost_components = {}
-    cost_formulas = {}
-    cost_parameters = {}
-    
-    # サービスタイプごとのコストコンフィグを取得
-    component_config = params_dict.get("cost_components", {})
-    
-    # 直接コスト削減（Cd）の動的パラメータ設定
-    if "direct_cost_reduction" in component_config:
-        config = component_config["direct_cost_reduction"]
-        formula = config.get("formula")
-        cost_formulas["direct_cost_reduction"] = formula
-        
-        # 必要なパラメータを取得
-        param_values = {}
-        for param in config.get("parameters", []):
-            param_values[param] = params_dict.get(param)
-        cost_parameters["direct_cost_reduction"] = param_values
-        
-        # 計算ロジックを動的に適用
-        calculation_function = config.get("calculation_function")
-        if calculation_function == "standard":
-            if all(k in param_values for k in ["manual_hours", "automated_hours", "hourly_rate", "resource_savings"]):
-                cost_components["direct_cost_reduction"] = (
-                    (param_values["manual_hours"] - param_values["automated_hours"]) * 
-                    param_values["hourly_rate"] + param_values["resource_savings"]
-                ) * adjustments["Co"]
-        elif calculation_function == "cloud_migration":
-            if all(k in param_values for k in ["infrastructure_cost_current", "infrastructure_cost_cloud", "maintenance_reduction"]):
-                cost_components["direct_cost_reduction"] = (
-                    (param_values["infrastructure_cost_current"] - param_values["infrastructure_cost_cloud"]) + 
-                    param_values["maintenance_reduction"]
-                ) * adjustments["Co"]
-        elif calculation_function == "custom":
-            if "calculated_value" in param_values:
-                cost_components["direct_cost_reduction"] = param_values["calculated_value"] * adjustments["Co"]
-    
-    # 品質関連コスト削減（Cq）の動的計算
-    if "quality_cost_reduction" in component_config:
-        config = component_config["quality_cost_reduction"]
-        formula = config.get("formula")
-        cost_formulas["quality_cost_reduction"] = formula
-        
-        # 必要なパラメータを取得
-        param_values = {}
-        for param in config.get("parameters", []):
-            param_values[param] = params_dict.get(param)
-        cost_parameters["quality_cost_reduction"] = param_values
-        
-        # 計算ロジックを動的に適用
-        calculation_function = config.get("calculation_function")
-        if calculation_function == "standard":
-            if all(k in param_values for k in ["defect_reduction", "defect_cost", "complaint_reduction", "complaint_cost"]):
-                cost_components["quality_cost_reduction"] = (
-                    param_values["defect_reduction"] * param_values["defect_cost"] + 
-                    param_values["complaint_reduction"] * param_values["complaint_cost"]
-                ) * adjustments["Co"]
-        elif calculation_function == "six_sigma":
-            if all(k in param_values for k in ["sigma_improvement", "defect_rate_reduction", "quality_cost_per_defect", "production_volume"]):
-                cost_components["quality_cost_reduction"] = (
-                    param_values["defect_rate_reduction"] * param_values["quality_cost_per_defect"] * 
-                    param_values["production_volume"]
-                ) * adjustments["Co"]
-        elif calculation_function == "custom":
-            if "calculated_value" in param_values:
-                cost_components["quality_cost_reduction"] = param_values["calculated_value"] * adjustments["Co"]
-    
-    # リスク関連コスト削減（Cr）の動的計算
-    if "risk_cost_reduction" in component_config:
-        config = component_config["risk_cost_reduction"]
-        formula = config.get("formula")
-        cost_formulas["risk_cost_reduction"] = formula
-        
-        # 必要なパラメータを取得
-        param_values = {}
-        for param in config.get("parameters", []):
-            param_values[param] = params_dict.get(param)
-        cost_parameters["risk_cost_reduction"] = param_values
-        
-        # 計算ロジックを動的に適用
-        calculation_function = config.get("calculation_function")
-        if calculation_function == "standard":
-            if all(k in param_values for k in ["risk_reduction_factor", "risk_exposure_value"]):
-                cost_components["risk_cost_reduction"] = (
-                    param_values["risk_reduction_factor"] * param_values["risk_exposure_value"]
-                ) * adjustments["Co"]
-        elif calculation_function == "compliance":
-            if all(k in param_values for k in ["compliance_penalty_reduction", "incident_probability_reduction", "average_incident_cost"]):
-                cost_components["risk_cost_reduction"] = (
-                    param_values["compliance_penalty_reduction"] + 
-                    param_values["incident_probability_reduction"] * param_values["average_incident_cost"]
-                ) * adjustments["Co"]
-        elif calculation_function == "custom":
-            if "calculated_value" in param_values:
-                cost_components["risk_cost_reduction"] = param_values["calculated_value"] * adjustments["Co"]
-    
-    # 時間関連コスト削減（Ct）の動的計算
-    if "time_cost_reduction" in component_config:
-        config = component_config["time_cost_reduction"]
-        formula = config.get("formula")
-        cost_formulas["time_cost_reduction"] = formula
-        
-        # 必要なパラメータを取得
-        param_values = {}
-        for param in config.get("parameters", []):
-            param_values[param] = params_dict.get(param)
-        cost_parameters["time_cost_reduction"] = param_values
-        
-        # 計算ロジックを動的に適用
-        calculation_function = config.get("calculation_function")
-        if calculation_function == "standard":
-            if all(k in param_values for k in ["decision_time_savings", "opportunity_cost_rate"]):
-                cost_components["time_cost_reduction"] = (
-                    param_values["decision_time_savings"] * param_values["opportunity_cost_rate"]
-                ) * adjustments["Co"]
-        elif calculation_function == "process_improvement":
-            if all(k in param_values for k in ["process_time_reduction", "process_frequency", "employee_cost_per_hour"]):
-                cost_components["time_cost_reduction"] = (
-                    param_values["process_time_reduction"] * param_values["process_frequency"] * 
-                    param_values["employee_cost_per_hour"] / 60
-                ) * adjustments["Co"]
-        elif calculation_function == "custom":
-            if "calculated_value" in param_values:
-                cost_components["time_cost_reduction"] = param_values["calculated_value"] * adjustments["Co"]
-    
-    # カスタムコストコンポーネントを動的に追加
-    custom_components = component_config.get("custom_components", [])
-    for component_name in custom_components:
-        if component_name in parameters:
-            config = parameters[component_name]
-            formula = config.get("formula")
-            cost_formulas[component_name] = formula
-            
-            # カスタムコンポーネントのパラメータを取得
-            param_values = {}
-            for param in config.get("parameters", []):
-                param_values[param] = params_dict.get(param)
-            cost_parameters[component_name] = param_values
-            
-            # 計算値を取得
-            if "calculated_value" in config:
-                cost_components[component_name] = config["calculated_value"] * adjustments["Co"]
-    
-    # コスト最適化価値の総額計算
-    cost_optimization_value = sum(cost_components.values()) if cost_components else 0
-    
-    # 導入コストの動的計算
-    # 導入コストコンポーネントの動的設定
-    implementation_cost_components = {}
-    implementation_cost_formulas = {}
-    implementation_cost_parameters = {}
-    
-    # 初期コストと運用コストをパラメータから取得
-    initial_cost = params_dict.get("initial_cost", 0)
-    recurring_cost = params_dict.get("recurring_cost", 0)
-    
-    # 計算式を記録
-    implementation_cost_formula = "I = initial_cost + recurring_cost × implementation_years"
-    implementation_cost_formulas["implementation_cost"] = implementation_cost_formula
-    
-    # 導入コストの計算
-    implementation_cost_value = (initial_cost + recurring_cost * implementation_years) * adjustments["I"]
-    
-    # 導入コストコンポーネントの情報を保存
-    implementation_cost_components["implementation_cost"] = implementation_cost_value
-    implementation_cost_parameters["implementation_cost"] = {
-        "initial_cost": initial_cost,
-        "recurring_cost": recurring_cost,
-        "implementation_years": implementation_years
-    }
-    
-    # EVC計算
-    evc_value = reference_price + (revenue_enhancement_value + cost_optimization_value) - implementation_cost_value
-    
-    # 結果の構築
-    # 動的に生成された収益向上価値のコンポーネントを準備
-    revenue_enhancement_components = {}
-    
-    # 各コンポーネントの詳細な計算情報を追加
-    for component_name, value in revenue_components.items():
-        component_info = {
-            "value": value,
-            "formula": revenue_formulas.get(component_name, ""),
-            "parameters": revenue_parameters.get(component_name, {})
-        }
-        revenue_enhancement_components[component_name] = component_info
-    
-    # 収益向上価値のオブジェクトを生成
-    revenue_enhancement = ValueComponent(
-        name="収益向上価値",
-        description="サービス導入による売上向上効果",
-        formula="Re = " + " + ".join([k for k in revenue_components.keys()]),
-        value=revenue_enhancement_value,
-        calculation_details={
-            "formula": "Re = " + " + ".join([k for k in revenue_components.keys()]),
-            "total_value": revenue_enhancement_value,
-            "components": revenue_enhancement_components,
-            "adjustment": adjustments["Re"]
-        }
-    )
-    
-    # 動的に生成されたコスト最適化価値のコンポーネントを準備
-    cost_optimization_components = {}
-    
-    # 各コンポーネントの詳細な計算情報を追加
-    for component_name, value in cost_components.items():
-        component_info = {
-            "value": value,
-            "formula": cost_formulas.get(component_name, ""),
-            "parameters": cost_parameters.get(component_name, {})
-        }
-        cost_optimization_components[component_name] = component_info
-    
-    # コスト最適化価値のオブジェクトを生成
-    cost_optimization = ValueComponent(
-        name="コスト最適化価値",
-        description="サービス導入によるコスト削減効果",
-        formula="Co = " + " + ".join([k for k in cost_components.keys()]),
-        value=cost_optimization_value,
-        calculation_details={
-            "formula": "Co = " + " + ".join([k for k in cost_components.keys()]),
-            "total_value": cost_optimization_value,
-            "components": cost_optimization_components,
-            "adjustment": adjustments["Co"]
-        }
-    )
-    
-    # 導入コストオブジェクトの生成
-    implementation_cost_obj = ValueComponent(
-        name="導入コスト",
-        description="サービス導入に必要なコスト",
-        formula=implementation_cost_formula,
-        value=implementation_cost_value,
-        calculation_details={
-            "formula": implementation_cost_formula,
-            "total_value": implementation_cost_value,
-            "components": {
-                "initial_cost": initial_cost,
-                "recurring_cost": recurring_cost * implementation_years
-            },
-            "adjustment": adjustments["I"]
-        }
-    )
-    
-    components = EVCComponents(
-        reference_price=reference_price,
-        revenue_enhancement=revenue_enhancement,
-        cost_optimization=cost_optimization,
-        implementation_cost=implementation_cost_value
-    )
-    
-    # セグメント名のマッピング
-    segment_names = {
-        "s1": "大企業・高価値",
-        "s2": "大企業・低価値",
-        "s3": "中小企業・高価値",
-        "s4": "中小企業・低価値"
-    }
-    
-    return EVCResult(
-        segment_id=segment_id,
-        segment_name=segment_names.get(segment_id, f"セグメント {segment_id}"),
-        evc_value=evc_value,
-        components=components,
-        calculation_details={
-            "formula": "EVC = R + (Re + Co) - I",
-            "evc_value": evc_value,
-            "reference_price": reference_price,
-            "revenue_enhancement_value": revenue_enhancement_value,
-            "cost_optimization_value": cost_optimization_value,
-            "implementation_cost": implementation_cost_value
-        }
-    )
+    return _calculate_evc_impl(segment_id, formula, parameters)
 
 
 # 内部実装（非同期）
-async def _calculate_all_segment_evc_impl(formula: str, segment_parameters: str) -> List[EVCResult]:
+async def _calculate_all_segment_evc_impl(formula: str, segment_parameters: str) -> Dict[str, Any]:
     """全セグメントのEVCを計算します - 内部実装
 
+    エージェントの実行中のイベントループ上でそのまま呼び出せるよう、ネストしたイベントループは使用しません。
+    各セグメントはコンパイル済みの評価計画で計算するため、1セグメントあたりの計算はマイクロ秒単位で完了します。
+
     Args:
         formula: EVC計算フォーミュラ
-        segment_parameters: セグメント別のパラメータ
+        segment_parameters: セグメント別のパラメータ（JSON形式・表形式・従来形式。形式はtools.segment_parametersを参照）
 
     Returns:
-        全セグメントのEVC計算結果
+        全セグメントのEVC計算結果とセグメント別の計算時間（ミリ秒）
+
+    Raises:
+        DataValidationError: セグメント別パラメータの形式が不正な場合
     """
-    # セグメントパラメータを解析
-    import logging
-    try:
-        # セグメントIDを抽出（パラメータ文字列からセグメントIDを取得）
-        segment_ids = []
-        if isinstance(segment_parameters, str) and ':' in segment_parameters:
-            # s1: 'パラメータ', s2: 'パラメータ' の形式を解析
-            parts = segment_parameters.split(',')
-            for part in parts:
-                if ':' in part:
-                    segment_id = part.split(':', 1)[0].strip()
-                    if segment_id.startswith('s'):
-                        segment_ids.append(segment_id)
-        
-        if not segment_ids:  # セグメントIDが取得できない場合はデフォルト値を使用
-            segment_ids = ["s1", "s2", "s3", "s4"]
-    except Exception as e:
-        logging.warning(f"セグメントパラメータの解析に失敗しました: {e}")
-        segment_ids = ["s1", "s2", "s3", "s4"]
-    
+    # フォーミュラは一度だけコンパイルし、全セグメントで共有する
+    compiled_formula = compile_formula(formula)
+
+    # セグメント別パラメータを1回の走査で解析
+    segments = parse_segment_parameters(segment_parameters)
+    if not segments:  # セグメントが指定されていない場合はデフォルトのセグメントを使用
+        segments = {segment_id: {} for segment_id in ["s1", "s2", "s3", "s4"]}
+
     # 各セグメントのEVCを計算
+    started_at = time.perf_counter()
     results = []
-    
-    for segment_id in segment_ids:
-        # セグメントごとのパラメータを取得
-        segment_param = "{}"
-        if segment_id in segment_parameters:
-            # s1: '売上増加率: 0.10, 年間売上: 100000000, ...' からパラメータを抽出
-            segment_start = segment_parameters.find(f"{segment_id}:")
-            if segment_start >= 0:
-                segment_end = segment_parameters.find(",", segment_start)
-                if segment_end < 0:  # 最後のセグメントの場合
-                    segment_end = len(segment_parameters)
-                segment_param = segment_parameters[segment_start:segment_end].split(':', 1)[1].strip().strip('\'"')
-        
+    segment_timings = {}
+
+    for segment_id, segment_param in segments.items():
         # EVCを計算
-        result = await calculate_evc(segment_id, formula, segment_param)
-        results.append(result)
-    
-    return results
+        segment_started_at = time.perf_counter()
+        results.append(_calculate_evc_impl(segment_id, compiled_formula, segment_param))
+        segment_timings[segment_id] = (time.perf_counter() - segment_started_at) * 1000
+
+    return {
+        "results": results,
+        "segment_timings_ms": segment_timings,
+        "total_ms": (time.perf_counter() - started_at) * 1000
+    }
 
-# ラッパー関数（同期的に呼び出し可能）
-def _calculate_all_segment_evc_wrapper(formula: str, segment_parameters: str) -> List[EVCResult]:
-    """全セグメントのEVCを計算します - ラッパー
+# function_toolの設定
+calculate_all_segment_evc = function_tool(_calculate_all_segment_evc_impl, name_override="calculate_all_segment_evc")
+
+
+# 内部実装（同期）
+def _calculate_npv_evc_impl(
+    formula: str,
+    segment_parameters: str,
+    discount_rate: float = 0.0,
+    adoption_ramp: str = "",
+    horizon_years: int = 0
+) -> Dict[str, Any]:
+    """全セグメントの複数年・割引EVC（NPV-EVC）と回収期間を計算します - 内部実装
+
+    Args:
+        formula: EVC計算フォーミュラ
+        segment_parameters: セグメント別のパラメータ（形式はtools.segment_parametersを参照）
+        discount_rate: 年率の割引率（例: 0.05）
+        adoption_ramp: 1年目からの採用率の推移（カンマ区切り。例: "0.3, 0.7, 1.0" または "30%, 70%, 100%"）
+        horizon_years: 評価期間（年）。0の場合は導入年数の最大値
+
+    Returns:
+        セグメント別のNPV-EVC、従来のEVC、回収期間、評価期間ごとのNPV-EVC
+
+    Raises:
+        DataValidationError: パラメータや採用率の推移の形式が不正な場合
+    """
+    compiled_formula = compile_formula(formula)
+    segments = parse_segment_parameters(segment_parameters)
+    if not segments:  # セグメントが指定されていない場合はデフォルトのセグメントを使用
+        segments = {segment_id: {} for segment_id in ["s1", "s2", "s3", "s4"]}
+
+    ramp = None
+    if adoption_ramp and adoption_ramp.strip():
+        ramp = [parse_japanese_number(part) for part in adoption_ramp.split(",") if part.strip()]
+        if any(value is None for value in ramp):
+            raise DataValidationError(f"採用率の推移は数値のカンマ区切りで指定してください: {adoption_ramp}")
+
+    # 評価期間はすべてのセグメントで揃える
+    horizon = horizon_years or max(
+        [math.ceil(params["implementation_years"]) for params in segments.values()
+         if isinstance(params.get("implementation_years"), (int, float))] or [1]
+    )
+
+    # コンポーネント設定が同じセグメントをまとめ、セグメント方向にベクトル化して計算する
+    groups: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for segment_id, params in segments.items():
+        # 調整係数はcalculate_evcと同じ順序（パラメータ、なければフォーミュラ）で決定する
+        params = dict(params, segment_adjustments={segment_id: compiled_formula.resolve_adjustments(params, segment_id)})
+        groups.setdefault(get_evc_plan(params).plan_id, {})[segment_id] = params
+
+    results = {}
+    for group in groups.values():
+        npv = evaluate_npv_evc(stack_segment_parameters(group), list(group), discount_rate, ramp, horizon)
+        results.update(npv.summary())
+
+    return {
+        "discount_rate": discount_rate,
+        "adoption_ramp": ramp,
+        "horizon_years": horizon,
+        "segments": {segment_id: results[segment_id] for segment_id in segments}
+    }
+
+
+@function_tool
+async def calculate_npv_evc(
+    formula: str,
+    segment_parameters: str,
+    discount_rate: float,
+    adoption_ramp: str,
+    horizon_years: int
+) -> Dict[str, Any]:
+    """全セグメントの複数年・割引EVC（NPV-EVC）と回収期間を計算します。
+
+    導入の立ち上がりと割引率を反映した年ごとのキャッシュフローから、評価期間の各年時点のNPV-EVCと
+    回収期間を一度に計算します。
 
     Args:
         formula: EVC計算フォーミュラ
         segment_parameters: セグメント別のパラメータ
+        discount_rate: 年率の割引率（例: 0.05）
+        adoption_ramp: 1年目からの採用率の推移（カンマ区切り。例: "0.3, 0.7, 1.0"、空文字の場合は1年目から100%）
+        horizon_years: 評価期間（年）。0の場合は導入年数の最大値
 
     Returns:
-        全セグメントのEVC計算結果
+        セグメント別のNPV-EVC、従来のEVC、回収期間、評価期間ごとのNPV-EVC
     """
-    import asyncio
-    import logging
-    try:
-        # 現在のイベントループを取得
-        loop = asyncio.get_event_loop()
-        # 非同期関数を同期的に実行
-        return loop.run_until_complete(_calculate_all_segment_evc_impl(formula, segment_parameters))
-    except RuntimeError as e:
-        # 現在のループが閉じられている場合は新しいループを作成
-        if "There is no current event loop in thread" in str(e):
-            new_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(new_loop)
-            try:
-                return new_loop.run_until_complete(_calculate_all_segment_evc_impl(formula, segment_parameters))
-            finally:
-                new_loop.close()
-        # 実行中のループ内からの呼び出しの場合は、空のリストを返す
-        # これはエラーを返すよりも、処理を継続させるためのフォールバック
-        logging.warning(f"EVC計算中に非同期エラーが発生しました: {e}")
-        return []
+    return _calculate_npv_evc_impl(formula, segment_parameters, discount_rate, adoption_ramp, horizon_years)
 
-# function_toolの設定
-calculate_all_segment_evc = function_tool(_calculate_all_segment_evc_wrapper)
+
+# 内部実装（同期）
+def _calculate_break_even_prices_impl(
+    formula: str,
+    segment_parameters: str,
+    price_parameter: str = DEFAULT_PRICE_PARAMETER,
+    target_evc: float = 0.0
+) -> Dict[str, Any]:
+    """全セグメントの損益分岐価格と優先度ランクが切り替わる閾値価格を計算します - 内部実装
+
+    Args:
+        formula: EVC計算フォーミュラ
+        segment_parameters: セグメント別のパラメータ（形式はtools.segment_parametersを参照。
+            market_size / acquisition_probability / market_growth_rate を含めると優先度ランクの閾値に使用）
+        price_parameter: 価格に当たるパラメータ名（空文字の場合は recurring_cost）
+        target_evc: 損益分岐とみなすEVC
+
+    Returns:
+        セグメント別の損益分岐価格、解法、優先度ランクと閾値価格
+
+    Raises:
+        DataValidationError: パラメータの形式が不正、または価格パラメータが評価計画で使用されていない場合
+    """
+    compiled_formula = compile_formula(formula)
+    segments = parse_segment_parameters(segment_parameters)
+    if not segments:  # セグメントが指定されていない場合はデフォルトのセグメントを使用
+        segments = {segment_id: {} for segment_id in ["s1", "s2", "s3", "s4"]}
+
+    for segment_id, params in segments.items():
+        # 調整係数はcalculate_evcと同じ順序（パラメータ、なければフォーミュラ）で決定する
+        segments[segment_id] = dict(
+            params, segment_adjustments={segment_id: compiled_formula.resolve_adjustments(params, segment_id)}
+        )
+
+    price_parameter = price_parameter or DEFAULT_PRICE_PARAMETER
+    return {
+        "price_parameter": price_parameter,
+        "target_evc": target_evc,
+        "segments": solve_break_even_prices(segments, price_parameter, target_evc)
+    }
+
+
+@function_tool
+async def calculate_break_even_prices(
+    formula: str,
+    segment_parameters: str,
+    price_parameter: str,
+    target_evc: float
+) -> Dict[str, Any]:
+    """全セグメントの損益分岐価格と、優先度ランクが切り替わる閾値価格を計算します。
+
+    価格に当たるパラメータを変えたときにEVCが目標値に達する価格と、他のセグメントを固定したときに
+    優先度ランクが1つ上がる・下がる価格を、全セグメントまとめて計算します。
+
+    Args:
+        formula: EVC計算フォーミュラ
+        segment_parameters: セグメント別のパラメータ
+        price_parameter: 価格に当たるパラメータ名（例: "recurring_cost"、空文字の場合は recurring_cost）
+        target_evc: 損益分岐とみなすEVC（通常は0）
+
+    Returns:
+        セグメント別の損益分岐価格、解法、優先度ランクと閾値価格
+    """
+    return _calculate_break_even_prices_impl(formula, segment_parameters, price_parameter, target_evc)
 
 
 @function_tool
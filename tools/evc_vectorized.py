@@ -0,0 +1,335 @@
+"""
+NexaSales顧客セグメンテーションシステムのベクトル化EVC計算
+
+このモジュールでは、複数セグメント × 複数シナリオのEVCをNumPy配列で一括計算する機能を提供します。
+コンポーネント設定はevc_engineの評価計画として一度だけコンパイルし、各パラメータを
+(セグメント数, シナリオ数) の配列として評価計画に流し込みます。
+EVCResultモデルは必要な場合にのみ構築します。
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from models.models import EVCResult
+from tools.evc_engine import (
+    BASE_PARAMETERS,
+    COST_GROUP,
+    DEFAULT_ADJUSTMENTS,
+    IMPLEMENTATION_GROUP,
+    REVENUE_GROUP,
+    EVCPlan,
+    EVCRecord,
+    get_evc_plan,
+    resolve_adjustments,
+)
+from utils.utils import DataValidationError
+
+DEFAULT_SEGMENT_IDS = ("s1", "s2", "s3", "s4")
+
+
+class EVCBatchResult:
+    """ベクトル化EVC計算の結果です。
+
+    各配列の形状は (セグメント数, シナリオ数) です。
+    """
+
+    def __init__(self, plan: EVCPlan, segment_ids: List[str], values: List[Any], breakdown: Dict[str, Any]):
+        self.plan = plan
+        self.segment_ids = list(segment_ids)
+        self._values = values
+        self.adjustments = breakdown["adjustments"]
+        self.evc = breakdown["evc_value"]
+        self.reference_price = breakdown["reference_price"]
+        self.revenue_enhancement = breakdown["revenue_enhancement_value"]
+        self.cost_optimization = breakdown["cost_optimization_value"]
+        self.implementation_cost = breakdown["implementation_cost"]
+        self.revenue_components = breakdown["revenue_components"]
+        self.cost_components = breakdown["cost_components"]
+        self.initial_cost = breakdown["initial_cost"]
+        self.recurring_cost = breakdown["recurring_cost"]
+        self.implementation_years = breakdown["implementation_years"]
+
+    @property
+    def shape(self) -> tuple:
+        return self.evc.shape
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """セグメントごとのEVCの要約統計を返します。
+
+        Returns:
+            セグメントID -> {mean, min, max} の辞書
+        """
+        return {
+            segment_id: {
+                "mean": float(self.evc[i].mean()),
+                "min": float(self.evc[i].min()),
+                "max": float(self.evc[i].max()),
+            }
+            for i, segment_id in enumerate(self.segment_ids)
+        }
+
+    def to_records(self, scenario: int = 0) -> List[EVCRecord]:
+        """指定したシナリオの軽量なEVC計算結果をセグメントごとに取り出します。
+
+        Args:
+            scenario: シナリオの位置
+
+        Returns:
+            セグメントごとのEVC計算結果（EVCRecord）
+        """
+        records = []
+        for i, segment_id in enumerate(self.segment_ids):
+            pick = _element_picker(i, scenario)
+            values = [pick(value) if value is not None else None for value in self._values]
+            breakdown = {
+                "evc_value": pick(self.evc),
+                "reference_price": pick(self.reference_price),
+                "revenue_enhancement_value": pick(self.revenue_enhancement),
+                "cost_optimization_value": pick(self.cost_optimization),
+                "implementation_cost": pick(self.implementation_cost),
+                "revenue_components": {k: pick(v) for k, v in self.revenue_components.items()},
+                "cost_components": {k: pick(v) for k, v in self.cost_components.items()},
+                "initial_cost": pick(self.initial_cost),
+                "recurring_cost": pick(self.recurring_cost),
+                "implementation_years": pick(self.implementation_years),
+                "adjustments": {k: pick(v) for k, v in self.adjustments.items()},
+            }
+            records.append(EVCRecord(self.plan, segment_id, values, breakdown))
+        return records
+
+    def to_evc_results(self, scenario: int = 0) -> List[EVCResult]:
+        """指定したシナリオのEVCResultモデルをセグメントごとに構築します。
+
+        Args:
+            scenario: シナリオの位置
+
+        Returns:
+            セグメントごとのEVC計算結果
+        """
+        return [record.to_model() for record in self.to_records(scenario)]
+
+
+def _element_picker(segment_index: int, scenario: int):
+    def pick(value):
+        return float(value[segment_index, scenario]) if isinstance(value, np.ndarray) else value
+    return pick
+
+
+def as_scenario_grid(name: str, value: Any, shape: tuple) -> np.ndarray:
+    """パラメータの値を (セグメント数, シナリオ数) の配列に揃えます。
+
+    スカラーと、(セグメント数, 1) の列などブロードキャストできる形状の配列を受け付けます。
+    1次元配列は、長さがシナリオ数に一致すればシナリオ方向（全セグメント共通）、
+    そうでなくセグメント数に一致すればセグメント方向（全シナリオ共通）とみなします。
+
+    Args:
+        name: エラーメッセージに表示するパラメータ名
+        value: パラメータの値
+        shape: (セグメント数, シナリオ数)
+
+    Returns:
+        読み取り専用の (セグメント数, シナリオ数) の配列
+
+    Raises:
+        DataValidationError: 数値配列に変換できない場合、または形状を揃えられない場合
+    """
+    try:
+        array = np.asarray(value, dtype=float)
+    except (TypeError, ValueError) as e:
+        raise DataValidationError(f"パラメータ {name} を数値配列に変換できません: {e}")
+    if array.ndim == 1 and array.shape[0] == shape[1]:
+        # シナリオ方向の1次元配列は全セグメント共通とみなす
+        array = array[np.newaxis, :]
+    elif array.ndim == 1 and array.shape[0] == shape[0]:
+        # セグメント方向の1次元配列は全シナリオ共通とみなす
+        array = array[:, np.newaxis]
+    try:
+        return np.broadcast_to(array, shape)
+    except ValueError:
+        raise DataValidationError(f"パラメータ {name} の形状 {array.shape} を {shape} に揃えられません")
+
+
+def _infer_scenario_count(params: Dict[str, Any], slots: Sequence[str], segment_count: int) -> int:
+    scenario_count = 1
+    for name in slots:
+        value = params.get(name)
+        if isinstance(value, (list, tuple, np.ndarray)):
+            array = np.asarray(value)
+            if array.ndim == 2:
+                scenario_count = max(scenario_count, array.shape[1])
+            elif array.ndim == 1 and array.shape[0] != segment_count:
+                scenario_count = max(scenario_count, array.shape[0])
+    return scenario_count
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def stack_segment_parameters(params_by_segment: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """セグメント別のパラメータ辞書を、evaluate_evc_batchに渡す1つのパラメータ辞書にまとめます。
+
+    数値のパラメータは (セグメント数, 1) の列にまとめ、コンポーネント設定などの数値以外の値は先頭のセグメントの値を使用します。
+    一部のセグメントで省略された基本パラメータ（reference_price など）は、calculate_evcと同じく0とします。
+    segment_adjustmentsは、各セグメントの辞書から該当するセグメントの調整係数を集めます（指定のないキーは1.0）。
+    コンポーネント設定はすべてのセグメントで共通である必要があります（get_evc_planのplan_idが同じ）。
+
+    Args:
+        params_by_segment: セグメントID -> calculate_evcのパラメータ辞書
+
+    Returns:
+        まとめたパラメータ辞書（セグメントの順序はparams_by_segmentと同じ）
+
+    Raises:
+        DataValidationError: 数値のパラメータが一部のセグメントにしかない場合
+    """
+    segments = list(params_by_segment.values())
+    params = dict(segments[0]) if segments else {}
+    keys = {key for segment in segments for key in segment if key != "segment_adjustments"}
+    for key in keys:
+        column = [segment.get(key, 0 if key in BASE_PARAMETERS else None) for segment in segments]
+        numeric = [_is_number(value) for value in column]
+        if all(numeric):
+            params[key] = np.asarray(column, dtype=float)[:, np.newaxis]
+        elif any(numeric):
+            raise DataValidationError(f"パラメータ {key} が一部のセグメントにしか数値で指定されていません")
+
+    params["segment_adjustments"] = {
+        segment_id: resolve_adjustments(segment, segment_id) for segment_id, segment in params_by_segment.items()
+    }
+    return params
+
+
+class EVCBatchInputs:
+    """バインド済みのベクトル化EVC計算の入力です。
+
+    評価計画のスロット値と調整係数を (セグメント数, シナリオ数) の配列として保持し、
+    一部のスロットだけを差し替えて評価計画の演算のみを繰り返し評価できます。
+    """
+
+    def __init__(self, plan: EVCPlan, segment_ids: List[str], shape: tuple, values: List[Any],
+                 adjustments: Dict[str, np.ndarray]):
+        self.plan = plan
+        self.segment_ids = segment_ids
+        self.shape = shape
+        self.values = values
+        self.adjustments = adjustments
+
+    def _override_values(self, overrides: Optional[Dict[str, Any]]) -> List[Any]:
+        values = self.values
+        if overrides:
+            values = list(values)
+            for name, value in overrides.items():
+                if name not in self.plan.slot_index:
+                    raise DataValidationError(f"パラメータ {name} は評価計画で使用されていません")
+                array = np.asarray(value, dtype=float)
+                # セグメント方向の1次元配列は (セグメント数, 1) の列とみなす
+                values[self.plan.slot_index[name]] = array[:, np.newaxis] if array.ndim == 1 else array
+        return values
+
+    def evaluate_evc(self, overrides: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        """スロットを差し替えてEVCのみを評価します。
+
+        Args:
+            overrides: パラメータ名 -> 値（(セグメント数,) または (セグメント数, k) の配列）
+
+        Returns:
+            EVC（差し替えた値と同じ列数の配列）
+        """
+        evc = self.plan.evaluate_values(self._override_values(overrides), self.adjustments)["evc_value"]
+        return np.asarray(evc, dtype=float)
+
+    def evaluate(self, overrides: Optional[Dict[str, Any]] = None) -> EVCBatchResult:
+        """スロットを差し替えてEVCとその内訳を評価します。
+
+        Args:
+            overrides: パラメータ名 -> 値（形状はバインド時と同じ）
+
+        Returns:
+            ベクトル化EVC計算の結果
+        """
+        shape = self.shape
+        values = self._override_values(overrides)
+        breakdown = self.plan.evaluate_values(values, self.adjustments)
+        # コンポーネントが無い場合の0もシナリオ形状に揃える
+        for key in ("revenue_enhancement_value", "cost_optimization_value", "reference_price",
+                    "initial_cost", "recurring_cost", "implementation_years"):
+            breakdown[key] = as_scenario_grid(key, breakdown[key], shape)
+        breakdown["evc_value"] = as_scenario_grid("evc_value", breakdown["evc_value"], shape)
+        breakdown["implementation_cost"] = as_scenario_grid("implementation_cost", breakdown["implementation_cost"], shape)
+        return EVCBatchResult(self.plan, self.segment_ids, values, breakdown)
+
+
+def bind_evc_batch(
+    params: Dict[str, Any],
+    segment_ids: Optional[Sequence[str]] = None,
+    scenario_count: Optional[int] = None
+) -> EVCBatchInputs:
+    """パラメータを評価計画のスロット順に (セグメント数, シナリオ数) の配列としてバインドします。
+
+    Args:
+        params: calculate_evcと同じ形式のパラメータ辞書（値は配列でも可。evaluate_evc_batchを参照）
+        segment_ids: 計算するセグメントID（省略時はs1〜s4）
+        scenario_count: シナリオ数（省略時はパラメータ配列の形状から推定）
+
+    Returns:
+        バインド済みの入力
+
+    Raises:
+        DataValidationError: パラメータ配列の形状が揃わない場合
+    """
+    segment_ids = list(segment_ids or DEFAULT_SEGMENT_IDS)
+    plan = get_evc_plan(params)
+    if scenario_count is None:
+        scenario_count = _infer_scenario_count(params, plan.slots, len(segment_ids))
+    shape = (len(segment_ids), scenario_count)
+
+    values = [
+        as_scenario_grid(name, value, shape) if value is not None else None
+        for name, value in zip(plan.slots, plan.bind(params))
+    ]
+
+    segment_adjustments = params.get("segment_adjustments") or {}
+    adjustments = {}
+    for group in (REVENUE_GROUP, COST_GROUP, IMPLEMENTATION_GROUP):
+        factors = [
+            segment_adjustments.get(segment_id, DEFAULT_ADJUSTMENTS).get(group, DEFAULT_ADJUSTMENTS[group])
+            for segment_id in segment_ids
+        ]
+        if all(_is_number(factor) for factor in factors):
+            # すべてスカラーの場合はセグメント方向の列としてまとめて変換する
+            adjustments[group] = np.broadcast_to(np.array(factors, dtype=float)[:, np.newaxis], shape)
+            continue
+        # セグメントごとの係数（スカラーまたはシナリオ方向の配列）を行として積み上げる
+        rows = [
+            as_scenario_grid(f"segment_adjustments.{segment_id}.{group}", factor, (1, scenario_count))
+            for segment_id, factor in zip(segment_ids, factors)
+        ]
+        adjustments[group] = np.vstack(rows)
+    return EVCBatchInputs(plan, segment_ids, shape, values, adjustments)
+
+
+def evaluate_evc_batch(
+    params: Dict[str, Any],
+    segment_ids: Optional[Sequence[str]] = None,
+    scenario_count: Optional[int] = None
+) -> EVCBatchResult:
+    """セグメント × シナリオのEVCをベクトル化して一括計算します。
+
+    パラメータはスカラー、(シナリオ数,) または (セグメント数,) の1次元配列、
+    あるいは (セグメント数, シナリオ数) の配列で指定します（長さが両方に一致する1次元配列はシナリオ方向とみなします）。
+    params["segment_adjustments"]の各係数も、スカラーのほかシナリオ方向の配列で指定できます。
+
+    Args:
+        params: calculate_evcと同じ形式のパラメータ辞書（値は配列でも可）
+        segment_ids: 計算するセグメントID（省略時はs1〜s4）
+        scenario_count: シナリオ数（省略時はパラメータ配列の形状から推定）
+
+    Returns:
+        ベクトル化EVC計算の結果
+
+    Raises:
+        DataValidationError: パラメータ配列の形状が揃わない場合
+    """
+    return bind_evc_batch(params, segment_ids, scenario_count).evaluate()
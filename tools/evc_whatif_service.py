@@ -0,0 +1,293 @@
+"""
+NexaSales顧客セグメンテーションシステムのEVCワットイフサービス
+
+このモジュールでは、設計済みのEVC計算フォーミュラ（design_evc_formulaの出力）とセグメント別パラメータを
+一度だけ読み込み、EVC依存グラフ（tools.evc_graph）としてメモリ上に保持するローカルのHTTPサービスを提供します。
+「価格がXだったら」のようなワットイフの問い合わせをまとめて受け取り、ワークフローを実行せずにEVCを返します。
+問い合わせの上書きは影響を受けるノードのみを再計算し、応答後に元の値へ戻します。
+上書きの値はcalculate_evcと同じ規則で数値に変換し、数値でない値や未知のパラメータ名はエラー（400）にします。
+
+エンドポイント:
+    POST /whatif  {"queries": [{"segment_id": "s1", "overrides": {"reference_price": 20000}}, ...]}
+    GET  /stats   リクエスト数と応答時間（リクエストの読み込み開始から応答の書き込み完了まで）のパーセンタイル（p50 / p99）
+    GET  /health  稼働確認
+
+使用例:
+    python -m tools.evc_whatif_service --formula formula.json --segment-parameters segments.json --port 8765
+    python -m tools.evc_whatif_service --formula formula.json --segment-parameters segments.json --unix-socket /tmp/evc.sock
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from tools.evc_engine import list_numeric_parameters
+from tools.evc_formula import compile_formula
+from tools.evc_graph import EVCDependencyGraph
+from tools.segment_parameters import parse_segment_parameters
+from utils.utils import DataValidationError, NexaSalesError, setup_logging
+
+# 応答時間のパーセンタイル計算に使う直近の記録数
+LATENCY_WINDOW = 10000
+# 評価計画を変更するため、依存グラフを構築し直して評価する上書きキー
+_PLAN_KEYS = ("revenue_components", "cost_components")
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percentile / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class EVCWhatIfService:
+    """コンパイル済みのEVC評価計画でワットイフの問い合わせに答えるサービスです。"""
+
+    def __init__(self, formula: Any, segment_parameters: Any):
+        """
+        フォーミュラとセグメント別パラメータを読み込み、評価計画をコンパイルします。
+
+        Args:
+            formula: design_evc_formulaが出力したフォーミュラ（文字列、辞書、またはコンパイル済みのフォーミュラ）
+            segment_parameters: セグメント別パラメータ（tools.segment_parametersの形式）
+
+        Raises:
+            DataValidationError: フォーミュラやパラメータの形式が不正な場合
+        """
+        # フォーミュラはcalculate_evcと同じくコンパイル済みのフォーミュラとして共有する
+        self.formula = compile_formula(formula)
+        if not self.formula.definition:
+            raise DataValidationError("フォーミュラを解析できません（design_evc_formulaの出力を指定してください）")
+
+        # 調整係数は依存グラフがcalculate_evcと同じ順序（パラメータ、なければフォーミュラ）で決定する
+        self.graph = EVCDependencyGraph(parse_segment_parameters(segment_parameters), self.formula)
+        self._parameter_names = self._known_parameters(self.graph)
+
+        self.request_count = 0
+        self.query_count = 0
+        self.error_count = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._started_at = time.monotonic()
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def segment_ids(self) -> List[str]:
+        return self.graph.segment_ids
+
+    @staticmethod
+    def _known_parameters(graph: EVCDependencyGraph) -> frozenset:
+        # 上書きできるパラメータ名（数値のパラメータ、評価計画のスロット、調整係数、コンポーネント設定）
+        names = set(list_numeric_parameters()) | {"segment_adjustments", *_PLAN_KEYS}
+        for segment_id in graph.segment_ids:
+            names.update(graph.plan(segment_id).slots)
+        return frozenset(names)
+
+    def _evaluate_query(self, segment_id: str, overrides: Dict[str, Any], adjustments: Dict[str, Any]) -> Dict[str, Any]:
+        if segment_id not in self.graph.segment_ids:
+            raise DataValidationError(f"セグメント {segment_id} は読み込まれていません")
+
+        graph = self.graph
+        known = self._parameter_names
+        plan_overrides = {key: overrides[key] for key in _PLAN_KEYS if key in overrides}
+        if plan_overrides:
+            # 評価計画が変わる上書きは、このセグメントのみの依存グラフを構築し直して評価する
+            graph = EVCDependencyGraph({segment_id: dict(self.graph.parameters(segment_id), **plan_overrides)}, self.formula)
+            overrides = {key: value for key, value in overrides.items() if key not in _PLAN_KEYS}
+            known = known | set(graph.plan(segment_id).slots)
+
+        unknown = [key for key in overrides if key not in known]
+        if unknown:
+            raise DataValidationError(f"未知のパラメータです: {', '.join(unknown)}")
+
+        breakdown = graph.evaluate_what_if(segment_id, overrides, adjustments)
+        return {
+            "segment_id": segment_id,
+            "evc_value": breakdown["evc_value"],
+            "revenue_enhancement_value": breakdown["revenue_enhancement_value"],
+            "cost_optimization_value": breakdown["cost_optimization_value"],
+            "implementation_cost": breakdown["implementation_cost"],
+        }
+
+    def evaluate(self, queries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """ワットイフの問い合わせをまとめて評価します。
+
+        各問い合わせは {"segment_id": ..., "overrides": {...}, "adjustments": {...}} の形式で、
+        segment_idを省略すると読み込んだ全セグメントを評価します。
+
+        Args:
+            queries: 問い合わせのリスト
+
+        Returns:
+            問い合わせごとの評価結果（segment_id省略時はセグメントごとの結果のリスト）
+
+        Raises:
+            DataValidationError: 問い合わせの形式が不正な場合、上書きの値が数値として解釈できない場合、
+                または未知のパラメータ名が指定された場合
+        """
+        results = []
+        for query in queries:
+            if not isinstance(query, dict):
+                raise DataValidationError("問い合わせはオブジェクトである必要があります")
+            overrides = query.get("overrides") or {}
+            adjustments = query.get("adjustments") or {}
+            if not isinstance(overrides, dict) or not isinstance(adjustments, dict):
+                raise DataValidationError("overridesとadjustmentsはオブジェクトである必要があります")
+
+            segment_id = query.get("segment_id")
+            if segment_id is None:
+                results.append([self._evaluate_query(sid, overrides, adjustments) for sid in self.segment_ids])
+            else:
+                results.append(self._evaluate_query(segment_id, overrides, adjustments))
+        self.query_count += len(queries)
+        return results
+
+    def handle(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        """HTTPリクエストを処理します。
+
+        Args:
+            method: HTTPメソッド
+            path: リクエストパス
+            body: リクエスト本文
+
+        Returns:
+            ステータスコードと応答本文
+        """
+        self.request_count += 1
+        try:
+            if method == "POST" and path == "/whatif":
+                try:
+                    payload = json.loads(body or b"{}")
+                except json.JSONDecodeError as e:
+                    raise DataValidationError(f"リクエスト本文のJSON解析に失敗しました: {e}")
+                queries = payload.get("queries") if isinstance(payload, dict) else payload
+                if not isinstance(queries, list):
+                    raise DataValidationError("queriesは配列である必要があります")
+                return 200, {"results": self.evaluate(queries)}
+            if method == "GET" and path == "/stats":
+                return 200, self.stats()
+            if method == "GET" and path == "/health":
+                return 200, {"status": "ok", "segments": self.segment_ids}
+            return 404, {"error": f"{method} {path} は存在しません"}
+        except NexaSalesError as e:
+            self.error_count += 1
+            return 400, {"error": str(e)}
+        except Exception as e:
+            self.error_count += 1
+            self.logger.error(f"ワットイフの問い合わせの処理中にエラーが発生しました: {e}")
+            return 500, {"error": str(e)}
+
+    def stats(self) -> Dict[str, Any]:
+        """リクエスト数と応答時間のパーセンタイルを返します。
+
+        応答時間は、リクエストの読み込み開始から応答の書き込み完了までの時間（ミリ秒）です。
+
+        Returns:
+            統計情報の辞書
+        """
+        latencies = sorted(self._latencies)
+        uptime = time.monotonic() - self._started_at
+        return {
+            "segments": len(self.segment_ids),
+            "requests": self.request_count,
+            "queries": self.query_count,
+            "errors": self.error_count,
+            "requests_per_second": self.request_count / uptime if uptime > 0 else 0.0,
+            "latency_ms": {
+                "p50": _percentile(latencies, 50),
+                "p99": _percentile(latencies, 99),
+                "max": latencies[-1] if latencies else 0.0,
+                "window": len(latencies),
+            },
+        }
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # HTTP/1.1のキープアライブに対応した最小限のリクエスト処理
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                # 応答時間はリクエスト行の受信から応答の書き込み完了までを計測する（キープアライブの待ち時間は含めない）
+                started_at = time.perf_counter()
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = self.handle(method.upper(), path.split("?", 1)[0], body)
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                self._latencies.append((time.perf_counter() - started_at) * 1000)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765, unix_socket: Optional[str] = None) -> None:
+        """サービスを起動し、停止されるまで問い合わせを受け付けます。
+
+        Args:
+            host: 待ち受けるホスト
+            port: 待ち受けるポート
+            unix_socket: 指定するとTCPの代わりにUnixドメインソケットで待ち受けます
+        """
+        if unix_socket:
+            server = await asyncio.start_unix_server(self._handle_connection, path=unix_socket)
+            self.logger.info(f"EVCワットイフサービスを起動しました: {unix_socket}")
+        else:
+            server = await asyncio.start_server(self._handle_connection, host, port)
+            self.logger.info(f"EVCワットイフサービスを起動しました: http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def parse_arguments():
+    """コマンドライン引数を解析します。"""
+    parser = argparse.ArgumentParser(description="NexaSales - EVCワットイフサービス")
+    parser.add_argument("--formula", required=True,
+                        help="design_evc_formulaが出力したフォーミュラのJSONファイル")
+    parser.add_argument("--segment-parameters", dest="segment_parameters", required=True,
+                        help="セグメント別パラメータのファイル（JSON形式・表形式・従来形式）")
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けるホスト（デフォルト: 127.0.0.1）")
+    parser.add_argument("--port", type=int, default=8765, help="待ち受けるポート（デフォルト: 8765）")
+    parser.add_argument("--unix-socket", dest="unix_socket",
+                        help="TCPの代わりに待ち受けるUnixドメインソケットのパス")
+    return parser.parse_args()
+
+
+def main():
+    """メイン関数"""
+    args = parse_arguments()
+    setup_logging("INFO")
+    with open(args.formula, "r", encoding="utf-8") as f:
+        formula = f.read()
+    with open(args.segment_parameters, "r", encoding="utf-8") as f:
+        segment_parameters = f.read()
+
+    service = EVCWhatIfService(formula, segment_parameters)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""
+NexaSales顧客セグメンテーションシステムのフォーミュラ設計ドキュメントの生成
+
+このモジュールでは、コンパイル済みのフォーミュラ（CompiledFormula）から、セグメント別のフォーミュラ、
+コンポーネントの重みとセグメント固有パラメータの表、調整の根拠、検証結果をまとめたドキュメントを
+1回の呼び出しで決定的に生成する機能を提供します。
+
+テンプレートは string.Template として一度だけコンパイルし、セグメントごとの節はコンパイル済みのフォーミュラ単位で
+保持するため、同じフォーミュラのドキュメントを再生成しても描画し直す必要はありません。
+エージェントに任せるのは設計の概要（narrative）の短い文章だけです。
+"""
+
+import copy
+import re
+from functools import lru_cache
+from string import Template
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from tools.evc_formula import (
+    ADJUSTMENT_KEYS, REQUIRED_COMPONENTS, SEGMENT_PARAMETER_UNITS, UNIT_RATE, UNIT_YEN,
+    CompiledFormula, compile_formula, parse_formula_text
+)
+
+# コンポーネントの表示名
+COMPONENT_LABELS = {
+    "R": "参照価格",
+    "Re": "収益向上価値",
+    "Co": "コスト最適化価値",
+    "I": "導入コスト",
+}
+
+# セグメント固有パラメータの表示名
+PARAMETER_LABELS = {
+    "annual_revenue": "年間売上",
+    "annual_cost": "年間コスト",
+    "implementation_years": "導入年数",
+    "revenue_increase_rate": "売上増加率",
+    "cost_reduction_rate": "コスト削減率",
+    "reference_price": "参照価格",
+    "initial_cost": "初期費用",
+    "operation_cost": "運用コスト",
+}
+
+# 設計プロセスの説明（従来のdocument_formula_designと同じ内容）
+BASE_FORMULA_JUSTIFICATION = "標準的なEVC計算式を採用し、各コンポーネントの重み付けを調整することで、セグメント特性を反映"
+CUSTOMIZATION_APPROACH = "各セグメントの特性（価値創出ポテンシャルと実現容易性）に基づいて、コンポーネントの重み付けを調整"
+CUSTOMIZATION_CONSIDERATIONS = (
+    "収益向上価値とコスト最適化価値のバランス",
+    "導入コストへの感度",
+    "セグメント固有のパラメータ値",
+)
+VALIDATION_APPROACH = "各フォーミュラの論理的整合性と現実的な結果を検証"
+USAGE_GUIDELINES = {
+    "parameter_selection": "各セグメントの実際の企業データに基づいてパラメータを設定",
+    "sensitivity_analysis": "主要パラメータ（収益増加率、コスト削減率、導入年数）の変動による結果への影響を分析",
+    "interpretation": "EVCは金銭的価値を表し、正の値は投資価値があることを示す。値が大きいほど投資価値が高い。",
+}
+
+DEFAULT_BASE_FORMULA = "EVC = R + (Re + Co) - I"
+
+# ドキュメントのテンプレート（Markdown）
+TEMPLATES = {
+    "document": """# EVCフォーミュラ設計
+
+## 基本フォーミュラ
+
+`${formula}`
+
+${base_justification}
+
+| コンポーネント | 説明 | 計算方法 | 重み |
+|---|---|---|---|
+${component_rows}
+${narrative}
+## セグメント別フォーミュラ
+
+${customization_approach}
+
+${segments}
+## 検証結果
+
+${validation_approach}
+
+| セグメント | 判定 | 問題 | 推奨事項 |
+|---|---|---|---|
+${validation_rows}
+
+## 利用ガイドライン
+
+- パラメータの設定: ${parameter_selection}
+- 感度分析: ${sensitivity_analysis}
+- 解釈: ${interpretation}
+""",
+    "narrative": """
+## 設計の概要
+
+${narrative}
+""",
+    "segment": """### ${segment_id}: ${segment_name}
+
+- フォーミュラ: `${formula}`
+- 検証: ${status}
+
+| コンポーネント | 説明 | 計算方法 | 重み |
+|---|---|---|---|
+${component_rows}
+
+| パラメータ | 値 | 単位 |
+|---|---|---|
+${parameter_rows}
+${adjustments}${justification}""",
+    "adjustments": """
+調整係数: ${factors}
+""",
+    "justification": """
+根拠: ${justification}
+""",
+    "component_row": "| ${label}（${component}） | ${description} | ${calculation} | ${weight} |",
+    "parameter_row": "| ${label}（${name}） | ${value} | ${unit} |",
+    "validation_row": "| ${segment_id} | ${status} | ${issues} | ${recommendations} |",
+}
+
+_SEGMENT_ID_PATTERN = re.compile(r"^s(\d+)$")
+_MISSING = "—"
+
+SegmentFormulas = Union[str, Dict[str, Any], Iterable[Any]]
+
+
+@lru_cache(maxsize=None)
+def get_template(name: str) -> Template:
+    """コンパイル済みのテンプレートを返します。
+
+    Args:
+        name: テンプレート名（TEMPLATESのキー）
+
+    Returns:
+        テンプレート
+    """
+    return Template(TEMPLATES[name])
+
+
+def _render(template_name: str, **values: Any) -> str:
+    return get_template(template_name).substitute(values)
+
+
+def _cell(value: Any) -> str:
+    # 表のセルで使えない文字を置き換える
+    text = str(value).replace("|", "｜").replace("\n", " ").strip()
+    return text or _MISSING
+
+
+def _format_number(value: float) -> str:
+    return f"{round(value, 4):g}"
+
+
+def _format_parameter(value: float, unit: str) -> str:
+    if unit == UNIT_YEN:
+        return f"{value:,.0f}"
+    if unit == UNIT_RATE:
+        return f"{value:.1%}"
+    return _format_number(value)
+
+
+def _component_rows(compiled: CompiledFormula) -> Tuple[str, Dict[str, Any]]:
+    components = compiled.definition.get("components") or {}
+    rows = []
+    weights = {}
+    for component in REQUIRED_COMPONENTS:
+        component_data = components.get(component) if isinstance(components.get(component), dict) else {}
+        weight = compiled.weights.get(component)
+        weights[component] = weight
+        rows.append(_render(
+            "component_row",
+            label=COMPONENT_LABELS[component],
+            component=component,
+            description=_cell(component_data.get("description", "")),
+            calculation=_cell(component_data.get("calculation", "")),
+            weight=_MISSING if weight is None else _format_number(weight),
+        ))
+    return "\n".join(rows), weights
+
+
+def _status(compiled: CompiledFormula) -> str:
+    return "妥当" if compiled.is_valid else f"要修正（{len(compiled.issues)}件）"
+
+
+class SegmentFormulaDoc:
+    """1セグメント分のフォーミュラのドキュメントです。"""
+
+    __slots__ = ("segment_id", "compiled", "markdown", "summary")
+
+    def __init__(self, segment_id: str, compiled: CompiledFormula, markdown: str, summary: Dict[str, Any]):
+        self.segment_id = segment_id
+        self.compiled = compiled
+        self.markdown = markdown
+        self.summary = summary
+
+
+@lru_cache(maxsize=256)
+def render_segment_formula(compiled: CompiledFormula, segment_id: str,
+                           adjustments: Optional[Tuple[Tuple[str, float], ...]] = None) -> SegmentFormulaDoc:
+    """コンパイル済みのフォーミュラから、1セグメント分のドキュメントを生成します。
+
+    コンパイル済みのフォーミュラは共有されるため、同じフォーミュラの節は生成済みのものを再利用します。
+
+    Args:
+        compiled: コンパイル済みのフォーミュラ
+        segment_id: セグメントID
+        adjustments: 表示する調整係数の (キー, 値) の組（省略時はフォーミュラのsegment_adjustments）
+
+    Returns:
+        セグメントのドキュメント
+    """
+    definition = compiled.definition
+    component_rows, weights = _component_rows(compiled)
+
+    parameters = {}
+    parameter_rows = []
+    for name, unit in SEGMENT_PARAMETER_UNITS.items():
+        value = compiled.segment_parameters.get(name)
+        parameters[name] = value
+        parameter_rows.append(_render(
+            "parameter_row",
+            label=PARAMETER_LABELS[name],
+            name=name,
+            value=_MISSING if value is None else _format_parameter(value, unit),
+            unit=unit,
+        ))
+
+    if adjustments is None and segment_id in compiled.segment_adjustments:
+        adjustments = tuple(sorted(compiled.adjustments_for(segment_id).items()))
+    adjustment_text = ""
+    if adjustments:
+        factors = dict(adjustments)
+        adjustment_text = _render("adjustments", factors=", ".join(
+            f"{key} × {_format_number(factors[key])}" for key in ADJUSTMENT_KEYS if key in factors
+        ))
+
+    justification = str(definition.get("adjustment_justification") or "").strip()
+    segment_name = str(definition.get("segment_name") or "").strip() or _MISSING
+    formula = str(compiled.base_formula or DEFAULT_BASE_FORMULA)
+
+    markdown = _render(
+        "segment",
+        segment_id=segment_id,
+        segment_name=segment_name,
+        formula=formula,
+        status=_status(compiled),
+        component_rows=component_rows,
+        parameter_rows="\n".join(parameter_rows),
+        adjustments=adjustment_text,
+        justification=_render("justification", justification=justification) if justification else "",
+    )
+    summary = {
+        "name": segment_name,
+        "formula": formula,
+        "component_weights": weights,
+        "segment_specific_parameters": parameters,
+        "adjustments": dict(adjustments) if adjustments else {},
+        "justification": justification,
+        "validation": compiled.to_validation_result(),
+    }
+    return SegmentFormulaDoc(segment_id, compiled, markdown, summary)
+
+
+def _segment_sort_key(segment_id: str) -> Tuple[int, Any]:
+    match = _SEGMENT_ID_PATTERN.match(segment_id)
+    return (0, int(match.group(1))) if match else (1, segment_id)
+
+
+def collect_segment_formulas(segment_formulas: SegmentFormulas) -> Dict[str, CompiledFormula]:
+    """セグメント別フォーミュラをセグメントID -> コンパイル済みのフォーミュラの辞書にまとめます。
+
+    customize_formulas_for_segmentsの出力（セグメントIDをキーとするJSON）、フォーミュラのリスト、
+    およびそれらを混在させたリストに対応します。セグメントIDはフォーミュラのsegment_id、辞書のキー、
+    リストの位置（s1, s2, ...）の順に決定し、結果はセグメントIDの順（s1, s2, ..., s10）に並べます。
+
+    Args:
+        segment_formulas: セグメント別フォーミュラ
+
+    Returns:
+        セグメントID -> コンパイル済みのフォーミュラ
+    """
+    collected: Dict[str, CompiledFormula] = {}
+
+    def add(formula: Any, fallback_id: str) -> None:
+        if isinstance(formula, CompiledFormula):
+            compiled = formula
+        else:
+            definition = parse_formula_text(formula)
+            if not definition:
+                return
+            if "base_formula" not in definition and "components" not in definition:
+                # セグメントIDをキーとするフォーミュラの辞書
+                for key, value in definition.items():
+                    add(value, str(key))
+                return
+            compiled = compile_formula(definition)
+        collected[str(compiled.segment_id or fallback_id)] = compiled
+
+    if isinstance(segment_formulas, (str, dict, CompiledFormula)):
+        add(segment_formulas, "s1")
+    else:
+        for index, formula in enumerate(segment_formulas or []):
+            add(formula, f"s{index + 1}")
+    return {segment_id: collected[segment_id] for segment_id in sorted(collected, key=_segment_sort_key)}
+
+
+def render_formula_documentation(
+    base_formula: Any,
+    segment_formulas: SegmentFormulas,
+    narrative: str = ""
+) -> Dict[str, Any]:
+    """フォーミュラ設計のドキュメントを生成します。
+
+    基本フォーミュラとすべてのセグメント別フォーミュラを一度だけコンパイルし、
+    同じ入力からは常に同じドキュメントを生成します。
+
+    Args:
+        base_formula: 基本フォーミュラ（design_evc_formulaの出力など）
+        segment_formulas: セグメント別フォーミュラ（形式はcollect_segment_formulasを参照）
+        narrative: 設計の概要（エージェントが記述する短い文章。空の場合は省略）
+
+    Returns:
+        design_process / segment_formulas / usage_guidelines と、Markdownのドキュメント（document）を含む辞書
+    """
+    base = compile_formula(base_formula)
+    if not base.definition and isinstance(base_formula, str) and base_formula.strip():
+        # 数式として解釈できない文字列は、そのまま基本フォーミュラとして表示する
+        base_text = base_formula.strip()
+    else:
+        base_text = str(base.base_formula or DEFAULT_BASE_FORMULA)
+    base_rows, _ = _component_rows(base)
+
+    docs: List[SegmentFormulaDoc] = []
+    for segment_id, compiled in collect_segment_formulas(segment_formulas).items():
+        # セグメント別フォーミュラに調整係数がなければ、基本フォーミュラの調整係数を表示する
+        adjustments = None
+        if segment_id not in compiled.segment_adjustments and segment_id in base.segment_adjustments:
+            adjustments = tuple(sorted(base.adjustments_for(segment_id).items()))
+        docs.append(render_segment_formula(compiled, segment_id, adjustments))
+
+    validation_rows = [
+        _render(
+            "validation_row",
+            segment_id=doc.segment_id,
+            status=_status(doc.compiled),
+            issues=_cell(" / ".join(doc.compiled.issues)),
+            recommendations=_cell(" / ".join(doc.compiled.recommendations)),
+        )
+        for doc in docs
+    ]
+    narrative = (narrative or "").strip()
+
+    document = _render(
+        "document",
+        formula=base_text,
+        base_justification=BASE_FORMULA_JUSTIFICATION,
+        component_rows=base_rows,
+        narrative=_render("narrative", narrative=narrative) if narrative else "",
+        customization_approach=CUSTOMIZATION_APPROACH,
+        segments="\n".join(doc.markdown for doc in docs),
+        validation_approach=VALIDATION_APPROACH,
+        validation_rows="\n".join(validation_rows) or _render(
+            "validation_row", segment_id=_MISSING, status=_MISSING, issues=_MISSING, recommendations=_MISSING
+        ),
+        **USAGE_GUIDELINES,
+    )
+
+    return {
+        "design_process": {
+            "base_formula": {
+                "formula": base_text,
+                "components": base.definition.get("components", {}),
+                "justification": BASE_FORMULA_JUSTIFICATION,
+            },
+            "segment_customization": {
+                "approach": CUSTOMIZATION_APPROACH,
+                "key_considerations": list(CUSTOMIZATION_CONSIDERATIONS),
+            },
+            "validation": {
+                "approach": VALIDATION_APPROACH,
+                "issues_addressed": [issue for doc in docs for issue in doc.compiled.issues],
+                "recommendations_applied": [rec for doc in docs for rec in doc.compiled.recommendations],
+            },
+            "narrative": narrative,
+        },
+        # 生成済みの節は共有されるため、呼び出し元には複製を返す
+        "segment_formulas": {doc.segment_id: copy.deepcopy(doc.summary) for doc in docs},
+        "usage_guidelines": dict(USAGE_GUIDELINES),
+        "document": document,
+    }
@@ -0,0 +1,280 @@
+"""
+NexaSales顧客セグメンテーションシステムのセグメントパラメータ表
+
+このモジュールでは、セグメント特性から推定するパラメータ（年間売上、初期コストなど）の既定値を、
+(セグメントタイプ, 業種, 企業規模帯) をキーとする宣言的な表で定義します。
+業種と企業規模帯は省略可能で、省略した行はそのセグメントタイプ全体の既定値になります。
+
+表は一度だけ読み込み、キーごとに行を重ねた結果を保持するため、参照は辞書の検索1回で完了します。
+データファイル（JSONまたはCSV）で行を追加・上書きできるため、セグメントの分類が増えてもコードを変更する必要はありません。
+環境変数 PARAMETER_TABLE_FILES にファイルのパスを指定すると（複数指定は os.pathsep 区切り）、
+get_parameter_tableが返す表に読み込まれます。
+
+JSONの例:
+    [{"segment_type": "high_value_low_barrier", "industry": "manufacturing", "parameters": {"annual_revenue": 2000000000}}]
+
+CSVの例（空欄の列は上書きしない）:
+    segment_type,industry,size_band,annual_revenue,initial_cost
+    high_value_low_barrier,manufacturing,,2000000000,
+"""
+
+import csv
+import json
+import os
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from models.models import SegmentType
+from utils.japanese_numbers import parse_japanese_number
+from utils.utils import DataValidationError
+
+# 上書きファイルのパスを指定する環境変数
+PARAMETER_TABLE_FILES_ENV = "PARAMETER_TABLE_FILES"
+
+# (セグメントタイプ, 業種, 企業規模帯)。業種・企業規模帯のNoneはすべてに一致する
+TableKey = Tuple[str, Optional[str], Optional[str]]
+
+# 組み込みのパラメータ表（セグメントタイプごとの既定値）
+DEFAULT_PARAMETER_ROWS: Dict[TableKey, Dict[str, Any]] = {
+    # 大企業・高価値
+    (SegmentType.HIGH_VALUE_LOW_BARRIER.value, None, None): {
+        "annual_revenue": 1000000000,
+        "annual_cost": 500000000,
+        "revenue_increase_rate": 0.05,
+        "cost_reduction_rate": 0.15,
+        "reference_price": 15000,
+        "initial_cost": 500000,
+        "operation_cost": 10000,
+        "implementation_years": 3,
+    },
+    # 大企業・低価値
+    (SegmentType.LOW_VALUE_LOW_BARRIER.value, None, None): {
+        "annual_revenue": 800000000,
+        "annual_cost": 400000000,
+        "revenue_increase_rate": 0.03,
+        "cost_reduction_rate": 0.20,
+        "reference_price": 15000,
+        "initial_cost": 400000,
+        "operation_cost": 8000,
+        "implementation_years": 3,
+    },
+    # 中小企業・高価値
+    (SegmentType.HIGH_VALUE_HIGH_BARRIER.value, None, None): {
+        "annual_revenue": 200000000,
+        "annual_cost": 100000000,
+        "revenue_increase_rate": 0.08,
+        "cost_reduction_rate": 0.12,
+        "reference_price": 15000,
+        "initial_cost": 200000,
+        "operation_cost": 5000,
+        "implementation_years": 3,
+    },
+    # 中小企業・低価値
+    (SegmentType.LOW_VALUE_HIGH_BARRIER.value, None, None): {
+        "annual_revenue": 50000000,
+        "annual_cost": 25000000,
+        "revenue_increase_rate": 0.02,
+        "cost_reduction_rate": 0.10,
+        "reference_price": 15000,
+        "initial_cost": 100000,
+        "operation_cost": 3000,
+        "implementation_years": 3,
+    },
+}
+
+_KEY_COLUMNS = ("segment_type", "industry", "size_band")
+
+
+def segment_type_for(is_enterprise: bool, is_high_value: bool) -> str:
+    """企業規模と価値の区分からセグメントタイプを決定します。
+
+    Args:
+        is_enterprise: 大企業かどうか
+        is_high_value: 高価値セグメントかどうか
+
+    Returns:
+        セグメントタイプ（SegmentTypeの値）
+    """
+    if is_high_value:
+        segment_type = SegmentType.HIGH_VALUE_LOW_BARRIER if is_enterprise else SegmentType.HIGH_VALUE_HIGH_BARRIER
+    else:
+        segment_type = SegmentType.LOW_VALUE_LOW_BARRIER if is_enterprise else SegmentType.LOW_VALUE_HIGH_BARRIER
+    return segment_type.value
+
+
+def classify_segment_id(segment_id: str) -> Tuple[bool, bool]:
+    """セグメントIDから企業規模と価値の区分を判定します。
+
+    s1, s2 は大企業、s1, s3 は高価値とみなします（s5以降も同じ規則）。
+    「大企業・高価値」のような日本語のIDは、含まれる語で判定します。
+
+    Args:
+        segment_id: セグメントID
+
+    Returns:
+        (大企業かどうか, 高価値かどうか)
+    """
+    if segment_id.startswith("s") and segment_id[1:].isdigit():
+        segment_num = int(segment_id[1:])
+        return segment_num <= 2, segment_num % 2 == 1
+    return "大企業" in segment_id, "高価値" in segment_id
+
+
+def _normalize_key_part(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+class ParameterTable:
+    """(セグメントタイプ, 業種, 企業規模帯) をキーとするパラメータ表です。
+
+    参照時は、セグメントタイプの既定値、業種の行、企業規模帯の行、業種と企業規模帯の両方を指定した行の順に重ねます。
+    重ねた結果はキーごとに保持するため、同じキーの2回目以降の参照は辞書の検索1回で完了します。
+    """
+
+    def __init__(self, rows: Optional[Dict[TableKey, Dict[str, Any]]] = None):
+        """
+        パラメータ表を初期化します。
+
+        Args:
+            rows: キー -> パラメータの辞書（省略時は組み込みのパラメータ表）
+        """
+        self._rows: Dict[TableKey, Dict[str, Any]] = {}
+        self._resolved: Dict[TableKey, Dict[str, Any]] = {}
+        for key, parameters in (DEFAULT_PARAMETER_ROWS if rows is None else rows).items():
+            self.set_row(key[0], parameters, key[1], key[2])
+
+    def set_row(self, segment_type: str, parameters: Dict[str, Any],
+                industry: Optional[str] = None, size_band: Optional[str] = None) -> None:
+        """行を追加します（同じキーの行があればパラメータを上書きします）。
+
+        Args:
+            segment_type: セグメントタイプ
+            parameters: パラメータ名 -> 値
+            industry: 業種（省略時はすべての業種）
+            size_band: 企業規模帯（省略時はすべての規模帯）
+
+        Raises:
+            DataValidationError: セグメントタイプが空、またはパラメータが辞書でない場合
+        """
+        segment_type = _normalize_key_part(segment_type)
+        if segment_type is None:
+            raise DataValidationError("パラメータ表の行にはsegment_typeが必要です")
+        if not isinstance(parameters, dict):
+            raise DataValidationError(f"パラメータ表の行 {segment_type} のparametersはオブジェクトである必要があります")
+        key = (segment_type, _normalize_key_part(industry), _normalize_key_part(size_band))
+        self._rows.setdefault(key, {}).update(parameters)
+        self._resolved.clear()
+
+    def lookup(self, segment_type: str, industry: Optional[str] = None,
+               size_band: Optional[str] = None) -> Dict[str, Any]:
+        """キーに対応するパラメータを返します。
+
+        返す辞書は表の内部で共有されるため、変更する場合は複製してください。
+
+        Args:
+            segment_type: セグメントタイプ
+            industry: 業種
+            size_band: 企業規模帯
+
+        Returns:
+            パラメータ名 -> 値（該当する行がない場合は空の辞書）
+        """
+        key = (segment_type, _normalize_key_part(industry), _normalize_key_part(size_band))
+        resolved = self._resolved.get(key)
+        if resolved is None:
+            segment_type, industry, size_band = key
+            resolved = {}
+            for row_key in (
+                (segment_type, None, None),
+                (segment_type, industry, None),
+                (segment_type, None, size_band),
+                (segment_type, industry, size_band),
+            ):
+                resolved.update(self._rows.get(row_key, {}))
+            self._resolved[key] = resolved
+        return resolved
+
+    def get(self, segment_type: str, parameter_name: str, industry: Optional[str] = None,
+            size_band: Optional[str] = None, default: Any = None) -> Any:
+        """キーに対応するパラメータの値を1つ返します。
+
+        Args:
+            segment_type: セグメントタイプ
+            parameter_name: パラメータ名
+            industry: 業種
+            size_band: 企業規模帯
+            default: 該当する値がない場合の値
+
+        Returns:
+            パラメータの値
+        """
+        return self.lookup(segment_type, industry, size_band).get(parameter_name, default)
+
+    def load_rows(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """{"segment_type", "industry", "size_band", "parameters"} 形式の行をまとめて追加します。
+
+        Args:
+            rows: 行のリスト
+
+        Raises:
+            DataValidationError: 行の形式が不正な場合
+        """
+        for row in rows:
+            if not isinstance(row, dict):
+                raise DataValidationError("パラメータ表の行はオブジェクトである必要があります")
+            self.set_row(row.get("segment_type"), row.get("parameters"), row.get("industry"), row.get("size_band"))
+
+    def load_file(self, path: str) -> None:
+        """データファイル（JSONまたはCSV）の行を追加します。
+
+        Args:
+            path: ファイルのパス（拡張子が .csv の場合はCSV、それ以外はJSON）
+
+        Raises:
+            DataValidationError: ファイルを読み込めない、または形式が不正な場合
+        """
+        try:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                if path.lower().endswith(".csv"):
+                    rows = _read_csv_rows(f)
+                else:
+                    data = json.load(f)
+                    rows = data.get("rows", []) if isinstance(data, dict) else data
+        except (OSError, json.JSONDecodeError, csv.Error) as e:
+            raise DataValidationError(f"パラメータ表のファイルを読み込めません: {path}: {e}")
+        if not isinstance(rows, list):
+            raise DataValidationError(f"パラメータ表のファイルの形式が不正です: {path}")
+        self.load_rows(rows)
+
+
+def _read_csv_rows(f) -> List[Dict[str, Any]]:
+    rows = []
+    for record in csv.DictReader(f):
+        parameters = {}
+        for name, raw in record.items():
+            if name in _KEY_COLUMNS or name is None or raw is None or not raw.strip():
+                continue
+            value = parse_japanese_number(raw.strip())
+            if value is None:
+                raise DataValidationError(f"パラメータ表のCSVの値 {name}={raw} は数値である必要があります")
+            parameters[name] = int(value) if value.is_integer() else value
+        rows.append({**{column: record.get(column) for column in _KEY_COLUMNS}, "parameters": parameters})
+    return rows
+
+
+@lru_cache(maxsize=1)
+def get_parameter_table() -> ParameterTable:
+    """組み込みのパラメータ表に、PARAMETER_TABLE_FILESで指定されたファイルの行を重ねた表を返します。
+
+    表はプロセス内で一度だけ読み込みます。
+
+    Returns:
+        パラメータ表
+    """
+    table = ParameterTable()
+    for path in filter(None, os.environ.get(PARAMETER_TABLE_FILES_ENV, "").split(os.pathsep)):
+        table.load_file(path)
+    return table
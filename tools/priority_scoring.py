@@ -0,0 +1,98 @@
+"""
+NexaSales顧客セグメンテーションシステムの優先度スコア計算
+
+このモジュールでは、優先度評価エージェントとシナリオスイープで共有する優先度スコアの重みとランク区分、
+およびスコアの計算関数を定義します。計算関数はスカラーだけでなく、
+先頭の軸をセグメントとするNumPy配列（セグメント数, シナリオ数）でも評価できます。
+"""
+
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+# 優先度スコアの計算パラメータ
+PRIORITY_WEIGHTS = {
+    "evc_value": 0.4,                # EVC値の重み
+    "market_size": 0.2,              # 市場規模の重み
+    "acquisition_probability": 0.3,  # 獲得確率の重み
+    "growth_potential": 0.1          # 成長ポテンシャルの重み
+}
+
+# 成長率がこの値以上のセグメントの成長ポテンシャルを1とする
+GROWTH_RATE_CAP = 0.1
+
+# 優先度ランク（スコアの下限, ランク名）。上から順に判定する
+PRIORITY_RANKS = (
+    (0.8, "最優先"),
+    (0.6, "高優先"),
+    (0.4, "中優先"),
+    (0.2, "低優先"),
+    (float("-inf"), "最低優先"),
+)
+
+
+def priority_rank(priority_score: float) -> str:
+    """優先度スコアからランク名を決定します。
+
+    Args:
+        priority_score: 優先度スコア
+
+    Returns:
+        優先度ランク
+    """
+    for threshold, rank in PRIORITY_RANKS:
+        if priority_score >= threshold:
+            return rank
+    return PRIORITY_RANKS[-1][1]
+
+
+def normalize_growth(growth_rate: Any) -> Any:
+    """成長率を成長ポテンシャル（0〜1）に正規化します。
+
+    Args:
+        growth_rate: 市場成長率（スカラーまたは配列）
+
+    Returns:
+        正規化した成長ポテンシャル
+    """
+    return np.minimum(np.asarray(growth_rate, dtype=float) / GROWTH_RATE_CAP, 1.0)
+
+
+def score_priorities(
+    evc_value: Any,
+    market_size: Any,
+    acquisition_probability: Any,
+    growth_rate: Any,
+    weights: Optional[Dict[str, float]] = None
+) -> np.ndarray:
+    """セグメント間で正規化した優先度スコアを計算します。
+
+    EVC値と市場規模はセグメント間の最大値で正規化し（最大値が0以下の場合は0）、
+    獲得確率は0〜1の値をそのまま使用します。
+
+    Args:
+        evc_value: EVC値（先頭の軸がセグメント）
+        market_size: 市場規模
+        acquisition_probability: 獲得確率（0〜1）
+        growth_rate: 市場成長率
+        weights: 指標の重み（省略時はPRIORITY_WEIGHTS）
+
+    Returns:
+        優先度スコア（evc_valueと同じ形状）
+    """
+    weights = weights or PRIORITY_WEIGHTS
+    evc_value = np.asarray(evc_value, dtype=float)
+    shape = evc_value.shape
+
+    def normalize_by_max(values: Any) -> np.ndarray:
+        values = np.broadcast_to(np.asarray(values, dtype=float), shape)
+        maximum = values.max(axis=0, keepdims=True)
+        safe_maximum = np.where(maximum > 0, maximum, 1.0)
+        return np.where(maximum > 0, values / safe_maximum, 0.0)
+
+    return (
+        weights["evc_value"] * normalize_by_max(evc_value)
+        + weights["market_size"] * normalize_by_max(market_size)
+        + weights["acquisition_probability"] * np.broadcast_to(np.asarray(acquisition_probability, dtype=float), shape)
+        + weights["growth_potential"] * np.broadcast_to(normalize_growth(growth_rate), shape)
+    )
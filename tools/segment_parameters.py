@@ -0,0 +1,274 @@
+"""
+NexaSales顧客セグメンテーションシステムのセグメント別パラメータ形式
+
+このモジュールでは、calculate_all_segment_evcが受け取るセグメント別パラメータの形式と、その解析関数を定義します。
+どの形式も入力を先頭から1回だけ走査して解析し、解析結果はスキーマ検査を通した
+セグメントID -> パラメータ辞書 の形で返します。
+
+対応する形式:
+
+1. JSON形式（推奨）
+    {"common": {"reference_price": 15000, ...},
+     "s1": {"new_customers": 10, ...},
+     "s2": {"new_customers": 5, ...}}
+   "common" は全セグメント共通のパラメータで、各セグメントの値で上書きされます。
+
+2. 表形式（1行目が見出し、1列目がセグメントID。区切りは "|" またはタブ。Markdownの表も可）
+    segment_id | reference_price | new_customers
+    s1         | 15000           | 10
+    s2         | 12000           | 5
+
+3. 従来形式（値の引用符は省略可）
+    s1: 'reference_price: 15000, new_customers: 10', s2: 'reference_price: 12000'
+
+どの形式でも、評価計画のスロットとして数値を受け取るパラメータ（reference_price など）の文字列の値は
+「15000」「1,000,000」「1.5億円」「25%」のような数値表現を数値に変換し、数値として解釈できない場合はエラーにします。
+"""
+
+import json
+import logging
+import re
+from typing import Any, Dict, List
+
+from tools.evc_engine import list_numeric_parameters
+from utils.japanese_numbers import KIND_PERCENT, extract_numbers
+from utils.utils import DataValidationError
+
+COMMON_KEY = "common"
+
+_SEGMENT_ID_PATTERN = re.compile(r"^s\d+$")
+_PARAMETER_NAME_PATTERN = re.compile(r"^[^\W\d]\w*$")
+# "key: value" 形式のパラメータ名（値に含まれる桁区切りのカンマの後ろは数字のため、パラメータ名とは区別される）
+_KEY_PATTERN = re.compile(r"(?:^|,)\s*([^\W\d]\w*)\s*[:：]")
+# 従来形式のセグメントIDの位置
+_LEGACY_SEGMENT_PATTERN = re.compile(r"(?:^|[,\n])\s*(s\d+)\s*[:：]")
+
+logger = logging.getLogger(__name__)
+
+
+def _convert_scalar(value: str) -> Any:
+    # 全体が1つの数値表現（桁区切り・日本語の単位・割合を含む）の値は数値に変換し、それ以外は文字列のまま返す
+    text = value.strip().strip("'\"").strip()
+    tokens = extract_numbers(text)
+    if len(tokens) != 1 or tokens[0].start != 0 or tokens[0].end != len(text):
+        return text
+    token = tokens[0]
+    if token.kind != KIND_PERCENT and token.value.is_integer() and "." not in token.raw:
+        return int(token.value)
+    return token.value
+
+
+def _parse_key_values(text: str) -> Dict[str, Any]:
+    # "key: value, key: value" 形式のパラメータ文字列を解析する
+    # 値は次のパラメータ名までとするため、"1,000,000" のような桁区切りのカンマでは分割しない
+    matches = list(_KEY_PATTERN.finditer(text))
+    params = {}
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+        params[match.group(1)] = _convert_scalar(text[match.end():end])
+    return params
+
+
+def _parse_json(text: str) -> Dict[str, Dict[str, Any]]:
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise DataValidationError(f"セグメント別パラメータのJSON解析に失敗しました: {e}")
+    return _parse_object(data)
+
+
+def _parse_object(data: Any) -> Dict[str, Dict[str, Any]]:
+    if not isinstance(data, dict):
+        raise DataValidationError("セグメント別パラメータのJSONはオブジェクトである必要があります")
+
+    common = data.get(COMMON_KEY) or {}
+    if not isinstance(common, dict):
+        raise DataValidationError("commonはオブジェクトである必要があります")
+
+    segments = {}
+    for segment_id, params in data.items():
+        if segment_id == COMMON_KEY:
+            continue
+        if isinstance(params, str):
+            params = _parse_key_values(params)
+        if not isinstance(params, dict):
+            raise DataValidationError(f"セグメント {segment_id} のパラメータはオブジェクトである必要があります")
+        segments[segment_id] = {**common, **params}
+    return segments
+
+
+def _parse_table(lines: List[str]) -> Dict[str, Dict[str, Any]]:
+    delimiter = "|" if "|" in lines[0] else "\t"
+
+    def split_row(line: str, width: int) -> List[str]:
+        cells = [cell.strip() for cell in line.strip(" \r\n").split(delimiter)]
+        # Markdownの表の先頭の "|" による空のセルと、見出しの列数を超える末尾の空のセルを取り除く
+        if delimiter == "|" and len(cells) > 1 and cells[0] == "":
+            cells = cells[1:]
+        while len(cells) > width and cells[-1] == "":
+            cells.pop()
+        return cells
+
+    header = split_row(lines[0], 1)
+    names = header[1:]
+    segments = {}
+    for line in lines[1:]:
+        cells = split_row(line, len(header))
+        # Markdownの区切り行は読み飛ばす
+        if all(set(cell) <= set("-: ") for cell in cells):
+            continue
+        if len(cells) != len(header):
+            raise DataValidationError(
+                f"表形式の行の列数が見出しと一致しません（見出し {len(header)} 列, 行 {len(cells)} 列）: {line.strip()}"
+            )
+        segment_id = cells[0]
+        if segment_id in segments:
+            raise DataValidationError(f"セグメント {segment_id} が重複しています")
+        segments[segment_id] = {
+            name: _convert_scalar(cell) for name, cell in zip(names, cells[1:]) if cell != ""
+        }
+    return segments
+
+
+def _parse_legacy(text: str) -> Dict[str, Dict[str, Any]]:
+    # セグメントIDの位置で区切り、次のセグメントIDまでをそのセグメントのパラメータ文字列とする
+    matches = list(_LEGACY_SEGMENT_PATTERN.finditer(text))
+    segments = {}
+    for index, match in enumerate(matches):
+        segment_id = match.group(1)
+        if segment_id in segments:
+            raise DataValidationError(f"セグメント {segment_id} が重複しています")
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+        segments[segment_id] = _parse_key_values(text[match.end():end].strip().strip("'\"").strip())
+    if not segments:
+        # セグメントIDを判別できない場合は、デフォルトのセグメントで計算できるよう空の結果を返す
+        logger.warning(f"セグメント別パラメータからセグメントIDを判別できません: {text[:50]}")
+    return segments
+
+
+def coerce_numeric_value(name: str, value: Any, segment_id: str = "") -> Any:
+    """数値のパラメータの値を、calculate_evcのパラメータ解析と同じ規則で数値に変換します。
+
+    「15000」「1,000,000」「1.5億円」「25%」のような文字列は数値に変換し、数値とNoneはそのまま返します。
+
+    Args:
+        name: エラーメッセージに表示するパラメータ名
+        value: パラメータの値
+        segment_id: エラーメッセージに表示するセグメントID
+
+    Returns:
+        変換した値
+
+    Raises:
+        DataValidationError: 値が数値として解釈できない場合
+    """
+    if value is None or (isinstance(value, (int, float)) and not isinstance(value, bool)):
+        return value
+    converted = _convert_scalar(value) if isinstance(value, str) else value
+    if isinstance(converted, str) or not isinstance(converted, (int, float)) or isinstance(converted, bool):
+        raise DataValidationError(f"セグメント {segment_id} のパラメータ {name} は数値である必要があります: {value}")
+    return converted
+
+
+def _validate_parameters(segment_id: str, params: Dict[str, Any], numeric_names: frozenset) -> Dict[str, Any]:
+    # パラメータ名と値の型を検査し、数値のパラメータの文字列の値を数値に変換する
+    validated = {}
+    for name, value in params.items():
+        if not _PARAMETER_NAME_PATTERN.match(name):
+            raise DataValidationError(f"セグメント {segment_id} のパラメータ名 {name} が不正です")
+        if value is not None and not isinstance(value, (int, float, str, list, dict)):
+            raise DataValidationError(f"セグメント {segment_id} のパラメータ {name} の値の型が不正です")
+        if name in numeric_names and isinstance(value, str):
+            value = coerce_numeric_value(name, value, segment_id)
+        validated[name] = value
+    return validated
+
+
+def validate_segment_parameters(segments: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """セグメント別パラメータのスキーマを検査します。
+
+    数値のパラメータに文字列で指定された値は、数値表現を解釈して数値に変換します。
+
+    Args:
+        segments: セグメントID -> パラメータ辞書
+
+    Returns:
+        検査済みのセグメント別パラメータ（数値のパラメータは数値に変換済み）
+
+    Raises:
+        DataValidationError: セグメントIDやパラメータ名・値が不正な場合
+    """
+    numeric_names = list_numeric_parameters()
+    validated = {}
+    for segment_id, params in segments.items():
+        if not _SEGMENT_ID_PATTERN.match(segment_id):
+            raise DataValidationError(f"セグメントID {segment_id} は s1, s2, ... の形式である必要があります")
+        validated[segment_id] = _validate_parameters(segment_id, params, numeric_names)
+    return validated
+
+
+def parse_parameters(parameters: Any, segment_id: str = "") -> Dict[str, Any]:
+    """1つのセグメントのパラメータを解析します。
+
+    JSON形式（シングルクォートのJSONも可）または "key: value, key: value" 形式の文字列、あるいは辞書を受け取ります。
+
+    Args:
+        parameters: パラメータ（文字列または辞書）
+        segment_id: エラーメッセージに表示するセグメントID
+
+    Returns:
+        検査済みのパラメータ辞書
+
+    Raises:
+        DataValidationError: 形式やスキーマが不正な場合
+    """
+    if isinstance(parameters, str):
+        text = parameters.strip()
+        if text.startswith("{") and text.endswith("}"):
+            try:
+                parameters = json.loads(text)
+            except json.JSONDecodeError:
+                # シングルクォートをダブルクォートに変換して再度解析する
+                try:
+                    parameters = json.loads(text.replace("'", "\"").replace("\n", " "))
+                except json.JSONDecodeError as e:
+                    raise DataValidationError(f"パラメータのJSON解析に失敗しました: {e}")
+        else:
+            parameters = _parse_key_values(text)
+    if not isinstance(parameters, dict):
+        raise DataValidationError("パラメータは文字列またはオブジェクトである必要があります")
+    return _validate_parameters(segment_id, parameters, list_numeric_parameters())
+
+
+def parse_segment_parameters(segment_parameters: Any) -> Dict[str, Dict[str, Any]]:
+    """セグメント別パラメータを解析します。
+
+    JSON形式・表形式・従来形式のいずれかを先頭の文字から判定し、入力を1回だけ走査して解析します。
+
+    Args:
+        segment_parameters: セグメント別パラメータ（文字列または辞書）
+
+    Returns:
+        セグメントID -> パラメータ辞書（入力の順序を保持）
+
+    Raises:
+        DataValidationError: 形式やスキーマが不正な場合
+    """
+    if isinstance(segment_parameters, dict):
+        return validate_segment_parameters(_parse_object(segment_parameters))
+    if not isinstance(segment_parameters, str):
+        raise DataValidationError("セグメント別パラメータは文字列または辞書である必要があります")
+
+    text = segment_parameters.strip()
+    if not text:
+        return {}
+    if text.startswith("{"):
+        segments = _parse_json(text)
+    else:
+        lines = [line for line in text.splitlines() if line.strip()]
+        first_cell = re.split(r"[|\t]", lines[0].strip().strip("|"), 1)[0].strip()
+        if len(lines) > 1 and ("|" in lines[0] or "\t" in lines[0]) and not _SEGMENT_ID_PATTERN.match(first_cell):
+            segments = _parse_table(lines)
+        else:
+            segments = _parse_legacy(text)
+    return validate_segment_parameters(segments)
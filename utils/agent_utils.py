@@ -12,6 +12,7 @@ import os
 
 # OpenAI Agents SDKのインポート
 from agents import Runner, Agent, RunConfig, gen_trace_id
+from utils.concurrency import classify_exception, retry_after_seconds
 
 # ロガーの設定
 logger = logging.getLogger(__name__)
@@ -118,10 +119,17 @@ async def call_agent(agent: Any, message: str, context: Optional[Dict[str, Any]]
         logger.error(f"エージェント呼び出し中にエラーが発生しました: {e}")
         traceback.print_exc()
         
-        return {
+        error = {
             "error": str(e),
+            # 同時実行制御がレート制限・タイムアウトを判別できるようにエラー種別を付与
+            "error_type": classify_exception(e),
             "result": "エージェントの実行中にエラーが発生しました"
         }
+        # 再試行までの待ち時間の指定があれば、同時実行制御のバックオフで使用する
+        retry_after = retry_after_seconds(e)
+        if retry_after is not None:
+            error["retry_after"] = retry_after
+        return error
 
 
 
@@ -0,0 +1,420 @@
+"""
+適応型同時実行制御
+
+このモジュールでは、エージェント呼び出しの同時実行数をAIMD（加算増加・乗算減少）方式で
+動的に調整するコントローラーを提供します。
+レイテンシとエラー率が健全な間は同時実行数を徐々に増やし、
+レート制限（429）やタイムアウトを検知した場合は同時実行数を即座に削減します。
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+# 呼び出し結果の分類
+OUTCOME_OK = "ok"
+OUTCOME_RATE_LIMITED = "rate_limited"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_ERROR = "error"
+
+# エラーメッセージから分類するためのキーワード（小文字で比較）
+RATE_LIMIT_MARKERS = ("429", "rate limit", "rate_limit", "ratelimit", "too many requests")
+TIMEOUT_MARKERS = ("timeout", "timed out", "タイムアウト")
+
+
+def classify_exception(error: BaseException) -> str:
+    """例外をAIMD制御用の分類に変換します。
+
+    Args:
+        error: 発生した例外
+
+    Returns:
+        分類結果（"rate_limited" / "timeout" / "error"）
+    """
+    if isinstance(error, asyncio.TimeoutError):
+        return OUTCOME_TIMEOUT
+
+    # OpenAI SDKの例外は型名とメッセージの両方から判定する
+    error_name = error.__class__.__name__.lower()
+    if "ratelimit" in error_name or getattr(error, "status_code", None) == 429:
+        return OUTCOME_RATE_LIMITED
+    if "timeout" in error_name:
+        return OUTCOME_TIMEOUT
+
+    return classify_error_message(str(error))
+
+
+def classify_error_message(message: str) -> str:
+    """エラーメッセージをAIMD制御用の分類に変換します。
+
+    Args:
+        message: エラーメッセージ
+
+    Returns:
+        分類結果（"rate_limited" / "timeout" / "error"）
+    """
+    lowered = (message or "").lower()
+    if any(marker in lowered for marker in RATE_LIMIT_MARKERS):
+        return OUTCOME_RATE_LIMITED
+    if any(marker in lowered for marker in TIMEOUT_MARKERS):
+        return OUTCOME_TIMEOUT
+    return OUTCOME_ERROR
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """例外から再試行までの待ち時間（Retry-After）を取り出します。
+
+    OpenAI SDKの例外は応答ヘッダー（retry-after-ms / retry-after）から、
+    それ以外の例外はretry_after属性から取り出します。
+
+    Args:
+        error: 発生した例外
+
+    Returns:
+        待ち時間（秒）。指定がない、または秒数として解釈できない場合はNone
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    candidates = []
+    if headers is not None:
+        # 一方のヘッダーが不正でも、もう一方の値は使用できるようヘッダーごとに解釈する
+        try:
+            milliseconds = headers.get("retry-after-ms")
+            if milliseconds is not None:
+                candidates.append(float(milliseconds) / 1000)
+        except (AttributeError, TypeError, ValueError):
+            pass
+        try:
+            candidates.append(headers.get("retry-after"))
+        except (AttributeError, TypeError):
+            pass
+    candidates.append(getattr(error, "retry_after", None))
+    for candidate in candidates:
+        try:
+            seconds = float(candidate)
+        except (TypeError, ValueError):
+            # HTTP日付形式などの秒数でない値は使用しない
+            continue
+        if seconds >= 0:
+            return seconds
+    return None
+
+
+def classify_agent_result(result: Any) -> str:
+    """call_agentの戻り値を分類します。
+
+    call_agentは例外を送出せず、エラー時には"error"キーを持つ辞書を返すため、
+    その内容（"error_type"があれば優先）から呼び出し結果を判定します。
+
+    Args:
+        result: call_agentの戻り値
+
+    Returns:
+        分類結果（"ok" / "rate_limited" / "timeout" / "error"）
+    """
+    if not isinstance(result, dict) or not result.get("error"):
+        return OUTCOME_OK
+    error_type = result.get("error_type")
+    if error_type in (OUTCOME_RATE_LIMITED, OUTCOME_TIMEOUT, OUTCOME_ERROR):
+        return error_type
+    return classify_error_message(str(result["error"]))
+
+
+class AdaptiveConcurrencyController:
+    """AIMD方式でエージェント呼び出しの同時実行数を調整するコントローラーです。
+
+    - 成功が現在の上限回数分続き、レイテンシとエラー率が健全であれば上限を1増やします（加算増加）
+    - レート制限・タイムアウト、または目標の2倍を超えるレイテンシを検知すると上限を乗算で削減します（乗算減少）
+    - 削減は「世代」単位で1回のみ行い、同じ混雑で発生した後続エラーによる連続削減を防ぎます
+    - レート制限・タイムアウトの再試行は、Retry-Afterの指定があればその時間、なければジッター付きの
+      指数バックオフの時間だけ待ってから実行枠を取得し直します
+
+    複数のワークフローで1つのインスタンスを共有することで、プロセス全体の同時実行数を制御できます。
+    対話的な呼び出しは、待機中の非対話的な呼び出しより先に実行枠を取得します。ただし非対話的な呼び出しが
+    待機している間に対話的な呼び出しへ max_interactive_streak 回続けて実行枠を渡すと、次の空き枠は
+    非対話的な呼び出しに渡し、対話的な呼び出しが続いても非対話的な呼び出しが実行されないままにならないようにします。
+    また reserved_interactive を指定すると、非対話的な呼び出しはその数の実行枠を使用できず、
+    対話的な呼び出し用に常に空きが残ります。
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        decrease_factor: float = 0.5,
+        latency_target: float = 60.0,
+        error_rate_threshold: float = 0.2,
+        window_size: int = 20,
+        max_retries: int = 2,
+        reserved_interactive: int = 0,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        max_interactive_streak: int = 8
+    ):
+        """
+        コントローラーを初期化します。
+
+        Args:
+            initial_limit: 初期の同時実行上限
+            min_limit: 同時実行上限の下限
+            max_limit: 同時実行上限の上限
+            decrease_factor: 混雑検知時に上限へ掛ける係数（0〜1）
+            latency_target: 健全とみなすレイテンシの目標値（秒）
+            error_rate_threshold: 上限を増やさないエラー率の閾値
+            window_size: エラー率・レイテンシを集計する直近の呼び出し数
+            max_retries: レート制限・タイムアウト時の再試行回数
+            reserved_interactive: 対話的な呼び出し専用に予約する実行枠の数
+            backoff_base: 再試行の待ち時間の基準値（秒）。n回目の再試行は0〜backoff_base × 2^(n-1)秒の範囲で待つ
+            backoff_max: バックオフによる待ち時間の上限（秒）
+            max_interactive_streak: 非対話的な呼び出しの待機中に、対話的な呼び出しへ続けて実行枠を渡す回数の上限
+        """
+        if not 0 < decrease_factor < 1:
+            raise ValueError("decrease_factorは0より大きく1未満である必要があります")
+        if min_limit < 1 or max_limit < min_limit:
+            raise ValueError("min_limitとmax_limitの指定が不正です")
+        if reserved_interactive < 0:
+            raise ValueError("reserved_interactiveは0以上である必要があります")
+        if backoff_base < 0 or backoff_max < 0:
+            raise ValueError("backoff_baseとbackoff_maxは0以上である必要があります")
+        if max_interactive_streak < 1:
+            raise ValueError("max_interactive_streakは1以上である必要があります")
+
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.error_rate_threshold = error_rate_threshold
+        self.max_retries = max_retries
+        self.reserved_interactive = reserved_interactive
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_interactive_streak = max_interactive_streak
+
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._in_flight = 0
+        self._interactive_waiting = 0
+        self._bulk_waiting = 0
+        self._interactive_streak = 0
+        self._epoch = 0
+        self._successes_since_change = 0
+        self._window = deque(maxlen=window_size)
+        self._condition: Optional[asyncio.Condition] = None
+
+        # メトリクス用カウンター
+        self._counters = {
+            OUTCOME_OK: 0,
+            OUTCOME_RATE_LIMITED: 0,
+            OUTCOME_TIMEOUT: 0,
+            OUTCOME_ERROR: 0,
+        }
+        self._increases = 0
+        self._decreases = 0
+        self._retries = 0
+        self._backoff_seconds = 0.0
+        self._peak_in_flight = 0
+
+    @property
+    def limit(self) -> int:
+        """現在の同時実行上限を返します。"""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        """現在実行中の呼び出し数を返します。"""
+        return self._in_flight
+
+    def _get_condition(self) -> asyncio.Condition:
+        # 実行中のイベントループに紐づけるため、初回使用時に生成する
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _bulk_limit(self) -> int:
+        # 非対話的な呼び出しが使用できる枠数（上限が予約枠以下に削減されても1枠は使用できる）
+        return max(self.limit - self.reserved_interactive, 1)
+
+    def _bulk_turn(self) -> bool:
+        # 非対話的な呼び出しの待機中に対話的な呼び出しへ続けて実行枠を渡した回数が上限に達したか
+        return self._bulk_waiting > 0 and self._interactive_streak >= self.max_interactive_streak
+
+    def _can_acquire(self, interactive: bool) -> bool:
+        if interactive:
+            if self._bulk_turn():
+                # 非対話的な呼び出しの番では、予約枠のみ使用する
+                return self._bulk_limit() <= self._in_flight < self.limit
+            return self._in_flight < self.limit
+        # 非対話的な呼び出しは、対話的な呼び出しの待ちがないか自分の番であり、予約枠を除いた空きがある場合のみ実行する
+        if self._interactive_waiting and not self._bulk_turn():
+            return False
+        return self._in_flight < self._bulk_limit()
+
+    async def acquire(self, interactive: bool = True) -> int:
+        """実行枠を取得します。
+
+        Args:
+            interactive: 対話的な呼び出しか（Falseの場合は予約枠を使用せず、原則として対話的な呼び出しの後に実行される）
+
+        Returns:
+            取得時点の世代番号（releaseに渡す）
+        """
+        condition = self._get_condition()
+        async with condition:
+            if interactive:
+                self._interactive_waiting += 1
+                try:
+                    await condition.wait_for(lambda: self._can_acquire(True))
+                finally:
+                    self._interactive_waiting -= 1
+                    # 待ちが解消したことを非対話的な呼び出しに通知する
+                    condition.notify_all()
+                if self._bulk_waiting:
+                    self._interactive_streak += 1
+            else:
+                self._bulk_waiting += 1
+                try:
+                    await condition.wait_for(lambda: self._can_acquire(False))
+                finally:
+                    self._bulk_waiting -= 1
+                    # 待ちが解消したことを対話的な呼び出しに通知する
+                    condition.notify_all()
+                self._interactive_streak = 0
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+            return self._epoch
+
+    async def release(self, epoch: int, outcome: str, latency: float) -> None:
+        """実行枠を返却し、呼び出し結果に応じて上限を調整します。
+
+        Args:
+            epoch: acquireで取得した世代番号
+            outcome: 呼び出し結果の分類
+            latency: 呼び出しのレイテンシ（秒）
+        """
+        condition = self._get_condition()
+        async with condition:
+            self._in_flight -= 1
+            self._record(epoch, outcome, latency)
+            condition.notify_all()
+
+    def _record(self, epoch: int, outcome: str, latency: float) -> None:
+        self._counters[outcome] = self._counters.get(outcome, 0) + 1
+        self._window.append((outcome, latency))
+
+        congested = outcome in (OUTCOME_RATE_LIMITED, OUTCOME_TIMEOUT) or (
+            outcome == OUTCOME_OK and latency > self.latency_target * 2
+        )
+        if congested:
+            # 同じ世代で開始された呼び出しによる削減は1回のみ
+            if epoch == self._epoch:
+                self._decrease(outcome, latency)
+            return
+
+        if outcome != OUTCOME_OK or latency > self.latency_target:
+            return
+        if self._error_rate() >= self.error_rate_threshold:
+            return
+
+        # 現在の上限回数分の成功が続いたら1枠増やす
+        self._successes_since_change += 1
+        if self._successes_since_change >= self.limit and self._limit < self.max_limit:
+            self._limit = min(self._limit + 1, self.max_limit)
+            self._successes_since_change = 0
+            self._increases += 1
+            logger.debug(f"同時実行上限を {self.limit} に増やしました")
+
+    def _decrease(self, outcome: str, latency: float) -> None:
+        previous = self.limit
+        self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+        self._epoch += 1
+        self._successes_since_change = 0
+        self._decreases += 1
+        logger.warning(
+            f"混雑を検知したため同時実行上限を {previous} から {self.limit} に削減しました "
+            f"(結果: {outcome}, レイテンシ: {latency:.1f}秒)"
+        )
+
+    def _error_rate(self) -> float:
+        if not self._window:
+            return 0.0
+        errors = sum(1 for outcome, _ in self._window if outcome != OUTCOME_OK)
+        return errors / len(self._window)
+
+    def _retry_delay(self, attempt: int, result: Any) -> float:
+        # 応答にRetry-Afterの指定があればそれに従い、なければフルジッターの指数バックオフで待つ
+        retry_after = result.get("retry_after") if isinstance(result, dict) else None
+        if isinstance(retry_after, (int, float)) and retry_after >= 0:
+            return float(retry_after)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    async def call(self, func: Callable[..., Awaitable[Any]], *args, interactive: bool = True, **kwargs) -> Any:
+        """実行枠を確保してエージェント呼び出しを実行します。
+
+        レート制限・タイムアウトの場合は、上限を削減した上で最大max_retries回まで再試行します。
+        再試行の前には実行枠を返却した状態で待機します（_retry_delayを参照）。
+
+        Args:
+            func: call_agent互換の非同期関数
+            *args: 関数に渡す位置引数
+            interactive: 対話的な呼び出しか（acquireを参照）
+            **kwargs: 関数に渡すキーワード引数
+
+        Returns:
+            関数の戻り値
+        """
+        attempt = 0
+        while True:
+            epoch = await self.acquire(interactive)
+            started = time.perf_counter()
+            outcome = OUTCOME_ERROR
+            try:
+                result = await func(*args, **kwargs)
+                outcome = classify_agent_result(result)
+            except Exception as e:
+                outcome = classify_exception(e)
+                raise
+            finally:
+                await self.release(epoch, outcome, time.perf_counter() - started)
+
+            if outcome in (OUTCOME_RATE_LIMITED, OUTCOME_TIMEOUT) and attempt < self.max_retries:
+                attempt += 1
+                self._retries += 1
+                delay = self._retry_delay(attempt, result)
+                self._backoff_seconds += delay
+                logger.info(
+                    f"エージェント呼び出しを {delay:.1f}秒後に再試行します ({attempt}/{self.max_retries}, 理由: {outcome})"
+                )
+                await asyncio.sleep(delay)
+                continue
+            return result
+
+    def metrics(self) -> Dict[str, Any]:
+        """現在の上限と集計値をメトリクスとして返します。
+
+        Returns:
+            メトリクスの辞書
+        """
+        latencies = [latency for _, latency in self._window]
+        return {
+            "concurrency_limit": self.limit,
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "reserved_interactive": self.reserved_interactive,
+            "in_flight": self._in_flight,
+            "interactive_waiting": self._interactive_waiting,
+            "bulk_waiting": self._bulk_waiting,
+            "max_interactive_streak": self.max_interactive_streak,
+            "peak_in_flight": self._peak_in_flight,
+            "calls": dict(self._counters),
+            "retries": self._retries,
+            "backoff_seconds": self._backoff_seconds,
+            "limit_increases": self._increases,
+            "limit_decreases": self._decreases,
+            "window_error_rate": self._error_rate(),
+            "window_average_latency": sum(latencies) / len(latencies) if latencies else 0.0,
+        }
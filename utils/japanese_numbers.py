@@ -0,0 +1,103 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+このモジュールは、モデルが出力したテキストに含まれる日本語の数値表現を数値に変換する関数を提供します。
+「1.5億円」「1兆2,000億円」「500万円」「25%」「1,234,567」のような金額・割合・桁区切りの数値を、
+事前にコンパイルした1つの正規表現で1回だけ走査して浮動小数点数に変換します。
+"""
+
+import re
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
+
+# 数値の種類
+KIND_YEN = "yen"
+KIND_PERCENT = "percent"
+KIND_NUMBER = "number"
+
+_UNIT_MULTIPLIERS = {"": 1.0, "千": 1e3, "万": 1e4, "億": 1e8, "兆": 1e12}
+
+# 全角の数字・記号を半角に揃える
+_FULLWIDTH_TABLE = str.maketrans("０１２３４５６７８９，．％－", "0123456789,.%-")
+
+# 単位（千 / 万 / 億 / 兆。「千万」「千億」のように千と組み合わせる表記も含む）
+_UNIT = r"(?:千?[万億兆]|千)"
+# 1つの数値（桁区切り・小数を含む）と、任意の単位
+_NUMBER_WITH_UNIT = rf"\d[\d,]*(?:\.\d+)?\s*{_UNIT}?"
+
+# 他の正規表現に埋め込んで金額や割合を取り出すためのパターン（例: rf"EVC\D+({AMOUNT_PATTERN})"）
+# 「1兆2000億円」のように単位付きの数値が続く表現もまとめて1つの金額として扱う
+AMOUNT_PATTERN = rf"(?:\d[\d,]*(?:\.\d+)?\s*{_UNIT}\s*)*{_NUMBER_WITH_UNIT}\s*(?:円|%|パーセント)?"
+
+_AMOUNT_REGEX = re.compile(rf"(?:(?<![\w-])(?P<sign>[-−▲△]))?(?P<amount>{AMOUNT_PATTERN})")
+_PART_REGEX = re.compile(r"(\d[\d,]*(?:\.\d+)?)\s*(千)?([万億兆])?")
+
+
+class NumberToken(NamedTuple):
+    """テキストから取り出した数値です。"""
+
+    value: float
+    kind: str
+    raw: str
+    start: int
+    end: int
+
+
+def _token_value(sign: Optional[str], amount: str, percent_as_fraction: bool) -> NumberToken:
+    value = 0.0
+    for number, thousand, unit in _PART_REGEX.findall(amount):
+        value += float(number.replace(",", "")) * _UNIT_MULTIPLIERS[thousand] * _UNIT_MULTIPLIERS[unit]
+    if sign:
+        value = -value
+
+    stripped = amount.rstrip()
+    if stripped.endswith(("%", "パーセント")):
+        kind = KIND_PERCENT
+        if percent_as_fraction:
+            value /= 100
+    elif stripped.endswith("円"):
+        kind = KIND_YEN
+    else:
+        kind = KIND_NUMBER
+    return NumberToken(value, kind, "", 0, 0)
+
+
+def extract_numbers(text: str, percent_as_fraction: bool = True) -> List[NumberToken]:
+    """テキストに含まれるすべての数値を順に取り出します。
+
+    Args:
+        text: 対象のテキスト
+        percent_as_fraction: 割合（%）を0〜1の小数に変換するか
+
+    Returns:
+        数値のリスト（出現順）
+    """
+    if not text:
+        return []
+    normalized = text.translate(_FULLWIDTH_TABLE)
+    tokens = []
+    for match in _AMOUNT_REGEX.finditer(normalized):
+        token = _token_value(match.group("sign"), match.group("amount"), percent_as_fraction)
+        tokens.append(token._replace(raw=match.group(0).strip(), start=match.start(), end=match.end()))
+    return tokens
+
+
+@lru_cache(maxsize=4096)
+def parse_japanese_number(text: str, percent_as_fraction: bool = True) -> Optional[float]:
+    """テキストに含まれる最初の数値を浮動小数点数に変換します。
+
+    例: "1.5億円" -> 150000000.0, "1兆2,000億円" -> 1200000000000.0, "25%" -> 0.25, "1,234" -> 1234.0
+
+    Args:
+        text: 対象のテキスト
+        percent_as_fraction: 割合（%）を0〜1の小数に変換するか
+
+    Returns:
+        変換した数値（数値が含まれない場合はNone）
+    """
+    if not isinstance(text, str):
+        return float(text) if isinstance(text, (int, float)) else None
+    match = _AMOUNT_REGEX.search(text.translate(_FULLWIDTH_TABLE))
+    if not match:
+        return None
+    return _token_value(match.group("sign"), match.group("amount"), percent_as_fraction).value
@@ -0,0 +1,113 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+このモジュールは、複数サービスのワークフローをまとめて実行するバッチランナーを提供します。
+すべてのワークフローで同時実行制御コントローラーを共有し、
+プロバイダーの状況に応じてエージェント呼び出しの同時実行数を調整します。
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from utils.concurrency import AdaptiveConcurrencyController
+from workflows.segmentation_workflow import get_segmentation_workflow
+from workflows.result_store import SpillingResultStore
+from workflows.stage_cache import StageCache
+
+
+class BatchWorkflowRunner:
+    """複数のセグメンテーションワークフローを並行実行するクラスです。"""
+
+    def __init__(
+        self,
+        concurrency_controller: Optional[AdaptiveConcurrencyController] = None,
+        max_workflows: Optional[int] = None,
+        stage_cache: Optional[StageCache] = None,
+        result_store: Optional[SpillingResultStore] = None
+    ):
+        """BatchWorkflowRunnerクラスのコンストラクタ
+
+        Args:
+            concurrency_controller: 共有する同時実行制御コントローラー（省略時は既定値で生成）
+            max_workflows: 同時に実行するワークフロー数の上限（省略時はコントローラーの最大上限）
+            stage_cache: 共有するステップキャッシュ（省略時はバッチ内で共有するキャッシュを生成。
+                result_storeを指定した場合は、ステップ結果をメモリに保持しないディスクのみのキャッシュ）
+            result_store: ステップ結果の退避先（指定するとメモリ上限付きモードで実行し、
+                各結果には軽量なハンドルのみが残ります）
+        """
+        self.concurrency_controller = concurrency_controller or AdaptiveConcurrencyController()
+        # ワークフローは各ステップを逐次実行するため、エージェント呼び出しの上限以上に
+        # ワークフローを並行させておかないと上限を増やしても使い切れない
+        self.max_workflows = max_workflows or self.concurrency_controller.max_limit
+        self.result_store = result_store
+        # 同じ市場データを共有するバリエーション間でステップ結果を再利用する
+        if stage_cache is None:
+            if result_store is None:
+                stage_cache = StageCache()
+            else:
+                # 退避したステップ結果をメモリ上のLRUが保持し続けないよう、キャッシュはディスクのみに置く
+                stage_cache = StageCache(max_entries=0, cache_dir=os.path.join(result_store.base_dir, "stage_cache"))
+        self.stage_cache = stage_cache
+        self.workflow = get_segmentation_workflow(
+            concurrency_controller=self.concurrency_controller,
+            stage_cache=self.stage_cache,
+            result_store=self.result_store
+        )
+        self.logger = logging.getLogger(__name__)
+
+    async def _run_one(self, semaphore: asyncio.Semaphore, index: int, request: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            self.logger.info(f"バッチ内のワークフロー {index + 1} を開始します")
+            try:
+                # 一括実行のため、共有コントローラーでは対話的なワークフローの呼び出しを優先させる
+                return await self.workflow.run_workflow(
+                    request.get("service_description", ""),
+                    request.get("market_data", ""),
+                    interactive=False
+                )
+            except Exception as e:
+                self.logger.error(f"バッチ内のワークフロー {index + 1} でエラーが発生しました: {e}")
+                return {"status": "failed", "error": str(e)}
+
+    async def run_batch(self, requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """複数のワークフローを実行します。
+
+        Args:
+            requests: service_descriptionとmarket_dataを持つ辞書のリスト
+
+        Returns:
+            各ワークフローの結果と同時実行制御のメトリクス
+        """
+        started_at = datetime.now().isoformat()
+        semaphore = asyncio.Semaphore(self.max_workflows)
+
+        results = await asyncio.gather(
+            *(self._run_one(semaphore, i, request) for i, request in enumerate(requests))
+        )
+
+        metrics = self.concurrency_controller.metrics()
+        self.logger.info(f"バッチ実行が完了しました: {len(results)} 件, 同時実行メトリクス: {metrics}")
+
+        batch_result = {
+            "started_at": started_at,
+            "completed_at": datetime.now().isoformat(),
+            "workflow_count": len(results),
+            "succeeded": sum(1 for r in results if r.get("status") == "success"),
+            "failed": sum(1 for r in results if r.get("status") != "success"),
+            "results": list(results),
+            "concurrency_metrics": metrics,
+            "stage_cache": self.stage_cache.stats()
+        }
+        if self.result_store is not None:
+            batch_result["result_store"] = self.result_store.stats()
+        return batch_result
+
+    def metrics(self) -> Dict[str, Any]:
+        """現在の同時実行上限などのメトリクスを返します。
+
+        Returns:
+            同時実行制御のメトリクス
+        """
+        return self.concurrency_controller.metrics()
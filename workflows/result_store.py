@@ -0,0 +1,156 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+このモジュールは、ワークフローのステップ結果をディスクへ退避するストアを提供します。
+後続ステップから参照されなくなったステップ結果をすぐにファイルへ書き出し、
+メモリ上には軽量なハンドルだけを残すことで、大量のワークフローを一括実行しても
+メモリ使用量がバッチサイズに比例して増えないようにします。
+"""
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from typing import Any, Dict, Optional
+
+
+class SpilledStageResult(dict):
+    """ディスクへ退避したステップ結果のハンドルです。
+
+    ハンドルは {"spilled_to": パス, "stage": ステップ名, "size_bytes": サイズ} の辞書そのものであるため、
+    ハンドルを含むワークフロー実行結果もそのままJSONに保存できます。
+    保存した実行結果は、load_workflow_output（またはSpillingResultStore.materialize）でステップ結果に戻せます。
+    """
+
+    __slots__ = ()
+
+    def __init__(self, path: str, stage: str, size_bytes: int):
+        super().__init__(spilled_to=path, stage=stage, size_bytes=size_bytes)
+
+    @property
+    def path(self) -> str:
+        return self["spilled_to"]
+
+    @property
+    def stage(self) -> str:
+        return self["stage"]
+
+    @property
+    def size_bytes(self) -> int:
+        return self["size_bytes"]
+
+    @classmethod
+    def from_value(cls, value: Any) -> Optional["SpilledStageResult"]:
+        """ハンドル、またはJSONから読み込んだハンドルの辞書表現をハンドルに変換します。
+
+        Args:
+            value: ワークフロー実行結果の値
+
+        Returns:
+            ハンドル（ハンドルでない値の場合はNone）
+        """
+        if isinstance(value, SpilledStageResult):
+            return value
+        if isinstance(value, dict) and set(value) == {"spilled_to", "stage", "size_bytes"}:
+            return cls(value["spilled_to"], value["stage"], value["size_bytes"])
+        return None
+
+    def load(self) -> Dict[str, Any]:
+        """退避したステップ結果を読み込みます。
+
+        Returns:
+            ステップ結果
+        """
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSONに出力するための辞書表現を返します。
+
+        Returns:
+            ハンドル情報の辞書
+        """
+        return dict(self)
+
+    def __repr__(self) -> str:
+        return f"SpilledStageResult(stage={self.stage!r}, path={self.path!r}, size_bytes={self.size_bytes})"
+
+
+class SpillingResultStore:
+    """ステップ結果をJSONファイルとして退避するストアです。"""
+
+    def __init__(self, base_dir: Optional[str] = None):
+        """
+        ストアを初期化します。
+
+        Args:
+            base_dir: 退避先のディレクトリ（省略時は一時ディレクトリを作成）
+        """
+        self._owns_dir = base_dir is None
+        self.base_dir = base_dir or tempfile.mkdtemp(prefix="nexasales-results-")
+        os.makedirs(self.base_dir, exist_ok=True)
+        self.spilled_count = 0
+        self.spilled_bytes = 0
+
+    def spill(self, workflow_id: str, stage: str, value: Dict[str, Any]) -> SpilledStageResult:
+        """ステップ結果をディスクへ書き出し、ハンドルを返します。
+
+        同じ秒に開始したワークフローはworkflow_idが重複し得るため、ファイル名には一意な接尾辞を付けます。
+
+        Args:
+            workflow_id: ワークフローID
+            stage: ステップ名
+            value: ステップ結果
+
+        Returns:
+            退避したステップ結果のハンドル
+        """
+        directory = os.path.join(self.base_dir, workflow_id)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{stage}-{uuid.uuid4().hex[:8]}.json")
+
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(data)
+
+        self.spilled_count += 1
+        self.spilled_bytes += len(data)
+        return SpilledStageResult(path, stage, len(data))
+
+    @staticmethod
+    def materialize(results: Dict[str, Any]) -> Dict[str, Any]:
+        """ハンドルを含むワークフロー実行結果を、ステップ結果を読み込んだ辞書に変換します。
+
+        JSONに保存した実行結果に含まれるハンドルの辞書表現も読み込みます。
+
+        Args:
+            results: ワークフロー実行結果
+
+        Returns:
+            ステップ結果を展開したワークフロー実行結果
+
+        Raises:
+            OSError: 退避先のファイルを読み込めない場合
+        """
+        materialized = {}
+        for key, value in results.items():
+            handle = SpilledStageResult.from_value(value)
+            materialized[key] = handle.load() if handle is not None else value
+        return materialized
+
+    def stats(self) -> Dict[str, Any]:
+        """退避した件数とサイズを返します。
+
+        Returns:
+            統計情報の辞書
+        """
+        return {
+            "base_dir": self.base_dir,
+            "spilled_count": self.spilled_count,
+            "spilled_bytes": self.spilled_bytes,
+        }
+
+    def cleanup(self) -> None:
+        """ストアが作成した一時ディレクトリを削除します。"""
+        if self._owns_dir:
+            shutil.rmtree(self.base_dir, ignore_errors=True)
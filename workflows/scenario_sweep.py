@@ -0,0 +1,411 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+このモジュールは、ワークフローの数値計算部分（EVC → 市場ポテンシャル → 優先度スコア）を
+シナリオのグリッドに対して一括評価するスイープランナーを提供します。
+保存済みのワークフロー実行結果（output.json）とセグメント別パラメータを基準値とし、
+導入年数 × 価格帯 × 調整係数のようなグリッドをLLMを呼び出さずに評価します。
+
+グリッドは展開せずにシナリオ番号から各軸の値を復元するため、10^6件規模のシナリオでも
+メモリ上に保持するのはチャンク1つ分のみです。チャンクはプロセスプールで並列に評価し、
+結果は列ごとのバイナリファイル（列指向）に順次書き出します。
+
+使用例:
+    python -m workflows.scenario_sweep --workflow-result output.json --parameters segments.json \\
+        --grid grid.json --output sweep-results --workers 4
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from tools.evc_engine import DEFAULT_ADJUSTMENTS, get_evc_plan
+from tools.evc_vectorized import evaluate_evc_batch, stack_segment_parameters
+from tools.priority_scoring import score_priorities
+from tools.segment_parameters import parse_segment_parameters
+from utils.japanese_numbers import AMOUNT_PATTERN, parse_japanese_number
+from utils.utils import DataValidationError, WorkflowError, setup_logging
+from workflows.segmentation_workflow import load_workflow_output
+
+# グリッドの軸名の接頭辞。この軸の値は各セグメントの調整係数に掛ける倍率として扱う
+ADJUSTMENT_AXIS_PREFIX = "segment_adjustments."
+# 市場ポテンシャルと優先度スコアの計算に使う、セグメント別パラメータのキー
+MARKET_PARAMETERS = ("company_count", "acquisition_probability", "market_growth_rate")
+SCHEMA_FILENAME = "schema.json"
+DEFAULT_CHUNK_SIZE = 50_000
+
+# 保存済みの実行結果から基準値を取り出すパターン
+_ADJUSTMENT_SEGMENT_PATTERN = re.compile(r"\((s\d+)\)")
+_ADJUSTMENT_VALUE_PATTERN = re.compile(r"\b(Re|Co|I)\s*[:：]\s*([\d.]+)")
+_BASELINE_VALUE_PATTERNS = {
+    "reference_price": re.compile(rf"平均価格\s*[:：]\s*({AMOUNT_PATTERN})"),
+    "initial_cost": re.compile(rf"平均初期コスト\s*[:：]\s*({AMOUNT_PATTERN})"),
+    "recurring_cost": re.compile(rf"平均運用コスト\s*[:：]\s*({AMOUNT_PATTERN})"),
+}
+
+
+def _stage_text(workflow_result: Dict[str, Any], stage: str) -> str:
+    value = workflow_result.get(stage)
+    if isinstance(value, dict):
+        value = value.get("result", "")
+    return value if isinstance(value, str) else ""
+
+
+def extract_sweep_baseline(workflow_result: Dict[str, Any]) -> Dict[str, Any]:
+    """保存済みのワークフロー実行結果から、スイープの基準値を取り出します。
+
+    フォーミュラ設計のセグメント別調整係数（Re / Co / I）と、価値比較の平均価格・平均初期コスト・
+    平均運用コストを取り出します。取り出せなかった値は含めません。
+
+    Args:
+        workflow_result: ワークフロー実行結果
+
+    Returns:
+        {"common": 共通パラメータ, "segment_adjustments": セグメントID -> 調整係数}
+    """
+    segment_adjustments: Dict[str, Dict[str, float]] = {}
+    current_segment = None
+    for line in _stage_text(workflow_result, "formula_designs").splitlines():
+        segment_match = _ADJUSTMENT_SEGMENT_PATTERN.search(line)
+        if segment_match:
+            current_segment = segment_match.group(1)
+        if current_segment:
+            for group, value in _ADJUSTMENT_VALUE_PATTERN.findall(line):
+                segment_adjustments.setdefault(current_segment, {})[group] = float(value)
+
+    common = {}
+    value_text = _stage_text(workflow_result, "value_comparisons")
+    for key, pattern in _BASELINE_VALUE_PATTERNS.items():
+        match = pattern.search(value_text)
+        if match:
+            common[key] = parse_japanese_number(match.group(1))
+
+    return {"common": common, "segment_adjustments": segment_adjustments}
+
+
+class ScenarioGrid:
+    """シナリオのグリッドです。シナリオ番号から各軸の値を復元するため、グリッドを展開しません。"""
+
+    def __init__(self, axes: Dict[str, List[float]]):
+        """
+        グリッドを初期化します。
+
+        Args:
+            axes: 軸名 -> 値のリスト（軸名はパラメータ名、または "segment_adjustments.Re" のような調整係数の倍率）
+
+        Raises:
+            DataValidationError: 軸の値が空、または数値でない場合
+        """
+        if not axes:
+            raise DataValidationError("グリッドには1つ以上の軸が必要です")
+        self.names = list(axes)
+        self.values = []
+        for name in self.names:
+            try:
+                values = np.asarray(axes[name], dtype=float)
+            except (TypeError, ValueError):
+                raise DataValidationError(f"グリッドの軸 {name} の値は数値である必要があります")
+            if values.ndim != 1 or values.size == 0:
+                raise DataValidationError(f"グリッドの軸 {name} には1つ以上の値のリストが必要です")
+            self.values.append(values)
+        self.sizes = np.array([len(values) for values in self.values], dtype=np.int64)
+        # 混合基数のけた（最後の軸が最も速く変化する）
+        self.strides = np.concatenate([np.cumprod(self.sizes[::-1])[::-1][1:], [1]]).astype(np.int64)
+        self.size = int(np.prod(self.sizes))
+
+    def decode(self, start: int, stop: int) -> Dict[str, np.ndarray]:
+        """シナリオ番号の範囲 [start, stop) に対応する各軸の値を返します。
+
+        Args:
+            start: 開始シナリオ番号
+            stop: 終了シナリオ番号（含まない）
+
+        Returns:
+            軸名 -> 値の配列
+        """
+        index = np.arange(start, stop, dtype=np.int64)
+        return {
+            name: values[(index // stride) % size]
+            for name, values, stride, size in zip(self.names, self.values, self.strides, self.sizes)
+        }
+
+    def chunks(self, chunk_size: int) -> Iterator[Tuple[int, int]]:
+        """シナリオ番号のチャンクを順に返します。
+
+        Args:
+            chunk_size: チャンクあたりのシナリオ数
+
+        Returns:
+            (開始, 終了) のイテレータ
+        """
+        for start in range(0, self.size, chunk_size):
+            yield start, min(start + chunk_size, self.size)
+
+
+def _evaluate_chunk(
+    segments: Dict[str, Dict[str, Any]],
+    grid: ScenarioGrid,
+    start: int,
+    stop: int
+) -> Dict[str, np.ndarray]:
+    # 1チャンク分のシナリオを EVC → 市場ポテンシャル → 優先度スコア の順に評価する（プロセスプールで実行）
+    segment_ids = list(segments)
+    count = stop - start
+    axis_values = grid.decode(start, stop)
+
+    # セグメントごとに異なる基準値は (セグメント数, 1) の列にまとめる
+    params = stack_segment_parameters(segments)
+    segment_adjustments = {
+        segment_id: dict(DEFAULT_ADJUSTMENTS, **adjustments)
+        for segment_id, adjustments in params["segment_adjustments"].items()
+    }
+    for name, values in axis_values.items():
+        if name.startswith(ADJUSTMENT_AXIS_PREFIX):
+            group = name[len(ADJUSTMENT_AXIS_PREFIX):]
+            for adjustments in segment_adjustments.values():
+                adjustments[group] = adjustments.get(group, 1.0) * values
+        elif name not in MARKET_PARAMETERS:
+            params[name] = np.broadcast_to(values, (len(segment_ids), count))
+    params["segment_adjustments"] = segment_adjustments
+
+    batch = evaluate_evc_batch(params, segment_ids, scenario_count=count)
+    evc = batch.evc
+
+    def market_input(key: str) -> np.ndarray:
+        # グリッドの軸にある値はシナリオ方向の値とし、ない場合はセグメントごとの基準値の列を使う
+        if key in axis_values:
+            return np.broadcast_to(axis_values[key], (len(segment_ids), count))
+        return np.asarray([float(segment.get(key) or 0) for segment in segments.values()])[:, np.newaxis]
+
+    company_count = market_input("company_count")
+    acquisition_probability = market_input("acquisition_probability")
+    # ポテンシャル = 企業数 × 獲得率 × EVC
+    potential = company_count * acquisition_probability * evc
+    scores = score_priorities(evc, company_count, acquisition_probability, market_input("market_growth_rate"))
+
+    columns = {"scenario": np.arange(start, stop, dtype=np.int64)}
+    for name, values in axis_values.items():
+        columns[name] = values
+    for i, segment_id in enumerate(segment_ids):
+        columns[f"evc.{segment_id}"] = evc[i]
+        columns[f"potential.{segment_id}"] = potential[i]
+        columns[f"priority_score.{segment_id}"] = scores[i]
+    columns["top_segment"] = np.argmax(scores, axis=0).astype(np.int16)
+    return columns
+
+
+class ScenarioSweepRunner:
+    """シナリオのグリッドを評価し、結果を列指向のファイルに書き出すランナーです。"""
+
+    def __init__(self, segments: Dict[str, Dict[str, Any]], workers: Optional[int] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        ランナーを初期化します。
+
+        Args:
+            segments: セグメントID -> 基準パラメータ（EVCのパラメータと company_count / acquisition_probability /
+                market_growth_rate）
+            workers: 並列に評価するプロセス数（省略時はCPU数、1ならプロセスプールを使用しない）
+            chunk_size: チャンクあたりのシナリオ数
+
+        Raises:
+            DataValidationError: セグメントが空の場合
+        """
+        if not segments:
+            raise DataValidationError("スイープにはセグメント別パラメータが必要です")
+        self.segments = segments
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_workflow_result(cls, workflow_result: Dict[str, Any], segment_parameters: Any = None, **kwargs):
+        """保存済みのワークフロー実行結果とセグメント別パラメータからランナーを作成します。
+
+        セグメント別パラメータの値は、実行結果から取り出した基準値より優先されます。
+
+        Args:
+            workflow_result: ワークフロー実行結果
+            segment_parameters: セグメント別パラメータ（tools.segment_parametersの形式）
+            **kwargs: ScenarioSweepRunnerのその他の引数
+
+        Returns:
+            スイープランナー
+        """
+        baseline = extract_sweep_baseline(workflow_result)
+        segments = parse_segment_parameters(segment_parameters) if segment_parameters else {}
+        if not segments:
+            segments = {segment_id: {} for segment_id in baseline["segment_adjustments"]}
+
+        merged = {}
+        for segment_id, params in segments.items():
+            merged[segment_id] = {
+                **baseline["common"],
+                "segment_adjustments": baseline["segment_adjustments"],
+                **params
+            }
+        return cls(merged, **kwargs)
+
+    def validate_grid(self, grid: ScenarioGrid) -> None:
+        """グリッドの軸名がスイープで評価できる入力であることを検査します。
+
+        軸名は、評価計画のパラメータ、市場ポテンシャルと優先度スコアの入力（company_count /
+        acquisition_probability / market_growth_rate）、"segment_adjustments.Re" のような調整係数の倍率のいずれかです。
+
+        Args:
+            grid: シナリオのグリッド
+
+        Raises:
+            DataValidationError: 評価に使用されない軸がある場合
+        """
+        plan = get_evc_plan(stack_segment_parameters(self.segments))
+        # カスタムコンポーネントの設定を参照する "名前.キー" のスロットは、グリッドの軸では差し替えられない
+        allowed = {name for name in plan.slots if "." not in name}
+        allowed.update(MARKET_PARAMETERS)
+        allowed.update(ADJUSTMENT_AXIS_PREFIX + group for group in DEFAULT_ADJUSTMENTS)
+        for name in grid.names:
+            if name not in allowed:
+                raise DataValidationError(
+                    f"グリッドの軸 {name} は評価に使用されません"
+                    f"（評価計画のパラメータ、{' / '.join(MARKET_PARAMETERS)}、"
+                    f"{ADJUSTMENT_AXIS_PREFIX}Re / Co / I のいずれかを指定してください）"
+                )
+
+    def run(self, grid: ScenarioGrid, output_dir: str) -> Dict[str, Any]:
+        """グリッドのすべてのシナリオを評価し、列ごとのファイルに書き出します。
+
+        Args:
+            grid: シナリオのグリッド
+            output_dir: 出力先のディレクトリ
+
+        Returns:
+            書き出した列とシナリオ数などのスキーマ情報
+
+        Raises:
+            DataValidationError: 評価に使用されない軸がある場合
+        """
+        self.validate_grid(grid)
+        os.makedirs(output_dir, exist_ok=True)
+        started_at = time.perf_counter()
+        chunks = list(grid.chunks(self.chunk_size))
+        files = {}
+        dtypes = {}
+        rows = 0
+
+        def write(columns: Dict[str, np.ndarray]) -> None:
+            nonlocal rows
+            for name, values in columns.items():
+                if name not in files:
+                    files[name] = open(os.path.join(output_dir, f"{name}.bin"), "wb")
+                    dtypes[name] = values.dtype.str
+                np.ascontiguousarray(values).tofile(files[name])
+            rows += len(columns["scenario"])
+
+        try:
+            if self.workers == 1 or len(chunks) == 1:
+                for start, stop in chunks:
+                    write(_evaluate_chunk(self.segments, grid, start, stop))
+            else:
+                with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                    # mapは投入順に結果を返すため、書き出し順はシナリオ番号順になる
+                    results = executor.map(
+                        _evaluate_chunk,
+                        [self.segments] * len(chunks),
+                        [grid] * len(chunks),
+                        [start for start, _ in chunks],
+                        [stop for _, stop in chunks],
+                    )
+                    for columns in results:
+                        write(columns)
+        finally:
+            for f in files.values():
+                f.close()
+
+        schema = {
+            "rows": rows,
+            "segments": list(self.segments),
+            "axes": {name: values.tolist() for name, values in zip(grid.names, grid.values)},
+            "columns": dtypes,
+            "elapsed_seconds": time.perf_counter() - started_at,
+        }
+        with open(os.path.join(output_dir, SCHEMA_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(schema, f, ensure_ascii=False, indent=2)
+        self.logger.info(f"シナリオスイープが完了しました: {rows} 件, {schema['elapsed_seconds']:.1f}秒")
+        return schema
+
+
+def load_sweep_columns(output_dir: str, columns: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+    """スイープ結果の列をメモリマップで読み込みます。
+
+    Args:
+        output_dir: スイープ結果のディレクトリ
+        columns: 読み込む列名（省略時はすべての列）
+
+    Returns:
+        列名 -> 値の配列
+
+    Raises:
+        WorkflowError: スイープ結果を読み込めない場合
+    """
+    try:
+        with open(os.path.join(output_dir, SCHEMA_FILENAME), "r", encoding="utf-8") as f:
+            schema = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise WorkflowError(f"スイープ結果を読み込めません: {output_dir}: {e}")
+
+    names = columns or list(schema["columns"])
+    loaded = {}
+    for name in names:
+        if name not in schema["columns"]:
+            raise WorkflowError(f"スイープ結果に列 {name} はありません")
+        loaded[name] = np.memmap(
+            os.path.join(output_dir, f"{name}.bin"), dtype=np.dtype(schema["columns"][name]), mode="r",
+            shape=(schema["rows"],)
+        )
+    return loaded
+
+
+def parse_arguments():
+    """コマンドライン引数を解析します。"""
+    parser = argparse.ArgumentParser(description="NexaSales - シナリオスイープ")
+    parser.add_argument("--workflow-result", dest="workflow_result", required=True,
+                        help="保存済みのワークフロー実行結果（例: output.json）")
+    parser.add_argument("--parameters", help="セグメント別パラメータのファイル（JSON形式・表形式・従来形式）")
+    parser.add_argument("--grid", required=True,
+                        help='グリッドのJSONファイル（例: {"implementation_years": [1, 2, 3, 4, 5]}）')
+    parser.add_argument("--output", required=True, help="結果を書き出すディレクトリ")
+    parser.add_argument("--workers", type=int, help="並列に評価するプロセス数（デフォルト: CPU数）")
+    parser.add_argument("--chunk-size", dest="chunk_size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"チャンクあたりのシナリオ数（デフォルト: {DEFAULT_CHUNK_SIZE}）")
+    return parser.parse_args()
+
+
+def main():
+    """メイン関数"""
+    args = parse_arguments()
+    setup_logging("INFO")
+
+    workflow_result = load_workflow_output(args.workflow_result)
+    segment_parameters = None
+    if args.parameters:
+        with open(args.parameters, "r", encoding="utf-8") as f:
+            segment_parameters = f.read()
+    with open(args.grid, "r", encoding="utf-8") as f:
+        grid = ScenarioGrid(json.load(f))
+
+    runner = ScenarioSweepRunner.from_workflow_result(
+        workflow_result, segment_parameters, workers=args.workers, chunk_size=args.chunk_size
+    )
+    schema = runner.run(grid, args.output)
+    print(json.dumps({key: schema[key] for key in ("rows", "segments", "elapsed_seconds")}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+このモジュールは、SegmentationWorkflowの前段に置く優先度付きジョブスケジューラーを提供します。
+対話的な単一サービスのリクエストと夜間の一括バッチが同じ実行枠を共有する場合でも、
+優先度クラス・テナント間の公平性・エージング（待ち時間による優先度の引き上げ）に基づいて
+ジョブを起動し、対話クラス用の実行枠を予約します。
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, Optional
+
+from utils.concurrency import AdaptiveConcurrencyController
+from workflows.segmentation_workflow import get_segmentation_workflow
+
+# 優先度クラスと基本優先度（小さいほど先に実行される）
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BULK = "bulk"
+PRIORITY_CLASSES = {
+    PRIORITY_INTERACTIVE: 0.0,
+    PRIORITY_BULK: 10.0,
+}
+
+
+class _ScheduledJob:
+    """スケジューラーの待ち行列に入るジョブです。"""
+
+    __slots__ = ("service_description", "market_data", "priority", "tenant_id", "enqueued_at", "future")
+
+    def __init__(self, service_description: str, market_data: str, priority: str, tenant_id: str, future: asyncio.Future):
+        self.service_description = service_description
+        self.market_data = market_data
+        self.priority = priority
+        self.tenant_id = tenant_id
+        self.enqueued_at = time.monotonic()
+        self.future = future
+
+
+class WorkflowScheduler:
+    """優先度クラス・テナント公平性・エージングに基づいてワークフローを起動するスケジューラーです。
+
+    - 優先度クラスごとに待ち行列を持ち、実行枠が空くと実効優先度が最も高いクラスのジョブを起動します
+    - 実効優先度は「基本優先度 - 待ち時間 / aging_interval」で、一括ジョブも待ち続ければ順番が回ってきます
+    - 同じクラス内ではテナントをラウンドロビンで選び、大量投入したテナントが他を待たせないようにします
+    - 一括クラスは reserved_interactive 分の実行枠を使用できず、対話クラス用に常に空きが残ります
+
+    すべてのワークフローは1つの同時実行制御コントローラーを共有し、ジョブの優先度クラスを
+    エージェント呼び出しまで引き継ぎます。対話クラスの呼び出しは待機中の一括クラスの呼び出しより先に実行枠を取得し、
+    コントローラーの reserved_interactive 分の実行枠は一括クラスから使用されません。
+    """
+
+    def __init__(
+        self,
+        max_workflows: int = 8,
+        reserved_interactive: int = 2,
+        aging_interval: float = 30.0,
+        concurrency_controller: Optional[AdaptiveConcurrencyController] = None,
+        stage_cache=None
+    ):
+        """
+        スケジューラーを初期化します。
+
+        Args:
+            max_workflows: 同時に実行するワークフロー数の上限
+            reserved_interactive: 対話クラス専用に予約する実行枠の数
+            aging_interval: 実効優先度を1段階引き上げるまでの待ち時間（秒）
+            concurrency_controller: 共有する同時実行制御コントローラー（省略時は、reserved_interactive 分の
+                エージェント呼び出し枠を対話クラス用に予約するコントローラーを生成）
+            stage_cache: 共有するステップキャッシュ（オプション）
+        """
+        if not 0 <= reserved_interactive < max_workflows:
+            raise ValueError("reserved_interactiveは0以上max_workflows未満である必要があります")
+
+        self.max_workflows = max_workflows
+        self.reserved_interactive = reserved_interactive
+        self.aging_interval = aging_interval
+        self.concurrency_controller = concurrency_controller or AdaptiveConcurrencyController(
+            max_limit=max_workflows, reserved_interactive=reserved_interactive
+        )
+        self.workflow = get_segmentation_workflow(
+            concurrency_controller=self.concurrency_controller,
+            stage_cache=stage_cache
+        )
+        self.logger = logging.getLogger(__name__)
+
+        # クラスごとに テナントID -> 待ち行列 を保持し、先頭のテナントから順に処理する
+        self._queues: Dict[str, "OrderedDict[str, deque]"] = {cls: OrderedDict() for cls in PRIORITY_CLASSES}
+        self._running = {cls: 0 for cls in PRIORITY_CLASSES}
+        self._completed = {cls: 0 for cls in PRIORITY_CLASSES}
+        self._total_wait = {cls: 0.0 for cls in PRIORITY_CLASSES}
+        self._tasks = set()
+
+    async def run(
+        self,
+        service_description: str,
+        market_data: str,
+        priority: str = PRIORITY_INTERACTIVE,
+        tenant_id: str = "default"
+    ) -> Dict[str, Any]:
+        """ワークフローをスケジュールし、完了まで待機します。
+
+        Args:
+            service_description: サービス説明
+            market_data: 市場データ
+            priority: 優先度クラス（"interactive" または "bulk"）
+            tenant_id: テナントID
+
+        Returns:
+            ワークフロー実行結果
+        """
+        future = self.submit(service_description, market_data, priority, tenant_id)
+        return await future
+
+    def submit(
+        self,
+        service_description: str,
+        market_data: str,
+        priority: str = PRIORITY_INTERACTIVE,
+        tenant_id: str = "default"
+    ) -> asyncio.Future:
+        """ワークフローを待ち行列に追加します。
+
+        Args:
+            service_description: サービス説明
+            market_data: 市場データ
+            priority: 優先度クラス（"interactive" または "bulk"）
+            tenant_id: テナントID
+
+        Returns:
+            ワークフロー実行結果を受け取るFuture
+        """
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"未知の優先度クラスです: {priority}")
+
+        future = asyncio.get_running_loop().create_future()
+        job = _ScheduledJob(service_description, market_data, priority, tenant_id, future)
+        self._queues[priority].setdefault(tenant_id, deque()).append(job)
+        self._dispatch()
+        return future
+
+    def _has_capacity(self, priority: str) -> bool:
+        running_total = sum(self._running.values())
+        if running_total >= self.max_workflows:
+            return False
+        if priority != PRIORITY_INTERACTIVE:
+            # 対話クラス用の予約枠を残す
+            non_interactive = running_total - self._running[PRIORITY_INTERACTIVE]
+            return non_interactive < self.max_workflows - self.reserved_interactive
+        return True
+
+    def _effective_priority(self, priority: str, now: float) -> Optional[float]:
+        tenants = self._queues[priority]
+        if not tenants:
+            return None
+        # テナント先頭のうち最も長く待っているジョブでクラスの実効優先度を決める
+        oldest = min(queue[0].enqueued_at for queue in tenants.values())
+        return PRIORITY_CLASSES[priority] - (now - oldest) / self.aging_interval
+
+    def _pick_next(self) -> Optional[_ScheduledJob]:
+        now = time.monotonic()
+        best_priority = None
+        best_score = None
+        for priority in PRIORITY_CLASSES:
+            if not self._has_capacity(priority):
+                continue
+            score = self._effective_priority(priority, now)
+            if score is not None and (best_score is None or score < best_score):
+                best_priority, best_score = priority, score
+
+        if best_priority is None:
+            return None
+
+        # テナントのラウンドロビン: 先頭テナントから1件取り出し、末尾に回す
+        tenants = self._queues[best_priority]
+        tenant_id, queue = next(iter(tenants.items()))
+        job = queue.popleft()
+        del tenants[tenant_id]
+        if queue:
+            tenants[tenant_id] = queue
+        return job
+
+    def _dispatch(self) -> None:
+        while True:
+            job = self._pick_next()
+            if job is None:
+                return
+            if job.future.cancelled():
+                continue
+            self._running[job.priority] += 1
+            task = asyncio.ensure_future(self._execute(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, job: _ScheduledJob) -> None:
+        waited = time.monotonic() - job.enqueued_at
+        self._total_wait[job.priority] += waited
+        self.logger.info(
+            f"ワークフローを起動します (クラス: {job.priority}, テナント: {job.tenant_id}, 待ち時間: {waited:.1f}秒)"
+        )
+        try:
+            result = await self.workflow.run_workflow(
+                job.service_description, job.market_data, interactive=job.priority == PRIORITY_INTERACTIVE
+            )
+            if not job.future.done():
+                job.future.set_result(result)
+        except Exception as e:
+            self.logger.error(f"スケジュールされたワークフローでエラーが発生しました: {e}")
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            self._running[job.priority] -= 1
+            self._completed[job.priority] += 1
+            self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        """待ち行列と実行状況の統計を返します。
+
+        Returns:
+            統計情報の辞書
+        """
+        classes = {}
+        for priority in PRIORITY_CLASSES:
+            completed = self._completed[priority]
+            running = self._running[priority]
+            started = completed + running
+            classes[priority] = {
+                "queued": sum(len(queue) for queue in self._queues[priority].values()),
+                "queued_tenants": len(self._queues[priority]),
+                "running": running,
+                "completed": completed,
+                "average_wait": self._total_wait[priority] / started if started else 0.0,
+            }
+        return {
+            "max_workflows": self.max_workflows,
+            "reserved_interactive": self.reserved_interactive,
+            "classes": classes,
+            "concurrency_metrics": self.concurrency_controller.metrics(),
+        }
@@ -48,7 +48,12 @@ from nexasales_agents.formula_design import get_formula_design_agent
 from nexasales_agents.evc_calculation import get_evc_calculation_agent
 from nexasales_agents.market_potential import get_market_potential_agent
 from nexasales_agents.priority_evaluation_final import get_priority_evaluation_agent
+from tools.evc_memo import get_evc_memo
 from utils.agent_utils import call_agent, get_tracer
+from utils.japanese_numbers import AMOUNT_PATTERN, parse_japanese_number
+from utils.utils import WorkflowError
+from workflows.result_store import SpillingResultStore
+from workflows.stage_cache import compute_stage_key
 
 async def extract_service_analysis_results(text: str) -> str:
     """サービス分析結果を抽出します。
@@ -289,6 +294,16 @@ async def integrate_evc_and_market_potential(evc_data: str, market_data: str) ->
         return error_msg
 
 
+# extract_data_from_textで使用するセグメント別の値のパターン（単位付きの金額・人数も数値に変換する）
+# EVCは負になり得るため、金額の直前の符号（"-" / "−" / "▲" / "△"）も含めて取り出す
+_EVC_SEGMENT_PATTERN = re.compile(
+    rf"(?:セグメント|Segment)\s*(\d+)[^:]*?:\s*([-−▲△]?{AMOUNT_PATTERN})", re.IGNORECASE
+)
+_MARKET_SEGMENT_PATTERN = re.compile(
+    rf"(?:セグメント|Segment)\s*(\d+)[^:]*?:\s*({AMOUNT_PATTERN})(?:\s*人|\s*社|\s*組織)*", re.IGNORECASE
+)
+
+
 def extract_data_from_text(evc_text: str, market_text: str) -> str:
     """テキストデータから構造化データを抽出します。
 
@@ -301,29 +316,13 @@ def extract_data_from_text(evc_text: str, market_text: str) -> str:
     """
     # EVC情報の抽出
     evc_segments = {}
-    evc_pattern = r"(?:セグメント|Segment)\s*(\d+)[^:]*?:\s*([0-9,.]+)"
-    evc_matches = re.finditer(evc_pattern, evc_text, re.IGNORECASE)
-
-    for match in evc_matches:
-        segment_id = match.group(1)
-        evc_value = match.group(2).replace(',', '')
-        try:
-            evc_segments[f"segment_{segment_id}"] = float(evc_value)
-        except ValueError:
-            evc_segments[f"segment_{segment_id}"] = evc_value
+    for match in _EVC_SEGMENT_PATTERN.finditer(evc_text):
+        evc_segments[f"segment_{match.group(1)}"] = parse_japanese_number(match.group(2))
 
     # 市場ポテンシャル情報の抽出
     market_segments = {}
-    market_pattern = r"(?:セグメント|Segment)\s*(\d+)[^:]*?:\s*([0-9,.]+)(?:\s*[万億兆]*人|\s*社|\s*組織)*"
-    market_matches = re.finditer(market_pattern, market_text, re.IGNORECASE)
-
-    for match in market_matches:
-        segment_id = match.group(1)
-        market_value = match.group(2).replace(',', '')
-        try:
-            market_segments[f"segment_{segment_id}"] = float(market_value)
-        except ValueError:
-            market_segments[f"segment_{segment_id}"] = market_value
+    for match in _MARKET_SEGMENT_PATTERN.finditer(market_text):
+        market_segments[f"segment_{match.group(1)}"] = parse_japanese_number(match.group(2))
 
     # 統合データを作成
     integrated_data = {
@@ -334,20 +333,154 @@ def extract_data_from_text(evc_text: str, market_text: str) -> str:
     return json.dumps(integrated_data, ensure_ascii=False, indent=2)
 
 
-def get_segmentation_workflow():
+# ワークフローのステップ定義（実行順）
+# name: 結果のキー, agent: エージェントの属性名, label: ログに表示する名称,
+# inputs: ステップが読み取る入力の (入力名, メッセージ見出し) のタプル。
+# 見出しがNoneの入力はそのままメッセージとして送信します。
+# ステップキャッシュのキーはinputsに列挙した入力のみから計算されます。
+WORKFLOW_STEPS: List[Dict[str, Any]] = [
+    {
+        "name": "service_analysis",
+        "agent": "service_analysis_agent",
+        "label": "サービス分析",
+        "inputs": (("service_description", None),),
+    },
+    {
+        "name": "customer_segments",
+        "agent": "customer_segment_agent",
+        "label": "顧客セグメント抽出",
+        "inputs": (("service_analysis", "サービス分析結果"), ("market_data", "市場データ")),
+    },
+    {
+        "name": "reference_products",
+        "agent": "reference_product_agent",
+        "label": "参照製品の特定",
+        "inputs": (("service_analysis", "サービス分析結果"), ("customer_segments", "顧客セグメント")),
+    },
+    {
+        "name": "value_comparisons",
+        "agent": "value_comparison_agent",
+        "label": "価値比較",
+        "inputs": (("service_analysis", "サービス分析結果"), ("reference_products", "参照製品")),
+    },
+    {
+        "name": "formula_designs",
+        "agent": "formula_design_agent",
+        "label": "計算式設計",
+        "inputs": (("value_comparisons", "価値比較"), ("customer_segments", "顧客セグメント")),
+    },
+    {
+        "name": "evc_calculations",
+        "agent": "evc_calculation_agent",
+        "label": "EVC計算",
+        "inputs": (("formula_designs", "計算式設計"), ("customer_segments", "顧客セグメント")),
+    },
+    {
+        "name": "market_potentials",
+        "agent": "market_potential_agent",
+        "label": "市場ポテンシャル分析",
+        "inputs": (
+            ("evc_calculations", "EVC計算結果"),
+            ("customer_segments", "顧客セグメント"),
+            ("market_data", "市場データ"),
+        ),
+    },
+    {
+        "name": "priority_evaluations",
+        "agent": "priority_evaluation_agent",
+        "label": "優先度評価",
+        "inputs": (("market_potentials", "市場ポテンシャル分析"), ("evc_calculations", "EVC計算結果")),
+    },
+]
+
+# JSON化せずにそのままメッセージへ埋め込むワークフロー入力
+WORKFLOW_RAW_INPUTS = ("service_description", "market_data")
+
+# 各ステップ結果を最後に参照するステップの位置（参照されない結果は生成したステップ自身の位置）
+# 結果の退避（result_store）は、この位置のステップが完了した時点で行います
+WORKFLOW_LAST_CONSUMER: Dict[str, int] = {
+    step["name"]: max(
+        [index]
+        + [
+            consumer_index
+            for consumer_index, consumer in enumerate(WORKFLOW_STEPS)
+            if any(input_name == step["name"] for input_name, _ in consumer["inputs"])
+        ]
+    )
+    for index, step in enumerate(WORKFLOW_STEPS)
+}
+
+
+def load_workflow_output(path: str) -> Dict[str, Any]:
+    """以前のワークフロー実行結果（output.json）を読み込みます。
+
+    result_storeへ退避したステップ結果のハンドルは、退避先のファイルからステップ結果を読み込みます。
+
+    Args:
+        path: ワークフロー実行結果のJSONファイルのパス
+
+    Returns:
+        ワークフロー実行結果
+
+    Raises:
+        WorkflowError: ファイルがワークフロー実行結果として読み込めない場合、または退避したステップ結果を読み込めない場合
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            previous_results = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise WorkflowError(f"ワークフロー実行結果を読み込めません: {path}: {e}")
+
+    if not isinstance(previous_results, dict):
+        raise WorkflowError(f"ワークフロー実行結果の形式が不正です: {path}")
+    return _materialize_results(previous_results, path)
+
+
+def _materialize_results(results: Dict[str, Any], source: str) -> Dict[str, Any]:
+    # 退避したステップ結果のハンドルを、退避先のファイルから読み込んだステップ結果に置き換える
+    try:
+        return SpillingResultStore.materialize(results)
+    except (OSError, json.JSONDecodeError) as e:
+        raise WorkflowError(f"退避したステップ結果を読み込めません: {source}: {e}")
+
+
+def get_segmentation_workflow(concurrency_controller=None, stage_cache=None, result_store=None):
     """セグメンテーションワークフローを取得します。
 
+    Args:
+        concurrency_controller: エージェント呼び出しの同時実行を制御するコントローラー（オプション）
+        stage_cache: ステップ出力をメモ化するキャッシュ（オプション）
+        result_store: 不要になったステップ結果を退避するストア（オプション）
+
     Returns:
         セグメンテーションワークフローのインスタンス
     """
-    return SegmentationWorkflow()
+    return SegmentationWorkflow(
+        concurrency_controller=concurrency_controller,
+        stage_cache=stage_cache,
+        result_store=result_store
+    )
 
 
 class SegmentationWorkflow:
     """顧客セグメンテーションと市場優先度評価のワークフローを管理するクラスです。"""
 
-    def __init__(self):
-        """SegmentationWorkflowクラスのコンストラクタ"""
+    def __init__(self, concurrency_controller=None, stage_cache=None, result_store=None):
+        """SegmentationWorkflowクラスのコンストラクタ
+
+        Args:
+            concurrency_controller: エージェント呼び出しの同時実行を制御するコントローラー（オプション）。
+                複数ワークフローで共有すると、プロセス全体の同時実行数が制御されます。
+            stage_cache: ステップ出力をメモ化するキャッシュ（オプション）。
+                兄弟ワークフローで共有すると、入力が一致するステップの結果を再利用します。
+            result_store: 不要になったステップ結果を退避するストア（オプション）。
+                指定すると、後続ステップから参照されなくなった結果をディスクへ書き出し、
+                実行結果にはSpilledStageResultハンドルのみを残します（失敗した場合も含め、実行の終了時に
+                すべてのステップ結果を退避します）。
+        """
+        self.concurrency_controller = concurrency_controller
+        self.stage_cache = stage_cache
+        self.result_store = result_store
         self.service_analysis_agent = get_service_analysis_agent()
         self.customer_segment_agent = get_customer_segment_agent()
         self.reference_product_agent = get_reference_product_agent()
@@ -358,7 +491,7 @@ class SegmentationWorkflow:
         self.priority_evaluation_agent = get_priority_evaluation_agent()
         self.logger = logging.getLogger(__name__)
 
-    async def _run_agent(self, agent, message: str, shared_context=None) -> Dict[str, Any]:
+    async def _run_agent(self, agent, message: str, shared_context=None, interactive: bool = True) -> Dict[str, Any]:
         """
         エージェントを実行するためのヘルパーメソッド
 
@@ -369,6 +502,7 @@ class SegmentationWorkflow:
             agent: 実行するエージェント
             message: エージェントに送信するメッセージ
             shared_context: 共有コンテキスト（オプション）
+            interactive: 対話的なワークフローの呼び出しか（同時実行制御の優先度に使用）
             
         Returns:
             エージェントからのレスポンス
@@ -379,7 +513,13 @@ class SegmentationWorkflow:
         try:
             # シンプルなAPI呼び出し
             self.logger.info(f"エージェント {agent.__class__.__name__} を実行します")
-            result = await call_agent(agent, message, context_data)
+            if self.concurrency_controller is not None:
+                # 同時実行制御が有効な場合は実行枠を確保してから呼び出す
+                result = await self.concurrency_controller.call(
+                    call_agent, agent, message, context_data, interactive=interactive
+                )
+            else:
+                result = await call_agent(agent, message, context_data)
             
             # 結果がない場合のフォールバック処理
             if result is None:
@@ -394,16 +534,147 @@ class SegmentationWorkflow:
             # 例外が発生してもクラッシュせず、エラー情報を返す
             return {"error": str(e), "result": "エージェントの実行中にエラーが発生しました"}
 
-    async def run_workflow(self, service_description: str, market_data: str) -> Dict[str, Any]:
+    def _build_stage_message(self, step: Dict[str, Any], stage_inputs: Dict[str, Any]) -> str:
+        """ステップの入力からエージェントに送信するメッセージを組み立てます。
+
+        Args:
+            step: WORKFLOW_STEPSのステップ定義
+            stage_inputs: ステップが読み取る入力
+
+        Returns:
+            エージェントに送信するメッセージ
+        """
+        sections = []
+        for input_name, heading in step["inputs"]:
+            value = stage_inputs[input_name]
+            if heading is None:
+                return value
+            if input_name not in WORKFLOW_RAW_INPUTS:
+                value = json.dumps(value, indent=2, ensure_ascii=False)
+            sections.append(f"# {heading}\n{value}")
+        return "\n\n".join(sections)
+
+    async def _run_stage(
+        self,
+        step: Dict[str, Any],
+        available: Dict[str, Any],
+        shared_context: Dict[str, Any],
+        interactive: bool = True
+    ) -> Dict[str, Any]:
+        """ワークフローの1ステップを実行します。
+
+        ステップキャッシュが有効な場合は、ステップが読み取る入力のみから計算したキーで
+        結果をメモ化し、入力が一致する兄弟ワークフローの結果を再利用します。
+
+        Args:
+            step: WORKFLOW_STEPSのステップ定義
+            available: ワークフロー入力とこれまでのステップ結果
+            shared_context: 共有コンテキスト
+            interactive: 対話的なワークフローのステップか（同時実行制御の優先度に使用）
+
+        Returns:
+            ステップの結果
+        """
+        agent = getattr(self, step["agent"])
+        stage_inputs = {input_name: available[input_name] for input_name, _ in step["inputs"]}
+        message = self._build_stage_message(step, stage_inputs)
+
+        if self.stage_cache is None:
+            return await self._run_agent(agent, message, shared_context, interactive)
+
+        key = compute_stage_key(step["name"], agent, stage_inputs)
+        return await self.stage_cache.get_or_compute(
+            key, lambda: self._run_agent(agent, message, shared_context, interactive)
+        )
+
+    async def run_workflow(self, service_description: str, market_data: str, interactive: bool = True) -> Dict[str, Any]:
         """ワークフローを実行します。
 
         Args:
             service_description: サービス説明
             market_data: 市場データ
+            interactive: 対話的なワークフローか（Falseの場合、エージェント呼び出しは同時実行制御の
+                予約枠を使用せず、対話的なワークフローの呼び出しの後に実行されます）
 
         Returns:
             ワークフロー実行結果
         """
+        results, available, shared_context, trace_id = self._initialize_run(service_description, market_data)
+        return await self._execute_steps(
+            results, available, shared_context, trace_id, start_index=0, interactive=interactive
+        )
+
+    async def replay_workflow(
+        self,
+        previous_results: Dict[str, Any],
+        from_stage: str,
+        service_description: str = "",
+        market_data: str = ""
+    ) -> Dict[str, Any]:
+        """既存のワークフロー結果を再利用し、指定したステップ以降のみを再実行します。
+
+        from_stageより前のステップ結果はprevious_results（output.jsonの内容）から復元し、
+        エージェントを呼び出しません。計算式設計以降など後半のステップだけを
+        パラメータ調整後に素早く再実行する用途を想定しています。
+
+        Args:
+            previous_results: 以前のワークフロー実行結果
+            from_stage: 再実行を開始するステップ名（WORKFLOW_STEPSのname）
+            service_description: サービス説明（再実行するステップが参照する場合に必要）
+            market_data: 市場データ（再実行するステップが参照する場合に必要）
+
+        Returns:
+            ワークフロー実行結果
+
+        Raises:
+            WorkflowError: ステップ名が不正な場合、または再実行に必要な結果・入力が不足している場合
+        """
+        # 退避したステップ結果のハンドルを含む場合は、ステップ結果を読み込んでから復元する
+        previous_results = _materialize_results(previous_results, "previous_results")
+
+        step_names = [step["name"] for step in WORKFLOW_STEPS]
+        if from_stage not in step_names:
+            raise WorkflowError(f"未知のステップです: {from_stage}（指定可能: {', '.join(step_names)}）")
+        start_index = step_names.index(from_stage)
+
+        results, available, shared_context, trace_id = self._initialize_run(service_description, market_data)
+        results["replayed_from"] = {
+            "workflow_id": previous_results.get("workflow_id"),
+            "stage": from_stage
+        }
+
+        # 再実行するステップが参照する入力のうち、前半のステップ結果を復元する
+        required = {
+            input_name
+            for step in WORKFLOW_STEPS[start_index:]
+            for input_name, _ in step["inputs"]
+        }
+        for step in WORKFLOW_STEPS[:start_index]:
+            name = step["name"]
+            step_result = previous_results.get(name)
+            if name in required and (not isinstance(step_result, dict) or step_result.get("error")):
+                raise WorkflowError(f"再実行に必要なステップ結果 '{name}' が以前の結果に含まれていません")
+            if step_result is not None:
+                results[name] = step_result
+                available[name] = step_result
+
+        for input_name in WORKFLOW_RAW_INPUTS:
+            if input_name in required and not available.get(input_name):
+                raise WorkflowError(f"ステップ {from_stage} 以降の再実行には {input_name} が必要です")
+
+        self.logger.info(f"ステップ {from_stage} からワークフローを再実行します")
+        return await self._execute_steps(results, available, shared_context, trace_id, start_index=start_index)
+
+    def _initialize_run(self, service_description: str, market_data: str) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any], str]:
+        """ワークフロー実行結果・ステップ入力・共有コンテキスト・トレースIDを初期化します。
+
+        Args:
+            service_description: サービス説明
+            market_data: 市場データ
+
+        Returns:
+            (実行結果, ステップ入力, 共有コンテキスト, トレースID) のタプル
+        """
         # 初期化
         workflow_id = f"workflow-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
         results = {
@@ -432,110 +703,69 @@ class SegmentationWorkflow:
         shared_context["workflow_name"] = "NexaSales顧客セグメンテーションワークフロー"
         
         self.logger.info(f"統一トレースIDを生成しました: {trace_id}")
-        
+
+        # 各ステップが参照できる入力（ワークフロー入力とステップ結果）
+        available = {
+            "service_description": service_description,
+            "market_data": market_data
+        }
+        return results, available, shared_context, trace_id
+
+    def _spill_finished_results(self, results: Dict[str, Any], available: Dict[str, Any], step_index: int) -> None:
+        """後続ステップから参照されなくなったステップ結果をresult_storeへ退避します。
+
+        Args:
+            results: ワークフロー実行結果（退避した結果はハンドルに置き換えられます）
+            available: ワークフロー入力とこれまでのステップ結果（退避した結果は削除されます）
+            step_index: 完了したステップの位置
+        """
+        for name in [name for name in available if name in WORKFLOW_LAST_CONSUMER]:
+            if WORKFLOW_LAST_CONSUMER[name] <= step_index:
+                results[name] = self.result_store.spill(results["workflow_id"], name, available.pop(name))
+
+    async def _execute_steps(
+        self,
+        results: Dict[str, Any],
+        available: Dict[str, Any],
+        shared_context: Dict[str, Any],
+        trace_id: str,
+        start_index: int = 0,
+        interactive: bool = True
+    ) -> Dict[str, Any]:
+        """WORKFLOW_STEPSをstart_index番目のステップから順に実行します。
+
+        Args:
+            results: ワークフロー実行結果（ステップ結果が追記されます）
+            available: ワークフロー入力とこれまでのステップ結果
+            shared_context: 共有コンテキスト
+            trace_id: トレースID
+            start_index: 実行を開始するステップの位置
+            interactive: 対話的なワークフローか（同時実行制御の優先度に使用）
+
+        Returns:
+            ワークフロー実行結果
+        """
         try:
-            # ステップ1: サービス分析
-            self.logger.info("サービス分析を開始します")
-            service_analysis_result = await self._run_agent(self.service_analysis_agent, service_description, shared_context)
-            results["service_analysis"] = service_analysis_result
-            
-            if service_analysis_result.get("error"):
-                self.logger.error(f"サービス分析でエラーが発生しました: {service_analysis_result['error']}")
-                results["error"] = service_analysis_result["error"]
-                results["status"] = "failed"
-                results["completed_at"] = datetime.now().isoformat()
-                return results
-
-            # ステップ2: 顧客セグメント抽出
-            self.logger.info("顧客セグメント抽出を開始します")
-            customer_segment_message = f"# サービス分析結果\n{json.dumps(service_analysis_result, indent=2, ensure_ascii=False)}\n\n# 市場データ\n{market_data}"
-            customer_segments = await self._run_agent(self.customer_segment_agent, customer_segment_message, shared_context)
-            results["customer_segments"] = customer_segments
-
-            if customer_segments.get("error"):
-                self.logger.error(f"顧客セグメント抽出でエラーが発生しました: {customer_segments['error']}")
-                results["error"] = customer_segments["error"]
-                results["status"] = "failed"
-                results["completed_at"] = datetime.now().isoformat()
-                return results
-
-            # ステップ3: 参照製品の特定
-            self.logger.info("参照製品の特定を開始します")
-            reference_product_message = f"# サービス分析結果\n{json.dumps(service_analysis_result, indent=2, ensure_ascii=False)}\n\n# 顧客セグメント\n{json.dumps(customer_segments, indent=2, ensure_ascii=False)}"
-            reference_products = await self._run_agent(self.reference_product_agent, reference_product_message, shared_context)
-            results["reference_products"] = reference_products
-
-            if reference_products.get("error"):
-                self.logger.error(f"参照製品の特定でエラーが発生しました: {reference_products['error']}")
-                results["error"] = reference_products["error"]
-                results["status"] = "failed"
-                results["completed_at"] = datetime.now().isoformat()
-                return results
-
-            # ステップ4: 価値比較
-            self.logger.info("価値比較を開始します")
-            value_comparison_message = f"# サービス分析結果\n{json.dumps(service_analysis_result, indent=2, ensure_ascii=False)}\n\n# 参照製品\n{json.dumps(reference_products, indent=2, ensure_ascii=False)}"
-            value_comparisons = await self._run_agent(self.value_comparison_agent, value_comparison_message, shared_context)
-            results["value_comparisons"] = value_comparisons
-
-            if value_comparisons.get("error"):
-                self.logger.error(f"価値比較でエラーが発生しました: {value_comparisons['error']}")
-                results["error"] = value_comparisons["error"]
-                results["status"] = "failed"
-                results["completed_at"] = datetime.now().isoformat()
-                return results
-
-            # ステップ5: 計算式設計
-            self.logger.info("計算式設計を開始します")
-            formula_design_message = f"# 価値比較\n{json.dumps(value_comparisons, indent=2, ensure_ascii=False)}\n\n# 顧客セグメント\n{json.dumps(customer_segments, indent=2, ensure_ascii=False)}"
-            formula_designs = await self._run_agent(self.formula_design_agent, formula_design_message, shared_context)
-            results["formula_designs"] = formula_designs
-
-            if formula_designs.get("error"):
-                self.logger.error(f"計算式設計でエラーが発生しました: {formula_designs['error']}")
-                results["error"] = formula_designs["error"]
-                results["status"] = "failed"
-                results["completed_at"] = datetime.now().isoformat()
-                return results
-
-            # ステップ6: EVC計算
-            self.logger.info("EVC計算を開始します")
-            evc_calculation_message = f"# 計算式設計\n{json.dumps(formula_designs, indent=2, ensure_ascii=False)}\n\n# 顧客セグメント\n{json.dumps(customer_segments, indent=2, ensure_ascii=False)}"
-            evc_calculations = await self._run_agent(self.evc_calculation_agent, evc_calculation_message, shared_context)
-            results["evc_calculations"] = evc_calculations
-
-            if evc_calculations.get("error"):
-                self.logger.error(f"EVC計算でエラーが発生しました: {evc_calculations['error']}")
-                results["error"] = evc_calculations["error"]
-                results["status"] = "failed"
-                results["completed_at"] = datetime.now().isoformat()
-                return results
-
-            # ステップ7: 市場ポテンシャル分析
-            self.logger.info("市場ポテンシャル分析を開始します")
-            market_potential_message = f"# EVC計算結果\n{json.dumps(evc_calculations, indent=2, ensure_ascii=False)}\n\n# 顧客セグメント\n{json.dumps(customer_segments, indent=2, ensure_ascii=False)}\n\n# 市場データ\n{market_data}"
-            market_potentials = await self._run_agent(self.market_potential_agent, market_potential_message, shared_context)
-            results["market_potentials"] = market_potentials
-
-            if market_potentials.get("error"):
-                self.logger.error(f"市場ポテンシャル分析でエラーが発生しました: {market_potentials['error']}")
-                results["error"] = market_potentials["error"]
-                results["status"] = "failed"
-                results["completed_at"] = datetime.now().isoformat()
-                return results
-
-            # ステップ8: 優先度評価
-            self.logger.info("優先度評価を開始します")
-            priority_evaluation_message = f"# 市場ポテンシャル分析\n{json.dumps(market_potentials, indent=2, ensure_ascii=False)}\n\n# EVC計算結果\n{json.dumps(evc_calculations, indent=2, ensure_ascii=False)}"
-            priority_evaluations = await self._run_agent(self.priority_evaluation_agent, priority_evaluation_message, shared_context)
-            results["priority_evaluations"] = priority_evaluations
-
-            if priority_evaluations.get("error"):
-                self.logger.error(f"優先度評価でエラーが発生しました: {priority_evaluations['error']}")
-                results["error"] = priority_evaluations["error"]
-                results["status"] = "failed"
-                results["completed_at"] = datetime.now().isoformat()
-                return results
+            try:
+                for step in WORKFLOW_STEPS[start_index:]:
+                    self.logger.info(f"{step['label']}を開始します")
+                    step_result = await self._run_stage(step, available, shared_context, interactive)
+                    results[step["name"]] = step_result
+                    available[step["name"]] = step_result
+
+                    if step_result.get("error"):
+                        self.logger.error(f"{step['label']}でエラーが発生しました: {step_result['error']}")
+                        results["error"] = step_result["error"]
+                        results["status"] = "failed"
+                        results["completed_at"] = datetime.now().isoformat()
+                        return results
+
+                    if self.result_store is not None:
+                        self._spill_finished_results(results, available, WORKFLOW_STEPS.index(step))
+            finally:
+                if self.result_store is not None:
+                    # 失敗・例外を含むすべての終了経路で、以降参照されないステップ結果をすべて退避する
+                    self._spill_finished_results(results, available, len(WORKFLOW_STEPS))
             self.logger.info("優先度評価が完了しました")
 
             # 正常完了
@@ -546,6 +776,9 @@ class SegmentationWorkflow:
             
             # 実行完了ログ
             self.logger.info("すべてのエージェント呼び出しが完了しました")
+            if self.stage_cache is not None:
+                self.logger.info(f"ステップキャッシュの統計: {self.stage_cache.stats()}")
+            self.logger.info(f"EVC計算メモの統計: {get_evc_memo().stats()}")
                 
             # トレースIDを結果に含める
             results["trace_id"] = trace_id
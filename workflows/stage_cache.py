@@ -0,0 +1,200 @@
+"""
+NexaSales - 顧客セグメンテーションと市場優先度評価フレームワーク
+
+このモジュールは、ワークフローのステップ出力をメモ化するキャッシュを提供します。
+キャッシュキーは各ステップが実際に読み取る入力だけを正規化してハッシュ化したもので、
+同じ市場データを共有する製品バリエーションなど、入力が一致する兄弟ワークフロー間で
+ステップの結果を再利用できます。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# 連続する空白を1つにまとめるためのパターン
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_stage_input(value: Any) -> Any:
+    """ステップ入力をハッシュ用に正規化します。
+
+    文字列はインデントや改行の違いを無視するため空白を正規化し、
+    辞書・リストは再帰的に正規化します。
+
+    Args:
+        value: ステップ入力
+
+    Returns:
+        正規化された入力
+    """
+    if isinstance(value, str):
+        return _WHITESPACE_PATTERN.sub(" ", value).strip()
+    if isinstance(value, dict):
+        return {str(k): normalize_stage_input(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_stage_input(v) for v in value]
+    return value
+
+
+def compute_stage_key(stage_name: str, agent: Any, inputs: Dict[str, Any]) -> str:
+    """ステップのキャッシュキーを計算します。
+
+    エージェントの名前と指示もキーに含め、プロンプトが変更された場合は再計算されるようにします。
+
+    Args:
+        stage_name: ステップ名
+        agent: ステップを実行するエージェント
+        inputs: ステップが読み取る入力のみを含む辞書
+
+    Returns:
+        SHA-256のハッシュ文字列
+    """
+    payload = {
+        "stage": stage_name,
+        "agent": getattr(agent, "name", agent.__class__.__name__),
+        "instructions": normalize_stage_input(getattr(agent, "instructions", "") or ""),
+        "inputs": normalize_stage_input(inputs),
+    }
+    canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class StageCache:
+    """ワークフローのステップ出力をメモ化するキャッシュです。
+
+    メモリ上のLRUに加え、cache_dirを指定するとディスクにも保存し、プロセスをまたいで再利用できます。
+    max_entries=0とcache_dirを指定すると、結果をメモリに保持しないディスクのみのキャッシュになります。
+    同じキーの計算が並行して要求された場合は、最初の計算結果を共有します。
+    エラーを含む結果はキャッシュしません。
+    """
+
+    def __init__(self, max_entries: int = 256, cache_dir: Optional[str] = None):
+        """
+        キャッシュを初期化します。
+
+        Args:
+            max_entries: メモリ上に保持するエントリ数の上限（0の場合はメモリに保持しない）
+            cache_dir: ディスクキャッシュのディレクトリ（省略時はメモリのみ）
+        """
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._stats = {"hits": 0, "misses": 0, "shared": 0}
+        self.logger = logging.getLogger(__name__)
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _disk_path(self, key: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """キャッシュ済みの結果を取得します。
+
+        Args:
+            key: キャッシュキー
+
+        Returns:
+            キャッシュ済みの結果（存在しない場合はNone）
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        path = self._disk_path(key)
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    value = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                self.logger.warning(f"ステップキャッシュの読み込みに失敗しました: {e}")
+                return None
+            self._remember(key, value)
+            return value
+
+        return None
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        """結果をキャッシュに保存します。
+
+        Args:
+            key: キャッシュキー
+            value: ステップの結果
+        """
+        if not isinstance(value, dict) or value.get("error"):
+            return
+        self._remember(key, value)
+
+        path = self._disk_path(key)
+        if path:
+            try:
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(value, f, ensure_ascii=False)
+            except (OSError, TypeError) as e:
+                self.logger.warning(f"ステップキャッシュの書き込みに失敗しました: {e}")
+
+    def _remember(self, key: str, value: Dict[str, Any]) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """キャッシュ済みの結果を返すか、計算して保存します。
+
+        Args:
+            key: キャッシュキー
+            compute: 結果を計算する非同期関数
+
+        Returns:
+            ステップの結果
+        """
+        cached = self.get(key)
+        if cached is not None:
+            self._stats["hits"] += 1
+            return cached
+
+        # 同じ入力のステップが実行中であれば、その結果を待つ
+        pending = self._pending.get(key)
+        if pending is not None:
+            self._stats["shared"] += 1
+            return await asyncio.shield(pending)
+
+        self._stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            value = await compute()
+            self.put(key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            # 待機者がいない場合の未取得例外の警告を抑制する
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            del self._pending[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """キャッシュのヒット率などの統計を返します。
+
+        Returns:
+            統計情報の辞書
+        """
+        lookups = self._stats["hits"] + self._stats["misses"] + self._stats["shared"]
+        reused = self._stats["hits"] + self._stats["shared"]
+        return {
+            **self._stats,
+            "entries": len(self._entries),
+            "hit_rate": reused / lookups if lookups else 0.0,
+        }